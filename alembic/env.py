@@ -19,7 +19,8 @@ if DATABASE_URL:
 
 # логирование Alembic
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # keep the app's loggers alive when migrations run in-process (entrypoint, tests)
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # указываем MetaData из моделей
 target_metadata = Base.metadata
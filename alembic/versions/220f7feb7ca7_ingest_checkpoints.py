@@ -0,0 +1,35 @@
+"""ingest_checkpoints table for resumable bulk imports
+
+Revision ID: 220f7feb7ca7
+Revises: bc33cfcf3288
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '220f7feb7ca7'
+down_revision: Union[str, None] = 'bc33cfcf3288'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not sa.inspect(op.get_bind()).has_table('ingest_checkpoints'):
+        op.create_table(
+            'ingest_checkpoints',
+            sa.Column('source', sa.String(length=255), primary_key=True),
+            sa.Column('line_no', sa.Integer(), nullable=False),
+            sa.Column('rows', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ingest_checkpoints')
@@ -0,0 +1,78 @@
+"""name search: FTS5 table with triggers on SQLite, trigram indexes on Postgres
+
+Revision ID: 24958f17aab6
+Revises: b8f415b1bb4c
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '24958f17aab6'
+down_revision: Union[str, None] = 'b8f415b1bb4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> kind; the FTS rowid is id * 4 + kind
+TABLES = {'horses': 1, 'jockeys': 2, 'owners': 3}
+
+
+def _fold(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in TABLES:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} "
+                f"USING gin (lower(name) gin_trgm_ops)"
+            )
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_name_prefix ON {table} "
+                f"(lower(name) text_pattern_ops)"
+            )
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "name, display UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    for table, kind in TABLES.items():
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO search_index (rowid, name, display) "
+            f"VALUES (new.id * 4 + {kind}, {_fold('new.name')}, new.name); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF name ON {table} BEGIN "
+            f"UPDATE search_index SET name = {_fold('new.name')}, display = new.name "
+            f"WHERE rowid = old.id * 4 + {kind}; END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM search_index WHERE rowid = old.id * 4 + {kind}; END"
+        )
+        op.execute(
+            f"INSERT OR REPLACE INTO search_index (rowid, name, display) "
+            f"SELECT id * 4 + {kind}, {_fold('name')}, name FROM {table} WHERE name IS NOT NULL"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_name_prefix")
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_name_trgm")
+        return
+
+    for table in TABLES:
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_index")
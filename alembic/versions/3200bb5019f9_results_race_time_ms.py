@@ -0,0 +1,99 @@
+"""results.race_time_ms with backfill and timing indexes
+
+Revision ID: 3200bb5019f9
+Revises: 220f7feb7ca7
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3200bb5019f9'
+down_revision: Union[str, None] = '220f7feb7ca7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHUNK = 5000
+
+# parser frozen as of this revision; app.race_time is free to change later
+_UNITS_RE = re.compile(r"^(?:(\d+)\s*h\s*)?(?:(\d+)\s*m(?:in)?\s*)?(\d+(?:\.\d+)?)\s*s(?:ec)?$")
+_COLON_RE = re.compile(r"^(?:(\d+):)?(\d+):(\d{1,2}(?:\.\d+)?)$")
+_DOTTED_RE = re.compile(r"^(\d+)\.(\d{2})\.(\d+)$")
+_SECONDS_RE = re.compile(r"^\d+(?:\.\d+)?$")
+
+
+def _ms(hours, minutes, seconds):
+    return (int(hours or 0) * 3600 + int(minutes or 0) * 60) * 1000 + round(float(seconds) * 1000)
+
+
+def _parse_race_time(value):
+    if value is None:
+        return None
+    text = value.strip().lower().replace(",", ".")
+    if not text:
+        return None
+    match = _COLON_RE.match(text)
+    if match:
+        hours, minutes, seconds = match.groups()
+        return None if float(seconds) >= 60 else _ms(hours, minutes, seconds)
+    match = _DOTTED_RE.match(text)
+    if match:
+        minutes, seconds, fraction = match.groups()
+        return None if int(seconds) >= 60 else _ms(0, minutes, f"{seconds}.{fraction}")
+    match = _UNITS_RE.match(text)
+    if match:
+        return _ms(*match.groups())
+    if _SECONDS_RE.match(text):
+        return _ms(0, 0, text)
+    return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('results')}
+    if 'race_time_ms' not in columns:
+        op.add_column('results', sa.Column('race_time_ms', sa.Integer(), nullable=True))
+
+    # backfill in id-ordered chunks, each one a short statement batch
+    results = sa.table('results', sa.column('id'), sa.column('race_time'), sa.column('race_time_ms'))
+    update = (
+        sa.update(results)
+        .where(results.c.id == sa.bindparam('_id'))
+        .values(race_time_ms=sa.bindparam('_ms'))
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(results.c.id, results.c.race_time)
+            .where(results.c.id > last_id, results.c.race_time_ms.is_(None))
+            .order_by(results.c.id)
+            .limit(CHUNK)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        params = [
+            {'_id': row.id, '_ms': ms}
+            for row in rows
+            if (ms := _parse_race_time(row.race_time)) is not None
+        ]
+        if params:
+            bind.execute(update, params)
+
+    op.create_index('ix_results_race_position', 'results', ['race_id', 'position'], if_not_exists=True)
+    op.create_index('ix_results_horse_time', 'results', ['horse_id', 'race_time_ms'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_results_horse_time', table_name='results')
+    op.drop_index('ix_results_race_position', table_name='results')
+    with op.batch_alter_table('results') as batch_op:
+        batch_op.drop_column('race_time_ms')
@@ -0,0 +1,44 @@
+"""covering and case-insensitive indexes on users.login
+
+Revision ID: 37758253a6b4
+Revises: c166d830a0d4
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '37758253a6b4'
+down_revision: Union[str, None] = 'c166d830a0d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # login -> (id, password, type) is answered from the index alone on
+    # Postgres; SQLite has no INCLUDE and would need the columns in the key
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index(
+            'ix_users_login_auth',
+            'users',
+            ['login'],
+            postgresql_include=['id', 'password', 'type'],
+            if_not_exists=True,
+        )
+    op.create_index(
+        'ix_users_login_lower',
+        'users',
+        [sa.text('lower(login)')],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_login_lower', table_name='users')
+    op.drop_index('ix_users_login_auth', table_name='users', if_exists=True)
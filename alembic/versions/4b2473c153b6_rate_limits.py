@@ -0,0 +1,34 @@
+"""rate_limits table for shared login token buckets
+
+Revision ID: 4b2473c153b6
+Revises: 4db1ad942d75
+Create Date: 2026-10-18 17:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b2473c153b6'
+down_revision: Union[str, None] = '4db1ad942d75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not sa.inspect(op.get_bind()).has_table('rate_limits'):
+        op.create_table(
+            'rate_limits',
+            sa.Column('key', sa.String(length=200), primary_key=True),
+            sa.Column('tokens', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.Float(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rate_limits')
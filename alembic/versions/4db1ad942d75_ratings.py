@@ -0,0 +1,51 @@
+"""horses.rating, rating_history and rating indexes
+
+Revision ID: 4db1ad942d75
+Revises: 54dcd9fcac99
+Create Date: 2026-10-18 16:30:00.000000
+
+Ratings are not backfilled here; run ``flask ratings rebuild`` once.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4db1ad942d75'
+down_revision: Union[str, None] = '54dcd9fcac99'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {c['name'] for c in inspector.get_columns('horses')}
+    if 'rating' not in columns:
+        op.add_column('horses', sa.Column('rating', sa.Float(), nullable=True))
+    if not inspector.has_table('rating_history'):
+        op.create_table(
+            'rating_history',
+            sa.Column('result_id', sa.Integer(), sa.ForeignKey('results.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('horse_before', sa.Float(), nullable=False),
+            sa.Column('horse_after', sa.Float(), nullable=False),
+            sa.Column('jockey_before', sa.Float(), nullable=False),
+            sa.Column('jockey_after', sa.Float(), nullable=False),
+        )
+    if 'rating' not in columns:
+        # jockeys.rating was never computed before; start everyone at the initial rating
+        op.execute("UPDATE jockeys SET rating = 1500")
+    op.create_index('ix_horses_rating', 'horses', ['rating'], if_not_exists=True)
+    op.create_index('ix_jockeys_rating', 'jockeys', ['rating'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_jockeys_rating', table_name='jockeys')
+    op.drop_index('ix_horses_rating', table_name='horses')
+    op.drop_table('rating_history')
+    with op.batch_alter_table('horses') as batch_op:
+        batch_op.drop_column('rating')
@@ -0,0 +1,41 @@
+"""user_sessions table for the server-side session store
+
+Revision ID: 54dcd9fcac99
+Revises: 24958f17aab6
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '54dcd9fcac99'
+down_revision: Union[str, None] = '24958f17aab6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not sa.inspect(op.get_bind()).has_table('user_sessions'):
+        op.create_table(
+            'user_sessions',
+            sa.Column('id', sa.String(length=64), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=True),
+            sa.Column('login', sa.String(length=120), nullable=True),
+            sa.Column('user_type', sa.String(length=20), nullable=True),
+            sa.Column('data', sa.Text(), nullable=False),
+            sa.Column('expires_at', sa.Float(), nullable=False),
+        )
+    op.create_index('ix_user_sessions_user_id', 'user_sessions', ['user_id'], if_not_exists=True)
+    op.create_index('ix_user_sessions_expires_at', 'user_sessions', ['expires_at'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_sessions_expires_at', table_name='user_sessions', if_exists=True)
+    op.drop_index('ix_user_sessions_user_id', table_name='user_sessions', if_exists=True)
+    op.drop_table('user_sessions')
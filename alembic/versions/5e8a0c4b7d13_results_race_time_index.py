@@ -0,0 +1,27 @@
+"""results (race_id, race_time_ms) index for venue track records
+
+Revision ID: 5e8a0c4b7d13
+Revises: 9f1d2c7a4e60
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a0c4b7d13'
+down_revision: Union[str, None] = '9f1d2c7a4e60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_results_race_time', 'results', ['race_id', 'race_time_ms'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_results_race_time', table_name='results')
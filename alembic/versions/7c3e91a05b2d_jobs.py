@@ -0,0 +1,52 @@
+"""jobs table for the background job queue
+
+Revision ID: 7c3e91a05b2d
+Revises: d4287e4efbe6
+Create Date: 2026-10-18 19:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e91a05b2d'
+down_revision: Union[str, None] = 'd4287e4efbe6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not sa.inspect(op.get_bind()).has_table('jobs'):
+        op.create_table(
+            'jobs',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('kind', sa.String(length=50), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('status', sa.String(length=10), nullable=False),
+            sa.Column('priority', sa.Integer(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('max_attempts', sa.Integer(), nullable=False),
+            sa.Column('run_after', sa.DateTime(), nullable=False),
+            sa.Column('locked_by', sa.String(length=100), nullable=True),
+            sa.Column('locked_at', sa.DateTime(), nullable=True),
+            sa.Column('progress', sa.Float(), nullable=False),
+            sa.Column('message', sa.String(length=200), nullable=False),
+            sa.Column('result', sa.Text(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+        )
+    op.create_index('ix_jobs_status_priority', 'jobs', ['status', 'priority', 'run_after', 'id'], if_not_exists=True)
+    op.create_index('ix_jobs_created_at', 'jobs', ['created_at'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_jobs_created_at', table_name='jobs')
+    op.drop_index('ix_jobs_status_priority', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,143 @@
+"""results.race_date, season_archives and season partitions on Postgres
+
+Revision ID: 9f1d2c7a4e60
+Revises: 7c3e91a05b2d
+Create Date: 2026-10-18 21:05:00.000000
+
+"""
+import datetime as dt
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f1d2c7a4e60'
+down_revision: Union[str, None] = '7c3e91a05b2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The partition rebuild below is frozen as of this revision; app.seasons has
+# its own copy for the CLI and is free to change later.
+PARTITIONED = {'races': 'date', 'results': 'race_date'}
+
+
+def _is_partitioned(bind) -> bool:
+    return bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('races'))"
+    )).scalar()
+
+
+def _partition_ddl(table: str, season: int) -> str:
+    return (f"CREATE TABLE IF NOT EXISTS {table}_{season} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{dt.date(season, 1, 1)}') TO ('{dt.date(season + 1, 1, 1)}')")
+
+
+def _rebuild_tables(bind, partitioned: bool, seasons=()) -> None:
+    """Recreate races/results (partitioned per season or plain) and copy the rows over."""
+    layout = {}
+    for table in PARTITIONED:
+        indexes = bind.execute(sa.text(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:t))"
+        ), {'t': table}).scalars().all()
+        sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': table}).scalar()
+        layout[table] = (indexes, sequence)
+    foreign_keys = bind.execute(sa.text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = 'results'::regclass AND contype = 'f' AND confrelid <> 'races'::regclass"
+    )).all()
+    # rating_history.result_id cannot reference a partitioned table, which
+    # has no unique index on id alone
+    referencing = bind.execute(sa.text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f' "
+        "AND confrelid IN ('races'::regclass, 'results'::regclass) "
+        "AND conrelid NOT IN ('races'::regclass, 'results'::regclass)"
+    )).all()
+    notify = bind.execute(sa.text("SELECT to_regproc('results_live_notify') IS NOT NULL")).scalar()
+    for table, name in referencing:
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+
+    for table in reversed(list(PARTITIONED)):
+        if layout[table][1]:
+            op.execute(f"ALTER SEQUENCE {layout[table][1]} OWNED BY NONE")
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    for table, key in PARTITIONED.items():
+        suffix = f" PARTITION BY RANGE ({key})" if partitioned else ""
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS){suffix}")
+        for season in sorted(seasons):
+            op.execute(_partition_ddl(table, season))
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+    op.execute("DROP TABLE results_old, races_old")
+
+    for table, key in PARTITIONED.items():
+        columns = f"id, {key}" if partitioned else "id"
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({columns})")
+        indexes, sequence = layout[table]
+        if sequence:
+            op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        for definition in indexes:
+            op.execute(definition)
+    if partitioned:
+        op.execute("ALTER TABLE results ALTER COLUMN race_date SET NOT NULL")
+        # a changed race date moves its results along to the right partition
+        op.execute("ALTER TABLE results ADD CONSTRAINT results_race_id_fkey FOREIGN KEY "
+                   "(race_id, race_date) REFERENCES races (id, date) ON UPDATE CASCADE")
+    else:
+        op.execute("ALTER TABLE results ALTER COLUMN race_date DROP NOT NULL")
+        op.execute("ALTER TABLE results ADD CONSTRAINT results_race_id_fkey "
+                   "FOREIGN KEY (race_id) REFERENCES races (id)")
+        op.execute("ALTER TABLE rating_history ADD CONSTRAINT rating_history_result_id_fkey "
+                   "FOREIGN KEY (result_id) REFERENCES results (id) ON DELETE CASCADE")
+    for name, definition in foreign_keys:
+        op.execute(f'ALTER TABLE results ADD CONSTRAINT "{name}" {definition}')
+    if notify:
+        # the live feed trigger went with the old table (d4287e4efbe6)
+        op.execute("CREATE TRIGGER results_live_notify AFTER INSERT ON results "
+                   "FOR EACH ROW EXECUTE FUNCTION results_live_notify()")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('results')}
+    if 'race_date' not in columns:
+        op.add_column('results', sa.Column('race_date', sa.Date(), nullable=True))
+    op.execute(
+        "UPDATE results SET race_date = (SELECT races.date FROM races WHERE races.id = results.race_id) "
+        "WHERE race_date IS NULL"
+    )
+    op.create_index('ix_results_race_date_id', 'results', ['race_date', 'id'], if_not_exists=True)
+
+    if not sa.inspect(bind).has_table('season_archives'):
+        op.create_table(
+            'season_archives',
+            sa.Column('season', sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column('date_from', sa.Date(), nullable=False),
+            sa.Column('date_to', sa.Date(), nullable=False),
+            sa.Column('location', sa.String(length=255), nullable=False),
+            sa.Column('races', sa.Integer(), nullable=False),
+            sa.Column('results', sa.Integer(), nullable=False),
+            sa.Column('archived_at', sa.DateTime(), nullable=False),
+        )
+
+    # Postgres: rebuild races/results partitioned per season, one partition
+    # for every season with races plus the current and the next one
+    if bind.dialect.name == 'postgresql' and not _is_partitioned(bind):
+        current = dt.date.today().year
+        found = bind.execute(sa.text("SELECT DISTINCT CAST(EXTRACT(YEAR FROM date) AS INTEGER) FROM races"))
+        _rebuild_tables(bind, True, set(found.scalars()) | {current, current + 1})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql' and _is_partitioned(bind):
+        if bind.execute(sa.text("SELECT count(*) FROM season_archives")).scalar():
+            raise RuntimeError("restore the archived seasons (flask seasons restore) before downgrading")
+        _rebuild_tables(bind, False)
+    op.drop_table('season_archives')
+    op.drop_index('ix_results_race_date_id', table_name='results')
+    with op.batch_alter_table('results') as batch_op:
+        batch_op.drop_column('race_date')
@@ -0,0 +1,41 @@
+"""NOTIFY the live feed on result updates too (PostgreSQL only)
+
+Revision ID: a71c5d9e2b48
+Revises: 5e8a0c4b7d13
+Create Date: 2026-10-18 22:30:00.000000
+
+Corrections to a result's position or time must reach live viewers, so
+the trigger from d4287e4efbe6 fires on UPDATE as well as INSERT.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71c5d9e2b48'
+down_revision: Union[str, None] = '5e8a0c4b7d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _trigger(events: str) -> None:
+    op.execute("DROP TRIGGER IF EXISTS results_live_notify ON results")
+    op.execute(
+        f"CREATE TRIGGER results_live_notify AFTER {events} ON results "
+        "FOR EACH ROW EXECUTE FUNCTION results_live_notify()"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    _trigger("INSERT OR UPDATE")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    _trigger("INSERT")
@@ -0,0 +1,46 @@
+"""races.starts_at with backfill, schedule indexes and results(jockey_id, race_id)
+
+Revision ID: b6207f5137fc
+Revises: 4b2473c153b6
+Create Date: 2026-10-18 17:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6207f5137fc'
+down_revision: Union[str, None] = '4b2473c153b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('races')}
+    if 'starts_at' not in columns:
+        op.add_column('races', sa.Column('starts_at', sa.DateTime(), nullable=True))
+
+    if bind.dialect.name == 'sqlite':
+        # SQLAlchemy stores DATE as 'YYYY-MM-DD' and TIME as 'HH:MM:SS.ffffff' on SQLite,
+        # so the concatenation is exactly its DATETIME format
+        op.execute("UPDATE races SET starts_at = date || ' ' || time WHERE starts_at IS NULL")
+    else:
+        op.execute("UPDATE races SET starts_at = date + time WHERE starts_at IS NULL")
+
+    op.create_index('ix_races_starts_at_id', 'races', ['starts_at', 'id'], if_not_exists=True)
+    op.create_index('ix_races_place_starts_at_id', 'races', ['place', 'starts_at', 'id'], if_not_exists=True)
+    op.create_index('ix_results_jockey_race', 'results', ['jockey_id', 'race_id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_results_jockey_race', table_name='results')
+    op.drop_index('ix_races_place_starts_at_id', table_name='races')
+    op.drop_index('ix_races_starts_at_id', table_name='races')
+    with op.batch_alter_table('races') as batch_op:
+        batch_op.drop_column('starts_at')
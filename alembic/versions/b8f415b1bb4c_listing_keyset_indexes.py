@@ -0,0 +1,33 @@
+"""composite indexes for keyset-paginated race and horse lists
+
+Revision ID: b8f415b1bb4c
+Revises: 3200bb5019f9
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8f415b1bb4c'
+down_revision: Union[str, None] = '3200bb5019f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_races_date_time_id', 'races', ['date', 'time', 'id'], if_not_exists=True)
+    op.create_index('ix_races_place_date_time_id', 'races', ['place', 'date', 'time', 'id'], if_not_exists=True)
+    op.create_index('ix_horses_owner_id', 'horses', ['owner_id', 'id'], if_not_exists=True)
+    op.create_index('ix_horses_gender_id', 'horses', ['gender', 'id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_horses_gender_id', table_name='horses')
+    op.drop_index('ix_horses_owner_id', table_name='horses')
+    op.drop_index('ix_races_place_date_time_id', table_name='races')
+    op.drop_index('ix_races_date_time_id', table_name='races')
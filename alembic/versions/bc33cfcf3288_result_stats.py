@@ -0,0 +1,71 @@
+"""result_stats aggregate table for leaderboards
+
+Revision ID: bc33cfcf3288
+Revises: 37758253a6b4
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bc33cfcf3288'
+down_revision: Union[str, None] = '37758253a6b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('result_stats'):
+        op.create_table(
+            'result_stats',
+            sa.Column('entity', sa.String(length=10), primary_key=True),
+            sa.Column('entity_id', sa.Integer(), primary_key=True),
+            sa.Column('place', sa.String(length=120), primary_key=True),
+            sa.Column('period', sa.String(length=7), primary_key=True),
+            sa.Column('starts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('wins', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('podiums', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('position_sum', sa.Integer(), nullable=False, server_default='0'),
+        )
+    op.create_index(
+        'ix_result_stats_board', 'result_stats',
+        ['entity', 'place', 'period', 'wins'], if_not_exists=True,
+    )
+
+    # backfill with one INSERT ... SELECT per bucket kind, in SQL frozen
+    # here rather than app.stats, which changes as the app evolves
+    op.execute("DELETE FROM result_stats")
+    month = {
+        'postgresql': "to_char(races.date, 'YYYY-MM')",
+    }.get(bind.dialect.name, "strftime('%Y-%m', races.date)")
+    entities = (('horse', 'results.horse_id'), ('jockey', 'results.jockey_id'), ('owner', 'horses.owner_id'))
+    place = "coalesce(races.place, '')"
+    buckets = ((place, month), (place, "''"), ("''", month), ("''", "''"))
+    for entity, column in entities:
+        for i, (place, period) in enumerate(buckets):
+            # a race without a venue only counts towards the all-venues buckets
+            venue = f" AND {place} <> ''" if i < 2 else ""
+            op.execute(
+                "INSERT INTO result_stats (entity, entity_id, place, period, starts, wins, podiums, position_sum) "
+                f"SELECT '{entity}', {column}, {place}, {period}, count(*), "
+                "sum(CASE WHEN results.position = 1 THEN 1 ELSE 0 END), "
+                "sum(CASE WHEN results.position BETWEEN 1 AND 3 THEN 1 ELSE 0 END), "
+                "sum(coalesce(results.position, 0)) "
+                "FROM results JOIN races ON races.id = results.race_id "
+                "JOIN horses ON horses.id = results.horse_id "
+                # declared runners (position 0) are not starts
+                f"WHERE races.date IS NOT NULL AND {column} IS NOT NULL AND results.position > 0{venue} "
+                f"GROUP BY {column}, {place}, {period}"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_result_stats_board', table_name='result_stats')
+    op.drop_table('result_stats')
@@ -0,0 +1,92 @@
+"""initial schema
+
+Revision ID: c166d830a0d4
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c166d830a0d4'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _missing(name: str) -> bool:
+    # databases bootstrapped by Base.metadata.create_all already have the tables
+    return not sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _missing('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('login', sa.String(length=120), nullable=False, unique=True),
+            sa.Column('password', sa.String(length=255), nullable=False),
+            sa.Column('description', sa.String(length=255), nullable=False),
+            sa.Column('type', sa.Enum('ADMIN', 'PEASANT', name='user_type'), nullable=False),
+        )
+    if _missing('owners'):
+        op.create_table(
+            'owners',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('address', sa.String(length=200), nullable=True),
+            sa.Column('phone', sa.String(length=20), nullable=True),
+        )
+    if _missing('horses'):
+        op.create_table(
+            'horses',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('gender', sa.String(length=10), nullable=False),
+            sa.Column('age', sa.Integer(), nullable=False),
+            sa.Column('owner_id', sa.Integer(), sa.ForeignKey('owners.id'), nullable=False),
+        )
+    if _missing('jockeys'):
+        op.create_table(
+            'jockeys',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('address', sa.String(length=200), nullable=True),
+            sa.Column('age', sa.Integer(), nullable=False),
+            sa.Column('rating', sa.Float(), nullable=False),
+        )
+    if _missing('races'):
+        op.create_table(
+            'races',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('time', sa.Time(), nullable=False),
+            sa.Column('place', sa.String(length=120), nullable=False),
+            sa.Column('title', sa.String(length=120), nullable=True),
+        )
+    if _missing('results'):
+        op.create_table(
+            'results',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('race_id', sa.Integer(), sa.ForeignKey('races.id'), nullable=False),
+            sa.Column('horse_id', sa.Integer(), sa.ForeignKey('horses.id'), nullable=False),
+            sa.Column('jockey_id', sa.Integer(), sa.ForeignKey('jockeys.id'), nullable=False),
+            sa.Column('position', sa.Integer(), nullable=False),
+            sa.Column('race_time', sa.String(length=20), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('results')
+    op.drop_table('races')
+    op.drop_table('jockeys')
+    op.drop_table('horses')
+    op.drop_table('owners')
+    op.drop_table('users')
+    sa.Enum(name='user_type').drop(op.get_bind(), checkfirst=True)
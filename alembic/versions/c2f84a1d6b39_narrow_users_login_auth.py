@@ -0,0 +1,37 @@
+"""narrow ix_users_login_auth to (login) INCLUDE (id, password, type)
+
+Revision ID: c2f84a1d6b39
+Revises: a71c5d9e2b48
+Create Date: 2026-10-18 23:30:00.000000
+
+37758253a6b4 used to key the index on (login, password, type): a wide
+duplicate of the unique login index.  Databases migrated before it was
+corrected get the narrow Postgres index, and none on SQLite.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f84a1d6b39'
+down_revision: Union[str, None] = 'a71c5d9e2b48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_users_login_auth', table_name='users', if_exists=True)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index(
+            'ix_users_login_auth',
+            'users',
+            ['login'],
+            postgresql_include=['id', 'password', 'type'],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 37758253a6b4 now creates the same index; the wide one is not brought back
@@ -0,0 +1,45 @@
+"""NOTIFY trigger on results for the live feed (PostgreSQL only)
+
+Revision ID: d4287e4efbe6
+Revises: b6207f5137fc
+Create Date: 2026-10-18 18:10:00.000000
+
+On other databases the live feed polls, so there is nothing to do.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4287e4efbe6'
+down_revision: Union[str, None] = 'b6207f5137fc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # frozen here; app.live.NOTIFY_DDL follows later revisions
+    op.execute(
+        """CREATE OR REPLACE FUNCTION results_live_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('results_live', NEW.race_id::text);
+    RETURN NULL;
+END $$ LANGUAGE plpgsql"""
+    )
+    op.execute("DROP TRIGGER IF EXISTS results_live_notify ON results")
+    op.execute(
+        "CREATE TRIGGER results_live_notify AFTER INSERT ON results "
+        "FOR EACH ROW EXECUTE FUNCTION results_live_notify()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP TRIGGER IF EXISTS results_live_notify ON results")
+    op.execute("DROP FUNCTION IF EXISTS results_live_notify()")
@@ -1,18 +1,134 @@
-from flask import Flask
+from flask import Flask, session as flask_session
+import logging
 import os
+import time
+import weakref
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from flask_login import LoginManager
 from dotenv import load_dotenv
 
 load_dotenv()
 
+log = logging.getLogger("app")
+
 
 class EnvConfig:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
     DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///dev.db")
+    # Per-process cache of logged-in users (see app/user_cache.py)
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+    USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "300"))
+    # Password hashing (see app/hashing.py); 0 workers hashes inline
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    # match logins case-insensitively on sign-in (served by ix_users_login_lower);
+    # with logins that differ only in case the oldest account wins
+    LOGIN_CASE_INSENSITIVE = os.environ.get("LOGIN_CASE_INSENSITIVE", "0") == "1"
+    # ignored under sync gunicorn workers, which block for the hash anyway
+    HASH_POOL_WORKERS = int(os.environ.get("HASH_POOL_WORKERS", "0"))
+    HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", "32"))
+    HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "10"))
+    # Request instrumentation (see app/metrics.py); QUERY_BUDGET 0 disables the check
+    QUERY_BUDGET = int(os.environ.get("QUERY_BUDGET", "0"))
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+    METRICS_WINDOW = int(os.environ.get("METRICS_WINDOW", "1000"))
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") == "1"
+    # Connection pool, normally sized by app/entrypoint.py; "null" for PgBouncer
+    DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "queue")
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+    # Run Base.metadata.create_all on startup; the container entrypoint turns
+    # this off because it already ran the Alembic migrations
+    AUTO_CREATE_SCHEMA = os.environ.get("AUTO_CREATE_SCHEMA", "1") == "1"
+    # Rendered-page cache (see app/cache.py): "memory", "sqlite" or "none"
+    PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", "memory")
+    PAGE_CACHE_PATH = os.environ.get("PAGE_CACHE_PATH", "")
+    PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "512"))
+    PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", "300"))
+    # e.g. the release id; by default a digest of the app's sources
+    PAGE_CACHE_NAMESPACE = os.environ.get("PAGE_CACHE_NAMESPACE", "")
+    # Comma-separated read replica URLs (see app/replicas.py)
+    DATABASE_REPLICA_URLS = os.environ.get("DATABASE_REPLICA_URLS", "")
+    REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+    REPLICA_RETRY_SECONDS = float(os.environ.get("REPLICA_RETRY_SECONDS", "10"))
+    # Session store (see app/sessions.py): "database", "memory" or "cookie"
+    SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "database")
+    SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+    SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", "5"))
+    SESSION_SWEEP_SECONDS = float(os.environ.get("SESSION_SWEEP_SECONDS", "300"))
+    # Login rate limiting (see app/ratelimit.py): "memory", "database" or "none";
+    # rates are "capacity/seconds", the shared table defaults to DATABASE_URL
+    RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_PER_IP = os.environ.get("RATE_LIMIT_PER_IP", "20/60")
+    RATE_LIMIT_PER_LOGIN = os.environ.get("RATE_LIMIT_PER_LOGIN", "5/300")
+    RATE_LIMIT_DATABASE_URL = os.environ.get("RATE_LIMIT_DATABASE_URL", "")
+    # In-memory upcoming-races snapshot behind /schedule (see app/schedule.py)
+    SCHEDULE_DAYS = int(os.environ.get("SCHEDULE_DAYS", "7"))
+    SCHEDULE_REFRESH_SECONDS = float(os.environ.get("SCHEDULE_REFRESH_SECONDS", "60"))
+    # Server-Sent Events results feed (see app/live.py)
+    LIVE_POLL_SECONDS = float(os.environ.get("LIVE_POLL_SECONDS", "1"))
+    LIVE_BUFFER = int(os.environ.get("LIVE_BUFFER", "256"))
+    LIVE_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_MAX_SUBSCRIBERS", "1000"))
+    LIVE_HEARTBEAT_SECONDS = float(os.environ.get("LIVE_HEARTBEAT_SECONDS", "15"))
+    # In-memory results arrays for head-to-head and form (see app/analysis.py)
+    ANALYSIS_REFRESH_SECONDS = float(os.environ.get("ANALYSIS_REFRESH_SECONDS", "30"))
+    ANALYSIS_RELOAD_SECONDS = float(os.environ.get("ANALYSIS_RELOAD_SECONDS", "3600"))
+    ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", "256"))
+    ANALYSIS_FORM_RUNS = int(os.environ.get("ANALYSIS_FORM_RUNS", "6"))
+    # Background job queue (see app/jobs.py); the worker runs as `python -m app.jobs`
+    # with JOBS_WORKERS threads or processes (JOBS_POOL "thread" or "process")
+    JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", "2"))
+    JOBS_POOL = os.environ.get("JOBS_POOL", "thread")
+    JOBS_POLL_SECONDS = float(os.environ.get("JOBS_POLL_SECONDS", "1"))
+    JOBS_LEASE_SECONDS = float(os.environ.get("JOBS_LEASE_SECONDS", "300"))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", "3"))
+    JOBS_RETRY_SECONDS = float(os.environ.get("JOBS_RETRY_SECONDS", "30"))
+    # where uploads wait for the worker; must be shared with the worker container
+    JOBS_SPOOL_DIR = os.environ.get("JOBS_SPOOL_DIR", "")
+    # spooled uploads and export files are deleted this long after writing
+    JOBS_SPOOL_RETENTION_SECONDS = float(os.environ.get("JOBS_SPOOL_RETENTION_SECONDS", "86400"))
+    # SQLite files of archived seasons; defaults to archive/ next to the database
+    SEASON_ARCHIVE_DIR = os.environ.get("SEASON_ARCHIVE_DIR", "")
+
+
+def engine_options(config, url: str) -> dict:
+    """create_engine keyword arguments for the configured pool."""
+    options = {"future": True, "pool_pre_ping": True}
+    if config.get("DB_POOL_MODE", "queue") == "null":
+        options["poolclass"] = NullPool
+        return options
+    if url.startswith("sqlite"):
+        # SQLite uses its own pool classes, sizing does not apply
+        return options
+    options.update(
+        pool_size=int(config.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(config.get("DB_MAX_OVERFLOW", 10)),
+        pool_recycle=int(config.get("DB_POOL_RECYCLE", 1800)),
+        pool_timeout=int(config.get("DB_POOL_TIMEOUT", 30)),
+    )
+    return options
+
+
+def _dispose_after_fork(engine) -> None:
+    # with gunicorn --preload engines are created before the fork; children
+    # must not reuse the parent's pooled connections
+    if not hasattr(os, "register_at_fork"):
+        return
+    engine_ref = weakref.ref(engine)
+
+    def _dispose_in_child():
+        forked_engine = engine_ref()
+        if forked_engine is not None:
+            forked_engine.dispose(close=False)
+
+    os.register_at_fork(after_in_child=_dispose_in_child)
+
 
 def create_app(config_object=None, testing=False):
+    started = time.time()
     app = Flask(__name__)
     
     if testing:
@@ -39,11 +155,96 @@ def create_app(config_object=None, testing=False):
     if isinstance(DATABASE_URL, str) and DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-    engine = create_engine(DATABASE_URL, future=True, pool_pre_ping=True)
-    SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, future=True)
+    engine = create_engine(DATABASE_URL, **engine_options(app.config, DATABASE_URL))
     app.db_engine = engine
+    _dispose_after_fork(engine)
+
+    # Optional read replicas (see app/replicas.py); without them sessions are plain
+    from app.replicas import ReplicaSet, routing_sessionmaker
+    replica_urls = [u.strip() for u in app.config.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    replicas = []
+    for url in replica_urls:
+        if url.startswith("postgres://"):
+            url = url.replace("postgres://", "postgresql://", 1)
+        replicas.append(create_engine(url, **engine_options(app.config, url)))
+        _dispose_after_fork(replicas[-1])
+    app.db_replicas = ReplicaSet(
+        engine, replicas, retry_after=float(app.config.get("REPLICA_RETRY_SECONDS", 10)),
+    )
+    if replicas:
+        SessionLocal = routing_sessionmaker(
+            app.db_replicas,
+            sticky_seconds=float(app.config.get("REPLICA_STICKY_SECONDS", 5)),
+            expire_on_commit=False,
+        )
+    else:
+        SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, future=True)
     app.db_session = SessionLocal
 
+    from app import metrics
+    metrics.install(app, engine, *replicas)
+
+    # Server-side sessions that carry the signed-in user (or signed cookies)
+    from app import sessions
+    sessions.init_app(app, engine)
+
+    # Cache of detached user snapshots, so repeat visitors skip the DB
+    from app.user_cache import UserCache, UserSnapshot, watch_sessions
+    user_cache = UserCache(
+        maxsize=int(app.config.get("USER_CACHE_SIZE", 1024)),
+        ttl=float(app.config.get("USER_CACHE_TTL", 300)),
+    )
+    # a changed user is also reloaded by the sessions that carry them
+    watch_sessions(user_cache, SessionLocal, *([app.session_store.forget_user] if app.session_store else []))
+    app.user_cache = user_cache
+
+    from app.hashing import PasswordHasher, pool_workers
+    # app.entrypoint exports the worker class it starts gunicorn with
+    hash_workers = int(app.config.get("HASH_POOL_WORKERS", 0))
+    worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "")
+    if hash_workers and not pool_workers(hash_workers, worker_class):
+        log.warning(
+            "HASH_POOL_WORKERS=%d ignored: %s workers block for the hash anyway", hash_workers, worker_class,
+        )
+    app.password_hasher = PasswordHasher(
+        method=app.config.get("PASSWORD_HASH_METHOD", "scrypt"),
+        workers=pool_workers(hash_workers, worker_class),
+        max_pending=int(app.config.get("HASH_QUEUE_LIMIT", 32)),
+        timeout=float(app.config.get("HASH_TIMEOUT", 10)),
+    )
+
+    # Token buckets checked before any login lookup or password hash
+    from app import ratelimit
+    limit_url = app.config.get("RATE_LIMIT_DATABASE_URL", "")
+    limit_engine = engine
+    if limit_url and app.config.get("RATE_LIMIT_BACKEND", "memory") == "database":
+        limit_engine = create_engine(limit_url, **engine_options(app.config, limit_url))
+        _dispose_after_fork(limit_engine)
+        if app.config.get("AUTO_CREATE_SCHEMA", True):
+            ratelimit.rate_limits.create(limit_engine, checkfirst=True)
+    app.login_limiter = ratelimit.make_limiter(app.config, limit_engine)
+
+    # Next days of races kept in memory, reloaded after writes to races/results
+    from app import schedule
+    schedule.init_app(app, engine, SessionLocal)
+
+    # One results publisher per process for the live SSE streams; also
+    # installs the NOTIFY trigger DDL before create_all below
+    from app import live
+    live.init_app(app, engine, SessionLocal)
+
+    # Results history as NumPy arrays for race-card head-to-head and form
+    from app import analysis
+    analysis.init_app(app, engine, SessionLocal)
+
+    # Durable queue for work too slow for a request; run by `python -m app.jobs`
+    from app import jobs
+    jobs.init_app(app, engine, SessionLocal)
+
+    # Rendered pages and {% cache %} fragments; the namespace changes per deploy
+    from app import cache
+    cache.init_app(app)
+
     # Flask-Login setup
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -51,23 +252,76 @@ def create_app(config_object=None, testing=False):
     @login_manager.user_loader
     def load_user(user_id: str):
         try:
+            uid = int(user_id)
+            principal = sessions.session_principal(flask_session)
+            if principal is not None and principal.id == uid:
+                return principal
+            # a server-side session without its principal was forgotten:
+            # this worker's user_cache may still hold the old row
+            server_side = sessions.is_server_session(flask_session)
+            cached = None if server_side else user_cache.get(uid)
+            if cached is not None:
+                return cached
             from app.models import User
             session = SessionLocal()
-            user = session.get(User, int(user_id))
-            session.close()
-            return user
+            try:
+                user = session.get(User, uid)
+            finally:
+                session.close()
+            if user is None:
+                return None
+            snapshot = UserSnapshot.from_user(user)
+            user_cache.put(snapshot)
+            sessions.principal_loaded(flask_session, snapshot)
+            return snapshot
         except Exception:
             return None
 
     # Import models and create tables in development (convenience)
-    try:
-        from app import models
-        models.Base.metadata.create_all(bind=engine)
-    except Exception:
-        pass
+    if app.config.get("AUTO_CREATE_SCHEMA", True):
+        try:
+            from app import models
+            models.Base.metadata.create_all(bind=engine)
+        except Exception:
+            pass
 
     # Подключаем роуты
     from app.routes import main
+    from app.stats import stats
+    from app.ingest import ingest
+    from app.listing import listing
+    from app.search import search
+    from app.export import export
+    from app.ratings import ratings
+    from app.seasons import seasons
     app.register_blueprint(main)
+    app.register_blueprint(stats)
+    app.register_blueprint(ingest)
+    app.register_blueprint(listing)
+    app.register_blueprint(search)
+    app.register_blueprint(export)
+    app.register_blueprint(ratings)
+    app.register_blueprint(schedule.schedule)
+    app.register_blueprint(live.live)
+    app.register_blueprint(analysis.analysis)
+    app.register_blueprint(jobs.jobs)
+    app.register_blueprint(sessions.sessions)
+    app.register_blueprint(seasons)
 
+    _report_startup(app, started)
     return app
+
+
+def _report_startup(app, started: float) -> None:
+    """Log create_app time and, once per process, boot-to-first-request time."""
+    log.info("create_app took %.3fs", time.time() - started)
+    boot = os.environ.get("STARTUP_T0")
+    state = {"pending": True}
+
+    @app.before_request
+    def _first_request():
+        if state["pending"]:
+            state["pending"] = False
+            since = float(boot) if boot else started
+            log.info("First request in pid %d %.3fs after %s", os.getpid(), time.time() - since,
+                     "container start" if boot else "create_app")
@@ -0,0 +1,351 @@
+"""Head-to-head records and recent form for horses and jockeys.
+
+Head to head: out of the earlier races two horses (or jockeys) both
+finished, how often each came in ahead of the other.  Form: the finishing
+positions of the last ``FORM_RUNS`` starts as racing form figures, oldest
+first, with 10th and worse written as ``0``.
+
+Both are read from ``ResultArrays``, the results history held per process
+as flat NumPy columns with sorted indexes by race, horse and jockey.  The
+matrix for a whole race card is built in one pass: the earlier races of
+the card's runners that at least two of them finished become a
+``(races, runners)`` matrix of positions, and every pair is compared at
+once.  Only races that started before the card
+count, so a past card shows the picture its runners went in with.
+
+Cards are kept in an LRU.  After a committed insert into ``results``
+(see ``app.schedule.watch_engine``) the next read loads just the rows past
+the highest id it has, less ``LOOKBACK_IDS`` for transactions that
+committed out of id order, and drops the cached cards of the horses and
+jockeys those rows touch.  A committed UPDATE or DELETE (a corrected
+position, a removed row) makes the next read reload everything instead.
+The catch-up also runs every ``ANALYSIS_REFRESH_SECONDS`` for inserts
+from other processes, and a full reload every ``ANALYSIS_RELOAD_SECONDS``
+picks up their edits.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from flask import Blueprint, abort, current_app, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.sql.dml import Delete, Update
+
+from app.metrics import record_timing
+from app.models import Horse, Jockey, Race, Result
+from app.schedule import watch_engine
+
+analysis = Blueprint('analysis', __name__, url_prefix='/analysis')
+
+FORM_RUNS = 6
+ENTITIES = {"horse": Horse, "jockey": Jockey}
+NO_START = np.iinfo(np.int64).min  # races without starts_at sort as the oldest
+# re-read a few ids below the highest one: ids are assigned at insert, but
+# transactions may commit out of order
+LOOKBACK_IDS = 1000
+
+
+class ResultArrays:
+    """Results as columns, with rows of a race, horse or jockey found by bisection.
+
+    Within a horse or a jockey rows are ordered by start time, so form is
+    the tail of the slice.
+    """
+
+    def __init__(self, ids, race, horse, jockey, position, starts):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.race = np.asarray(race, dtype=np.int32)
+        self.horse = np.asarray(horse, dtype=np.int32)
+        self.jockey = np.asarray(jockey, dtype=np.int32)
+        self.position = np.asarray(position, dtype=np.int16)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self._index = {}
+        for name, keys in (("race", self.race), ("horse", self.horse), ("jockey", self.jockey)):
+            order = np.lexsort((self.ids, self.starts, keys))
+            self._index[name] = (keys[order], order)
+
+    @classmethod
+    def empty(cls) -> "ResultArrays":
+        return cls(*([],) * 6)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def max_id(self) -> int:
+        return int(self.ids.max()) if len(self.ids) else 0
+
+    def extend(self, other: "ResultArrays") -> "ResultArrays":
+        if not len(other):
+            return self
+        columns = ("ids", "race", "horse", "jockey", "position", "starts")
+        return ResultArrays(*(np.concatenate((getattr(self, c), getattr(other, c))) for c in columns))
+
+    def take(self, rows) -> "ResultArrays":
+        columns = ("ids", "race", "horse", "jockey", "position", "starts")
+        return ResultArrays(*(getattr(self, c)[rows] for c in columns))
+
+    def rows(self, entity: str, key: int) -> np.ndarray:
+        keys, order = self._index[entity]
+        key = keys.dtype.type(key)  # a wider key would make searchsorted copy the whole column
+        return order[np.searchsorted(keys, key, "left"):np.searchsorted(keys, key, "right")]
+
+    def rows_of_many(self, entity: str, keys) -> np.ndarray:
+        sorted_keys, order = self._index[entity]
+        keys = np.asarray(keys, dtype=sorted_keys.dtype)
+        if not len(keys):
+            return np.empty(0, dtype=np.int64)
+        lo = np.searchsorted(sorted_keys, keys, "left")
+        hi = np.searchsorted(sorted_keys, keys, "right")
+        return np.concatenate([order[a:b] for a, b in zip(lo.tolist(), hi.tolist())])
+
+    def head_to_head(self, entity: str, ids, before: Optional[int] = None):
+        """``(ahead, meetings)`` for every ordered pair of ``ids``.
+
+        ``ahead[i, j]`` counts the races in which ``ids[i]`` finished ahead
+        of ``ids[j]``, ``meetings[i, j]`` those both finished; a dead heat
+        is a meeting without a winner.  With ``before`` only races that
+        started earlier count.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(ids)
+        rows = self.rows_of_many(entity, ids)
+        keep = self.position[rows] > 0
+        if before is not None:
+            keep &= self.starts[rows] < before
+        rows = rows[keep]
+        # only races with at least two of ids in them can hold a meeting
+        _, race_of_row, runners = np.unique(self.race[rows], return_inverse=True, return_counts=True)
+        rows = rows[runners[race_of_row] > 1]
+        if not len(rows):
+            zeros = np.zeros((n, n), dtype=np.int64)
+            return zeros, zeros.copy()
+
+        sorter = np.argsort(ids, kind="stable")
+        column = sorter[np.searchsorted(ids, getattr(self, entity)[rows], sorter=sorter)]
+        races, race_of_row = np.unique(self.race[rows], return_inverse=True)
+        positions = np.zeros((len(races), n), dtype=np.int16)
+        positions[race_of_row, column] = self.position[rows]
+        ran = positions > 0
+        both = ran[:, :, None] & ran[:, None, :]
+        ahead = (both & (positions[:, :, None] < positions[:, None, :])).sum(axis=0)
+        meetings = both.sum(axis=0)
+        np.fill_diagonal(meetings, 0)
+        return ahead, meetings
+
+    def form(self, entity: str, key: int, runs: int = FORM_RUNS, before: Optional[int] = None) -> list:
+        """Positions of the last ``runs`` finished starts, oldest first."""
+        rows = self.rows(entity, key)
+        keep = self.position[rows] > 0
+        if before is not None:
+            keep &= self.starts[rows] < before
+        return self.position[rows[keep][-runs:]].tolist() if runs > 0 else []
+
+
+def form_figures(positions) -> str:
+    return "".join(str(p) if p < 10 else "0" for p in positions)
+
+
+def _epoch(value) -> int:
+    return NO_START if value is None else int(np.datetime64(value, "s").astype(np.int64))
+
+
+def load_results(conn, after_id: int = 0) -> ResultArrays:
+    stmt = (
+        select(Result.id, Result.race_id, Result.horse_id, Result.jockey_id, Result.position, Race.starts_at)
+        .join(Race, Race.id == Result.race_id)
+        .where(Result.id > after_id)
+    )
+    ints, starts = [], []
+    for part in conn.execution_options(stream_results=True, yield_per=50000).execute(stmt).partitions():
+        ints.append(np.array([row[:5] for row in part], dtype=np.int64).reshape(-1, 5))
+        starts.append(np.fromiter((_epoch(row[5]) for row in part), dtype=np.int64, count=len(part)))
+    if not ints:
+        return ResultArrays.empty()
+    columns = np.concatenate(ints)
+    return ResultArrays(*columns.T, np.concatenate(starts))
+
+
+class FormAnalysis:
+    """Per-process ``ResultArrays`` plus an LRU of computed race cards."""
+
+    def __init__(self, engine, session_factory, refresh_seconds: float = 30.0,
+                 reload_seconds: float = 3600.0, cache_size: int = 256, form_runs: int = FORM_RUNS):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.refresh_seconds = refresh_seconds
+        self.reload_seconds = reload_seconds
+        self.cache_size = cache_size
+        self.form_runs = form_runs
+        self._lock = threading.Lock()
+        self._arrays = ResultArrays.empty()
+        self._stale = True
+        self._full = True
+        self._expires = 0.0
+        self._reload_at = 0.0
+        self._cards = OrderedDict()
+        self.loads = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def reload(self) -> None:
+        """Rows were edited or deleted: the next read loads everything again."""
+        self._full = True
+        self._stale = True
+
+    def arrays(self) -> ResultArrays:
+        now = time.monotonic()
+        if not self._stale and now < self._expires:
+            return self._arrays
+        with self._lock:
+            now = time.monotonic()
+            if not self._stale and now < self._expires:
+                return self._arrays
+            full = self._full or now >= self._reload_at
+            self._stale = self._full = False
+            self._expires = now + self.refresh_seconds
+            try:
+                self._catch_up(full=full)
+            except Exception:
+                self._stale = True
+                self._full = self._full or full
+                raise
+            if full:
+                self._reload_at = now + self.reload_seconds
+            return self._arrays
+
+    def _catch_up(self, full: bool) -> None:
+        with self.engine.connect() as conn:
+            if full:
+                self._arrays = load_results(conn)
+                self._cards.clear()
+                self.loads += 1
+                return
+            floor = max(self._arrays.max_id - LOOKBACK_IDS, 0)
+            new = load_results(conn, after_id=floor)
+        known = self._arrays.ids[self._arrays.ids > floor]
+        if len(known):
+            new = new.take(np.flatnonzero(~np.isin(new.ids, known)))
+        if not len(new):
+            return
+        self._arrays = self._arrays.extend(new)
+        touched = {
+            "race": set(new.race.tolist()), "horse": set(new.horse.tolist()), "jockey": set(new.jockey.tolist()),
+        }
+        for race_id, card in list(self._cards.items()):
+            if race_id in touched["race"] or any(
+                touched[entity].intersection(card["_ids"][entity]) for entity in ("horse", "jockey")
+            ):
+                del self._cards[race_id]
+
+    def race_card(self, race_id: int) -> Optional[dict]:
+        """Runners of a race with their form and the horse and jockey head-to-head matrices."""
+        arrays = self.arrays()
+        with self._lock:
+            card = self._cards.get(race_id)
+            if card is not None:
+                self._cards.move_to_end(race_id)
+                self.hits += 1
+                return card
+        rows = arrays.rows("race", race_id)
+        if not len(rows):
+            return None
+        self.misses += 1
+        card = self._build_card(arrays, race_id, rows)
+        with self._lock:
+            if self._arrays is not arrays:
+                return card  # rows arrived while building; do not cache a stale card
+            self._cards[race_id] = card
+            while len(self._cards) > self.cache_size:
+                self._cards.popitem(last=False)
+        return card
+
+    def _build_card(self, arrays: ResultArrays, race_id: int, rows: np.ndarray) -> dict:
+        rows = rows[np.argsort(arrays.ids[rows], kind="stable")]
+        before = int(arrays.starts[rows[0]])
+        horses, jockeys = arrays.horse[rows].tolist(), arrays.jockey[rows].tolist()
+        session = self.session_factory()
+        try:
+            horse_names = dict(session.execute(select(Horse.id, Horse.name).where(Horse.id.in_(horses))).all())
+            jockey_names = dict(session.execute(select(Jockey.id, Jockey.name).where(Jockey.id.in_(jockeys))).all())
+        finally:
+            session.close()
+
+        runners = []
+        for horse_id, jockey_id, position in zip(horses, jockeys, arrays.position[rows].tolist()):
+            horse_form = arrays.form("horse", horse_id, self.form_runs, before)
+            jockey_form = arrays.form("jockey", jockey_id, self.form_runs, before)
+            runners.append({
+                "horse_id": horse_id, "horse": horse_names.get(horse_id),
+                "jockey_id": jockey_id, "jockey": jockey_names.get(jockey_id),
+                "position": position or None,
+                "horse_form": form_figures(horse_form), "jockey_form": form_figures(jockey_form),
+            })
+        card = {"race_id": race_id, "runners": runners, "_ids": {"horse": set(horses), "jockey": set(jockeys)}}
+        for entity, ids in (("horse", horses), ("jockey", jockeys)):
+            ahead, meetings = arrays.head_to_head(entity, ids, before)
+            card[f"{entity}_ahead"] = ahead.tolist()
+            card[f"{entity}_meetings"] = meetings.tolist()
+        return card
+
+    def pair(self, entity: str, a: int, b: int) -> dict:
+        ahead, meetings = self.arrays().head_to_head(entity, [a, b])
+        return {"entity": entity, "a": a, "b": b, "a_ahead": int(ahead[0, 1]), "b_ahead": int(ahead[1, 0]),
+                "meetings": int(meetings[0, 1])}
+
+    def form(self, entity: str, entity_id: int, runs: Optional[int] = None) -> dict:
+        positions = self.arrays().form(entity, entity_id, self.form_runs if runs is None else runs)
+        return {"entity": entity, "id": entity_id, "form": form_figures(positions), "positions": positions}
+
+    def stats(self) -> dict:
+        return {"results": len(self._arrays), "cards": len(self._cards), "loads": self.loads,
+                "hits": self.hits, "misses": self.misses}
+
+
+def init_app(app, engine, session_factory) -> None:
+    app.form_analysis = FormAnalysis(
+        engine,
+        session_factory,
+        refresh_seconds=float(app.config.get("ANALYSIS_REFRESH_SECONDS", 30)),
+        reload_seconds=float(app.config.get("ANALYSIS_RELOAD_SECONDS", 3600)),
+        cache_size=int(app.config.get("ANALYSIS_CACHE_SIZE", 256)),
+        form_runs=int(app.config.get("ANALYSIS_FORM_RUNS", FORM_RUNS)),
+    )
+    watch_engine(engine, {Result.__tablename__}, app.form_analysis.invalidate)
+    watch_engine(engine, {Result.__tablename__}, app.form_analysis.reload, statements=(Update, Delete))
+
+
+# --- views -------------------------------------------------------------------
+
+def _entity_arg(entity: str) -> str:
+    if entity not in ENTITIES:
+        abort(404)
+    return entity
+
+
+@analysis.route('/races/<int:race_id>')
+def race_view(race_id):
+    started = time.perf_counter()
+    card = current_app.form_analysis.race_card(race_id)
+    if card is None:
+        abort(404)
+    record_timing("analysis", (time.perf_counter() - started) * 1000)
+    return jsonify({key: value for key, value in card.items() if not key.startswith("_")})
+
+
+@analysis.route('/<entity>/<int:a>/vs/<int:b>')
+def pair_view(entity, a, b):
+    return jsonify(current_app.form_analysis.pair(_entity_arg(entity), a, b))
+
+
+@analysis.route('/<entity>/<int:entity_id>/form')
+def form_view(entity, entity_id):
+    runs = request.args.get('runs', type=int)
+    if runs is not None:
+        runs = max(0, min(runs, 50))
+    return jsonify(current_app.form_analysis.form(_entity_arg(entity), entity_id, runs))
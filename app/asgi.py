@@ -0,0 +1,335 @@
+"""Optional ASGI entry point with async auth routes.
+
+    uvicorn --factory app.asgi:create_asgi_app
+    GUNICORN_WORKER_CLASS=uvicorn python -m app.entrypoint
+
+``/``, ``/login`` and ``/register`` are served natively on the event
+loop.  Their database work goes through ``create_async_engine``
+(aiosqlite / asyncpg) and password hashing is awaited in an executor
+(``PasswordHasher.hash_async`` / ``verify_async``), so slow clients and
+slow hashes do not hold a worker thread each and one process can keep
+thousands of connections open.  ``/races/<id>/live`` (app/live.py) is
+streamed from the event loop as well, so an SSE viewer costs a coroutine
+rather than a thread.  Every other route runs the regular Flask app in
+asgiref's thread pool.
+
+The native routes still go through Flask for everything that does no I/O:
+the request context, signed session cookie, flashes, Flask-Login,
+before/after request hooks (metrics, Server-Timing), templates and the
+page cache.  Only the current user is loaded up front (from the
+server-side session, or ``load_user`` async) and stored where
+Flask-Login looks for it.  They always use the
+primary database, not the read replicas.
+
+Needs uvicorn, asgiref, aiosqlite and asyncpg, which requirements.txt
+installs into the image.
+"""
+import asyncio
+import io
+import re
+import sys
+from typing import Optional
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import current_app, flash, g, redirect, render_template, request, session, url_for
+from flask_login import login_user
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import _dispose_after_fork, create_app, engine_options
+from app.auth import create_user, lookup_login, update_password, users
+from app.live import SSE_HEADERS, LiveFeedFull
+from app.metrics import instrument_engine
+from app.ratelimit import attempt_succeeded, check_attempt
+from app.sessions import forget_user, is_server_session, principal_loaded, session_principal
+from app.models import UserType
+from app.user_cache import UserSnapshot
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+MAX_FORM_BYTES = 64 * 1024
+LIVE_PATH = re.compile(r"/races/(\d+)/live")
+
+
+def async_database_url(url: str) -> str:
+    """``DATABASE_URL`` with the async driver of its backend."""
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def build_environ(scope: dict, body: bytes) -> dict:
+    """WSGI environ for an ASGI HTTP scope (PEP 3333 / ASGI spec mapping)."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for raw_name, raw_value in scope.get("headers", ()):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = raw_value.decode("latin-1")
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    # the body is already read in full
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+class AsgiApp:
+    """Native async handlers for the auth routes, Flask (via WSGI) for the rest."""
+
+    def __init__(self, flask_app, async_engine):
+        self.flask_app = flask_app
+        self.async_engine = async_engine
+        self.async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {
+            "/": ({"GET", "HEAD"}, self.index),
+            "/login": ({"GET", "HEAD", "POST"}, self.login),
+            "/register": ({"GET", "HEAD", "POST"}, self.register),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "GET" and (live := LIVE_PATH.fullmatch(scope["path"])):
+            return await self.live(scope, receive, send, int(live.group(1)))
+        methods, handler = self.routes.get(scope["path"], ((), None)) if scope["type"] == "http" else ((), None)
+        if scope.get("method") not in methods:
+            # other routes (and 405s) are served by the Flask app in a thread
+            return await self.wsgi(scope, receive, send)
+
+        body = await self._read_body(receive)
+        if body is None:
+            await send({"type": "http.response.start", "status": 413, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        environ = build_environ(scope, body)
+        response = await self.dispatch(environ, handler)
+        app_iter, status, headers = response.get_wsgi_response(environ)
+        try:
+            payload = b"".join(app_iter)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def live(self, scope, receive, send, race_id: int):
+        """SSE stream of a race's results, see app/live.py."""
+        feed = self.flask_app.live_feed
+        try:
+            channel = await asyncio.to_thread(feed.subscribe, race_id)
+        except LiveFeedFull:
+            await send({"type": "http.response.start", "status": 503, "headers": [(b"retry-after", b"5")]})
+            await send({"type": "http.response.body", "body": b"Too many live viewers, please retry shortly"})
+            return
+        if channel is None:
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        last_event_id = None
+        for name, value in scope.get("headers", ()):
+            if name.lower() == b"last-event-id":
+                last_event_id = value.decode("latin-1")
+        headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+        headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in SSE_HEADERS.items()]
+        frames = feed.stream_async(channel, last_event_id)
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            while True:
+                # a viewer that leaves is noticed right away, not at the next heartbeat
+                next_frame = asyncio.ensure_future(frames.__anext__())
+                await asyncio.wait({next_frame, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_frame.done():
+                    next_frame.cancel()
+                    await asyncio.wait({next_frame})
+                    break
+                try:
+                    frame = next_frame.result()
+                except StopAsyncIteration:
+                    await send({"type": "http.response.body", "body": b""})
+                    break
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+        finally:
+            disconnected.cancel()
+            await frames.aclose()
+            feed.unsubscribe(channel)
+
+    async def _wait_disconnect(self, receive) -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_FORM_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.async_engine.dispose()
+                self.flask_app.password_hasher.shutdown()
+                self.flask_app.live_feed.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def dispatch(self, environ, handler):
+        """Flask's full_dispatch_request with an awaitable view."""
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        ctx.push()
+        try:
+            try:
+                user_id = session.get("_user_id")
+                user = session_principal(session) if user_id else None
+                if user_id and (user is None or str(user.id) != user_id):
+                    # see load_user in app/__init__.py: a forgotten principal
+                    # is read from users, not from this worker's user_cache
+                    server_side = is_server_session(session)
+                    user = await self.load_user(user_id, use_cache=not server_side)
+                    if user is not None:
+                        principal_loaded(session, user)
+                g._login_user = user or app.login_manager.anonymous_user()
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await handler()
+            except Exception as exc:
+                rv = app.handle_user_exception(exc)
+            return app.finalize_request(rv)
+        except Exception as exc:
+            return app.handle_exception(exc)
+        finally:
+            ctx.pop()
+
+    # --- async versions of the load_user / routes.py paths --------------------
+
+    async def load_user(self, user_id: str, use_cache: bool = True) -> Optional[UserSnapshot]:
+        try:
+            uid = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        cache = self.flask_app.user_cache
+        cached = cache.get(uid) if use_cache else None
+        if cached is not None:
+            return cached
+        async with self.async_session() as db:
+            row = (await db.execute(
+                select(users.c.id, users.c.login, users.c.type).where(users.c.id == uid)
+            )).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(id=row.id, login=row.login, type=row.type)
+        cache.put(snapshot)
+        return snapshot
+
+    async def index(self):
+        return current_app.view_functions["main.index"]()
+
+    async def register(self):
+        if request.method != "POST":
+            return current_app.view_functions["main.register"]()
+        login_val = request.form.get("login")
+        password = request.form.get("password")
+        if not login_val or not password:
+            flash("Login and password required", "error")
+            return render_template("register.html", login=login_val)
+        check_attempt()
+
+        user_type = UserType.PEASANT
+        type_str = request.form.get("type")
+        if type_str and type_str.upper() in UserType.__members__:
+            user_type = UserType[type_str.upper()]
+
+        password_hash = await current_app.password_hasher.hash_async(password)
+        async with self.async_session() as db:
+            user_id = await db.run_sync(create_user, login_val, password_hash, user_type)
+            if user_id is None:
+                flash("User already exists", "error")
+                return render_template("register.html", login=login_val)
+            await db.commit()
+        current_app.user_cache.invalidate(user_id)
+        flash("User created, please log in", "success")
+        return redirect(url_for("main.login"))
+
+    async def login(self):
+        if request.method != "POST":
+            return current_app.view_functions["main.login"]()
+        login_val = request.form.get("login")
+        password = request.form.get("password")
+        if not login_val or not password:
+            flash("Login and password required", "error")
+            return render_template("login.html", login=login_val)
+        check_attempt(login_val)
+
+        hasher = current_app.password_hasher
+        # the connection goes back to the pool before the (slow) hash check
+        async with self.async_session() as db:
+            row = await db.run_sync(lookup_login, login_val,
+                                    current_app.config.get("LOGIN_CASE_INSENSITIVE", False))
+        if row is None or not await hasher.verify_async(row.password, password):
+            flash("Invalid credentials", "error")
+            return render_template("login.html", login=login_val)
+
+        if hasher.needs_rehash(row.password):
+            new_hash = await hasher.hash_async(password)
+            async with self.async_session() as db:
+                await db.run_sync(update_password, row.id, new_hash)
+                await db.commit()
+            await asyncio.to_thread(forget_user, row.id)
+
+        attempt_succeeded(login_val)
+        snapshot = UserSnapshot(id=row.id, login=login_val, type=row.type)
+        current_app.user_cache.put(snapshot)
+        principal_loaded(session, snapshot)
+        login_user(snapshot)
+        flash("Logged in successfully", "success")
+        return redirect(url_for("main.index"))
+
+
+def create_asgi_app(config_object=None) -> AsgiApp:
+    flask_app = create_app(config_object)
+    url = async_database_url(flask_app.config.get("DATABASE_URL", "sqlite:///dev.db"))
+    async_engine = create_async_engine(url, **engine_options(flask_app.config, url))
+    instrument_engine(async_engine.sync_engine)
+    _dispose_after_fork(async_engine.sync_engine)
+    return AsgiApp(flask_app, async_engine)
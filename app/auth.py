@@ -0,0 +1,78 @@
+"""Lean data access for the login and register views.
+
+The auth path only needs ``(id, password, type)``, so instead of hydrating
+a full ORM ``User`` it runs Core statements built once at import time;
+SQLAlchemy caches their compiled form.  On Postgres the covering index
+``ix_users_login_auth`` lets the database answer from the index alone.
+"""
+from typing import Optional
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import User, UserType
+
+users = User.__table__
+
+LOGIN_LOOKUP = select(users.c.id, users.c.password, users.c.type).where(
+    users.c.login == bindparam("login")
+)
+LOGIN_LOOKUP_CI = select(users.c.id, users.c.password, users.c.type).where(
+    func.lower(users.c.login) == func.lower(bindparam("login"))
+).order_by(users.c.id)
+
+
+def lookup_login(session: Session, login: str, case_insensitive: bool = False) -> Optional[Row]:
+    """Return ``(id, password, type)`` for ``login`` or None.
+
+    ``case_insensitive`` follows the ``LOGIN_CASE_INSENSITIVE`` setting in
+    the login views.
+    """
+    stmt = LOGIN_LOOKUP_CI if case_insensitive else LOGIN_LOOKUP
+    return session.execute(stmt, {"login": login}).first()
+
+
+def _upsert_insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return (
+        dialect_insert(users)
+        .on_conflict_do_nothing(index_elements=[users.c.login])
+        .returning(users.c.id)
+    )
+
+
+def create_user(
+    session: Session,
+    login: str,
+    password_hash: str,
+    type_: UserType = UserType.PEASANT,
+) -> Optional[int]:
+    """Insert a user in a single statement; None when the login is taken.
+
+    Uses ``INSERT ... ON CONFLICT (login) DO NOTHING`` so two concurrent
+    registrations of the same login cannot both pass a check-then-insert.
+    The caller commits.
+    """
+    values = {"login": login, "password": password_hash, "description": "", "type": type_}
+    stmt = _upsert_insert(session.get_bind().dialect.name)
+    if stmt is not None:
+        return session.execute(stmt, values).scalar_one_or_none()
+
+    # other backends: rely on the unique constraint
+    try:
+        with session.begin_nested():
+            result = session.execute(insert(users), values)
+    except IntegrityError:
+        return None
+    return result.inserted_primary_key[0]
+
+
+def update_password(session: Session, user_id: int, password_hash: str) -> None:
+    session.execute(update(users).where(users.c.id == user_id).values(password=password_hash))
@@ -0,0 +1,302 @@
+"""Rendered-page and template-fragment caching.
+
+``@cached_page()`` stores the rendered body of a GET view keyed on the
+path, query string, whether the visitor is logged in and their role, so
+after warm-up anonymous hits on the landing, login and register pages
+skip Jinja entirely.  Cached responses carry ``ETag`` and
+``Last-Modified`` and answer conditional requests with 304.
+
+``{% cache "key", ttl %} ... {% endcache %}`` caches an expensive block
+inside a template in the same backend.
+
+Backends:
+
+* ``MemoryBackend`` - per-process LRU with TTL.
+* ``SQLiteBackend`` - a local SQLite file shared by all gunicorn workers
+  on the host.
+
+Keys are prefixed with ``PAGE_CACHE_NAMESPACE`` or, by default, a digest
+of the templates and modules of the app (``source_namespace``).  Every
+worker of a deploy computes the same one, with or without ``--preload``,
+and a deploy that changes a template or a view starts with a fresh
+namespace, so old pages are never served.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional
+
+from flask import current_app, make_response, request, session
+from flask.globals import request_ctx
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from werkzeug.http import http_date
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: dict, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else 0, entry)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteBackend:
+    """Cache table in a local SQLite file, readable by every worker process."""
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, maxsize: int = 5000):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS page_cache ("
+            " key TEXT PRIMARY KEY, entry TEXT NOT NULL, body BLOB NOT NULL,"
+            " expires_at REAL NOT NULL, stored_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_page_cache_stored ON page_cache (stored_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread and per process (gunicorn forks after create_app)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT entry, body, expires_at FROM page_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        entry, body, expires_at = row
+        if expires_at and expires_at <= time.time():
+            self.delete(key)
+            return None
+        entry = json.loads(entry)
+        entry["body"] = bytes(body)
+        return entry
+
+    def set(self, key: str, entry: dict, ttl: float) -> None:
+        meta = {k: v for k, v in entry.items() if k != "body"}
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO page_cache (key, entry, body, expires_at, stored_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(meta), entry["body"], now + ttl if ttl else 0, now),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM page_cache WHERE expires_at > 0 AND expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM page_cache WHERE key IN ("
+            " SELECT key FROM page_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM page_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM page_cache")
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, entry, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class PageCache:
+    def __init__(self, backend, namespace: str, default_ttl: float = 300):
+        self.backend = backend
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts) -> str:
+        return ":".join([self.namespace, *map(str, parts)])
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses}
+
+
+def make_backend(config):
+    kind = config.get("PAGE_CACHE_BACKEND", "memory")
+    size = int(config.get("PAGE_CACHE_SIZE", 512))
+    if kind == "memory":
+        return MemoryBackend(maxsize=size)
+    if kind == "sqlite":
+        path = config.get("PAGE_CACHE_PATH") or os.path.join(tempfile.gettempdir(), "page_cache.sqlite")
+        return SQLiteBackend(path, maxsize=size)
+    if kind == "none":
+        return NullBackend()
+    raise ValueError(f"Unknown PAGE_CACHE_BACKEND: {kind!r}")
+
+
+def _visitor_key() -> str:
+    if not current_user.is_authenticated:
+        return "anon"
+    user_type = getattr(current_user, "type", None)
+    return f"auth:{getattr(user_type, 'name', user_type)}"
+
+
+def _not_modified(entry: dict) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(entry["etag"])
+    since = request.if_modified_since
+    if since is not None:
+        return int(entry["last_modified"]) <= since.timestamp()
+    return False
+
+
+def _respond(entry: dict, hit: bool):
+    if _not_modified(entry):
+        response = make_response("", 304)
+    else:
+        response = make_response(entry["body"], entry["status"])
+        response.headers["Content-Type"] = entry["content_type"]
+    response.set_etag(entry["etag"])
+    response.headers["Last-Modified"] = http_date(entry["last_modified"])
+    response.headers["Cache-Control"] = "no-cache"  # always revalidate; 304s are cheap
+    response.headers["X-Page-Cache"] = "hit" if hit else "miss"
+    response.vary.add("Cookie")
+    return response
+
+
+def cached_page(ttl: Optional[float] = None):
+    """Cache the rendered GET response of a view (see module docstring)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            cache = current_app.page_cache
+            key = cache.key("page", request.full_path, _visitor_key())
+            entry = cache.backend.get(key)
+            # a page that shows flash messages must be rendered for whoever has some pending
+            if entry is not None and not (entry.get("reads_flashes") and session.get("_flashes")):
+                cache.hits += 1
+                return _respond(entry, hit=True)
+
+            cache.misses += 1
+            response = make_response(view(*args, **kwargs))
+            flashes = request_ctx.flashes  # set once the template calls get_flashed_messages
+            if response.status_code != 200 or response.direct_passthrough or flashes:
+                return response
+            body = response.get_data()
+            entry = {
+                "body": body,
+                "status": response.status_code,
+                "content_type": response.headers.get("Content-Type", "text/html; charset=utf-8"),
+                "etag": hashlib.sha1(body).hexdigest(),
+                "last_modified": int(time.time()),
+                "reads_flashes": flashes is not None,
+            }
+            cache.backend.set(key, entry, cache.default_ttl if ttl is None else ttl)
+            return _respond(entry, hit=False)
+        return wrapped
+    return decorator
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache "key", ttl %}...{% endcache %}`` backed by the page cache."""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_cache", args), [], [], body).set_lineno(lineno)
+
+    def _cache(self, name, ttl, caller):
+        cache = getattr(current_app, "page_cache", None)
+        if cache is None:
+            return caller()
+        key = cache.key("fragment", name)
+        entry = cache.backend.get(key)
+        if entry is not None:
+            return entry["body"].decode("utf-8")
+        rendered = caller()
+        cache.backend.set(key, {"body": rendered.encode("utf-8")}, cache.default_ttl if ttl is None else ttl)
+        return rendered
+
+
+def source_namespace(root: str) -> str:
+    """Digest of the files under ``root``, compiled bytecode aside."""
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()[:12]
+
+
+def init_app(app, namespace: Optional[str] = None) -> None:
+    app.page_cache = PageCache(
+        make_backend(app.config),
+        namespace=app.config.get("PAGE_CACHE_NAMESPACE") or namespace or source_namespace(app.root_path),
+        default_ttl=float(app.config.get("PAGE_CACHE_TTL", 300)),
+    )
+    app.jinja_env.add_extension(FragmentCacheExtension)
@@ -4,10 +4,15 @@ Behavior:
 - Read DATABASE_URL from env
 - Wait for the DB to be ready (try connecting via SQLAlchemy)
 - Run Alembic migrations programmatically (alembic upgrade head)
+- On Postgres, create the races/results partitions of this season and
+  the next one
+- Size gunicorn workers/threads from the CPU count and derive the
+  SQLAlchemy pool so all workers together stay under DB_MAX_CONNECTIONS
 - Replace the process with gunicorn to serve the Flask app
 
 This avoids using shell scripts and keeps init logic in Python.
 """
+import importlib.util
 import os
 import sys
 import time
@@ -15,6 +20,8 @@ import logging
 from sqlalchemy import create_engine, text
 from alembic.config import Config
 from alembic import command
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("entrypoint")
@@ -28,37 +35,209 @@ def normalize_db_url(url: str) -> str:
     return url
 
 
-def wait_for_db(url: str, timeout: int = 60):
+def wait_for_db(url: str, timeout: int = 60, initial_delay: float = 0.1,
+                max_delay: float = 5.0, sleep=time.sleep):
+    """Poll the database with exponential backoff (0.1s, 0.2s, 0.4s ... max_delay)."""
     start = time.time()
     engine = create_engine(url, future=True)
-    last_exc = None
-    while True:
-        try:
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            log.info("Database is ready: %s", url)
-            return
-        except Exception as exc:
-            last_exc = exc
-            if time.time() - start > timeout:
-                log.exception("Timed out waiting for database: %s", exc)
-                raise
-            log.info("Waiting for database to be ready (%s). Sleeping 1s...", exc)
-            time.sleep(1)
-
-
-def run_alembic_upgrade():
+    delay = initial_delay
+    try:
+        while True:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                log.info("Database is ready: %s", url)
+                return
+            except Exception as exc:
+                if time.time() - start > timeout:
+                    log.exception("Timed out waiting for database: %s", exc)
+                    raise
+                log.info("Waiting for database to be ready (%s). Sleeping %.1fs...", exc, delay)
+                sleep(delay)
+                delay = min(max_delay, delay * 2)
+    finally:
+        engine.dispose()
+
+
+def alembic_config(db_url=None) -> Config:
     # assume alembic.ini is in the current working directory
     cfg = Config(os.path.join(os.getcwd(), "alembic.ini"))
     # If DATABASE_URL is set, make sure alembic uses it
-    db_url = os.environ.get("DATABASE_URL")
+    db_url = db_url or os.environ.get("DATABASE_URL")
     if db_url:
-        cfg.set_main_option("sqlalchemy.url", db_url)
+        cfg.set_main_option("sqlalchemy.url", normalize_db_url(db_url))
+    return cfg
+
+
+def migrations_current(cfg: Config) -> bool:
+    """True when the database is already at the head revision(s).
+
+    Costs a single SELECT on alembic_version instead of loading env.py
+    and running the full upgrade machinery.
+    """
+    heads = set(ScriptDirectory.from_config(cfg).get_heads())
+    engine = create_engine(cfg.get_main_option("sqlalchemy.url"), future=True)
+    try:
+        with engine.connect() as conn:
+            current = set(MigrationContext.configure(conn).get_current_heads())
+    finally:
+        engine.dispose()
+    return current == heads
+
+
+def ensure_season_partitions(db_url: str, ahead: int = 1) -> None:
+    """Create the partitions imports of the coming seasons write to (Postgres only)."""
+    if not db_url.startswith("postgresql"):
+        return
+    from app.seasons import current_season, ensure_partitions
+    engine = create_engine(db_url, future=True)
+    try:
+        with engine.begin() as conn:
+            current = current_season()
+            ensure_partitions(conn, range(current, current + ahead + 1))
+    finally:
+        engine.dispose()
+
+
+def run_alembic_upgrade(cfg=None) -> bool:
+    """Upgrade to head unless already there; returns True if it ran."""
+    cfg = cfg or alembic_config()
+    if migrations_current(cfg):
+        log.info("Database schema is at head, skipping alembic upgrade")
+        return False
     log.info("Running alembic upgrade head (alembic.ini=%s)", cfg.config_file_name)
     command.upgrade(cfg, "head")
+    return True
+
+
+WORKER_CLASSES = ("sync", "gthread", "gevent", "uvicorn")
+# gunicorn --worker-class and app target per worker class; "uvicorn" serves app/asgi.py
+WORKER_CLASS_PATHS = {"uvicorn": "uvicorn.workers.UvicornWorker"}
+APP_TARGETS = {"uvicorn": "app.asgi:create_asgi_app()"}
+
+
+def gunicorn_settings(env=None, cpu_count=None) -> dict:
+    """Worker model from env, defaulting to sizes derived from the CPU count.
+
+    GUNICORN_WORKER_CLASS  sync (default), gthread, gevent or uvicorn (ASGI)
+    WEB_CONCURRENCY        worker processes (default: 2*CPU+1 for sync,
+                           CPU+1 for gthread, CPU for gevent and uvicorn)
+    GUNICORN_MAX_WORKERS   upper bound for the derived worker count
+    GUNICORN_THREADS       threads per gthread worker (default 4)
+    GUNICORN_WORKER_CONNECTIONS  connections per gevent/uvicorn worker (default 1000)
+    """
+    env = os.environ if env is None else env
+    cpus = cpu_count or os.cpu_count() or 1
+
+    worker_class = env.get("GUNICORN_WORKER_CLASS", "sync")
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}")
+    # a missing package must stop the deploy, not quietly change the worker model
+    if worker_class == "gevent" and importlib.util.find_spec("gevent") is None:
+        raise ValueError("GUNICORN_WORKER_CLASS=gevent needs the gevent package installed")
+    if worker_class == "uvicorn" and importlib.util.find_spec("uvicorn") is None:
+        raise ValueError("GUNICORN_WORKER_CLASS=uvicorn needs uvicorn (see requirements.txt)")
+
+    if env.get("WEB_CONCURRENCY"):
+        workers = int(env["WEB_CONCURRENCY"])
+    else:
+        workers = {"sync": 2 * cpus + 1, "gthread": cpus + 1, "gevent": cpus, "uvicorn": cpus}[worker_class]
+        workers = min(workers, int(env.get("GUNICORN_MAX_WORKERS", "16")))
+    workers = max(1, workers)
+
+    threads = int(env.get("GUNICORN_THREADS", "4")) if worker_class == "gthread" else 1
+    if worker_class in ("gevent", "uvicorn"):
+        connections = int(env.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+    else:
+        connections = threads
+    return {
+        "worker_class": worker_class,
+        "workers": workers,
+        "threads": threads,
+        # requests a single worker may serve at the same time
+        "concurrency": connections,
+        "bind": env.get("GUNICORN_BIND", "0.0.0.0:5000"),
+        "timeout": int(env.get("GUNICORN_TIMEOUT", "30")),
+        # import the app once in the master and fork it into the workers
+        "preload": env.get("GUNICORN_PRELOAD", "1") == "1",
+    }
+
+
+def engines_per_worker(worker_class: str, env=None) -> int:
+    """Pooled engines a web worker opens against the primary database.
+
+    The ASGI app adds an async engine to the sync one, and a database rate
+    limiter with its own RATE_LIMIT_DATABASE_URL adds another.  Replica
+    engines are sized the same way but count against their own servers.
+    """
+    env = os.environ if env is None else env
+    count = 2 if worker_class == "uvicorn" else 1
+    if env.get("RATE_LIMIT_BACKEND", "memory") == "database" and env.get("RATE_LIMIT_DATABASE_URL"):
+        count += 1
+    return count
+
+
+def pool_settings(workers: int, concurrency: int, env=None, engines_per_worker: int = 1) -> dict:
+    """SQLAlchemy pool sizing that keeps ``workers`` processes under budget.
+
+    ``engines_per_worker`` splits each worker's share between several
+    engines (see :func:`engines_per_worker`).
+
+    DB_MAX_CONNECTIONS  connections all clients together may open (default 90,
+                        leaving headroom under Postgres' default of 100)
+    DB_RESERVED_CONNECTIONS  part of that kept for other clients, by default
+                        the job worker's JOBS_WORKERS + 1 (see app/jobs.py)
+    DB_POOL_MODE        "queue" (default) or "null" to open a connection per
+                        checkout, for use behind PgBouncer
+    DB_POOL_RECYCLE / DB_POOL_TIMEOUT  seconds, passed through
+    """
+    env = os.environ if env is None else env
+    mode = env.get("DB_POOL_MODE", "queue")
+    if mode not in ("queue", "null"):
+        raise ValueError("DB_POOL_MODE must be 'queue' or 'null'")
+    settings = {
+        "DB_POOL_MODE": mode,
+        "DB_POOL_RECYCLE": int(env.get("DB_POOL_RECYCLE", "1800")),
+        "DB_POOL_TIMEOUT": int(env.get("DB_POOL_TIMEOUT", "30")),
+    }
+    if mode == "null":
+        return settings
+
+    reserved = env.get("DB_RESERVED_CONNECTIONS") or int(env.get("JOBS_WORKERS", "2")) + 1
+    budget = max(1, int(env.get("DB_MAX_CONNECTIONS", "90")) - int(reserved))
+    per_worker = max(1, budget // (workers * engines_per_worker))
+    if budget < workers:
+        log.warning("DB_MAX_CONNECTIONS=%d is below the worker count %d", budget, workers)
+    # one pooled connection per concurrent request, plus a little overflow
+    # headroom; pool_size + max_overflow never exceeds the per-worker share
+    pool_size = max(1, min(concurrency, per_worker))
+    settings["DB_POOL_SIZE"] = pool_size
+    settings["DB_MAX_OVERFLOW"] = max(0, min(per_worker - pool_size, max(1, concurrency // 2)))
+    return settings
+
+
+def gunicorn_argv(settings: dict) -> list:
+    argv = [
+        "gunicorn",
+        "--workers", str(settings["workers"]),
+        "--worker-class", WORKER_CLASS_PATHS.get(settings["worker_class"], settings["worker_class"]),
+        "--bind", settings["bind"],
+        "--timeout", str(settings["timeout"]),
+    ]
+    if settings["worker_class"] == "gthread":
+        argv += ["--threads", str(settings["threads"])]
+    if settings["worker_class"] in ("gevent", "uvicorn"):
+        argv += ["--worker-connections", str(settings["concurrency"])]
+    if settings["preload"]:
+        argv.append("--preload")
+    argv.append(APP_TARGETS.get(settings["worker_class"], "app:create_app()"))
+    return argv
 
 
 def main():
+    # create_app logs the time from here to the first served request
+    boot = time.time()
+    os.environ["STARTUP_T0"] = str(boot)
     db_url = os.environ.get("DATABASE_URL", "sqlite:///dev.db")
     db_url = normalize_db_url(db_url)
 
@@ -68,10 +247,11 @@ def main():
         wait_for_db(db_url, timeout=120)
     else:
         log.info("Using sqlite, skipping wait")
+    waited = time.time()
 
     # Run migrations (if alembic is available)
     try:
-        run_alembic_upgrade()
+        run_alembic_upgrade(alembic_config(db_url))
     except Exception as exc:
         log.warning("Alembic upgrade failed: %s", exc)
         # fallback: try to create tables via SQLAlchemy metadata
@@ -82,10 +262,33 @@ def main():
             log.info("Fallback: create_all applied")
         except Exception:
             log.exception("Fallback create_all also failed")
+    try:
+        ensure_season_partitions(db_url)
+    except Exception as exc:
+        log.warning("Creating season partitions failed: %s", exc)
+    migrated = time.time()
+    log.info("Startup: db wait %.2fs, migrations %.2fs", waited - boot, migrated - waited)
+    # the schema is handled here, workers must not run create_all again
+    os.environ["AUTO_CREATE_SCHEMA"] = "0"
+
+    settings = gunicorn_settings()
+    pool = pool_settings(
+        settings["workers"], settings["concurrency"],
+        engines_per_worker=engines_per_worker(settings["worker_class"]),
+    )
+    # workers size their hashing pool by the worker class (app/hashing.py)
+    os.environ["GUNICORN_WORKER_CLASS"] = settings["worker_class"]
+    # workers read the pool sizing through EnvConfig; explicit settings win
+    for key, value in pool.items():
+        pool[key] = os.environ.setdefault(key, str(value))
+    log.info(
+        "Starting gunicorn: %d %s workers x %d threads, pool %s",
+        settings["workers"], settings["worker_class"], settings["threads"], pool,
+    )
 
     # Exec gunicorn to serve the app (replaces current process)
-    log.info("Starting gunicorn")
-    os.execvp("gunicorn", ["gunicorn", "-w", "4", "--bind", "0.0.0.0:5000", "app:create_app()"])
+    argv = gunicorn_argv(settings)
+    os.execvp(argv[0], argv)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+"""Streaming export of the full results history.
+
+Rows join ``results`` with their race, horse, owner and jockey and use the
+same column names as the import format (see app/ingest.py), so a CSV or
+JSONL export can be imported again as is.
+
+Memory and locking stay flat however large the export gets:
+
+* rows are read in keyset chunks (``results.id > :last``), each chunk in
+  its own short transaction, so the export never holds a snapshot or
+  locks that writers have to wait for;
+* inside a chunk the rows come from a server-side cursor
+  (``stream_results`` / ``yield_per``) on drivers that support it;
+* every chunk is encoded (and gzip-compressed) as soon as it is read and
+  handed to the client by a generator response or written to the CLI's
+  output file.
+
+Formats: ``csv``, ``jsonl`` and ``columnar``, a compact binary layout for
+large dumps: one row group per chunk, integer/date/time columns as
+little-endian arrays and text columns dictionary-encoded (see
+``encode_columnar`` / ``read_columnar``).
+"""
+import csv
+import datetime as dt
+import io
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+import click
+from flask import Blueprint, Response, abort, current_app, request
+from sqlalchemy import select
+
+from app.metrics import query_budget
+from app.models import Horse, Jockey, Owner, Race, Result
+from app.routes import admin_required
+from app.seasons import source_connection, sources
+
+export = Blueprint('export', __name__)
+
+FORMATS = ("csv", "jsonl", "columnar")
+COLUMNS = (
+    ("id", "int"), ("date", "date"), ("time", "time"), ("place", "str"), ("title", "str"),
+    ("horse", "str"), ("gender", "str"), ("age", "int"), ("owner", "str"), ("jockey", "str"),
+    ("jockey_age", "int"), ("position", "int"), ("race_time", "str"), ("race_time_ms", "int"),
+)
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "columnar": "application/octet-stream",
+}
+EXTENSIONS = {"csv": "csv", "jsonl": "jsonl", "columnar": "rcol"}
+DEFAULT_CHUNK = 5000
+
+
+def export_query(race=Race, result=Result):
+    """The export columns of ``result`` rows; ``race``/``result`` may be season archives."""
+    return (
+        select(
+            result.id, race.date, race.time, race.place, race.title,
+            Horse.name.label("horse"), Horse.gender, Horse.age,
+            Owner.name.label("owner"), Jockey.name.label("jockey"), Jockey.age.label("jockey_age"),
+            result.position, result.race_time, result.race_time_ms,
+        )
+        .join(race, race.id == result.race_id)
+        .join(Horse, Horse.id == result.horse_id)
+        .join(Owner, Owner.id == Horse.owner_id)
+        .join(Jockey, Jockey.id == result.jockey_id)
+    )
+
+
+def iter_chunks(engine, chunk_size: int = DEFAULT_CHUNK, place: Optional[str] = None,
+                date_from: Optional[dt.date] = None, date_to: Optional[dt.date] = None) -> Iterator[list]:
+    """Yield lists of up to ``chunk_size`` row tuples ordered by result id.
+
+    Archived seasons in the date range come first (their ids are older).
+    """
+    for source in sources(engine, date_from, date_to):
+        race, result = source.race, source.result
+        stmt = export_query(race, result)
+        if place:
+            stmt = stmt.where(race.place == place)
+        if date_from is not None:
+            stmt = stmt.where(race.date >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(race.date <= date_to)
+
+        last_id = 0
+        while True:
+            # a new short transaction per chunk; nothing is held between chunks
+            with source_connection(engine, source) as conn:
+                rows = [tuple(row) for row in conn.execution_options(stream_results=True, yield_per=1000).execute(
+                    stmt.where(result.id > last_id).order_by(result.id).limit(chunk_size)
+                )]
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield rows
+            if len(rows) < chunk_size:
+                break
+
+
+# --- encoders ----------------------------------------------------------------
+
+def _text(value):
+    return value.isoformat() if isinstance(value, (dt.date, dt.time)) else value
+
+
+def encode_csv(chunks: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _ in COLUMNS)
+    for rows in chunks:
+        writer.writerows([_text(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_jsonl(chunks: Iterable[list]) -> Iterator[bytes]:
+    names = [name for name, _ in COLUMNS]
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(names, map(_text, row))), ensure_ascii=False) + "\n" for row in rows
+        ).encode("utf-8")
+
+
+MAGIC = b"RCOL\x01"
+_NULL_INT = -2 ** 63
+_NULL_I32 = -2 ** 31
+_EPOCH = dt.date(1970, 1, 1).toordinal()
+
+
+def _le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _encode_column(kind: str, values: list) -> bytes:
+    if kind == "int":
+        return _le(array("q", (_NULL_INT if v is None else v for v in values)))
+    if kind == "date":
+        return _le(array("i", (_NULL_I32 if v is None else v.toordinal() - _EPOCH for v in values)))
+    if kind == "time":
+        return _le(array("i", (
+            _NULL_I32 if v is None
+            else ((v.hour * 60 + v.minute) * 60 + v.second) * 1000 + v.microsecond // 1000
+            for v in values
+        )))
+    # text: per row group dictionary + int32 codes, -1 for NULL
+    dictionary = {}
+    codes = array("i", (-1 if v is None else dictionary.setdefault(v, len(dictionary)) for v in values))
+    words = json.dumps(list(dictionary), ensure_ascii=False).encode("utf-8")
+    return struct.pack("<I", len(words)) + words + _le(codes)
+
+
+def _decode_column(kind: str, data: bytes) -> list:
+    if kind == "int":
+        return [None if v == _NULL_INT else v for v in _from_le("q", data)]
+    if kind == "date":
+        return [None if v == _NULL_I32 else dt.date.fromordinal(v + _EPOCH) for v in _from_le("i", data)]
+    if kind == "time":
+        return [
+            None if v == _NULL_I32
+            else dt.time(v // 3_600_000, v // 60_000 % 60, v // 1000 % 60, v % 1000 * 1000)
+            for v in _from_le("i", data)
+        ]
+    (size,) = struct.unpack_from("<I", data)
+    words = json.loads(data[4:4 + size].decode("utf-8"))
+    return [None if code < 0 else words[code] for code in _from_le("i", data[4 + size:])]
+
+
+def encode_columnar(chunks: Iterable[list]) -> Iterator[bytes]:
+    """``MAGIC``, a JSON schema, then per chunk a row group; a 0-row group ends the file.
+
+    A row group is ``<u32 rows>`` followed by ``<u32 length><payload>`` per column.
+    """
+    schema = json.dumps({"columns": COLUMNS}).encode("utf-8")
+    yield MAGIC + struct.pack("<I", len(schema)) + schema
+    for rows in chunks:
+        parts = [struct.pack("<I", len(rows))]
+        for index, (_, kind) in enumerate(COLUMNS):
+            payload = _encode_column(kind, [row[index] for row in rows])
+            parts += [struct.pack("<I", len(payload)), payload]
+        yield b"".join(parts)
+    yield struct.pack("<I", 0)
+
+
+def read_columnar(fh: BinaryIO) -> Iterator[dict]:
+    """Yield each row group of a columnar export as ``{column: [values]}``."""
+    if fh.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a columnar export")
+    (size,) = struct.unpack("<I", fh.read(4))
+    columns = json.loads(fh.read(size))["columns"]
+    while True:
+        (rows,) = struct.unpack("<I", fh.read(4))
+        if rows == 0:
+            return
+        group = {}
+        for name, kind in columns:
+            (size,) = struct.unpack("<I", fh.read(4))
+            group[name] = _decode_column(kind, fh.read(size))
+        yield group
+
+
+ENCODERS = {"csv": encode_csv, "jsonl": encode_jsonl, "columnar": encode_columnar}
+
+
+def gzip_stream(parts: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(engine, fmt: str, compress: bool = False, **filters) -> Iterator[bytes]:
+    parts = ENCODERS[fmt](iter_chunks(engine, **filters))
+    return gzip_stream(parts) if compress else parts
+
+
+def _date_arg(name: str) -> Optional[dt.date]:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f"'{name}' must be YYYY-MM-DD")
+
+
+@export.route('/admin/export')
+@admin_required
+@query_budget(0)  # one query per chunk, after the view has returned
+def export_view():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        abort(400, description=f"format must be one of {', '.join(FORMATS)}")
+    chunk_size = max(1, min(request.args.get('chunk', DEFAULT_CHUNK, type=int), 50000))
+    compress = 'gzip' in request.accept_encodings
+    stream = export_stream(
+        current_app.db_replicas.read_engine(), fmt, compress=compress, chunk_size=chunk_size,
+        place=request.args.get('place'), date_from=_date_arg('from'), date_to=_date_arg('to'),
+    )
+    response = Response(stream, content_type=CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="results.{EXTENSIONS[fmt]}"'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@export.cli.command('results')
+@click.argument('output', type=click.Path(dir_okay=False, writable=True, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Compress; implied by a .gz output name.')
+@click.option('--place')
+@click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']))
+@click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']))
+@click.option('--chunk-size', default=DEFAULT_CHUNK, show_default=True)
+def export_command(output, fmt, compress, place, date_from, date_to, chunk_size):
+    """Stream the joined results history to OUTPUT ('-' for stdout)."""
+    compress = compress or output.endswith('.gz')
+    stream = export_stream(
+        current_app.db_replicas.read_engine(), fmt, compress=compress, chunk_size=chunk_size, place=place,
+        date_from=date_from.date() if date_from else None,
+        date_to=date_to.date() if date_to else None,
+    )
+    written = 0
+    with click.open_file(output, 'wb') as fh:
+        for part in stream:
+            fh.write(part)
+            written += len(part)
+    if output != '-':
+        click.echo(f"Wrote {written} bytes to {output}")
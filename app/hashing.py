@@ -0,0 +1,180 @@
+"""Password hashing with configurable cost and a bounded worker pool.
+
+Hashing is deliberately slow, so a burst of logins can keep every gunicorn
+worker busy.  ``PasswordHasher`` runs the work in a small process pool
+(or inline when ``workers`` is 0) and caps the number of hashes that may be
+in flight or queued at once; one that timed out holds its place until it
+actually finishes.  When the cap is reached the caller gets
+``HasherBusy`` immediately instead of waiting behind the queue, which lets
+the views answer 503 and keeps workers free for the rest of the site.
+
+The pool only frees the server when the waiting request is cheap to
+park: a gthread worker serves its other threads and an ASGI worker its
+other clients while a hash runs.  A sync gunicorn worker serves one
+request at a time and blocks in ``future.result`` for the whole hash, so
+the pool adds pickling and IPC on top and only the 503 back-pressure
+helps; ``pool_workers`` therefore hashes inline under sync workers.
+
+The ``*_async`` variants are for the ASGI entry point (app/asgi.py): they
+await the same pool (or the event loop's default thread pool when
+``workers`` is 0) so the loop keeps serving other clients meanwhile.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS,
+    check_password_hash,
+    generate_password_hash,
+)
+
+from app.metrics import record_timing
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash took too long."""
+
+
+def normalize_method(method: str) -> str:
+    """Expand a Werkzeug method string to the prefix it writes into hashes.
+
+    ``"scrypt"`` becomes ``"scrypt:32768:8:1"`` and ``"pbkdf2"`` becomes
+    ``"pbkdf2:sha256:<default iterations>"``, so two spellings of the same
+    parameters compare equal.
+    """
+    name, *args = method.split(":")
+    if name == "scrypt":
+        defaults = ["32768", "8", "1"]
+    elif name == "pbkdf2":
+        defaults = ["sha256", str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        raise ValueError(f"Unsupported password hash method: {method!r}")
+    args = args + defaults[len(args):]
+    return ":".join([name, *args])
+
+
+def pool_workers(configured: int, worker_class: str) -> int:
+    """Pool size to use under ``worker_class``; 0 (inline) for sync workers."""
+    return 0 if worker_class == "sync" else configured
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        method: str = "scrypt",
+        workers: int = 0,
+        max_pending: int = 32,
+        timeout: float = 10.0,
+    ):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending > 0 else None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # gunicorn forks workers after create_app, so every process gets its own pool
+        pid = os.getpid()
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != pid:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = pid
+            return self._pool
+
+    def _acquire(self) -> None:
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            self._reject()
+            raise HasherBusy("password hashing queue is full")
+
+    def _release(self, _future=None) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+    def _reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def _submit(self, fn, *args):
+        """Submit to the pool; the slot is freed when the hash ends, not when the caller gives up."""
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _inline(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            self._release()
+
+    def _run(self, fn, *args):
+        self._acquire()
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return self._inline(fn, *args)
+            future = self._submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                self._reject()
+                raise HasherBusy("password hashing timed out")
+        finally:
+            record_timing("hash", (time.perf_counter() - started) * 1000)
+
+    async def _run_async(self, fn, *args):
+        self._acquire()
+        started = time.perf_counter()
+        try:
+            if self.workers > 0:
+                future = asyncio.wrap_future(self._submit(fn, *args))
+            else:
+                # the default thread pool keeps running a hash we stop waiting for
+                future = asyncio.get_running_loop().run_in_executor(None, self._inline, fn, *args)
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                self._reject()
+                raise HasherBusy("password hashing timed out")
+        finally:
+            record_timing("hash", (time.perf_counter() - started) * 1000)
+
+    def hash(self, raw: str) -> str:
+        return self._run(generate_password_hash, raw, self.method)
+
+    def verify(self, hashed: Optional[str], raw: str) -> bool:
+        if not hashed:
+            return False
+        return self._run(check_password_hash, hashed, raw)
+
+    async def hash_async(self, raw: str) -> str:
+        return await self._run_async(generate_password_hash, raw, self.method)
+
+    async def verify_async(self, hashed: Optional[str], raw: str) -> bool:
+        if not hashed:
+            return False
+        return await self._run_async(check_password_hash, hashed, raw)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when ``hashed`` was made with other method or cost settings."""
+        return hashed.split("$", 1)[0] != self.method
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pool_pid = None
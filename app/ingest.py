@@ -0,0 +1,411 @@
+"""Bulk import of race results from CSV or JSON Lines files.
+
+Every record describes one finisher::
+
+    date,time,place,title,horse,gender,age,owner,jockey,jockey_age,position,race_time
+    2024-05-01,14:30,Moscow,Spring Cup,Lightning,male,5,Stable A,Ivanov,30,1,1:38.20
+
+The file is read lazily and processed in batches.  For each batch owner,
+horse, jockey and race names are resolved to ids through in-memory lookup
+tables (one SELECT for the unknown names, one multi-row INSERT for the
+ones that do not exist yet), then the results are written with COPY on
+Postgres/psycopg2 or multi-row ``INSERT ... VALUES`` elsewhere.  Each batch
+commits together with its leaderboard deltas, the ratings of its races
+(see app/ratings.py) and an ``ingest_checkpoints`` row, so a failed import can simply be started again and continues after
+the last committed record.  The checkpoint is keyed by ``source``, by
+default a hash of the file's first block and its size (``content_key``),
+so only the same file resumes, and it is deleted when a run completes:
+importing a file again imports it again.  Memory use depends on the batch
+size and the number of distinct names, not on the file size.
+"""
+import csv
+import datetime as dt
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, TextIO
+
+import click
+from flask import Blueprint, current_app, jsonify, request, abort, url_for
+from sqlalchemy import insert, select, update
+
+from app.models import Horse, IngestCheckpoint, Jockey, Owner, Race, Result
+from app.metrics import query_budget
+from app.race_time import parse_race_time
+from app.ratings import INITIAL_RATING, rebuild as rebuild_ratings, update_races
+from app.routes import admin_required
+from app.schedule import record_write
+from app.seasons import archived, ensure_partitions, season_of
+from app.stats import apply_deltas, result_deltas
+
+log = logging.getLogger("ingest")
+
+ingest = Blueprint('ingest', __name__)
+
+FIELDS = (
+    "date", "time", "place", "title", "horse", "gender", "age",
+    "owner", "jockey", "jockey_age", "position", "race_time",
+)
+FORMATS = ("csv", "jsonl")
+
+owners_t = Owner.__table__
+horses_t = Horse.__table__
+jockeys_t = Jockey.__table__
+races_t = Race.__table__
+results_t = Result.__table__
+checkpoints_t = IngestCheckpoint.__table__
+
+_IN_CHUNK = 500  # names per IN (...) list
+_KEY_BLOCK = 1 << 16  # bytes hashed by content_key
+
+
+class IngestError(ValueError):
+    def __init__(self, line_no: int, message: str):
+        super().__init__(f"record {line_no}: {message}")
+        self.line_no = line_no
+
+
+def content_key(fh: BinaryIO) -> str:
+    """Checkpoint key of a seekable binary file: sha256 of its first block plus its size."""
+    start = fh.tell()
+    digest = hashlib.sha256(fh.read(_KEY_BLOCK)).hexdigest()
+    size = fh.seek(0, os.SEEK_END) - start
+    fh.seek(start)
+    return f"sha256:{digest[:32]}:{size}"
+
+
+def detect_format(filename: str) -> str:
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def iter_records(fh: TextIO, fmt: str) -> Iterator[tuple]:
+    """Yield ``(record_no, raw_dict)`` pairs without reading the whole file."""
+    if fmt == "csv":
+        for line_no, row in enumerate(csv.DictReader(fh), start=1):
+            yield line_no, row
+    elif fmt == "jsonl":
+        line_no = 0
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            line_no += 1
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as exc:
+                raise IngestError(line_no, f"invalid JSON: {exc}") from None
+    else:
+        raise ValueError(f"Unsupported format: {fmt!r}")
+
+
+def parse_record(line_no: int, raw: dict) -> dict:
+    try:
+        record = {
+            "date": dt.date.fromisoformat(str(raw["date"]).strip()),
+            "time": dt.time.fromisoformat(str(raw["time"]).strip()),
+            "place": str(raw["place"]).strip(),
+            "title": (str(raw.get("title") or "").strip() or None),
+            "horse": str(raw["horse"]).strip(),
+            "gender": str(raw.get("gender") or "").strip(),
+            "age": int(raw.get("age") or 0),
+            "owner": str(raw["owner"]).strip(),
+            "jockey": str(raw["jockey"]).strip(),
+            "jockey_age": int(raw.get("jockey_age") or 0),
+            "position": int(raw["position"]),
+            "race_time": str(raw.get("race_time") or "").strip(),
+        }
+        record["race_time_ms"] = parse_race_time(record["race_time"])
+        record["race_date"] = record["date"]
+    except KeyError as exc:
+        raise IngestError(line_no, f"missing field {exc.args[0]!r}") from None
+    except (TypeError, ValueError) as exc:
+        raise IngestError(line_no, str(exc)) from None
+    if not record["place"] or not record["horse"] or not record["owner"] or not record["jockey"]:
+        raise IngestError(line_no, "place, horse, owner and jockey must not be empty")
+    return record
+
+
+@dataclass
+class IngestReport:
+    source: str
+    rows: int = 0
+    skipped: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    resumed_from: int = 0
+    ratings_rebuilt: bool = False
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "rows": self.rows,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "resumed_from": self.resumed_from,
+            "ratings_rebuilt": self.ratings_rebuilt,
+        }
+
+
+@dataclass
+class Lookups:
+    """name -> id tables shared by all batches of one import."""
+
+    owners: dict = field(default_factory=dict)
+    jockeys: dict = field(default_factory=dict)
+    horses: dict = field(default_factory=dict)
+    races: dict = field(default_factory=dict)  # (date, time, place) -> id
+
+    def _resolve_named(self, conn, table, cache: dict, wanted: dict) -> None:
+        missing = [name for name in wanted if name not in cache]
+        for i in range(0, len(missing), _IN_CHUNK):
+            chunk = missing[i:i + _IN_CHUNK]
+            rows = conn.execute(
+                select(table.c.name, table.c.id).where(table.c.name.in_(chunk)).order_by(table.c.id)
+            )
+            for name, id_ in rows:
+                cache.setdefault(name, id_)
+        new = [wanted[name] for name in missing if name not in cache]
+        if new:
+            rows = conn.execute(insert(table).returning(table.c.name, table.c.id), new)
+            cache.update(rows.all())
+
+    def _resolve_races(self, conn, records: list) -> None:
+        wanted = {}
+        for r in records:
+            key = (r["date"], r["time"], r["place"])
+            if key not in self.races:
+                wanted.setdefault(key, r["title"])
+        if not wanted:
+            return
+        dates = sorted({key[0] for key in wanted})
+        places = sorted({key[2] for key in wanted})
+        rows = conn.execute(
+            select(races_t.c.date, races_t.c.time, races_t.c.place, races_t.c.id)
+            .where(races_t.c.date.in_(dates), races_t.c.place.in_(places))
+            .order_by(races_t.c.id)
+        )
+        for date, time_, place, id_ in rows:
+            self.races.setdefault((date, time_, place), id_)
+        new = [
+            {"date": key[0], "time": key[1], "place": key[2], "title": title,
+             "starts_at": dt.datetime.combine(key[0], key[1])}
+            for key, title in wanted.items() if key not in self.races
+        ]
+        if new:
+            rows = conn.execute(
+                insert(races_t).returning(races_t.c.date, races_t.c.time, races_t.c.place, races_t.c.id),
+                new,
+            )
+            for date, time_, place, id_ in rows:
+                self.races[(date, time_, place)] = id_
+
+    def resolve(self, conn, records: list) -> None:
+        """Fill ``owner_id``, ``horse_id``, ``jockey_id`` and ``race_id`` in place."""
+        self._resolve_named(conn, owners_t, self.owners, {
+            r["owner"]: {"name": r["owner"]} for r in records
+        })
+        self._resolve_named(conn, jockeys_t, self.jockeys, {
+            r["jockey"]: {"name": r["jockey"], "age": r["jockey_age"], "rating": INITIAL_RATING} for r in records
+        })
+        self._resolve_named(conn, horses_t, self.horses, {
+            r["horse"]: {
+                "name": r["horse"], "gender": r["gender"], "age": r["age"],
+                "owner_id": self.owners[r["owner"]],
+            } for r in records
+        })
+        self._resolve_races(conn, records)
+        for r in records:
+            r["owner_id"] = self.owners[r["owner"]]
+            r["jockey_id"] = self.jockeys[r["jockey"]]
+            r["horse_id"] = self.horses[r["horse"]]
+            r["race_id"] = self.races[(r["date"], r["time"], r["place"])]
+
+
+_RESULT_COLUMNS = ("race_id", "race_date", "horse_id", "jockey_id", "position", "race_time", "race_time_ms")
+
+
+def write_results(conn, rows: list) -> None:
+    """Insert result rows with COPY (psycopg2) or multi-row INSERTs."""
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([row[c] for c in _RESULT_COLUMNS])
+        buf.seek(0)
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            # csv loads an unquoted empty field as NULL; race_time is NOT NULL
+            # and blank for runners without a time, race_time_ms may be NULL
+            cursor.copy_expert(
+                f"COPY results ({', '.join(_RESULT_COLUMNS)}) FROM STDIN "
+                "WITH (FORMAT csv, FORCE_NOT_NULL (race_time))", buf
+            )
+        finally:
+            cursor.close()
+        record_write(conn, {results_t.name})
+        return
+
+    # keep well below SQLite's bound-parameter limit
+    per_stmt = max(1, 900 // len(_RESULT_COLUMNS))
+    for i in range(0, len(rows), per_stmt):
+        chunk = [{c: row[c] for c in _RESULT_COLUMNS} for row in rows[i:i + per_stmt]]
+        conn.execute(insert(results_t).values(chunk))
+
+
+def _save_checkpoint(conn, source: str, line_no: int, rows: int) -> None:
+    values = {"line_no": line_no, "rows": rows, "updated_at": dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)}
+    updated = conn.execute(update(checkpoints_t).where(checkpoints_t.c.source == source).values(values))
+    if not updated.rowcount:
+        conn.execute(insert(checkpoints_t).values(source=source, **values))
+
+
+def load_checkpoint(conn, source: str) -> int:
+    line_no = conn.execute(
+        select(checkpoints_t.c.line_no).where(checkpoints_t.c.source == source)
+    ).scalar_one_or_none()
+    return line_no or 0
+
+
+class Ingestor:
+    def __init__(
+        self,
+        engine,
+        batch_size: int = 5000,
+        progress: Optional[Callable[[IngestReport], None]] = None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.progress = progress
+        self.lookups = Lookups()
+        self.seasons: set = set()  # seasons whose partitions exist
+        self.archived: set = set()
+
+    def _flush(self, records: list, report: IngestReport, last_line: int) -> None:
+        new_seasons = {season_of(r["date"]) for r in records} - self.seasons
+        if new_seasons:
+            with self.engine.begin() as conn:
+                ensure_partitions(conn, new_seasons)
+            self.seasons |= new_seasons
+        with self.engine.begin() as conn:
+            self.lookups.resolve(conn, records)
+            write_results(conn, records)
+            apply_deltas(conn, result_deltas(records))
+            if not update_races(conn, {r["race_id"] for r in records}):
+                # too far back in time to replay per batch, rebuild once at the end
+                report.ratings_rebuilt = True
+            _save_checkpoint(conn, report.source, last_line, report.rows + len(records))
+        report.rows += len(records)
+        report.batches += 1
+
+    def run(self, records: Iterable[tuple], source: str, restart: bool = False) -> IngestReport:
+        """Import ``(record_no, raw_dict)`` pairs, resuming after the checkpoint."""
+        report = IngestReport(source=source)
+        with self.engine.begin() as conn:
+            if restart:
+                conn.execute(checkpoints_t.delete().where(checkpoints_t.c.source == source))
+            else:
+                report.resumed_from = load_checkpoint(conn, source)
+            self.archived = {row.season for row in archived(conn)}
+
+        start = time.perf_counter()
+        batch, last_line = [], report.resumed_from
+        for line_no, raw in records:
+            if line_no <= report.resumed_from:
+                report.skipped += 1
+                continue
+            record = parse_record(line_no, raw)
+            if season_of(record["date"]) in self.archived:
+                raise IngestError(line_no, f"season {season_of(record['date'])} is archived; restore it first")
+            batch.append(record)
+            last_line = line_no
+            if len(batch) >= self.batch_size:
+                self._flush(batch, report, last_line)
+                batch = []
+                report.seconds = time.perf_counter() - start
+                log.info("%s: %d rows, %.0f rows/s", source, report.rows, report.rows_per_sec)
+                if self.progress:
+                    self.progress(report)
+        if batch:
+            self._flush(batch, report, last_line)
+        # done: the next import of this source starts from the top
+        with self.engine.begin() as conn:
+            conn.execute(checkpoints_t.delete().where(checkpoints_t.c.source == source))
+        if report.ratings_rebuilt:
+            rebuild_ratings(self.engine)
+        report.seconds = time.perf_counter() - start
+        log.info("%s: done, %d rows in %.1fs (%.0f rows/s)",
+                 source, report.rows, report.seconds, report.rows_per_sec)
+        return report
+
+
+def import_file(engine, fh: TextIO, fmt: str, source: str, batch_size: int = 5000,
+                restart: bool = False, progress=None) -> IngestReport:
+    ingestor = Ingestor(engine, batch_size=batch_size, progress=progress)
+    return ingestor.run(iter_records(fh, fmt), source, restart=restart)
+
+
+@ingest.route('/admin/import', methods=['POST'])
+@admin_required
+@query_budget(0)  # query count grows with the file by design
+def import_view():
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        abort(400, description="file is required")
+    fmt = request.form.get('format') or detect_format(upload.filename)
+    if fmt not in FORMATS:
+        abort(400, description=f"format must be one of {', '.join(FORMATS)}")
+    source = request.form.get('source') or content_key(upload.stream)
+    batch_size = request.form.get('batch_size', 5000, type=int)
+    restart = request.form.get('restart') == '1'
+    if request.form.get('background') == '1':
+        # spool the upload and let the job worker (app/jobs.py) import it
+        queue = current_app.job_queue
+        path = queue.spool_path(upload.filename)
+        upload.save(path)
+        job_id = queue.enqueue("import", {"path": path, "format": fmt, "source": source,
+                                          "batch_size": batch_size, "restart": restart})
+        return jsonify({"job_id": job_id, "status_url": url_for('jobs.job_view', job_id=job_id)}), 202
+    # werkzeug spools large uploads to a temporary file, so this streams from disk
+    fh = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    try:
+        report = import_file(current_app.db_engine, fh, fmt, source, batch_size=batch_size,
+                             restart=restart)
+    except IngestError as exc:
+        return jsonify({"error": str(exc), "line_no": exc.line_no}), 400
+    return jsonify(report.as_dict())
+
+
+@ingest.cli.command('results')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--source', help='Checkpoint key; defaults to a hash of the file contents.')
+@click.option('--restart', is_flag=True, help='Ignore a previous checkpoint.')
+def import_command(path, fmt, batch_size, source, restart):
+    """Stream race results from a CSV/JSONL file into the database."""
+    if not source:
+        with open(path, 'rb') as raw:
+            source = content_key(raw)
+
+    def progress(report):
+        click.echo(f"{report.rows} rows, {report.rows_per_sec:.0f} rows/s")
+
+    with open(path, encoding='utf-8', newline='') as fh:
+        try:
+            report = import_file(current_app.db_engine, fh, fmt or detect_format(path), source,
+                                 batch_size=batch_size, restart=restart, progress=progress)
+        except IngestError as exc:
+            raise click.ClickException(f"{exc} (earlier batches are committed; rerun to resume)")
+    if report.resumed_from:
+        click.echo(f"Resumed after record {report.resumed_from}, skipped {report.skipped}")
+    click.echo(f"Imported {report.rows} rows in {report.seconds:.1f}s ({report.rows_per_sec:.0f} rows/s)")
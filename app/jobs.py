@@ -0,0 +1,573 @@
+"""Background jobs: a durable queue in the ``jobs`` table and its worker.
+
+Imports, exports and full rebuilds take minutes, far past a gunicorn
+worker's timeout.  Views and CLI commands ``enqueue`` them instead and
+return at once; a separate process started with ``python -m app.jobs``
+(or ``flask jobs worker``) runs them on a thread or process pool.  There
+is no broker: the queue is the database the app already uses.
+
+* A job is claimed with a single ``UPDATE ... WHERE id = (SELECT ... FOR
+  UPDATE SKIP LOCKED) RETURNING``, so on Postgres concurrent workers never
+  wait for each other's rows.  SQLite has no row locks and drops the
+  ``FOR UPDATE``; there the ``UPDATE`` itself holds the database write
+  lock, which serialises claims just as well.
+* Higher ``priority`` runs first, then the oldest ``run_after``.
+* A failed job goes back to the queue after ``JOBS_RETRY_SECONDS``,
+  doubled on every further attempt, until ``max_attempts`` is reached.
+  Handlers must therefore be safe to run again; imports resume from their
+  checkpoint and rebuilds start from scratch anyway.
+* The worker refreshes ``locked_at`` of its running jobs; a job whose
+  lease is older than ``JOBS_LEASE_SECONDS`` (its worker was killed) is
+  queued again by whichever worker notices first.
+* Handlers report ``progress`` (0..1) and a short message through their
+  ``JobContext``; the admin page shows both.
+* Uploads and exports go through the spool directory.  A finished export
+  is downloaded from ``/admin/jobs/<id>/download``; the worker deletes
+  spool files older than ``JOBS_SPOOL_RETENTION_SECONDS`` unless a queued
+  or running job still names them.
+"""
+import argparse
+import datetime as dt
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import click
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, request, send_file, url_for
+from sqlalchemy import func, insert, select, update
+
+from app.listing import _wants_json
+from app.models import Job
+from app.routes import admin_required
+
+log = logging.getLogger("jobs")
+
+jobs = Blueprint('jobs', __name__)
+
+jobs_t = Job.__table__
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+STATUSES = (QUEUED, RUNNING, DONE, FAILED)
+# kinds an admin may start from the admin page without a payload
+ADMIN_KINDS = {"stats.rebuild": "Пересчитать статистику", "ratings.rebuild": "Пересчитать рейтинги",
+               "export": "Выгрузить результаты (CSV)"}
+PROGRESS_INTERVAL = 0.5  # seconds between progress writes of one job
+
+HANDLERS = {}
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+
+
+def handler(kind: str):
+    """Register ``fn(ctx, **payload)`` as the handler of ``kind``; its return value is the job result."""
+    def register(fn: Callable):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+# --- queue -------------------------------------------------------------------
+
+def enqueue(conn, kind: str, payload: Optional[dict] = None, priority: int = 0,
+            max_attempts: int = 3, delay: float = 0.0) -> int:
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind {kind!r}")
+    now = _now()
+    return conn.execute(
+        insert(jobs_t).returning(jobs_t.c.id).values(
+            kind=kind, payload=json.dumps(payload or {}), status=QUEUED, priority=priority, attempts=0,
+            max_attempts=max_attempts, run_after=now + dt.timedelta(seconds=delay), progress=0.0,
+            message="", created_at=now,
+        )
+    ).scalar_one()
+
+
+def claim(conn, worker: str, now: Optional[dt.datetime] = None):
+    """Take the next due job for ``worker``; ``None`` when there is none."""
+    now = now or _now()
+    candidate = (
+        select(jobs_t.c.id)
+        .where(jobs_t.c.status == QUEUED, jobs_t.c.run_after <= now)
+        .order_by(jobs_t.c.priority.desc(), jobs_t.c.run_after, jobs_t.c.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    values = {"status": RUNNING, "locked_by": worker, "locked_at": now, "started_at": now,
+              "attempts": jobs_t.c.attempts + 1, "progress": 0.0, "message": ""}
+    columns = (jobs_t.c.id, jobs_t.c.kind, jobs_t.c.payload, jobs_t.c.attempts, jobs_t.c.max_attempts)
+    if conn.dialect.update_returning:
+        return conn.execute(
+            update(jobs_t)
+            .where(jobs_t.c.id == candidate.scalar_subquery(), jobs_t.c.status == QUEUED)
+            .values(values)
+            .returning(*columns)
+        ).first()
+    # without RETURNING: pick, then claim only if nobody else did in between
+    while (job_id := conn.execute(candidate).scalar()) is not None:
+        claimed = conn.execute(update(jobs_t).where(jobs_t.c.id == job_id, jobs_t.c.status == QUEUED).values(values))
+        if claimed.rowcount:
+            return conn.execute(select(*columns).where(jobs_t.c.id == job_id)).first()
+    return None
+
+
+def finish(conn, job_id: int, worker: str, result=None) -> None:
+    conn.execute(
+        update(jobs_t).where(jobs_t.c.id == job_id, jobs_t.c.locked_by == worker).values(
+            status=DONE, progress=1.0, result=json.dumps(result), error=None, locked_by=None,
+            locked_at=None, finished_at=_now(),
+        )
+    )
+
+
+def fail(conn, job_id: int, worker: str, error: str, attempts: int, max_attempts: int,
+         retry_seconds: float) -> bool:
+    """Record a failed attempt; returns True when the job was queued again."""
+    now = _now()
+    values = {"error": error[-4000:], "locked_by": None, "locked_at": None}
+    retry = attempts < max_attempts
+    if retry:
+        values.update(status=QUEUED, run_after=now + dt.timedelta(seconds=retry_seconds * 2 ** (attempts - 1)))
+    else:
+        values.update(status=FAILED, finished_at=now)
+    conn.execute(update(jobs_t).where(jobs_t.c.id == job_id, jobs_t.c.locked_by == worker).values(values))
+    return retry
+
+
+def heartbeat(conn, worker: str, job_ids) -> None:
+    if job_ids:
+        conn.execute(
+            update(jobs_t).where(jobs_t.c.id.in_(list(job_ids)), jobs_t.c.locked_by == worker).values(locked_at=_now())
+        )
+
+
+def requeue_stale(conn, lease_seconds: float, now: Optional[dt.datetime] = None) -> int:
+    """Queue again the running jobs whose worker stopped renewing the lease."""
+    now = now or _now()
+    stale = (jobs_t.c.status == RUNNING, jobs_t.c.locked_at < now - dt.timedelta(seconds=lease_seconds))
+    failed = conn.execute(
+        update(jobs_t).where(*stale, jobs_t.c.attempts >= jobs_t.c.max_attempts).values(
+            status=FAILED, error="worker lost", locked_by=None, locked_at=None, finished_at=now,
+        )
+    ).rowcount
+    requeued = conn.execute(
+        update(jobs_t).where(*stale).values(status=QUEUED, run_after=now, locked_by=None, locked_at=None)
+    ).rowcount
+    if failed or requeued:
+        log.warning("Requeued %d and failed %d jobs with an expired lease", requeued, failed)
+    return requeued
+
+
+def _job_dict(row) -> dict:
+    return {
+        "id": row.id, "kind": row.kind, "status": row.status, "priority": row.priority,
+        "attempts": row.attempts, "max_attempts": row.max_attempts, "progress": round(row.progress, 3),
+        "message": row.message, "error": row.error,
+        "result": json.loads(row.result) if row.result else None,
+        "created_at": row.created_at.isoformat(),
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+    }
+
+
+class JobQueue:
+    """What the web app needs of the queue: enqueue, look up and summarise."""
+
+    def __init__(self, engine, max_attempts: int = 3, spool_dir: str = "", spool_retention: float = 86400.0):
+        self.engine = engine
+        self.max_attempts = max_attempts
+        self.spool_dir = spool_dir or os.path.join(tempfile.gettempdir(), "jobs")
+        self.spool_retention = spool_retention
+
+    def enqueue(self, kind: str, payload: Optional[dict] = None, priority: int = 0,
+                max_attempts: Optional[int] = None, delay: float = 0.0) -> int:
+        with self.engine.begin() as conn:
+            job_id = enqueue(conn, kind, payload, priority, max_attempts or self.max_attempts, delay)
+        log.info("Queued job %d (%s)", job_id, kind)
+        return job_id
+
+    def get(self, job_id: int) -> Optional[dict]:
+        with self.engine.connect() as conn:
+            row = conn.execute(select(jobs_t).where(jobs_t.c.id == job_id)).first()
+        return _job_dict(row) if row is not None else None
+
+    def spool_path(self, name: str) -> str:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=f"{int(time.time())}-", suffix=f"-{os.path.basename(name)}",
+                                    dir=self.spool_dir)
+        os.close(fd)
+        return path
+
+    def spooled(self, path: str) -> bool:
+        """Whether ``path`` is a file in the spool directory."""
+        return os.path.dirname(os.path.realpath(path)) == os.path.realpath(self.spool_dir)
+
+    def sweep_spool(self, now: Optional[float] = None) -> int:
+        """Delete spool files past the retention that no pending job names; returns how many."""
+        if not os.path.isdir(self.spool_dir):
+            return 0
+        cutoff = (now or time.time()) - self.spool_retention
+        with self.engine.connect() as conn:
+            payloads = conn.execute(select(jobs_t.c.payload).where(jobs_t.c.status.in_((QUEUED, RUNNING)))).scalars()
+            pending = {os.path.realpath(path) for payload in payloads
+                       if (path := json.loads(payload or "{}").get("path"))}
+        removed = 0
+        for entry in os.scandir(self.spool_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff and os.path.realpath(entry.path) not in pending:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            log.info("Removed %d expired files from the job spool", removed)
+        return removed
+
+    def stats(self, recent: int = 20) -> dict:
+        with self.engine.connect() as conn:
+            counts = dict(conn.execute(select(jobs_t.c.status, func.count()).group_by(jobs_t.c.status)).all())
+            rows = conn.execute(select(jobs_t).order_by(jobs_t.c.id.desc()).limit(recent)).all()
+        return {"counts": {status: counts.get(status, 0) for status in STATUSES},
+                "recent": [_job_dict(row) for row in rows], "kinds": ADMIN_KINDS}
+
+
+def init_app(app, engine, session_factory) -> None:
+    app.job_queue = JobQueue(
+        engine,
+        max_attempts=int(app.config.get("JOBS_MAX_ATTEMPTS", 3)),
+        spool_dir=app.config.get("JOBS_SPOOL_DIR", ""),
+        spool_retention=float(app.config.get("JOBS_SPOOL_RETENTION_SECONDS", 86400)),
+    )
+
+
+# --- running -----------------------------------------------------------------
+
+class JobContext:
+    """Handed to a handler: the app, and progress reporting for the job."""
+
+    def __init__(self, app, job_id: int, worker: str):
+        self.app = app
+        self.job_id = job_id
+        self.worker = worker
+        self._reported = 0.0
+
+    @property
+    def engine(self):
+        return self.app.db_engine
+
+    def progress(self, fraction: Optional[float] = None, message: Optional[str] = None, force: bool = False) -> None:
+        """Store progress, at most every ``PROGRESS_INTERVAL`` unless ``force``; also renews the lease."""
+        now = time.monotonic()
+        if not force and now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        values = {"locked_at": _now()}
+        if fraction is not None:
+            values["progress"] = max(0.0, min(float(fraction), 1.0))
+        if message is not None:
+            values["message"] = message[:200]
+        with self.engine.begin() as conn:
+            conn.execute(update(jobs_t).where(jobs_t.c.id == self.job_id, jobs_t.c.locked_by == self.worker)
+                         .values(values))
+
+
+def run_job(app, job, worker: str, retry_seconds: float = 30.0) -> str:
+    """Run one claimed job to completion; returns its new status."""
+    started = time.perf_counter()
+    try:
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise LookupError(f"no handler for job kind {job.kind!r}")
+        with app.app_context():
+            result = fn(JobContext(app, job.id, worker), **json.loads(job.payload or "{}"))
+    except Exception:
+        error = traceback.format_exc()
+        log.exception("Job %d (%s) failed on attempt %d/%d", job.id, job.kind, job.attempts, job.max_attempts)
+        with app.db_engine.begin() as conn:
+            retried = fail(conn, job.id, worker, error, job.attempts, job.max_attempts, retry_seconds)
+        return QUEUED if retried else FAILED
+    with app.db_engine.begin() as conn:
+        finish(conn, job.id, worker, result)
+    log.info("Job %d (%s) done in %.1fs", job.id, job.kind, time.perf_counter() - started)
+    return DONE
+
+
+_child_app = None
+
+
+def _init_child(settings: dict) -> None:
+    global _child_app
+    from app import create_app
+    _child_app = create_app(type("WorkerConfig", (), {**settings, "AUTO_CREATE_SCHEMA": False}))
+
+
+def _run_in_child(job: dict, worker: str, retry_seconds: float) -> str:
+    return run_job(_child_app, argparse.Namespace(**job), worker, retry_seconds)
+
+
+class Worker:
+    """Claims due jobs while the pool has free slots and renews their leases."""
+
+    def __init__(self, app, concurrency: int = 2, pool: str = "thread", poll_seconds: float = 1.0,
+                 lease_seconds: float = 300.0, retry_seconds: float = 30.0, name: Optional[str] = None):
+        if pool not in ("thread", "process"):
+            raise ValueError("pool must be 'thread' or 'process'")
+        self.app = app
+        self.engine = app.db_engine
+        self.concurrency = max(1, concurrency)
+        self.pool = pool
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.retry_seconds = retry_seconds
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self._running = {}  # future -> job id
+        self._wakeup = threading.Event()
+        self.completed = {DONE: 0, QUEUED: 0, FAILED: 0}
+
+    def _executor(self):
+        if self.pool == "thread":
+            return ThreadPoolExecutor(self.concurrency, thread_name_prefix="job")
+        settings = {key: value for key, value in self.app.config.items()
+                    if key.isupper() and isinstance(value, (str, int, float, bool, type(None)))}
+        # spawn: the children build their own app and engine instead of
+        # inheriting this process's threads and pooled connections
+        return ProcessPoolExecutor(self.concurrency, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_child, initargs=(settings,))
+
+    def _submit(self, executor, job) -> None:
+        if self.pool == "thread":
+            future = executor.submit(run_job, self.app, job, self.name, self.retry_seconds)
+        else:
+            future = executor.submit(_run_in_child, dict(job._mapping), self.name, self.retry_seconds)
+        self._running[future] = job.id
+        future.add_done_callback(self._done)
+
+    def _done(self, future) -> None:
+        job_id = self._running.pop(future, None)
+        try:
+            self.completed[future.result()] += 1
+        except Exception:
+            # the job's process died; its lease expires and it is queued again
+            log.exception("Job %s crashed its worker", job_id)
+        self._wakeup.set()
+
+    def run(self, burst: bool = False) -> None:
+        """Work until ``stop()``, or with ``burst`` until no job is due and none is running."""
+        log.info("Worker %s: %d %s slots", self.name, self.concurrency, self.pool)
+        next_maintenance = 0.0
+        with self._executor() as executor:
+            while not self.stopping.is_set():
+                now = time.monotonic()
+                if now >= next_maintenance:
+                    with self.engine.begin() as conn:
+                        heartbeat(conn, self.name, list(self._running.values()))
+                        requeue_stale(conn, self.lease_seconds)
+                    self.app.job_queue.sweep_spool()
+                    next_maintenance = now + self.lease_seconds / 3
+                claimed = False
+                while len(self._running) < self.concurrency:
+                    with self.engine.begin() as conn:
+                        job = claim(conn, self.name)
+                    if job is None:
+                        break
+                    claimed = True
+                    log.info("Job %d (%s) claimed, attempt %d", job.id, job.kind, job.attempts)
+                    self._submit(executor, job)
+                if burst and not claimed and not self._running:
+                    break
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self._wakeup.set()
+
+
+def make_worker(app, **overrides) -> Worker:
+    options = {
+        "concurrency": int(app.config.get("JOBS_WORKERS", 2)),
+        "pool": app.config.get("JOBS_POOL", "thread"),
+        "poll_seconds": float(app.config.get("JOBS_POLL_SECONDS", 1)),
+        "lease_seconds": float(app.config.get("JOBS_LEASE_SECONDS", 300)),
+        "retry_seconds": float(app.config.get("JOBS_RETRY_SECONDS", 30)),
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return Worker(app, **options)
+
+
+# --- handlers ----------------------------------------------------------------
+
+@handler("import")
+def import_job(ctx, path: str, format: str, source: str, batch_size: int = 5000,
+               restart: bool = False, remove: bool = True):
+    """Spooled upload from ``/admin/import?background=1``; resumes from its checkpoint on retry."""
+    from app.ingest import import_file
+    size = os.path.getsize(path) or 1
+    with open(path, encoding="utf-8", newline="") as fh:
+        def progress(report):
+            ctx.progress(fh.buffer.tell() / size, f"{report.rows} rows, {report.rows_per_sec:.0f} rows/s")
+
+        report = import_file(ctx.engine, fh, format, source, batch_size=batch_size, restart=restart,
+                             progress=progress)
+    if remove:
+        os.remove(path)
+    return report.as_dict()
+
+
+@handler("export")
+def export_job(ctx, path: Optional[str] = None, format: str = "csv", compress: bool = False, **filters):
+    from app.export import EXTENSIONS, export_stream
+    if path is None:
+        path = ctx.app.job_queue.spool_path(f"results.{EXTENSIONS[format]}{'.gz' if compress else ''}")
+    for key in ("date_from", "date_to"):
+        if filters.get(key):
+            filters[key] = dt.date.fromisoformat(filters[key])
+    written = 0
+    with open(path, "wb") as fh:
+        for part in export_stream(ctx.app.db_replicas.read_engine(), format, compress=compress, **filters):
+            fh.write(part)
+            written += len(part)
+            ctx.progress(message=f"{written} bytes")
+    return {"path": path, "bytes": written}
+
+
+@handler("stats.rebuild")
+def stats_rebuild_job(ctx):
+    from app.stats import rebuild
+    ctx.progress(0.0, "rebuilding result_stats", force=True)
+    session = ctx.app.db_session()
+    try:
+        total = rebuild(session)
+        session.commit()
+    finally:
+        session.close()
+    return {"results": total}
+
+
+@handler("ratings.rebuild")
+def ratings_rebuild_job(ctx):
+    from app.ratings import rebuild
+    ctx.progress(0.0, "rating the results history", force=True)
+    return {"results": rebuild(ctx.engine)}
+
+
+@handler("seasons.archive")
+def seasons_archive_job(ctx, before: int):
+    from app.seasons import archive_before, archive_dir
+    done = archive_before(ctx.engine, before, archive_dir(ctx.app),
+                          progress=lambda season: ctx.progress(message=f"season {season}"))
+    return {"seasons": [season["season"] for season in done]}
+
+
+# --- views and commands ------------------------------------------------------
+
+@jobs.route('/admin/jobs', methods=['POST'])
+@admin_required
+def enqueue_view():
+    kind = request.form.get('kind', '')
+    if kind not in ADMIN_KINDS:
+        abort(400, description=f"kind must be one of {', '.join(ADMIN_KINDS)}")
+    job_id = current_app.job_queue.enqueue(kind, priority=request.form.get('priority', 0, type=int))
+    if _wants_json():
+        return jsonify({"job_id": job_id, "status_url": url_for('jobs.job_view', job_id=job_id)}), 202
+    flash(f"Задача #{job_id} поставлена в очередь", 'info')
+    return redirect(url_for('main.admin'))
+
+
+@jobs.route('/admin/jobs/<int:job_id>')
+@admin_required
+def job_view(job_id):
+    job = current_app.job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+
+@jobs.route('/admin/jobs/<int:job_id>/download')
+@admin_required
+def download_view(job_id):
+    queue = current_app.job_queue
+    job = queue.get(job_id)
+    if job is None or job["kind"] != "export" or job["status"] != DONE:
+        abort(404)
+    path = job["result"]["path"]
+    # only files the export wrote into the spool, and only until the sweep
+    if not queue.spooled(path) or not os.path.isfile(path):
+        abort(404, description="the export file has expired, run the export again")
+    # spool names are "<time>-<random>-<name>"
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path).split("-", 2)[-1])
+
+
+@jobs.cli.command('worker')
+@click.option('--workers', type=int, help='Pool size; defaults to JOBS_WORKERS.')
+@click.option('--pool', type=click.Choice(['thread', 'process']), help='Defaults to JOBS_POOL.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def worker_command(workers, pool, burst):
+    """Run queued background jobs."""
+    worker = make_worker(current_app._get_current_object(), concurrency=workers, pool=pool)
+    worker.run(burst=burst)
+    click.echo(f"Done {worker.completed[DONE]}, retried {worker.completed[QUEUED]}, "
+               f"failed {worker.completed[FAILED]}")
+
+
+@jobs.cli.command('enqueue')
+@click.argument('kind', type=click.Choice(sorted(HANDLERS)))
+@click.option('--payload', default='{}', help='JSON keyword arguments for the handler.')
+@click.option('--priority', default=0, show_default=True)
+def enqueue_command(kind, payload, priority):
+    """Queue a background job."""
+    job_id = current_app.job_queue.enqueue(kind, json.loads(payload), priority=priority)
+    click.echo(f"Queued job {job_id}")
+
+
+def main(argv=None):
+    """Worker process entry point: wait for the database and its migrations, then work."""
+    from app import EnvConfig, create_app
+    from app.entrypoint import alembic_config, migrations_current, normalize_db_url, wait_for_db
+
+    parser = argparse.ArgumentParser(description="Run queued background jobs.")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--pool", choices=("thread", "process"))
+    parser.add_argument("--burst", action="store_true", help="exit once no job is due")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    db_url = normalize_db_url(EnvConfig.DATABASE_URL)
+    if not db_url.startswith("sqlite"):
+        wait_for_db(db_url, timeout=120)
+    # the web container runs the migrations; do not race it
+    cfg = alembic_config(db_url)
+    deadline = time.time() + 300
+    while not migrations_current(cfg):
+        if time.time() > deadline:
+            raise SystemExit("database schema is not at the Alembic head")
+        log.info("Waiting for migrations to reach head")
+        time.sleep(2)
+
+    overrides = {"AUTO_CREATE_SCHEMA": False}
+    if "DB_POOL_SIZE" not in os.environ:
+        # a connection per slot plus one for claims and heartbeats, which is
+        # what the web entrypoint reserves for this worker
+        overrides["DB_POOL_SIZE"] = (args.workers or EnvConfig.JOBS_WORKERS) + 1
+    if "DB_MAX_OVERFLOW" not in os.environ:
+        overrides["DB_MAX_OVERFLOW"] = 0
+    app = create_app(type("WorkerConfig", (EnvConfig,), overrides))
+    worker = make_worker(app, concurrency=args.workers, pool=args.pool)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # finish the running jobs; anything killed later is requeued by its lease
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run(burst=args.burst)
+
+
+if __name__ == "__main__":
+    main()
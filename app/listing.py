@@ -0,0 +1,172 @@
+"""Keyset-paginated lists of races, horses, jockeys and owners.
+
+``/races``, ``/horses``, ``/jockeys`` and ``/owners`` return HTML, or JSON
+with ``?format=json`` / ``Accept: application/json``.  Pages are cut with
+a row-value comparison on the sort key instead of OFFSET::
+
+    WHERE (date, time, id) < (:date, :time, :id) ORDER BY date DESC, time DESC, id DESC
+
+so with the composite indexes from the models (and the Alembic migration)
+page N costs one index seek plus ``limit`` rows, the same as page 1.
+The ``cursor`` parameter is the last row's key, base64-encoded; clients
+should treat it as opaque.
+"""
+import base64
+import binascii
+import datetime as dt
+import json
+from typing import Optional
+
+from flask import Blueprint, abort, current_app, jsonify, render_template, request, url_for
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from app.models import Horse, Jockey, Owner, Race
+
+listing = Blueprint('listing', __name__)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, keys) -> Optional[list]:
+    """Key values from ``token`` typed like ``keys``; None if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        typed = []
+        for column, value in zip(keys, values):
+            python_type = column.type.python_type
+            if python_type in (dt.date, dt.time, dt.datetime):
+                typed.append(python_type.fromisoformat(value))
+            else:
+                typed.append(python_type(value))
+        return typed
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+
+
+def keyset_page(session: Session, stmt, keys, after: Optional[list] = None,
+                limit: int = DEFAULT_LIMIT, descending: bool = False):
+    """One page of ``stmt`` ordered by ``keys``; returns (rows, next cursor or None)."""
+    if after is not None:
+        key, bound = tuple_(*keys), tuple_(*after)
+        stmt = stmt.where(key < bound if descending else key > bound)
+    stmt = stmt.order_by(*(k.desc() if descending else k.asc() for k in keys)).limit(limit + 1)
+    rows = session.execute(stmt).mappings().all()
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = rows[:limit]
+    return list(rows), encode_cursor([rows[-1][k.key] for k in keys])
+
+
+# --- per-entity queries ------------------------------------------------------
+
+def _date_arg(name: str) -> Optional[dt.date]:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f"'{name}' must be YYYY-MM-DD")
+
+
+def _races():
+    stmt = select(Race.id, Race.date, Race.time, Race.place, Race.title)
+    if place := request.args.get('place'):
+        stmt = stmt.where(Race.place == place)
+    if (date_from := _date_arg('from')) is not None:
+        stmt = stmt.where(Race.date >= date_from)
+    if (date_to := _date_arg('to')) is not None:
+        stmt = stmt.where(Race.date <= date_to)
+    # newest first
+    return stmt, (Race.date, Race.time, Race.id), True
+
+
+def _horses():
+    stmt = select(Horse.id, Horse.name, Horse.gender, Horse.age, Horse.owner_id, Horse.rating)
+    if (owner_id := request.args.get('owner', type=int)) is not None:
+        stmt = stmt.where(Horse.owner_id == owner_id)
+    if gender := request.args.get('gender'):
+        stmt = stmt.where(Horse.gender == gender)
+    return stmt, (Horse.id,), False
+
+
+def _jockeys():
+    return select(Jockey.id, Jockey.name, Jockey.age, Jockey.rating), (Jockey.id,), False
+
+
+def _owners():
+    return select(Owner.id, Owner.name, Owner.address, Owner.phone), (Owner.id,), False
+
+
+LISTINGS = {
+    "races": ("Заезды", _races),
+    "horses": ("Лошади", _horses),
+    "jockeys": ("Жокеи", _jockeys),
+    "owners": ("Владельцы", _owners),
+}
+
+
+def _wants_json() -> bool:
+    if request.args.get('format') == 'json':
+        return True
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
+def _list_view(kind: str):
+    title, build = LISTINGS[kind]
+    stmt, keys, descending = build()
+    limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+    after = None
+    if token := request.args.get('cursor'):
+        after = decode_cursor(token, keys)
+        if after is None:
+            abort(400, description="invalid cursor")
+
+    session = current_app.db_session()
+    try:
+        rows, next_cursor = keyset_page(session, stmt, keys, after, limit, descending)
+    finally:
+        session.close()
+
+    items = [
+        {k: v.isoformat() if hasattr(v, "isoformat") else v for k, v in row.items()}
+        for row in rows
+    ]
+    next_url = None
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        next_url = url_for(request.endpoint, **args)
+    if _wants_json():
+        return jsonify({"items": items, "next_cursor": next_cursor, "next": next_url})
+    columns = [c.key for c in stmt.selected_columns]
+    return render_template('listing.html', title=title, columns=columns, items=items, next_url=next_url)
+
+
+@listing.route('/races')
+def races():
+    return _list_view('races')
+
+
+@listing.route('/horses')
+def horses():
+    return _list_view('horses')
+
+
+@listing.route('/jockeys')
+def jockeys():
+    return _list_view('jockeys')
+
+
+@listing.route('/owners')
+def owners():
+    return _list_view('owners')
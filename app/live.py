@@ -0,0 +1,423 @@
+"""Live race-day results over Server-Sent Events.
+
+``GET /races/<id>/live`` streams ``text/event-stream``: a ``snapshot``
+event with the race's results so far, then one ``result`` event per new
+or corrected result row (a correction repeats the ``result_id`` with the
+new position or time).  Browsers reconnect on their own and send ``Last-Event-ID``,
+which resumes from the buffer when it still holds that event.
+
+Each process has one ``LiveFeed`` with one publisher thread, running
+while anyone is subscribed.  The publisher reads the results of all watched
+races with a single query and appends each row that is new or changed since
+the last read, already encoded as an SSE frame, to the race's ``Channel``: a bounded buffer shared by every
+subscriber of that race.  So the database sees one read per update and
+every frame is serialized once, however many people are watching.
+
+The publisher wakes up
+
+* on ``LISTEN results_live`` (PostgreSQL with psycopg2; a trigger on
+  ``results`` sends ``NOTIFY`` with the race id on insert and update), or
+* after a commit on this process that wrote ``results``, or
+* every ``LIVE_POLL_SECONDS`` to catch writes made elsewhere.
+
+Backpressure: the publisher never waits for subscribers.  A subscriber
+that falls more than ``LIVE_BUFFER`` events behind (a stalled connection)
+gets a ``dropped`` event and is closed; its browser reconnects and starts
+from a fresh snapshot.  ``LIVE_MAX_SUBSCRIBERS`` caps connections per
+process with a 503, and an idle stream sends a comment every
+``LIVE_HEARTBEAT_SECONDS`` so dead connections are noticed.
+
+Under WSGI every stream holds a worker thread; the ASGI server
+(app/asgi.py) serves this route natively on the event loop instead.  With
+``sync`` gunicorn workers a stream would hold a whole worker until the
+worker timeout kills it, so the route answers 503 there: run gthread,
+gevent or uvicorn workers (``GUNICORN_WORKER_CLASS``) to serve it.
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import select as select_module
+import threading
+from collections import deque
+from typing import Optional
+
+from flask import Blueprint, Response, abort, current_app, request
+from sqlalchemy import DDL, event, select
+
+from app.models import Horse, Jockey, Race, Result
+from app.schedule import watch_engine
+
+log = logging.getLogger("live")
+
+live = Blueprint('live', __name__)
+
+NOTIFY_CHANNEL = "results_live"
+RETRY_MS = 2000
+
+# PostgreSQL: NOTIFY the publisher on every insert and update (identical
+# notifications within one transaction are folded into one by the server)
+NOTIFY_DDL = [
+    f"""CREATE OR REPLACE FUNCTION results_live_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{NOTIFY_CHANNEL}', NEW.race_id::text);
+    RETURN NULL;
+END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS results_live_notify ON results",
+    "CREATE TRIGGER results_live_notify AFTER INSERT OR UPDATE ON results "
+    "FOR EACH ROW EXECUTE FUNCTION results_live_notify()",
+]
+for _statement in NOTIFY_DDL:
+    event.listen(Result.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+class LiveFeedFull(Exception):
+    pass
+
+
+def _frame(event_name: str, data: str, event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event_name}\ndata: {data}\n\n".encode()
+
+
+def _result_dict(row) -> dict:
+    return {
+        "result_id": row.id, "race_id": row.race_id, "position": row.position, "race_time": row.race_time,
+        "horse_id": row.horse_id, "horse": row.horse, "jockey_id": row.jockey_id, "jockey": row.jockey,
+    }
+
+
+def _results_query():
+    return (
+        select(Result.id, Result.race_id, Result.position, Result.race_time,
+               Result.horse_id, Horse.name.label("horse"), Result.jockey_id, Jockey.name.label("jockey"))
+        .join(Horse, Result.horse_id == Horse.id)
+        .join(Jockey, Result.jockey_id == Jockey.id)
+    )
+
+
+class Channel:
+    """Results of one race plus a bounded buffer of encoded events."""
+
+    def __init__(self, race_id: int, results: list, buffer_size: int = 256):
+        self.race_id = race_id
+        # a new id space per channel, so a Last-Event-ID from another
+        # worker or an earlier channel is never mistaken for ours
+        self.epoch = secrets.token_hex(4)
+        self.results = {r["result_id"]: r for r in results}
+        self.seq = 0
+        self.events: deque = deque(maxlen=buffer_size)  # (seq, frame)
+        self.subscribers = 0
+        self._cond = threading.Condition()
+        self._waiters: dict = {}  # event loop -> future resolved on the next publish
+        self._snapshot: Optional[bytes] = None
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def parse_event_id(self, value: Optional[str]) -> Optional[int]:
+        epoch, _, seq = (value or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def snapshot(self) -> tuple:
+        """(seq, frame) with every result so far, encoded once per update."""
+        with self._cond:
+            if self._snapshot is None:
+                ordered = sorted(self.results.values(), key=lambda r: (r["position"] or 0, r["result_id"]))
+                self._snapshot = _frame("snapshot", json.dumps(ordered, ensure_ascii=False), self.event_id(self.seq))
+            return self.seq, self._snapshot
+
+    def publish(self, rows: list) -> int:
+        """Append the rows that are new or differ from the last seen version; returns how many."""
+        new = [r for r in rows if self.results.get(r["result_id"]) != r]
+        if not new:
+            return 0
+        with self._cond:
+            for row in new:
+                self.results[row["result_id"]] = row
+                self.seq += 1
+                self.events.append((self.seq, _frame("result", json.dumps(row, ensure_ascii=False),
+                                                     self.event_id(self.seq))))
+            self._snapshot = None
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, {}
+        for loop, future in waiters.items():
+            loop.call_soon_threadsafe(_resolve, future)
+        return len(new)
+
+    def since(self, seq: int) -> Optional[list]:
+        """Frames after ``seq``; None when the buffer no longer reaches back that far."""
+        with self._cond:
+            if seq >= self.seq:
+                return []
+            if not self.events or self.events[0][0] > seq + 1:
+                return None
+            return [item for item in self.events if item[0] > seq]
+
+    def wait(self, seq: int, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.seq > seq, timeout)
+
+    async def wait_async(self, seq: int, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.seq > seq:
+                return True
+            future = self._waiters.get(loop)
+            if future is None:
+                future = self._waiters[loop] = loop.create_future()
+        try:
+            # shielded: the future is shared by every subscriber on this loop
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def _resolve(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class LiveFeed:
+    """Per-process publisher fanning results out to race channels."""
+
+    def __init__(self, engine, session_factory, poll_seconds: float = 1.0, buffer_size: int = 256,
+                 max_subscribers: int = 1000, heartbeat: float = 15.0, streaming: bool = True):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        # False under sync workers, where a stream would pin a whole worker
+        self.streaming = streaming
+        self.channels: dict = {}
+        self.subscribers = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.polls = 0
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    # --- subscriptions -------------------------------------------------------
+
+    def subscribe(self, race_id: int) -> Optional[Channel]:
+        """Channel for ``race_id`` (None if there is no such race); raises ``LiveFeedFull``."""
+        with self._lock:
+            if self.subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise LiveFeedFull()
+            channel = self.channels.get(race_id)
+            if channel is None:
+                # loaded under the lock so concurrent first viewers share one load
+                channel = self._open(race_id)
+                if channel is None:
+                    return None
+                self.channels[race_id] = channel
+            channel.subscribers += 1
+            self.subscribers += 1
+        self._ensure_thread()
+        return channel
+
+    def unsubscribe(self, channel: Channel) -> None:
+        with self._lock:
+            channel.subscribers -= 1
+            self.subscribers -= 1
+            if channel.subscribers <= 0 and self.channels.get(channel.race_id) is channel:
+                del self.channels[channel.race_id]
+
+    def _open(self, race_id: int) -> Optional[Channel]:
+        session = self.session_factory()
+        try:
+            if session.execute(select(Race.id).where(Race.id == race_id)).first() is None:
+                return None
+            rows = session.execute(_results_query().where(Result.race_id == race_id)).all()
+        finally:
+            session.close()
+        return Channel(race_id, [_result_dict(r) for r in rows], self.buffer_size)
+
+    # --- publisher -----------------------------------------------------------
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def poll_once(self) -> int:
+        """One read of every watched race's results; returns rows published.
+
+        Re-reading whole races (a race card is a dozen rows, found through
+        ``ix_results_race_position``) catches corrections as well as inserts,
+        whatever order the writing transactions committed in.
+        """
+        with self._lock:
+            race_ids = list(self.channels)
+        if not race_ids:
+            return 0
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                _results_query().where(Result.race_id.in_(race_ids)).order_by(Result.id)
+            ).all()
+        self.polls += 1
+        by_race: dict = {}
+        for row in rows:
+            by_race.setdefault(row.race_id, []).append(_result_dict(row))
+        published = 0
+        with self._lock:
+            channels = [(self.channels.get(race_id), results) for race_id, results in by_race.items()]
+        for channel, results in channels:
+            if channel is not None:
+                published += channel.publish(results)
+        self.published += published
+        return published
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+                self._thread.start()
+
+    def _idle(self) -> bool:
+        """Let the thread exit once nobody watches; decided under the lock ``subscribe`` uses."""
+        with self._lock:
+            if self.channels and not self._stopped:
+                return False
+            self._thread = None
+            return True
+
+    def _listen_connection(self):
+        if self.engine.dialect.name != "postgresql" or self.engine.dialect.driver != "psycopg2":
+            return None
+        raw = self.engine.raw_connection()
+        raw.detach()  # a dedicated connection, never handed back to the pool
+        dbapi = raw.dbapi_connection
+        dbapi.autocommit = True
+        with dbapi.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return raw
+
+    def _wait(self, listener) -> None:
+        if listener is None:
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+            return
+        dbapi = listener.dbapi_connection
+        if select_module.select([dbapi], [], [], self.poll_seconds) != ([], [], []):
+            dbapi.poll()
+            dbapi.notifies.clear()
+
+    def _run(self) -> None:
+        listener = None
+        try:
+            listener = self._listen_connection()
+        except Exception:
+            log.exception("LISTEN %s failed, polling every %ss", NOTIFY_CHANNEL, self.poll_seconds)
+        try:
+            while not self._idle():
+                self._wait(listener)
+                try:
+                    self.poll_once()
+                except Exception:
+                    log.exception("live feed poll failed")
+        finally:
+            if listener is not None:
+                listener.close()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+
+    # --- streams -------------------------------------------------------------
+
+    def _start(self, channel: Channel, last_event_id: Optional[str]):
+        """Opening frames and the sequence number to continue from."""
+        frames = [f"retry: {RETRY_MS}\n\n".encode()]
+        seq = channel.parse_event_id(last_event_id)
+        if seq is None or seq > channel.seq or channel.since(seq) is None:
+            seq, snapshot = channel.snapshot()
+            frames.append(snapshot)
+        return frames, seq
+
+    def _drop(self) -> bytes:
+        self.dropped += 1
+        return _frame("dropped", json.dumps({"reason": "too far behind, reconnect"}))
+
+    def stream(self, channel: Channel, last_event_id: Optional[str] = None):
+        """Blocking generator of SSE frames for a WSGI response."""
+        frames, seq = self._start(channel, last_event_id)
+        yield from frames
+        while not self._stopped:
+            events = channel.since(seq)
+            if events is None:
+                yield self._drop()
+                return
+            for seq, frame in events:
+                yield frame
+            if not events and not channel.wait(seq, self.heartbeat):
+                yield b": ping\n\n"
+
+    async def stream_async(self, channel: Channel, last_event_id: Optional[str] = None):
+        """The same frames for the ASGI server, waiting on the event loop."""
+        frames, seq = self._start(channel, last_event_id)
+        for frame in frames:
+            yield frame
+        while not self._stopped:
+            events = channel.since(seq)
+            if events is None:
+                yield self._drop()
+                return
+            for seq, frame in events:
+                yield frame
+            if not events and not await channel.wait_async(seq, self.heartbeat):
+                yield b": ping\n\n"
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self.channels),
+            "subscribers": self.subscribers,
+            "polls": self.polls,
+            "published": self.published,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "running": self._thread is not None,
+        }
+
+
+def init_app(app, engine, session_factory) -> None:
+    app.live_feed = LiveFeed(
+        engine,
+        session_factory,
+        poll_seconds=float(app.config.get("LIVE_POLL_SECONDS", 1)),
+        buffer_size=int(app.config.get("LIVE_BUFFER", 256)),
+        max_subscribers=int(app.config.get("LIVE_MAX_SUBSCRIBERS", 1000)),
+        heartbeat=float(app.config.get("LIVE_HEARTBEAT_SECONDS", 15)),
+        # app.entrypoint exports the worker class it starts gunicorn with
+        streaming=os.environ.get("GUNICORN_WORKER_CLASS", "") != "sync",
+    )
+    watch_engine(engine, {Result.__tablename__}, app.live_feed.notify)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@live.route('/races/<int:race_id>/live')
+def race_live(race_id):
+    feed = current_app.live_feed
+    if not feed.streaming:
+        return 'Live results are not served by sync workers', 503
+    try:
+        channel = feed.subscribe(race_id)
+    except LiveFeedFull:
+        return 'Too many live viewers, please retry shortly', 503, {'Retry-After': '5'}
+    if channel is None:
+        abort(404)
+    response = Response(feed.stream(channel, request.headers.get('Last-Event-ID')),
+                        mimetype='text/event-stream', headers=SSE_HEADERS)
+    response.call_on_close(lambda: feed.unsubscribe(channel))
+    return response
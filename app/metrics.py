@@ -0,0 +1,216 @@
+"""Per-request instrumentation: database, hashing and template time.
+
+SQLAlchemy cursor events count and time every statement a request runs,
+``record_timing`` lets other subsystems (password hashing) add their own
+durations and Flask's template signals time rendering.  After each
+request the numbers are
+
+* sent back as a ``Server-Timing`` header (visible in browser devtools),
+* written as one structured (JSON) log line on the ``request`` logger,
+* kept in a rolling window per endpoint for p50/p95/p99 on /admin/metrics.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged and kept for the
+metrics page as well.
+
+With ``QUERY_BUDGET`` set, a request that runs more queries than its view
+allows is reported: in testing/debug mode it raises
+``QueryBudgetExceeded`` (so an N+1 regression fails the test suite), in
+production it logs a warning.  Views can raise or lower their own limit
+with ``@query_budget(n)``.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+log = logging.getLogger("metrics")
+request_log = logging.getLogger("request")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit: int):
+    """Per-view override of the app-wide ``QUERY_BUDGET``; 0 disables it."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine):
+    """Count statements executed on ``engine`` inside the block."""
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+
+
+def record_timing(name: str, ms: float) -> None:
+    """Add ``ms`` to the current request's ``name`` timing (no-op outside requests)."""
+    if has_request_context():
+        timings = g.setdefault("timings", {})
+        timings[name] = timings.get(name, 0.0) + ms
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class RequestMetrics:
+    """Rolling window of the last ``window`` requests per endpoint."""
+
+    def __init__(self, window: int = 1000, slow_keep: int = 50):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.slow_queries = deque(maxlen=slow_keep)
+
+    def add(self, endpoint: str, total_ms: float, db_ms: float, queries: int) -> None:
+        samples = self._samples.get(endpoint)
+        if samples is None:
+            with self._lock:
+                samples = self._samples.setdefault(endpoint, deque(maxlen=self.window))
+        samples.append((total_ms, db_ms, queries))
+
+    def summary(self) -> list:
+        rows = []
+        for endpoint, samples in sorted(self._samples.items()):
+            samples = list(samples)
+            if not samples:
+                continue
+            totals = sorted(s[0] for s in samples)
+            db = sorted(s[1] for s in samples)
+            rows.append({
+                "endpoint": endpoint,
+                "count": len(samples),
+                "p50_ms": round(percentile(totals, 50), 2),
+                "p95_ms": round(percentile(totals, 95), 2),
+                "p99_ms": round(percentile(totals, 99), 2),
+                "db_p95_ms": round(percentile(db, 95), 2),
+                "avg_queries": round(sum(s[2] for s in samples) / len(samples), 2),
+            })
+        return rows
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    ms = (time.perf_counter() - context._metrics_start) * 1000
+    if not has_request_context():
+        return
+    g.db_query_count = g.get("db_query_count", 0) + 1
+    g.db_ms = g.get("db_ms", 0.0) + ms
+    slowest = g.setdefault("db_slowest", [])
+    slowest.append((ms, statement))
+    slowest.sort(key=lambda item: item[0], reverse=True)
+    del slowest[3:]
+
+    app = current_app._get_current_object()
+    slow_ms = float(app.config.get("SLOW_QUERY_MS", 200))
+    if slow_ms and ms >= slow_ms:
+        log.warning("slow query %.1fms on %s: %s", ms, request.endpoint, statement)
+        app.request_metrics.slow_queries.append({
+            "endpoint": request.endpoint, "ms": round(ms, 2), "statement": statement,
+        })
+
+
+def _view_budget(app):
+    view = app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", None)
+    if budget is None:
+        budget = int(app.config.get("QUERY_BUDGET", 0))
+    return budget
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault("template_start", []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    starts = g.get("template_start")
+    if starts:
+        record_timing("tpl", (time.perf_counter() - starts.pop()) * 1000)
+
+
+def instrument_engine(engine) -> None:
+    """Count and time ``engine``'s statements in the current request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def install(app, *engines) -> None:
+    app.request_metrics = RequestMetrics(window=int(app.config.get("METRICS_WINDOW", 1000)))
+    for engine in engines:
+        instrument_engine(engine)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_request(response):
+        app = current_app._get_current_object()
+        count = g.get("db_query_count", 0)
+        db_ms = g.get("db_ms", 0.0)
+        total_ms = (time.perf_counter() - g.get("request_start", time.perf_counter())) * 1000
+        timings = g.get("timings", {})
+        endpoint = request.endpoint or "<unmatched>"
+
+        if app.config.get("SERVER_TIMING", True):
+            parts = [f'db;dur={db_ms:.2f};desc="{count} queries"']
+            parts += [f"{name};dur={ms:.2f}" for name, ms in timings.items()]
+            parts.append(f"total;dur={total_ms:.2f}")
+            response.headers.add("Server-Timing", ", ".join(parts))
+
+        app.request_metrics.add(endpoint, total_ms, db_ms, count)
+        if request_log.isEnabledFor(logging.INFO):
+            request_log.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "endpoint": endpoint,
+                "status": response.status_code,
+                "duration_ms": round(total_ms, 2),
+                "db_ms": round(db_ms, 2),
+                "queries": count,
+                "timings": {name: round(ms, 2) for name, ms in timings.items()},
+                "slowest": [
+                    {"ms": round(ms, 2), "statement": stmt[:200]} for ms, stmt in g.get("db_slowest", [])
+                ],
+            }))
+
+        budget = _view_budget(app)
+        if budget and count > budget:
+            message = f"{request.endpoint} ran {count} queries (budget {budget})"
+            if app.testing or app.debug:
+                raise QueryBudgetExceeded(message)
+            log.warning(message)
+        return response
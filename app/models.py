@@ -1,13 +1,17 @@
 from typing import List, Optional
 import datetime as dt
 from enum import Enum
-from sqlalchemy import String, Integer, ForeignKey, Float, Date, Time, Enum as SAEnum
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import String, Text, Integer, ForeignKey, Float, Date, Time, DateTime, Enum as SAEnum, Index, event, func, select, update
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, relationship, validates
+from sqlalchemy.orm.attributes import get_history, set_committed_value
 
 # auth helpers
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from app.race_time import parse_race_time
+from app.search import install_ddl
+
 
 class Base(DeclarativeBase):
     """Базовый класс для всех моделей"""
@@ -24,7 +28,7 @@ class User(UserMixin, Base):
     login: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
     password: Mapped[str] = mapped_column(String(255), nullable=False)
     
-    description: Mapped[str] = mapped_column(String(255), nullable=False)
+    description: Mapped[str] = mapped_column(String(255), nullable=False, default="")
     # name the enum in the DB so migrations can reference it consistently
     type: Mapped[UserType] = mapped_column(
         SAEnum(UserType, name="user_type"),
@@ -32,8 +36,8 @@ class User(UserMixin, Base):
         default=UserType.PEASANT
     )
 
-    def set_password(self, raw: str) -> None:
-        self.password = generate_password_hash(raw)
+    def set_password(self, raw: str, method: str = "scrypt") -> None:
+        self.password = generate_password_hash(raw, method)
 
     def check_password(self, raw: str) -> bool:
         if not self.password:
@@ -47,6 +51,16 @@ class User(UserMixin, Base):
     def __repr__(self) -> str:
         return f"<User id={self.id} login={self.login} type={self.type}>"
 
+
+# Covering index for the login lookup (see app/auth.py) and a
+# case-insensitive variant; kept in sync with the Alembic migrations.
+# Postgres carries the looked-up columns as INCLUDE payload; on SQLite the
+# unique index on login already holds the rowid (= id), so it is skipped
+Index(
+    "ix_users_login_auth", User.login, postgresql_include=["id", "password", "type"]
+).ddl_if(dialect="postgresql")
+Index("ix_users_login_lower", func.lower(User.login))
+
     
 class Owner(Base):
     __tablename__ = "owners"
@@ -66,12 +80,22 @@ class Horse(Base):
     name: Mapped[str] = mapped_column(String(100))
     gender: Mapped[str] = mapped_column(String(10))   # "male" / "female"
     age: Mapped[int] = mapped_column(Integer)
+    # Elo rating maintained by app/ratings.py; NULL until the first rated start
+    rating: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
-    owner_id: Mapped[int] = mapped_column(ForeignKey("owners.id"))
+    # old value loaded on change, for the result_stats owner buckets (app/stats.py)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("owners.id"), active_history=True)
     owner: Mapped["Owner"] = relationship(back_populates="horses")
 
     results: Mapped[List["Result"]] = relationship(back_populates="horse")
 
+    # keyset pagination of the filtered horse lists (see app/listing.py)
+    __table_args__ = (
+        Index("ix_horses_owner_id", "owner_id", "id"),
+        Index("ix_horses_gender_id", "gender", "id"),
+        Index("ix_horses_rating", "rating"),
+    )
+
 
 class Jockey(Base):
     __tablename__ = "jockeys"
@@ -84,18 +108,51 @@ class Jockey(Base):
 
     results: Mapped[List["Result"]] = relationship(back_populates="jockey")
 
+    __table_args__ = (
+        Index("ix_jockeys_rating", "rating"),
+    )
+
 
 class Race(Base):
     __tablename__ = "races"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    date: Mapped[dt.date] = mapped_column(Date)
+    # old values loaded on change, to move the result_stats buckets (app/stats.py)
+    date: Mapped[dt.date] = mapped_column(Date, active_history=True)
     time: Mapped[dt.time] = mapped_column(Time)
-    place: Mapped[str] = mapped_column(String(120))
+    place: Mapped[str] = mapped_column(String(120), active_history=True)
     title: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
+    # date and time combined, so the schedule is one range scan (see app/schedule.py)
+    starts_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime, nullable=True)
 
     results: Mapped[List["Result"]] = relationship(back_populates="race")
 
+    # keyset pagination on (date, time, id), optionally within one place;
+    # on Postgres range-partitioned by season on "date" (see app/seasons.py)
+    __table_args__ = (
+        Index("ix_races_date_time_id", "date", "time", "id"),
+        Index("ix_races_place_date_time_id", "place", "date", "time", "id"),
+        Index("ix_races_starts_at_id", "starts_at", "id"),
+        Index("ix_races_place_starts_at_id", "place", "starts_at", "id"),
+        {"info": {"partition_by": "date"}},
+    )
+
+    @validates("date", "time")
+    def _sync_starts_at(self, key, value):
+        date = value if key == "date" else self.date
+        time_ = value if key == "time" else self.time
+        if date is not None and time_ is not None:
+            self.starts_at = dt.datetime.combine(date, time_)
+        return value
+
+
+def _race_date_of(context):
+    race_id = context.get_current_parameters().get("race_id")
+    if race_id is None:
+        return None
+    races = Race.__table__
+    return context.connection.execute(select(races.c.date).where(races.c.id == race_id)).scalar()
+
 
 class Result(Base):
     __tablename__ = "results"
@@ -107,7 +164,175 @@ class Result(Base):
 
     position: Mapped[int] = mapped_column(Integer)  # место в заезде
     race_time: Mapped[str] = mapped_column(String(20))  # время прохождения
+    # race_time parsed to milliseconds, so timings sort and aggregate in SQL
+    race_time_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # the race's date, copied so results are partitioned and pruned by season
+    # without a join; looked up from race_id when an insert leaves it out
+    race_date: Mapped[Optional[dt.date]] = mapped_column(Date, nullable=True, default=_race_date_of)
 
     race: Mapped["Race"] = relationship(back_populates="results")
     horse: Mapped["Horse"] = relationship(back_populates="results")
     jockey: Mapped["Jockey"] = relationship(back_populates="results")
+
+    __table_args__ = (
+        Index("ix_results_race_position", "race_id", "position"),
+        Index("ix_results_horse_time", "horse_id", "race_time_ms"),
+        # a venue's fastest finish: one seek per race there (see stats.track_record)
+        Index("ix_results_race_time", "race_id", "race_time_ms"),
+        Index("ix_results_jockey_race", "jockey_id", "race_id"),
+        Index("ix_results_race_date_id", "race_date", "id"),
+        {"info": {"partition_by": "race_date"}},
+    )
+
+    @validates("race_time")
+    def _sync_race_time_ms(self, key, value):
+        self.race_time_ms = parse_race_time(value)
+        return value
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_results_race_date(session, flush_context):
+    """Copy a rescheduled race's date onto ``results.race_date``.
+
+    The season-partitioned Postgres tables do this with ``ON UPDATE
+    CASCADE`` on the foreign key (app/seasons.py), which leaves nothing for
+    this UPDATE to match; elsewhere it is the only thing keeping the copy
+    right.
+    """
+    moved = {race.id: race.date for race in session.dirty
+             if isinstance(race, Race) and get_history(race, "date").deleted}
+    if not moved:
+        return
+    results = Result.__table__
+    conn = session.connection()
+    for race_id, date in moved.items():
+        conn.execute(
+            update(results)
+            .where(results.c.race_id == race_id, results.c.race_date.is_distinct_from(date))
+            .values(race_date=date)
+        )
+    for obj in session.identity_map.values():
+        # results not loaded yet read the new date from the table
+        if isinstance(obj, Result) and obj.__dict__.get("race_id") in moved:
+            set_committed_value(obj, "race_date", moved[obj.race_id])
+
+
+# FTS5 table and triggers (SQLite) / trigram indexes (Postgres) for app/search.py
+install_ddl(Base.metadata)
+
+
+class ResultStat(Base):
+    """Aggregates over results, maintained incrementally by app/stats.py.
+
+    One row per (entity, entity_id, place, period); ``place`` and ``period``
+    hold "" for the all-venues / all-time rollups.
+    """
+    __tablename__ = "result_stats"
+
+    entity: Mapped[str] = mapped_column(String(10), primary_key=True)  # horse / jockey / owner
+    entity_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    place: Mapped[str] = mapped_column(String(120), primary_key=True)
+    period: Mapped[str] = mapped_column(String(7), primary_key=True)  # "YYYY-MM"
+
+    starts: Mapped[int] = mapped_column(Integer, default=0)
+    wins: Mapped[int] = mapped_column(Integer, default=0)
+    podiums: Mapped[int] = mapped_column(Integer, default=0)
+    position_sum: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_result_stats_board", "entity", "place", "period", "wins"),
+    )
+
+
+class IngestCheckpoint(Base):
+    """Last committed line of a bulk import, so it can resume (see app/ingest.py)"""
+    __tablename__ = "ingest_checkpoints"
+
+    source: Mapped[str] = mapped_column(String(255), primary_key=True)
+    line_no: Mapped[int] = mapped_column(Integer, default=0)
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime)
+
+
+class UserSession(Base):
+    """Server-side session with the signed-in principal (see app/sessions.py)"""
+    __tablename__ = "user_sessions"
+
+    # sha256 of the cookie token, so the table alone cannot be replayed
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    login: Mapped[Optional[str]] = mapped_column(String(120))
+    user_type: Mapped[Optional[str]] = mapped_column(String(20))
+    data: Mapped[str] = mapped_column(Text, default="{}")
+    expires_at: Mapped[float] = mapped_column(Float)
+
+    __table_args__ = (
+        Index("ix_user_sessions_user_id", "user_id"),
+        Index("ix_user_sessions_expires_at", "expires_at"),
+    )
+
+
+class RatingHistory(Base):
+    """Horse and jockey ratings before and after each result (see app/ratings.py)"""
+    __tablename__ = "rating_history"
+
+    result_id: Mapped[int] = mapped_column(ForeignKey("results.id", ondelete="CASCADE"), primary_key=True)
+    horse_before: Mapped[float] = mapped_column(Float)
+    horse_after: Mapped[float] = mapped_column(Float)
+    jockey_before: Mapped[float] = mapped_column(Float)
+    jockey_after: Mapped[float] = mapped_column(Float)
+
+
+class RateLimitBucket(Base):
+    """Shared token bucket for login rate limiting (see app/ratelimit.py)"""
+    __tablename__ = "rate_limits"
+
+    # "ip:<address>" or "login:<lowercased login>"
+    key: Mapped[str] = mapped_column(String(200), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float)
+    updated_at: Mapped[float] = mapped_column(Float)
+
+
+class Job(Base):
+    """Queued background job, claimed and run by `python -m app.jobs` (see app/jobs.py)"""
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    payload: Mapped[str] = mapped_column(Text, default="{}")  # JSON keyword arguments
+    # queued / running / done / failed
+    status: Mapped[str] = mapped_column(String(10), default="queued")
+    priority: Mapped[int] = mapped_column(Integer, default=0)  # higher runs first
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    run_after: Mapped[dt.datetime] = mapped_column(DateTime)
+    # worker holding the job and its last heartbeat; a stale lease is requeued
+    locked_by: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    locked_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime, nullable=True)
+    progress: Mapped[float] = mapped_column(Float, default=0.0)  # 0..1
+    message: Mapped[str] = mapped_column(String(200), default="")
+    result: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # JSON
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime)
+    started_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # dequeue order: WHERE status = 'queued' ORDER BY priority DESC, run_after, id
+        Index("ix_jobs_status_priority", "status", "priority", "run_after", "id"),
+        Index("ix_jobs_created_at", "created_at"),
+    )
+
+
+class SeasonArchive(Base):
+    """A closed season moved out of the live races/results tables (see app/seasons.py)"""
+    __tablename__ = "season_archives"
+
+    season: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    date_from: Mapped[dt.date] = mapped_column(Date)
+    date_to: Mapped[dt.date] = mapped_column(Date)  # exclusive
+    # SQLite: the archive database file; Postgres: the schema of the detached partitions
+    location: Mapped[str] = mapped_column(String(255))
+    races: Mapped[int] = mapped_column(Integer, default=0)
+    results: Mapped[int] = mapped_column(Integer, default=0)
+    archived_at: Mapped[dt.datetime] = mapped_column(DateTime)
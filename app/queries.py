@@ -0,0 +1,91 @@
+"""Named loading profiles for pages that walk model relationships.
+
+Every relationship in app/models.py is lazy, so looping over
+``race.results`` and touching ``result.horse`` issues one query per row.
+The helpers below load exactly what a page needs with ``selectinload`` /
+``joinedload`` and put ``raiseload("*")`` on everything else, so a template
+that reaches for an unplanned relationship fails loudly instead of
+silently adding queries.
+"""
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, contains_eager, joinedload, raiseload, selectinload
+
+from app.models import Horse, Owner, Race, Result
+
+# race card: race -> finishers -> horse (+ owner) and jockey; 2 queries
+RACE_CARD = (
+    selectinload(Race.results).options(
+        joinedload(Result.horse).options(joinedload(Horse.owner).raiseload("*"), raiseload("*")),
+        joinedload(Result.jockey).raiseload("*"),
+        raiseload("*"),
+    ),
+    raiseload("*"),
+)
+
+# horse history: horse (+ owner) -> results -> race and jockey; 2 queries
+HORSE_HISTORY = (
+    joinedload(Horse.owner).raiseload("*"),
+    selectinload(Horse.results).options(
+        joinedload(Result.race).raiseload("*"),
+        joinedload(Result.jockey).raiseload("*"),
+        raiseload("*"),
+    ),
+    raiseload("*"),
+)
+
+# jockey form: a jockey's recent rides with race and horse; 1 query
+# (the race comes from the join used for ordering)
+JOCKEY_FORM = (
+    contains_eager(Result.race).raiseload("*"),
+    joinedload(Result.horse).raiseload("*"),
+    raiseload("*"),
+)
+
+# owner stable: owner -> horses; 2 queries
+OWNER_STABLE = (
+    selectinload(Owner.horses).raiseload("*"),
+    raiseload("*"),
+)
+
+
+def race_card(session: Session, race_id: int) -> Optional[Race]:
+    race = session.scalars(select(Race).where(Race.id == race_id).options(*RACE_CARD)).one_or_none()
+    if race is not None:
+        race.results.sort(key=lambda r: (r.position is None, r.position))
+    return race
+
+
+def race_cards(session: Session, race_ids: List[int]) -> List[Race]:
+    """Several race cards at once, still in a constant number of queries."""
+    races = session.scalars(
+        select(Race).where(Race.id.in_(race_ids)).order_by(Race.date, Race.time, Race.id).options(*RACE_CARD)
+    ).all()
+    for race in races:
+        race.results.sort(key=lambda r: (r.position is None, r.position))
+    return list(races)
+
+
+def horse_history(session: Session, horse_id: int) -> Optional[Horse]:
+    horse = session.scalars(select(Horse).where(Horse.id == horse_id).options(*HORSE_HISTORY)).one_or_none()
+    if horse is not None:
+        horse.results.sort(key=lambda r: (r.race.date, r.race.time), reverse=True)
+    return horse
+
+
+def jockey_form(session: Session, jockey_id: int, last: int = 10) -> List[Result]:
+    """The jockey's ``last`` rides, newest first."""
+    return list(session.scalars(
+        select(Result)
+        .join(Result.race)
+        .where(Result.jockey_id == jockey_id)
+        .order_by(Race.date.desc(), Race.time.desc(), Result.id.desc())
+        .limit(last)
+        .options(*JOCKEY_FORM)
+    ).all())
+
+
+def owner_stable(session: Session, owner_id: int) -> Optional[Owner]:
+    return session.scalars(select(Owner).where(Owner.id == owner_id).options(*OWNER_STABLE)).one_or_none()
+
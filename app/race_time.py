@@ -0,0 +1,63 @@
+"""Parsing of ``Result.race_time`` strings into milliseconds.
+
+Accepted spellings (comma works as decimal separator too)::
+
+    1:38.20      minutes:seconds.fraction
+    1:02:03.5    hours:minutes:seconds.fraction
+    98.2 / 98.2s seconds only
+    1m 38.2s     minutes and seconds with units
+    1.38.20      minutes.seconds.hundredths (common on printed race cards)
+
+Anything else (empty strings, "DNF", "-") parses to None.
+"""
+import re
+from typing import Optional
+
+_UNITS_RE = re.compile(r"^(?:(\d+)\s*h\s*)?(?:(\d+)\s*m(?:in)?\s*)?(\d+(?:\.\d+)?)\s*s(?:ec)?$")
+_COLON_RE = re.compile(r"^(?:(\d+):)?(\d+):(\d{1,2}(?:\.\d+)?)$")
+_DOTTED_RE = re.compile(r"^(\d+)\.(\d{2})\.(\d+)$")
+_SECONDS_RE = re.compile(r"^\d+(?:\.\d+)?$")
+
+
+def _ms(hours, minutes, seconds: str) -> int:
+    return (int(hours or 0) * 3600 + int(minutes or 0) * 60) * 1000 + round(float(seconds) * 1000)
+
+
+def parse_race_time(value: Optional[str]) -> Optional[int]:
+    """Return the duration in milliseconds, or None if it cannot be parsed."""
+    if value is None:
+        return None
+    text = value.strip().lower().replace(",", ".")
+    if not text:
+        return None
+
+    match = _COLON_RE.match(text)
+    if match:
+        hours, minutes, seconds = match.groups()
+        if float(seconds) >= 60:
+            return None
+        return _ms(hours, minutes, seconds)
+
+    match = _DOTTED_RE.match(text)
+    if match:
+        minutes, seconds, fraction = match.groups()
+        if int(seconds) >= 60:
+            return None
+        return _ms(0, minutes, f"{seconds}.{fraction}")
+
+    match = _UNITS_RE.match(text)
+    if match:
+        return _ms(*match.groups())
+
+    if _SECONDS_RE.match(text):
+        return _ms(0, 0, text)
+    return None
+
+
+def format_race_time(ms: Optional[int]) -> str:
+    """Format milliseconds back as ``m:ss.ff``."""
+    if ms is None:
+        return ""
+    minutes, hundredths = divmod(round(ms / 10), 6000)
+    return f"{minutes}:{hundredths // 100:02d}.{hundredths % 100:02d}"
+
@@ -0,0 +1,240 @@
+"""Login rate limiting with token buckets.
+
+Every POST to ``/login`` costs a password hash, so an unthrottled form
+lets one client keep the hash pool busy and guess passwords as fast as
+the server can check them.  ``LoginLimiter`` charges each attempt one
+token from two buckets before the view touches the database or the
+hasher:
+
+* ``ip:<address>`` (``RATE_LIMIT_PER_IP``) - slows down a single client
+  spraying many logins; ``/register`` is charged here too.
+* ``login:<login>`` (``RATE_LIMIT_PER_LOGIN``) - slows down guessing one
+  account's password from many addresses.  A successful login refills it.
+
+Rates are written ``"capacity/seconds"``: ``"5/300"`` allows a burst of
+five attempts and then one more every minute.  An empty bucket raises
+``RateLimited``, which the views turn into a 429 with ``Retry-After``.
+
+Backends (``RATE_LIMIT_BACKEND``):
+
+* ``memory`` - per-process buckets in an LRU dict; with N workers a client
+  gets up to N times the configured rate.
+* ``database`` - the same in-process buckets in front of the shared
+  ``rate_limits`` table (``RATE_LIMIT_DATABASE_URL``, default the main
+  database).  A process only ever sees a subset of the attempts, so an
+  empty local bucket rejects without a query; otherwise one ``UPDATE``
+  takes the token atomically from the shared row.
+* ``none`` - no limiting.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import current_app, request
+from sqlalchemy import case, delete, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.metrics import record_timing
+from app.models import RateLimitBucket
+
+rate_limits = RateLimitBucket.__table__
+
+
+class RateLimited(Exception):
+    """Raised when an attempt finds its bucket empty."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"{scope} rate limit exceeded, retry in {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Rate:
+    capacity: float
+    period: float
+
+    @property
+    def per_second(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, spec: str) -> "Rate":
+        capacity, _, period = spec.partition("/")
+        rate = cls(float(capacity), float(period or 60))
+        if rate.capacity < 1 or rate.period <= 0:
+            raise ValueError(f"Bad rate {spec!r}, expected 'capacity/seconds'")
+        return rate
+
+
+class MemoryBuckets:
+    """Token buckets in a per-process LRU dict.
+
+    Evicting a bucket forgets its debt, so ``maxsize`` should comfortably
+    exceed the number of clients seen within one refill period.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: Rate, now: float) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available."""
+        with self._lock:
+            bucket = self._data.get(key)
+            if bucket is None:
+                bucket = self._data[key] = [rate.capacity, now]
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(key)
+                bucket[0] = min(rate.capacity, bucket[0] + (now - bucket[1]) * rate.per_second)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate.per_second
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DatabaseBuckets:
+    """Token buckets in the ``rate_limits`` table, shared by all workers."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def take(self, key: str, rate: Rate, now: float) -> float:
+        level = rate_limits.c.tokens + (literal(now) - rate_limits.c.updated_at) * rate.per_second
+        refilled = case((level > rate.capacity, rate.capacity), else_=level)
+        with self.engine.begin() as conn:
+            taken = conn.execute(
+                update(rate_limits)
+                .where(rate_limits.c.key == key, refilled >= 1)
+                .values(tokens=refilled - 1, updated_at=now)
+            ).rowcount
+            if taken:
+                return 0.0
+            row = conn.execute(
+                select(rate_limits.c.tokens, rate_limits.c.updated_at).where(rate_limits.c.key == key)
+            ).first()
+            if row is not None:
+                tokens = min(rate.capacity, row.tokens + (now - row.updated_at) * rate.per_second)
+                return max((1 - tokens) / rate.per_second, 0.0)
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(rate_limits).values(key=key, tokens=rate.capacity - 1, updated_at=now))
+            return 0.0
+        except IntegrityError:
+            # another worker created the row first
+            return self.take(key, rate, now)
+
+    def reset(self, key: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(rate_limits).where(rate_limits.c.key == key))
+
+    def sweep(self, idle_before: float) -> int:
+        """Delete rows untouched since ``idle_before``; they would be full again anyway."""
+        with self.engine.begin() as conn:
+            return conn.execute(delete(rate_limits).where(rate_limits.c.updated_at < idle_before)).rowcount
+
+
+class LoginLimiter:
+    """Per-IP and per-login buckets for authentication attempts."""
+
+    def __init__(self, per_ip: Rate, per_login: Rate, shared: Optional[DatabaseBuckets] = None,
+                 maxsize: int = 100_000, sweep_every: float = 300.0):
+        self.rates = {"ip": per_ip, "login": per_login}
+        self.local = MemoryBuckets(maxsize)
+        self.shared = shared
+        self.sweep_every = sweep_every
+        self._next_sweep = time.time() + sweep_every
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = {"ip": 0, "login": 0}
+
+    def check(self, ip: Optional[str], login: Optional[str] = None) -> None:
+        """Charge one attempt from ``ip`` (and for ``login``); raises ``RateLimited``."""
+        now = time.time()
+        keys = [("ip", f"ip:{ip or '-'}")]
+        if login:
+            keys.append(("login", f"login:{login.lower()}"))
+        # all local buckets first, so a local rejection never reaches the shared table
+        stores = [self.local] if self.shared is None else [self.local, self.shared]
+        for store in stores:
+            for scope, key in keys:
+                wait = store.take(key, self.rates[scope], now)
+                if wait:
+                    with self._lock:
+                        self.rejected[scope] += 1
+                    raise RateLimited(scope, wait)
+        with self._lock:
+            self.allowed += 1
+        if self.shared is not None and now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_every
+            self.shared.sweep(now - max(rate.period for rate in self.rates.values()))
+
+    def succeeded(self, login: str) -> None:
+        """Refill the login's bucket; failed guesses before a success are forgiven."""
+        key = f"login:{login.lower()}"
+        self.local.reset(key)
+        if self.shared is not None:
+            self.shared.reset(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "database" if self.shared is not None else "memory",
+                "per_ip": self.rates["ip"],
+                "per_login": self.rates["login"],
+                "buckets": len(self.local),
+                "allowed": self.allowed,
+                "rejected_ip": self.rejected["ip"],
+                "rejected_login": self.rejected["login"],
+            }
+
+
+def make_limiter(config, engine) -> Optional[LoginLimiter]:
+    kind = config.get("RATE_LIMIT_BACKEND", "memory")
+    if kind == "none":
+        return None
+    if kind not in ("memory", "database"):
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {kind!r}")
+    shared = DatabaseBuckets(engine) if kind == "database" else None
+    return LoginLimiter(
+        per_ip=Rate.parse(config.get("RATE_LIMIT_PER_IP", "20/60")),
+        per_login=Rate.parse(config.get("RATE_LIMIT_PER_LOGIN", "5/300")),
+        shared=shared,
+        maxsize=int(config.get("RATE_LIMIT_SIZE", 100_000)),
+    )
+
+
+def check_attempt(login: Optional[str] = None) -> None:
+    """Charge the current request's attempt; no-op when limiting is off."""
+    limiter = current_app.login_limiter
+    if limiter is None:
+        return
+    started = time.perf_counter()
+    try:
+        limiter.check(request.remote_addr, login)
+    finally:
+        record_timing("ratelimit", (time.perf_counter() - started) * 1000)
+
+
+def attempt_succeeded(login: str) -> None:
+    limiter = current_app.login_limiter
+    if limiter is not None:
+        limiter.succeeded(login)
+
+
+def retry_after_header(exc: RateLimited) -> str:
+    return str(max(1, math.ceil(exc.retry_after)))
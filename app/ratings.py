@@ -0,0 +1,356 @@
+"""Elo ratings for horses and jockeys, computed from ``results``.
+
+Every race is scored as a round robin among its finishers: each pair is
+one game won by the better position (a dead heat is a draw), and a
+competitor's rating moves by ``K_FACTOR / (n - 1)`` times the sum of
+(score - expected score) against the other ``n - 1`` finishers.  Horses
+and jockeys are rated as two separate pools starting at ``INITIAL_RATING``.
+
+``rebuild`` recomputes everything from the results history.  Ratings are
+sequential by nature, but a race only depends on the earlier races of its
+own competitors, so the races of a pool are grouped into layers in which
+no competitor appears twice, and each layer is rated at once with NumPy
+(see ``compute``).
+
+``update_races`` handles newly ingested races.  When they come after
+every rated race only their own competitors are read and written;
+otherwise the races from the earliest new one onwards are replayed, or,
+beyond ``REPLAY_LIMIT`` races, the caller is told to ``rebuild`` instead.
+
+Every result gets a ``rating_history`` row with both ratings before and
+after its race.
+"""
+import csv
+import io
+from itertools import chain
+from typing import Iterable, Optional
+
+import click
+import numpy as np
+from flask import Blueprint, abort, current_app, jsonify, request
+from sqlalchemy import bindparam, delete, func, insert, select, tuple_, update
+
+from app.models import Horse, Jockey, Race, RatingHistory, Result
+from app.seasons import source_connection, sources
+
+ratings = Blueprint('ratings', __name__, url_prefix='/ratings')
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+REPLAY_LIMIT = 5000  # races; past this update_races asks for a rebuild
+ENTITIES = {"horse": Horse, "jockey": Jockey}
+
+history_t = RatingHistory.__table__
+horses_t = Horse.__table__
+jockeys_t = Jockey.__table__
+_INSERT_CHUNK = 10000
+RACE_ORDER = (Race.date, Race.time, Race.id)
+
+
+# --- computation -------------------------------------------------------------
+
+def _pad(race_of_row: np.ndarray, sizes: np.ndarray, values: np.ndarray, fill) -> np.ndarray:
+    """Rows grouped by race as a ``(races, max field)`` matrix."""
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    slot = np.arange(len(race_of_row)) - starts[race_of_row]
+    out = np.full((len(sizes), int(sizes.max())), fill, dtype=values.dtype)
+    out[race_of_row, slot] = values
+    return out
+
+
+def _layers(ids: np.ndarray, sizes: np.ndarray, pool_size: int) -> np.ndarray:
+    """Per race, one more than the latest layer of any of its competitors."""
+    last = [0] * pool_size
+    layers = []
+    for row, n in zip(ids.tolist(), sizes.tolist()):
+        row = row[:n]
+        layer = 1 + max(last[i] for i in row)
+        for i in row:
+            last[i] = layer
+        layers.append(layer)
+    return np.array(layers)
+
+
+def elo_delta(rating: np.ndarray, position: np.ndarray, mask: np.ndarray, k: float = K_FACTOR) -> np.ndarray:
+    """Rating change of every entry of a ``(races, field)`` batch of races."""
+    # [race, i, j]: expected score of i against j, and the actual one
+    expected = 1.0 / (1.0 + 10.0 ** ((rating[:, None, :] - rating[:, :, None]) / 400.0))
+    score = (position[:, :, None] < position[:, None, :]) + 0.5 * (position[:, :, None] == position[:, None, :])
+    pairs = mask[:, :, None] & mask[:, None, :] & ~np.eye(rating.shape[1], dtype=bool)
+    total = np.where(pairs, score - expected, 0.0).sum(axis=2)
+    opponents = np.maximum(mask.sum(axis=1) - 1, 1)
+    return np.where(mask, k * total / opponents[:, None], 0.0)
+
+
+def compute(race_of_row: np.ndarray, position: np.ndarray, pools: dict, k: float = K_FACTOR) -> dict:
+    """Rate rows sorted by race order.
+
+    ``race_of_row`` numbers the races 0, 1, ... in the order they were run;
+    ``pools`` maps a name to ``(competitor index per row, ratings)``, and
+    each ratings array is updated in place.  Returns ``{name: (before,
+    after)}`` with the ratings of every row around its race.
+    """
+    sizes = np.bincount(race_of_row)
+    rows = _pad(race_of_row, sizes, np.arange(len(race_of_row)), -1)
+    positions = _pad(race_of_row, sizes, np.asarray(position, dtype=np.int64), 0)
+    out = {}
+    for name, (index, rating) in pools.items():
+        ids = _pad(race_of_row, sizes, np.asarray(index, dtype=np.int64), -1)
+        layers = _layers(ids, sizes, len(rating))
+        order = np.argsort(layers, kind="stable")
+        before = np.empty(len(race_of_row))
+        after = np.empty(len(race_of_row))
+        for group in np.split(order, np.flatnonzero(np.diff(layers[order])) + 1):
+            width = int(sizes[group].max())
+            sub, row = ids[group, :width], rows[group, :width]
+            mask = sub >= 0
+            current = np.where(mask, rating[sub], 0.0)
+            delta = elo_delta(current, positions[group, :width], mask, k)
+            rating[sub[mask]] += delta[mask]
+            before[row[mask]] = current[mask]
+            after[row[mask]] = current[mask] + delta[mask]
+        out[name] = (before, after)
+    return out
+
+
+def _race_numbers(race_ids: np.ndarray) -> np.ndarray:
+    changes = np.concatenate(([False], race_ids[1:] != race_ids[:-1]))
+    return np.cumsum(changes)
+
+
+# --- storage -----------------------------------------------------------------
+
+def _rows_query(*conditions, race=Race, result=Result):
+    # declared runners (position 0) have not run yet and are not rated
+    return (
+        select(result.id, result.race_id, result.horse_id, result.jockey_id, result.position)
+        .join(race, race.id == result.race_id)
+        .where(result.position > 0, *conditions)
+        .order_by(race.date, race.time, race.id, result.id)
+    )
+
+
+def _load(conn, stmt) -> np.ndarray:
+    chunks = [
+        np.fromiter(chain.from_iterable(part), dtype=np.int64).reshape(-1, 5)
+        for part in conn.execution_options(stream_results=True, yield_per=50000).execute(stmt).partitions()
+    ]
+    return np.concatenate(chunks) if chunks else np.empty((0, 5), dtype=np.int64)
+
+
+_HISTORY_COLUMNS = ("result_id", "horse_before", "horse_after", "jockey_before", "jockey_after")
+
+
+def _write_history(conn, result_ids, horse, jockey) -> None:
+    """Insert history rows with COPY (psycopg2) or a precompiled executemany."""
+    rows = [
+        (int(r), hb, ha, jb, ja)
+        for r, hb, ha, jb, ja in zip(result_ids.tolist(), *horse, *jockey)
+    ]
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2":
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY rating_history ({', '.join(_HISTORY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf
+            )
+        finally:
+            cursor.close()
+        return
+
+    # one statement, plain tuples: skips per-row parameter processing
+    compiled = insert(history_t).compile(dialect=conn.dialect, column_keys=list(_HISTORY_COLUMNS))
+    if conn.dialect.positional:
+        params = rows
+    else:
+        params = [dict(zip(_HISTORY_COLUMNS, row)) for row in rows]
+    for i in range(0, len(params), _INSERT_CHUNK):
+        conn.exec_driver_sql(str(compiled), params[i:i + _INSERT_CHUNK])
+
+
+def _write_ratings(conn, table, ids, values) -> None:
+    if len(ids):
+        conn.execute(
+            update(table).where(table.c.id == bindparam("_id")).values(rating=bindparam("_rating")),
+            [{"_id": int(i), "_rating": float(r)} for i, r in zip(ids, values)],
+        )
+
+
+def rebuild(engine, k: float = K_FACTOR) -> int:
+    """Recompute all ratings and the history; returns the number of rated results.
+
+    Archived seasons count towards the ratings, but only live results keep
+    a history.
+    """
+    parts = []
+    for source in sources(engine):
+        with source_connection(engine, source) as conn:
+            parts.append(_load(conn, _rows_query(race=source.race, result=source.result)))
+    data = np.concatenate(parts)
+    archived_rows = len(data) - len(parts[-1])
+    result_ids, race_ids, horse_ids, jockey_ids, position = data.T
+    horses, horse_index = np.unique(horse_ids, return_inverse=True)
+    jockeys, jockey_index = np.unique(jockey_ids, return_inverse=True)
+    horse_rating = np.full(len(horses), INITIAL_RATING)
+    jockey_rating = np.full(len(jockeys), INITIAL_RATING)
+    history = {}
+    if len(data):
+        history = compute(_race_numbers(race_ids), position, {
+            "horse": (horse_index, horse_rating),
+            "jockey": (jockey_index, jockey_rating),
+        }, k)
+
+    with engine.begin() as conn:
+        conn.execute(delete(history_t))
+        conn.execute(update(horses_t).values(rating=None))
+        conn.execute(update(jockeys_t).values(rating=INITIAL_RATING))
+        if len(data) > archived_rows:
+            _write_history(conn, result_ids[archived_rows:], *(
+                tuple(values[archived_rows:] for values in history[name]) for name in ("horse", "jockey")
+            ))
+        _write_ratings(conn, horses_t, horses, horse_rating)
+        _write_ratings(conn, jockeys_t, jockeys, jockey_rating)
+    return len(data)
+
+
+def update_races(conn, race_ids: Iterable[int], k: float = K_FACTOR) -> bool:
+    """Rate newly added or changed races inside the caller's transaction.
+
+    Returns False, without changing anything, when that would mean
+    replaying more than ``REPLAY_LIMIT`` races; run ``rebuild`` then.
+    """
+    race_ids = list(set(race_ids))
+    if not race_ids:
+        return True
+    first = conn.execute(
+        select(*RACE_ORDER).where(Race.id.in_(race_ids)).order_by(*RACE_ORDER).limit(1)
+    ).first()
+    if first is None:
+        return True
+    replayed = tuple_(*RACE_ORDER) >= tuple(first)
+    races = conn.execute(
+        select(func.count(func.distinct(Result.race_id)))
+        .join(Race, Race.id == Result.race_id)
+        .where(Result.position > 0, replayed)
+    ).scalar_one()
+    if races > REPLAY_LIMIT:
+        return False
+
+    data = _load(conn, _rows_query(replayed))
+    if not len(data):
+        return True
+    result_ids, row_races, horse_ids, jockey_ids, position = data.T
+
+    # ratings before the replayed range: the first "before" inside it, else the current one
+    restored_horse, restored_jockey = {}, {}
+    old = conn.execute(
+        select(Result.horse_id, Result.jockey_id, history_t.c.horse_before, history_t.c.jockey_before)
+        .join(history_t, history_t.c.result_id == Result.id)
+        .join(Race, Race.id == Result.race_id)
+        .where(replayed)
+        .order_by(*RACE_ORDER, Result.id)
+    )
+    for horse_id, jockey_id, horse_before, jockey_before in old:
+        restored_horse.setdefault(horse_id, horse_before)
+        restored_jockey.setdefault(jockey_id, jockey_before)
+
+    horses, horse_index = np.unique(horse_ids, return_inverse=True)
+    jockeys, jockey_index = np.unique(jockey_ids, return_inverse=True)
+    current_horse = dict(conn.execute(select(Horse.id, Horse.rating).where(Horse.id.in_(horses.tolist()))).all())
+    current_jockey = dict(conn.execute(select(Jockey.id, Jockey.rating).where(Jockey.id.in_(jockeys.tolist()))).all())
+    horse_rating = np.array([
+        restored_horse.get(h, current_horse.get(h)) or INITIAL_RATING for h in horses.tolist()
+    ], dtype=float)
+    jockey_rating = np.array([
+        restored_jockey.get(j, current_jockey.get(j)) or INITIAL_RATING for j in jockeys.tolist()
+    ], dtype=float)
+
+    history = compute(_race_numbers(row_races), position, {
+        "horse": (horse_index, horse_rating),
+        "jockey": (jockey_index, jockey_rating),
+    }, k)
+    conn.execute(delete(history_t).where(history_t.c.result_id.in_(
+        select(Result.id).join(Race, Race.id == Result.race_id).where(replayed)
+    )))
+    _write_history(conn, result_ids, history["horse"], history["jockey"])
+    _write_ratings(conn, horses_t, horses, horse_rating)
+    _write_ratings(conn, jockeys_t, jockeys, jockey_rating)
+    return True
+
+
+# --- queries -----------------------------------------------------------------
+
+def top_rated(session, entity: str, limit: int = 20) -> list:
+    model = ENTITIES[entity]
+    rows = session.execute(
+        select(model.id, model.name, model.rating)
+        .where(model.rating.is_not(None))
+        .order_by(model.rating.desc(), model.id)
+        .limit(limit)
+    )
+    return [{"id": r.id, "name": r.name, "rating": round(r.rating, 1)} for r in rows]
+
+
+def rating_history(session, entity: str, entity_id: int, limit: int = 50) -> list:
+    """Newest first: ``{race_id, date, place, position, before, after}`` per start."""
+    column = Result.horse_id if entity == "horse" else Result.jockey_id
+    before, after = history_t.c[f"{entity}_before"], history_t.c[f"{entity}_after"]
+    rows = session.execute(
+        select(Result.race_id, Race.date, Race.place, Result.position, before, after)
+        .join(history_t, history_t.c.result_id == Result.id)
+        .join(Race, Race.id == Result.race_id)
+        .where(column == entity_id)
+        .order_by(*(c.desc() for c in RACE_ORDER))
+        .limit(limit)
+    )
+    return [
+        {"race_id": r.race_id, "date": r.date.isoformat() if r.date else None, "place": r.place,
+         "position": r.position, "before": round(r[4], 1), "after": round(r[5], 1)}
+        for r in rows
+    ]
+
+
+# --- views -------------------------------------------------------------------
+
+def _entity_arg(entity: str) -> str:
+    if entity not in ENTITIES:
+        abort(404)
+    return entity
+
+
+@ratings.route('/<entity>')
+def top_view(entity):
+    entity = _entity_arg(entity)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    session = current_app.db_session()
+    try:
+        rows = top_rated(session, entity, limit)
+    finally:
+        session.close()
+    return jsonify({"entity": entity, "results": rows})
+
+
+@ratings.route('/<entity>/<int:entity_id>')
+def history_view(entity, entity_id):
+    entity = _entity_arg(entity)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    model = ENTITIES[entity]
+    session = current_app.db_session()
+    try:
+        row = session.execute(select(model.name, model.rating).where(model.id == entity_id)).first()
+        if row is None:
+            abort(404)
+        history = rating_history(session, entity, entity_id, limit)
+    finally:
+        session.close()
+    rating: Optional[float] = round(row.rating, 1) if row.rating is not None else None
+    return jsonify({"entity": entity, "id": entity_id, "name": row.name, "rating": rating, "history": history})
+
+
+@ratings.cli.command('rebuild')
+def rebuild_command():
+    """Recompute horse and jockey ratings from the results history."""
+    total = rebuild(current_app.db_engine)
+    click.echo(f"Rated {total} results")
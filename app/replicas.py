@@ -0,0 +1,142 @@
+"""Read-replica routing for the sessions made by ``app.db_session``.
+
+With ``DATABASE_REPLICA_URLS`` set, ``create_app`` builds one engine per
+replica and a ``RoutingSession`` class that picks the engine per statement:
+
+* INSERT/UPDATE/DELETE, ``SELECT ... FOR UPDATE``, ORM flushes and
+  anything without a statement go to the primary, and once a session has
+  written, all of its later statements do too;
+* other reads go to one replica per session, chosen round-robin.
+
+Replica health comes from the engines themselves: ``pool_pre_ping``
+replaces dead pooled connections, and a failed connect or disconnect marks
+the replica down for ``REPLICA_RETRY_SECONDS``.  After that a single probe
+connection decides whether it rejoins the rotation.  With every replica
+down, reads fall back to the primary.
+
+Read-your-writes: a commit that wrote anything pins the rest of the
+request, and the visitor's next ``REPLICA_STICKY_SECONDS`` of requests
+(via a timestamp in the Flask session cookie), to the primary so users
+see their own changes despite replication lag.
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from flask import g, has_request_context, session as flask_session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+log = logging.getLogger("replicas")
+
+STICKY_KEY = "_db_primary_until"
+
+
+class ReplicaSet:
+    def __init__(self, primary: Engine, replicas: List[Engine], retry_after: float = 10.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.retry_after = retry_after
+        self._down = {}  # engine -> time of the next probe
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        for engine in self.replicas:
+            event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        # connect failures (no connection yet) and dropped connections
+        if context.connection is None or context.is_disconnect:
+            self.mark_down(context.engine)
+
+    def mark_down(self, engine: Engine) -> None:
+        with self._lock:
+            if engine not in self._down:
+                log.warning("replica %s is down", engine.url.render_as_string(hide_password=True))
+            self._down[engine] = time.monotonic() + self.retry_after
+
+    def _probe(self, engine: Engine) -> bool:
+        try:
+            with engine.connect():
+                pass
+        except Exception:
+            self.mark_down(engine)
+            return False
+        with self._lock:
+            self._down.pop(engine, None)
+        log.info("replica %s is back", engine.url.render_as_string(hide_password=True))
+        return True
+
+    def pick(self) -> Optional[Engine]:
+        """Next healthy replica, or None when there is none."""
+        for _ in range(len(self.replicas)):
+            engine = self.replicas[next(self._counter) % len(self.replicas)]
+            with self._lock:
+                retry_at = self._down.get(engine)
+                if retry_at is None:
+                    return engine
+                if retry_at > time.monotonic():
+                    continue
+                # one probe per retry interval, other threads skip it meanwhile
+                self._down[engine] = time.monotonic() + self.retry_after
+            if self._probe(engine):
+                return engine
+        return None
+
+    def read_engine(self) -> Engine:
+        """An engine for a standalone read-only job (exports, reports)."""
+        return self.pick() or self.primary
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(self.replicas),
+            "down": [e.url.render_as_string(hide_password=True) for e in list(self._down)],
+        }
+
+
+def _pinned_to_primary() -> bool:
+    if not has_request_context():
+        return False
+    if "db_primary" not in g:
+        g.db_primary = flask_session.get(STICKY_KEY, 0) > time.time()
+    return g.db_primary
+
+
+class RoutingSession(Session):
+    replica_set: ReplicaSet = None
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        replica_set = self.replica_set
+        is_write = (
+            clause is None
+            or getattr(clause, "is_dml", False)
+            or getattr(clause, "_for_update_arg", None) is not None
+        )
+        if is_write:
+            self.info["db_wrote"] = True
+            return replica_set.primary
+        if self.info.get("db_wrote") or _pinned_to_primary():
+            return replica_set.primary
+        engine = self.info.get("db_replica")
+        if engine is None:
+            engine = self.info["db_replica"] = replica_set.pick() or replica_set.primary
+        return engine
+
+
+def routing_sessionmaker(replica_set: ReplicaSet, sticky_seconds: float = 5.0, **kwargs) -> sessionmaker:
+    session_class = type("AppRoutingSession", (RoutingSession,), {"replica_set": replica_set})
+    factory = sessionmaker(class_=session_class, **kwargs)
+
+    @event.listens_for(factory, "after_commit")
+    def _stick_after_write(session):
+        if session.info.pop("db_wrote", False) and has_request_context():
+            g.db_primary = True
+            flask_session[STICKY_KEY] = time.time() + sticky_seconds
+
+    @event.listens_for(factory, "after_rollback")
+    def _forget_write(session):
+        session.info.pop("db_wrote", None)
+
+    return factory
@@ -1,19 +1,52 @@
+from functools import wraps
+
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, abort
-from sqlalchemy import select
+from flask import session as flask_session
 from flask_login import login_user, logout_user, login_required, current_user
 
-from app.models import User, UserType
+from app.auth import create_user, lookup_login, update_password
+from app.cache import cached_page
+from app.hashing import HasherBusy
+from app.models import UserType
+from app.ratelimit import RateLimited, attempt_succeeded, check_attempt, retry_after_header
+from app.seasons import stats as season_stats
+from app.sessions import forget_user, principal_loaded
+from app.user_cache import UserSnapshot
 
 main = Blueprint('main', __name__)
 # pull requestttt
 
 
+def admin_required(view):
+    """login_required plus a simple role-based check"""
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated or not getattr(current_user, 'type', None) == UserType.ADMIN:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@main.errorhandler(HasherBusy)
+def hasher_busy(exc):
+    # fail fast instead of queueing more password hashes behind a full pool
+    return 'Server is busy, please retry shortly', 503, {'Retry-After': '1'}
+
+
+@main.errorhandler(RateLimited)
+def rate_limited(exc):
+    return 'Too many attempts, please retry later', 429, {'Retry-After': retry_after_header(exc)}
+
+
 @main.route('/')
+@cached_page()
 def index():
     return render_template('index.html')
 
 
 @main.route('/register', methods=['GET', 'POST'])
+@cached_page()
 def register():
     if request.method == 'GET':
         return render_template('register.html')
@@ -23,24 +56,25 @@ def register():
     if not login_val or not password:
         flash('Login and password required', 'error')
         return render_template('register.html', login=login_val)
+    check_attempt()
+
+    # default type is PEASANT; allow passing 'type' in form if needed
+    user_type = UserType.PEASANT
+    type_str = request.form.get('type')
+    if type_str and type_str.upper() in UserType.__members__:
+        user_type = UserType[type_str.upper()]
 
+    password_hash = current_app.password_hasher.hash(password)
     SessionLocal = current_app.db_session
     session = SessionLocal()
     try:
-        existing = session.execute(select(User).where(User.login == login_val)).scalar_one_or_none()
-        if existing:
+        user_id = create_user(session, login_val, password_hash, user_type)
+        if user_id is None:
             flash('User already exists', 'error')
             return render_template('register.html', login=login_val)
-
-        user = User(login=login_val)
-        user.set_password(password)
-        # default type is PEASANT; allow passing 'type' in form if needed
-        type_str = request.form.get('type')
-        if type_str and type_str.upper() in UserType.__members__:
-            user.type = UserType[type_str.upper()]
-
-        session.add(user)
         session.commit()
+        # drop anything cached under this id (e.g. a deleted user's snapshot)
+        current_app.user_cache.invalidate(user_id)
         flash('User created, please log in', 'success')
         return redirect(url_for('main.login'))
     finally:
@@ -48,6 +82,7 @@ def register():
 
 
 @main.route('/login', methods=['GET', 'POST'])
+@cached_page()
 def login():
     if request.method == 'GET':
         return render_template('login.html')
@@ -57,16 +92,29 @@ def login():
     if not login_val or not password:
         flash('Login and password required', 'error')
         return render_template('login.html', login=login_val)
+    check_attempt(login_val)
 
     SessionLocal = current_app.db_session
     session = SessionLocal()
     try:
-        user = session.execute(select(User).where(User.login == login_val)).scalar_one_or_none()
-        if not user or not user.check_password(password):
+        hasher = current_app.password_hasher
+        row = lookup_login(session, login_val,
+                           case_insensitive=current_app.config.get("LOGIN_CASE_INSENSITIVE", False))
+        if row is None or not hasher.verify(row.password, password):
             flash('Invalid credentials', 'error')
             return render_template('login.html', login=login_val)
 
-        login_user(user)
+        # upgrade hashes made with older method/cost settings while we know the password
+        if hasher.needs_rehash(row.password):
+            update_password(session, row.id, hasher.hash(password))
+            session.commit()
+            forget_user(row.id)
+
+        attempt_succeeded(login_val)
+        snapshot = UserSnapshot(id=row.id, login=login_val, type=row.type)
+        current_app.user_cache.put(snapshot)
+        principal_loaded(flask_session, snapshot)
+        login_user(snapshot)
         flash('Logged in successfully', 'success')
         return redirect(url_for('main.index'))
     finally:
@@ -82,9 +130,29 @@ def logout():
 
 
 @main.route('/admin')
-@login_required
+@admin_required
 def admin():
-    # simple role-based check
-    if not current_user.is_authenticated or not getattr(current_user, 'type', None) == UserType.ADMIN:
-        abort(403)
-    return render_template('admin.html')
+    return render_template(
+        'admin.html',
+        user_cache=current_app.user_cache.stats(),
+        page_cache=current_app.page_cache.stats(),
+        session_store=current_app.session_store.stats() if current_app.session_store else None,
+        login_limiter=current_app.login_limiter.stats() if current_app.login_limiter else None,
+        schedule=current_app.upcoming_races.stats(),
+        live_feed=current_app.live_feed.stats(),
+        analysis=current_app.form_analysis.stats(),
+        jobs=current_app.job_queue.stats(),
+        seasons=season_stats(current_app.db_engine),
+    )
+
+
+@main.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    request_metrics = current_app.request_metrics
+    return render_template(
+        'admin_metrics.html',
+        endpoints=request_metrics.summary(),
+        slow_queries=list(reversed(request_metrics.slow_queries)),
+        window=request_metrics.window,
+    )
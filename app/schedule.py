@@ -0,0 +1,289 @@
+"""Race-card schedule: upcoming and past races per venue, horse and jockey.
+
+``races.starts_at`` holds date and time combined, so "races at X after
+now" is one range scan on ``(place, starts_at, id)`` instead of a scan
+that combines two columns in Python.
+
+Upcoming races are served from ``UpcomingRaces``, a per-process snapshot
+of the next ``SCHEDULE_DAYS`` days with their declared runners, indexed
+by venue, horse and jockey.  It is loaded with two queries and reloaded
+lazily on the next read after
+
+* a committed write to ``races`` or ``results`` on this process's engine:
+  ORM or Core statements, plus the writes the engine does not see that
+  are reported with ``record_write`` (the COPY of imports on Postgres,
+  partition moves when archiving or restoring a season),
+* ``SCHEDULE_REFRESH_SECONDS``, which bounds how stale a worker can be
+  after another process wrote,
+* the date changing, so the window keeps moving.
+
+Past races are read from the database with keyset pagination.
+"""
+import bisect
+import datetime as dt
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from flask import Blueprint, abort, current_app, jsonify, render_template, request, url_for
+from sqlalchemy import event, select
+from sqlalchemy.sql.dml import Insert, UpdateBase
+
+from app.listing import _wants_json, decode_cursor, keyset_page
+from app.models import Horse, Jockey, Race, Result
+
+schedule = Blueprint('schedule', __name__, url_prefix='/schedule')
+
+PAST_LIMIT = 20
+WATCHED_TABLES = {Race.__tablename__, Result.__tablename__}
+ENTITIES = {"horse": Result.horse_id, "jockey": Result.jockey_id}
+_watchers = []  # (tables, statements, flag) of every watch_engine call
+
+
+def _race_item(row, runners: list) -> dict:
+    return {
+        "id": row.id,
+        "starts_at": row.starts_at.isoformat(),
+        "place": row.place,
+        "title": row.title,
+        "runners": runners,
+    }
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    loaded_on: Optional[dt.date] = None
+    starts: tuple = ()  # starts_at of items, for bisect
+    items: tuple = ()
+    by_place: dict = field(default_factory=dict)
+    by_horse: dict = field(default_factory=dict)
+    by_jockey: dict = field(default_factory=dict)
+
+
+class UpcomingRaces:
+    """Next ``days`` days of races in memory, rebuilt after writes.
+
+    ``_load`` builds a complete ``_Snapshot`` and publishes it with one
+    assignment, so readers, which take no lock, always see one load.
+    """
+
+    def __init__(self, session_factory, days: int = 7, refresh_seconds: float = 60.0):
+        self.session_factory = session_factory
+        self.days = days
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._stale = True
+        self._expires = 0.0
+        self._snapshot = _Snapshot()
+        self.loads = 0
+        self.hits = 0
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def _load(self, now: dt.datetime) -> None:
+        until = dt.datetime.combine(now.date() + dt.timedelta(days=self.days + 1), dt.time())
+        # the date predicates add nothing to the starts_at range, but they
+        # let Postgres prune to the current season's partitions
+        in_window = (Race.date >= now.date(), Race.date <= until.date(),
+                     Race.starts_at >= now, Race.starts_at < until)
+        session = self.session_factory()
+        try:
+            races = session.execute(
+                select(Race.id, Race.starts_at, Race.place, Race.title)
+                .where(*in_window)
+                .order_by(Race.starts_at, Race.id)
+            ).all()
+            runners = defaultdict(list)
+            if races:
+                rows = session.execute(
+                    select(Result.race_id, Result.horse_id, Horse.name, Result.jockey_id, Jockey.name)
+                    .join(Race, Result.race_id == Race.id)
+                    .join(Horse, Result.horse_id == Horse.id)
+                    .join(Jockey, Result.jockey_id == Jockey.id)
+                    .where(*in_window, Result.race_date >= now.date(), Result.race_date <= until.date())
+                    .order_by(Result.race_id, Result.id)
+                )
+                for race_id, horse_id, horse, jockey_id, jockey in rows:
+                    runners[race_id].append(
+                        {"horse_id": horse_id, "horse": horse, "jockey_id": jockey_id, "jockey": jockey}
+                    )
+        finally:
+            session.close()
+
+        items = [_race_item(row, runners[row.id]) for row in races]
+        by_place, by_horse, by_jockey = defaultdict(list), defaultdict(list), defaultdict(list)
+        for row, item in zip(races, items):
+            by_place[row.place].append((row.starts_at, item))
+            for runner in item["runners"]:
+                by_horse[runner["horse_id"]].append((row.starts_at, item))
+                by_jockey[runner["jockey_id"]].append((row.starts_at, item))
+        self._snapshot = _Snapshot(
+            loaded_on=now.date(),
+            starts=tuple(row.starts_at for row in races),
+            items=tuple(items),
+            by_place=dict(by_place), by_horse=dict(by_horse), by_jockey=dict(by_jockey),
+        )
+        self.loads += 1
+
+    def _fresh(self, now: dt.datetime) -> bool:
+        return not self._stale and time.monotonic() < self._expires and self._snapshot.loaded_on == now.date()
+
+    def _ensure_fresh(self, now: dt.datetime) -> _Snapshot:
+        if self._fresh(now):
+            return self._snapshot
+        with self._lock:
+            # another thread may have reloaded while we waited
+            if self._fresh(now):
+                return self._snapshot
+            self._stale = False
+            self._expires = time.monotonic() + self.refresh_seconds
+            try:
+                self._load(now)
+            except Exception:
+                self._stale = True
+                raise
+            return self._snapshot
+
+    def upcoming(self, place: Optional[str] = None, horse_id: Optional[int] = None,
+                 jockey_id: Optional[int] = None, days: Optional[int] = None,
+                 now: Optional[dt.datetime] = None) -> list:
+        """Races starting from ``now`` within ``days`` (at most the cached window)."""
+        now = now or dt.datetime.now()
+        snapshot = self._ensure_fresh(now)
+        self.hits += 1
+        until = dt.datetime.combine(now.date() + dt.timedelta(days=min(days or self.days, self.days) + 1), dt.time())
+        if place is None and horse_id is None and jockey_id is None:
+            lo, hi = bisect.bisect_left(snapshot.starts, now), bisect.bisect_left(snapshot.starts, until)
+            return list(snapshot.items[lo:hi])
+        if place is not None:
+            entries = snapshot.by_place.get(place, ())
+        elif horse_id is not None:
+            entries = snapshot.by_horse.get(horse_id, ())
+        else:
+            entries = snapshot.by_jockey.get(jockey_id, ())
+        return [item for starts_at, item in entries if now <= starts_at < until]
+
+    def stats(self) -> dict:
+        return {"races": len(self._snapshot.items), "days": self.days, "loads": self.loads, "hits": self.hits}
+
+
+def watch_engine(engine, tables, callback, statements: tuple = (UpdateBase,)) -> None:
+    """Call ``callback()`` after a transaction that wrote to any of ``tables`` commits.
+
+    Catches ORM flushes and Core statements alike, since both execute on
+    the engine's connections; a rollback discards the pending call.
+    ``statements`` narrows the writes that count, e.g. to ``(Update, Delete)``.
+    """
+    names = set(tables)
+    flag = f"dirty:{id(callback)}"
+    _watchers.append((names, statements, flag))
+
+    @event.listens_for(engine, "after_execute")
+    def _collect(conn, clauseelement, multiparams, params, execution_options, result):
+        if isinstance(clauseelement, statements) and clauseelement.table.name in names:
+            conn.info[flag] = True
+
+    @event.listens_for(engine, "commit")
+    def _fire(conn):
+        if conn.info.pop(flag, False):
+            callback()
+
+    @event.listens_for(engine, "rollback")
+    def _discard(conn):
+        conn.info.pop(flag, None)
+
+
+def record_write(conn, tables, statement=Insert) -> None:
+    """Report a write to ``tables`` that bypassed ``after_execute``.
+
+    For raw COPY and DDL; the watchers fire when ``conn`` commits, as if
+    ``statement`` had run on each table.  Flags set on a connection of an
+    engine nobody watches are never read.
+    """
+    for names, statements, flag in _watchers:
+        if issubclass(statement, statements) and names.intersection(tables):
+            conn.info[flag] = True
+
+
+def init_app(app, engine, session_factory) -> None:
+    app.upcoming_races = UpcomingRaces(
+        session_factory,
+        days=int(app.config.get("SCHEDULE_DAYS", 7)),
+        refresh_seconds=float(app.config.get("SCHEDULE_REFRESH_SECONDS", 60)),
+    )
+    watch_engine(engine, WATCHED_TABLES, app.upcoming_races.invalidate)
+
+
+# --- views -------------------------------------------------------------------
+
+def _respond(title: str, upcoming: list, past: Optional[list] = None, next_url: Optional[str] = None, **extra):
+    if _wants_json():
+        payload = {**extra, "upcoming": upcoming}
+        if past is not None:
+            payload.update(past=past, next=next_url)
+        return jsonify(payload)
+    return render_template('schedule.html', title=title, upcoming=upcoming, past=past, next_url=next_url)
+
+
+@schedule.route('')
+def upcoming_view():
+    place = request.args.get('place') or None
+    days = request.args.get('days', type=int)
+    races = current_app.upcoming_races.upcoming(place=place, days=days)
+    title = f"Расписание: {place}" if place else "Расписание"
+    return _respond(title, races, place=place)
+
+
+@schedule.route('/past')
+def past_view():
+    keys = (Race.starts_at, Race.id)
+    stmt = select(Race.id, Race.starts_at, Race.place, Race.title).where(Race.starts_at < dt.datetime.now())
+    if place := request.args.get('place'):
+        stmt = stmt.where(Race.place == place)
+    limit = max(1, min(request.args.get('limit', PAST_LIMIT, type=int), 200))
+    after = None
+    if token := request.args.get('cursor'):
+        after = decode_cursor(token, keys)
+        if after is None:
+            abort(400, description="invalid cursor")
+
+    session = current_app.db_session()
+    try:
+        rows, next_cursor = keyset_page(session, stmt, keys, after, limit, descending=True)
+    finally:
+        session.close()
+    past = [{**row, "starts_at": row["starts_at"].isoformat()} for row in rows]
+    next_url = None
+    if next_cursor is not None:
+        next_url = url_for('schedule.past_view', **{**request.args.to_dict(), "cursor": next_cursor})
+    return _respond(f"Прошедшие заезды: {place}" if place else "Прошедшие заезды",
+                    [], past, next_url, place=place or None)
+
+
+@schedule.route('/<entity>/<int:entity_id>')
+def entity_view(entity, entity_id):
+    if entity not in ENTITIES:
+        abort(404)
+    model = Horse if entity == "horse" else Jockey
+    column = ENTITIES[entity]
+    limit = max(1, min(request.args.get('limit', PAST_LIMIT, type=int), 200))
+    session = current_app.db_session()
+    try:
+        name = session.execute(select(model.name).where(model.id == entity_id)).scalar_one_or_none()
+        if name is None:
+            abort(404)
+        rows = session.execute(
+            select(Race.id, Race.starts_at, Race.place, Race.title, Result.position, Result.race_time)
+            .join(Result, Result.race_id == Race.id)
+            .where(column == entity_id, Race.starts_at < dt.datetime.now())
+            .order_by(Race.starts_at.desc(), Race.id.desc())
+            .limit(limit)
+        ).mappings().all()
+    finally:
+        session.close()
+    upcoming = current_app.upcoming_races.upcoming(**{f"{entity}_id": entity_id})
+    past = [{**row, "starts_at": row["starts_at"].isoformat()} for row in rows]
+    return _respond(name, upcoming, past, entity=entity, id=entity_id, name=name)
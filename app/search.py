@@ -0,0 +1,176 @@
+"""Typeahead search over horse, jockey and owner names.
+
+``/search?q=...`` returns the best matches across all three entity types.
+
+* Postgres: ``pg_trgm`` GIN indexes on ``lower(name)`` answer substring
+  matches (3+ characters), ranked by trigram similarity. Shorter input
+  falls back to a prefix match on a ``text_pattern_ops`` index.
+* SQLite: an FTS5 table ``search_index`` kept in sync with the three
+  tables by triggers; every word of the query is matched as a word
+  prefix and hits are ranked by bm25.  The FTS rowid encodes the entity
+  (``id * 4 + kind``), so the triggers update single rows by rowid.
+
+Either way a prefix hit on the whole name ranks above other matches.
+The schema objects come from migration 24958f17aab6; ``install_ddl``
+attaches the same DDL to ``Base.metadata`` for ``create_all``.
+"""
+import re
+from typing import Iterable, List, Optional
+
+from flask import Blueprint, abort, current_app, jsonify, request
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm import Session
+
+search = Blueprint('search', __name__)
+
+ENTITY_TABLES = {"horse": "horses", "jockey": "jockeys", "owner": "owners"}
+_KINDS = {"horse": 1, "jockey": 2, "owner": 3}
+_KIND_NAMES = {kind: name for name, kind in _KINDS.items()}
+MAX_LIMIT = 50
+
+
+def normalize(value: str) -> str:
+    """Case-fold and spell ё as е, the way names are indexed."""
+    return value.lower().replace("ё", "е")
+
+
+# --- schema -------------------------------------------------------------------
+
+def _fold(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def sqlite_ddl() -> List[str]:
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "name, display UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    ]
+    for entity, table in ENTITY_TABLES.items():
+        kind = _KINDS[entity]
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO search_index (rowid, name, display) "
+            f"VALUES (new.id * 4 + {kind}, {_fold('new.name')}, new.name); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF name ON {table} BEGIN "
+            f"UPDATE search_index SET name = {_fold('new.name')}, display = new.name "
+            f"WHERE rowid = old.id * 4 + {kind}; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM search_index WHERE rowid = old.id * 4 + {kind}; END",
+        ]
+    return statements
+
+
+def postgres_ddl() -> List[str]:
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for table in ENTITY_TABLES.values():
+        statements += [
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} "
+            f"USING gin (lower(name) gin_trgm_ops)",
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_name_prefix ON {table} "
+            f"(lower(name) text_pattern_ops)",
+        ]
+    return statements
+
+
+def install_ddl(metadata) -> None:
+    """Create the search objects whenever ``metadata.create_all`` runs."""
+    for statement in sqlite_ddl():
+        event.listen(metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    for statement in postgres_ddl():
+        event.listen(metadata, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+    event.listen(
+        metadata, "before_drop",
+        DDL("DROP TABLE IF EXISTS search_index").execute_if(dialect="sqlite"),
+    )
+
+
+# --- queries ------------------------------------------------------------------
+
+def _like_escape(value: str) -> str:
+    return re.sub(r"([\\%_])", r"\\\1", value)
+
+
+def _fts_words(q: str) -> List[str]:
+    return [f'"{word}"*' for word in re.findall(r"\w+", normalize(q))]
+
+
+def _search_sqlite(session: Session, q: str, types: Iterable[str], limit: int) -> list:
+    words = _fts_words(q)
+    if not words:
+        return []
+    kinds = ", ".join(str(_KINDS[t]) for t in sorted(types))
+    # a single letter matches a large share of all names; ranking them all
+    # would cost more than the typeahead budget, so take them in index order
+    order = "" if len(q.strip()) < 2 else "ORDER BY score, length(display) "
+    stmt = text(
+        "SELECT rowid, display, bm25(search_index) AS score FROM search_index "
+        f"WHERE search_index MATCH :match AND rowid % 4 IN ({kinds}) "
+        f"{order}LIMIT :limit"
+    )
+    # names starting with the query first (^ anchors to the first word), then any word match
+    hits = {}
+    for match in ("^" + " ".join(words), " ".join(words)):
+        for row in session.execute(stmt, {"match": match, "limit": limit}):
+            hits.setdefault(row.rowid, row)
+        if len(hits) >= limit:
+            break
+    return [
+        {"type": _KIND_NAMES[row.rowid % 4], "id": row.rowid // 4, "name": row.display,
+         "score": round(-row.score, 4)}
+        for row in list(hits.values())[:limit]
+    ]
+
+
+def _search_postgres(session: Session, q: str, types: Iterable[str], limit: int) -> list:
+    needle = q.strip().lower()
+    escaped = _like_escape(needle)
+    # trigram indexes need 3+ characters; shorter input only matches name prefixes
+    pattern = f"%{escaped}%" if len(needle) >= 3 else f"{escaped}%"
+    branches = [
+        f"(SELECT '{entity}' AS type, id, name, similarity(lower(name), :q) AS score, "
+        f"lower(name) LIKE :prefix AS prefix_hit FROM {ENTITY_TABLES[entity]} "
+        f"WHERE lower(name) LIKE :pattern "
+        f"ORDER BY prefix_hit DESC, score DESC, length(name) LIMIT :limit)"
+        for entity in types
+    ]
+    rows = session.execute(
+        text(
+            f"SELECT type, id, name, score FROM ({' UNION ALL '.join(branches)}) AS hits "
+            "ORDER BY prefix_hit DESC, score DESC, length(name), id LIMIT :limit"
+        ),
+        {"q": needle, "prefix": escaped + "%", "pattern": pattern, "limit": limit},
+    ).all()
+    return [
+        {"type": row.type, "id": row.id, "name": row.name, "score": round(float(row.score), 4)}
+        for row in rows
+    ]
+
+
+def search_names(session: Session, q: str, types: Optional[Iterable[str]] = None, limit: int = 10) -> list:
+    """Ranked name matches as dicts with ``type``, ``id``, ``name`` and ``score``."""
+    types = [t for t in (types or ENTITY_TABLES) if t in ENTITY_TABLES]
+    if not q.strip() or not types:
+        return []
+    if session.get_bind().dialect.name == "postgresql":
+        return _search_postgres(session, q, types, limit)
+    return _search_sqlite(session, q, types, limit)
+
+
+@search.route('/search')
+def search_view():
+    q = request.args.get('q', '')
+    types = None
+    if request.args.get('type'):
+        types = request.args['type'].split(',')
+        if not set(types) <= set(ENTITY_TABLES):
+            abort(400, description=f"'type' must be one of {', '.join(ENTITY_TABLES)}")
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_LIMIT))
+
+    session = current_app.db_session()
+    try:
+        results = search_names(session, q, types, limit)
+    finally:
+        session.close()
+    response = jsonify({"q": q, "results": results})
+    response.cache_control.max_age = 30
+    return response
@@ -0,0 +1,508 @@
+"""Seasons: partitioned live tables and archived closed seasons.
+
+A season is a calendar year of race dates (``season_of``).  ``races`` and
+``results`` hold the live seasons; closed seasons can be archived, so the
+indexes, scans and aggregates of everyday queries only cover recent years.
+
+* Postgres: both tables are range-partitioned per season, ``races`` on
+  ``date`` and ``results`` on its copy ``race_date`` (the ``partition_by``
+  info of the models; migration 9f1d2c7a4e60 partitions the tables, and
+  ``partition_tables`` / ``unpartition_tables`` redo that by hand).  A
+  changed race date reaches ``race_date`` through ``ON UPDATE CASCADE``;
+  on other databases an ORM hook in app/models.py copies it.
+  A query with a date predicate only reads the partitions in range, so
+  the schedule, which asks for today onwards, touches the current one.
+  Archiving detaches a season's two partitions and moves them into the
+  ``archive`` schema.
+* SQLite: archiving moves a season's rows into a database file of its
+  own under ``SEASON_ARCHIVE_DIR``, attached only while it is read.
+
+``season_archives`` lists the archived seasons.  Code that needs history
+(exports, statistics and ratings rebuilds) reads ``sources(engine,
+date_from, date_to)``: the archived seasons overlapping the range, oldest
+first, then the live tables, each with ``Race``/``Result`` aliases for its
+own tables.  Everything else reads the live tables only.
+
+Only the oldest live season can be archived, and only once it is over,
+so every archived race is older than every live one.  Imports refuse rows
+of archived seasons; ``restore_season`` brings the newest archived season
+back.
+"""
+import datetime as dt
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import Column, Engine, MetaData, Table, delete, func, insert, select, text
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.dml import Delete, Update
+
+from app.models import Race, RatingHistory, Result, SeasonArchive
+from app.schedule import record_write
+
+log = logging.getLogger("seasons")
+
+seasons = Blueprint('seasons', __name__)
+
+races_t = Race.__table__
+results_t = Result.__table__
+archives_t = SeasonArchive.__table__
+history_t = RatingHistory.__table__
+PARTITIONED = {t.name: t.info["partition_by"] for t in (races_t, results_t)}
+ARCHIVE_SCHEMA = "archive"
+
+
+class SeasonError(RuntimeError):
+    pass
+
+
+def season_of(date: dt.date) -> int:
+    return date.year
+
+
+def season_bounds(season: int) -> tuple:
+    """``(first day, first day of the next season)``."""
+    return dt.date(season, 1, 1), dt.date(season + 1, 1, 1)
+
+
+def current_season(today: Optional[dt.date] = None) -> int:
+    return season_of(today or dt.date.today())
+
+
+# --- reading -----------------------------------------------------------------
+
+@dataclass
+class Source:
+    """Where one range of seasons lives; ``season`` is None for the live tables."""
+    season: Optional[int]
+    race: Any = Race
+    result: Any = Result
+    attach: Optional[tuple] = None  # SQLite: (file, schema) to attach first
+
+
+def _archive_tables(schema: str, races_name: str, results_name: str) -> tuple:
+    """Column-for-column copies of races/results; no keys into the live tables."""
+    metadata = MetaData()
+    return tuple(
+        Table(name, metadata, *(
+            Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+            for c in table.columns
+        ), schema=schema)
+        for table, name in ((races_t, races_name), (results_t, results_name))
+    )
+
+
+def _sqlite_schema(season: int) -> str:
+    return f"season_{season}"
+
+
+def _archive_source(dialect: str, row) -> Source:
+    if dialect == "sqlite":
+        schema = _sqlite_schema(row.season)
+        races, results = _archive_tables(schema, "races", "results")
+        attach = (row.location, schema)
+    else:
+        races, results = _archive_tables(row.location, f"races_{row.season}", f"results_{row.season}")
+        attach = None
+    return Source(row.season, aliased(Race, races, adapt_on_names=True),
+                  aliased(Result, results, adapt_on_names=True), attach)
+
+
+def archived(conn) -> list:
+    return conn.execute(select(archives_t).order_by(archives_t.c.season)).all()
+
+
+def sources(bind, date_from: Optional[dt.date] = None, date_to: Optional[dt.date] = None) -> list:
+    """Archived seasons overlapping ``[date_from, date_to]`` in date order, then the live tables.
+
+    ``bind`` is an engine or a connection to read ``season_archives`` on.
+    """
+    if isinstance(bind, Engine):
+        with bind.connect() as conn:
+            rows = archived(conn)
+    else:
+        rows = archived(bind)
+    found = [
+        _archive_source(bind.dialect.name, row) for row in rows
+        if (date_to is None or row.date_from <= date_to) and (date_from is None or row.date_to > date_from)
+    ]
+    return found + [Source(None)]
+
+
+@contextmanager
+def source_connection(engine, source: Source):
+    """A connection that can read ``source``; SQLite archives are attached just for it."""
+    with engine.connect() as conn:
+        if source.attach is None:
+            yield conn
+            return
+        path, schema = source.attach
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {schema}", (path,))
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql(f"DETACH DATABASE {schema}")
+
+
+# --- Postgres partitions -----------------------------------------------------
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('races'))"
+    )).scalar()
+
+
+def _partition_ddl(table: str, season: int) -> str:
+    date_from, date_to = season_bounds(season)
+    return (f"CREATE TABLE IF NOT EXISTS {table}_{season} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{date_from}') TO ('{date_to}')")
+
+
+def ensure_partitions(conn, seasons_: Iterable[int]) -> list:
+    """Create the missing live partitions of ``seasons_``; returns the seasons created."""
+    if not is_partitioned(conn):
+        return []
+    skip = {row.season for row in archived(conn)}
+    created = []
+    for season in sorted(set(seasons_) - skip):
+        if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": f"races_{season}"}).scalar():
+            continue
+        for table in PARTITIONED:
+            conn.exec_driver_sql(_partition_ddl(table, season))
+        created.append(season)
+    if created:
+        log.info("Created partitions for seasons %s", created)
+    return created
+
+
+def _table_layout(conn, table: str) -> dict:
+    """Secondary index definitions and the id sequence of ``table``."""
+    indexes = conn.execute(text(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:t))"
+    ), {"t": table}).scalars().all()
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table}).scalar()
+    return {"indexes": indexes, "sequence": sequence}
+
+
+def _other_foreign_keys(conn) -> list:
+    """Foreign keys of results except the one to races, as ``(name, definition)``."""
+    return conn.execute(text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = 'results'::regclass AND contype = 'f' AND confrelid <> 'races'::regclass"
+    )).all()
+
+
+def _rebuild_tables(conn, partitioned: bool, seasons_: Iterable[int] = ()) -> None:
+    layout = {table: _table_layout(conn, table) for table in PARTITIONED}
+    foreign_keys = _other_foreign_keys(conn)
+    # other tables' keys into races/results (rating_history.result_id) cannot
+    # point at a partitioned table, which has no unique index on id alone
+    referencing = conn.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f' "
+        "AND confrelid IN ('races'::regclass, 'results'::regclass) "
+        "AND conrelid NOT IN ('races'::regclass, 'results'::regclass)"
+    )).all()
+    for table, name in referencing:
+        conn.exec_driver_sql(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+
+    for table in reversed(list(PARTITIONED)):
+        if layout[table]["sequence"]:
+            conn.exec_driver_sql(f"ALTER SEQUENCE {layout[table]['sequence']} OWNED BY NONE")
+        conn.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {table}_old")
+    for table, key in PARTITIONED.items():
+        suffix = f" PARTITION BY RANGE ({key})" if partitioned else ""
+        conn.exec_driver_sql(f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS){suffix}")
+        for season in sorted(seasons_):
+            conn.exec_driver_sql(_partition_ddl(table, season))
+        conn.exec_driver_sql(f"INSERT INTO {table} SELECT * FROM {table}_old")
+    # also drops their indexes, constraints and the live NOTIFY trigger
+    conn.exec_driver_sql("DROP TABLE results_old, races_old")
+
+    for table, key in PARTITIONED.items():
+        columns = f"id, {key}" if partitioned else "id"
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({columns})")
+        if layout[table]["sequence"]:
+            conn.exec_driver_sql(f"ALTER SEQUENCE {layout[table]['sequence']} OWNED BY {table}.id")
+        for definition in layout[table]["indexes"]:
+            conn.exec_driver_sql(definition)
+    if partitioned:
+        conn.exec_driver_sql("ALTER TABLE results ALTER COLUMN race_date SET NOT NULL")
+        # a changed race date moves its results along to the right partition
+        conn.exec_driver_sql("ALTER TABLE results ADD CONSTRAINT results_race_id_fkey FOREIGN KEY "
+                             "(race_id, race_date) REFERENCES races (id, date) ON UPDATE CASCADE")
+    else:
+        conn.exec_driver_sql("ALTER TABLE results ALTER COLUMN race_date DROP NOT NULL")
+        conn.exec_driver_sql("ALTER TABLE results ADD CONSTRAINT results_race_id_fkey "
+                             "FOREIGN KEY (race_id) REFERENCES races (id)")
+        conn.exec_driver_sql("ALTER TABLE rating_history ADD CONSTRAINT rating_history_result_id_fkey "
+                             "FOREIGN KEY (result_id) REFERENCES results (id) ON DELETE CASCADE")
+    for name, definition in foreign_keys:
+        conn.exec_driver_sql(f'ALTER TABLE results ADD CONSTRAINT "{name}" {definition}')
+
+    if conn.execute(text("SELECT to_regproc('results_live_notify') IS NOT NULL")).scalar():
+        from app.live import NOTIFY_DDL
+        for statement in NOTIFY_DDL:
+            conn.exec_driver_sql(statement)
+
+
+def partition_tables(conn, ahead: int = 1) -> None:
+    """Turn ``races`` and ``results`` into season-partitioned tables (Postgres).
+
+    Creates a partition for every season with races plus the current one
+    and ``ahead`` more, and copies the rows over.  ``results.race_date``
+    must be filled in already.
+    """
+    if conn.dialect.name != "postgresql" or is_partitioned(conn):
+        return
+    current = current_season()
+    found = conn.execute(text("SELECT DISTINCT CAST(EXTRACT(YEAR FROM date) AS INTEGER) FROM races")).scalars()
+    _rebuild_tables(conn, True, set(found) | set(range(current, current + ahead + 1)))
+
+
+def unpartition_tables(conn) -> None:
+    """Undo ``partition_tables``; archived seasons must be restored first."""
+    if not is_partitioned(conn):
+        return
+    if archived(conn):
+        raise SeasonError("restore the archived seasons before removing the partitions")
+    _rebuild_tables(conn, False)
+
+
+# --- archiving ---------------------------------------------------------------
+
+def _check_archivable(conn, season: int, today: Optional[dt.date]) -> None:
+    if season >= current_season(today):
+        raise SeasonError(f"season {season} is not over yet")
+    if conn.execute(select(archives_t.c.season).where(archives_t.c.season == season)).first():
+        raise SeasonError(f"season {season} is already archived")
+    date_from, _ = season_bounds(season)
+    if conn.execute(select(races_t.c.id).where(races_t.c.date < date_from).limit(1)).first():
+        raise SeasonError(f"older seasons than {season} are still live; archive them first")
+
+
+def _register(conn, season: int, location: str, races: int, results: int) -> dict:
+    date_from, date_to = season_bounds(season)
+    values = {"season": season, "date_from": date_from, "date_to": date_to, "location": location,
+              "races": races, "results": results,
+              "archived_at": dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)}
+    conn.execute(insert(archives_t).values(values))
+    log.info("Archived season %d: %d races, %d results in %s", season, races, results, location)
+    return values
+
+
+def _archive_sqlite(engine, season: int, directory: str, today: Optional[dt.date]) -> Optional[dict]:
+    date_from, date_to = season_bounds(season)
+    in_season = (races_t.c.date >= date_from, races_t.c.date < date_to)
+    race_ids = select(races_t.c.id).where(*in_season)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, f"season_{season}.db"))
+    schema = _sqlite_schema(season)
+    races_a, results_a = _archive_tables(schema, "races", "results")
+
+    created, done = not os.path.exists(path), None
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {schema}", (path,))
+        conn.commit()
+        try:
+            with conn.begin():
+                # take the write lock up front: upgrading a read lock fails at
+                # once (no busy wait) while another connection writes
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                _check_archivable(conn, season, today)
+                races = conn.execute(select(func.count()).where(*in_season)).scalar_one()
+                if not races:
+                    return None
+                # SQLite hands out max(id) + 1, so ids moved away must stay below the live ones
+                for table, inside in ((races_t, races_t.c.id.in_(race_ids)),
+                                      (results_t, results_t.c.race_id.in_(race_ids))):
+                    moved = conn.execute(select(func.max(table.c.id)).where(inside)).scalar()
+                    kept = conn.execute(select(func.max(table.c.id)).where(~inside)).scalar()
+                    if moved is not None and (kept is None or kept < moved):
+                        raise SeasonError(f"season {season} holds the newest {table.name} ids; SQLite "
+                                          f"would hand them out again, so it cannot be archived")
+                races_a.create(conn, checkfirst=True)
+                results_a.create(conn, checkfirst=True)
+                if conn.execute(select(races_a.c.id).limit(1)).first():
+                    raise SeasonError(f"{path} already holds races")
+                conn.execute(insert(races_a).from_select(races_t.c.keys(), select(races_t).where(*in_season)))
+                results = conn.execute(insert(results_a).from_select(
+                    results_t.c.keys(), select(results_t).where(results_t.c.race_id.in_(race_ids))
+                )).rowcount
+                # ratings keep counting the season; only its per-result history goes
+                conn.execute(delete(history_t).where(history_t.c.result_id.in_(
+                    select(results_t.c.id).where(results_t.c.race_id.in_(race_ids))
+                )))
+                conn.execute(delete(results_t).where(results_t.c.race_id.in_(race_ids)))
+                conn.execute(delete(races_t).where(*in_season))
+                done = _register(conn, season, path, races, results)
+        finally:
+            conn.exec_driver_sql(f"DETACH DATABASE {schema}")
+            conn.commit()
+            # ATTACH creates the file even when nothing goes into it
+            if created and done is None:
+                os.remove(path)
+    return done
+
+
+def _archive_postgres(engine, season: int, today: Optional[dt.date]) -> Optional[dict]:
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            raise SeasonError("races and results are not partitioned; run the Alembic migrations")
+        _check_archivable(conn, season, today)
+        if not conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": f"races_{season}"}).scalar():
+            return None
+        races = conn.execute(text(f"SELECT count(*) FROM races_{season}")).scalar()
+        results = conn.execute(text(f"SELECT count(*) FROM results_{season}")).scalar()
+        conn.exec_driver_sql(f"DELETE FROM rating_history WHERE result_id IN (SELECT id FROM results_{season})")
+        conn.exec_driver_sql(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        conn.exec_driver_sql(f"ALTER TABLE results DETACH PARTITION results_{season}")
+        # the detached partition keeps its copy of the key into races, which
+        # would block detaching the races it points at
+        keys = conn.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:t) AND contype = 'f' "
+            "AND confrelid = 'races'::regclass"
+        ), {"t": f"results_{season}"}).scalars().all()
+        for name in keys:
+            conn.exec_driver_sql(f'ALTER TABLE results_{season} DROP CONSTRAINT "{name}"')
+        conn.exec_driver_sql(f"ALTER TABLE races DETACH PARTITION races_{season}")
+        for table in PARTITIONED:
+            conn.exec_driver_sql(f"ALTER TABLE {table}_{season} SET SCHEMA {ARCHIVE_SCHEMA}")
+        record_write(conn, PARTITIONED, Delete)
+        return _register(conn, season, ARCHIVE_SCHEMA, races, results)
+
+
+def archive_season(engine, season: int, directory: str, today: Optional[dt.date] = None) -> Optional[dict]:
+    """Move a closed season out of the live tables; None when it has no races."""
+    if engine.dialect.name == "postgresql":
+        return _archive_postgres(engine, season, today)
+    if engine.dialect.name != "sqlite":
+        raise SeasonError(f"archiving is not supported on {engine.dialect.name}")
+    return _archive_sqlite(engine, season, directory, today)
+
+
+def archive_before(engine, before: int, directory: str, progress=None) -> list:
+    """Archive every live season older than ``before``, oldest first."""
+    with engine.connect() as conn:
+        first = conn.execute(select(func.min(races_t.c.date))).scalar()
+    if first is None:
+        return []
+    done = []
+    for season in range(season_of(first), before):
+        archived_season = archive_season(engine, season, directory)
+        if archived_season is not None:
+            done.append(archived_season)
+        if progress:
+            progress(season)
+    return done
+
+
+def restore_season(engine, season: int) -> dict:
+    """Put the newest archived season back into the live tables.
+
+    Its rating history comes back with the next ratings rebuild.
+    """
+    with engine.connect() as conn:
+        rows = archived(conn)
+    if not rows or rows[-1].season != season:
+        raise SeasonError(f"season {season} is not the newest archived season")
+    row = rows[-1]
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for table in PARTITIONED:
+                conn.exec_driver_sql(f"ALTER TABLE {row.location}.{table}_{season} SET SCHEMA public")
+                conn.exec_driver_sql(f"ALTER TABLE {table} ATTACH PARTITION {table}_{season} "
+                                     f"FOR VALUES FROM ('{row.date_from}') TO ('{row.date_to}')")
+            conn.execute(delete(archives_t).where(archives_t.c.season == season))
+            # the rows come back under their old ids, below what readers have seen
+            record_write(conn, PARTITIONED, Update)
+    else:
+        schema = _sqlite_schema(season)
+        races_a, results_a = _archive_tables(schema, "races", "results")
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f"ATTACH DATABASE ? AS {schema}", (row.location,))
+            conn.commit()
+            try:
+                with conn.begin():
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                    conn.execute(insert(races_t).from_select(races_a.c.keys(), select(races_a)))
+                    conn.execute(insert(results_t).from_select(results_a.c.keys(), select(results_a)))
+                    conn.execute(delete(archives_t).where(archives_t.c.season == season))
+                    record_write(conn, PARTITIONED, Update)
+            finally:
+                conn.exec_driver_sql(f"DETACH DATABASE {schema}")
+                conn.commit()
+        os.remove(row.location)
+    log.info("Restored season %d", season)
+    return {"season": season, "races": row.races, "results": row.results}
+
+
+def stats(engine) -> dict:
+    with engine.connect() as conn:
+        rows = archived(conn)
+    return {"current": current_season(), "archived": [row._asdict() for row in rows]}
+
+
+def archive_dir(app) -> str:
+    """``SEASON_ARCHIVE_DIR``, by default ``archive/`` next to a SQLite database file."""
+    configured = app.config.get("SEASON_ARCHIVE_DIR", "")
+    if configured:
+        return configured
+    database = app.db_engine.url.database
+    if app.db_engine.dialect.name == "sqlite" and database and database != ":memory:":
+        return os.path.join(os.path.dirname(os.path.abspath(database)), "archive")
+    return os.path.join(tempfile.gettempdir(), "season-archive")
+
+
+# --- commands ----------------------------------------------------------------
+
+@seasons.cli.command('list')
+def list_command():
+    """Show the archived seasons."""
+    with current_app.db_engine.connect() as conn:
+        rows = archived(conn)
+    for row in rows:
+        click.echo(f"{row.season}: {row.races} races, {row.results} results in {row.location}")
+    click.echo(f"Current season {current_season()}, {len(rows)} archived")
+
+
+@seasons.cli.command('archive')
+@click.option('--before', type=int, required=True, help='Archive every live season older than this one.')
+def archive_command(before):
+    """Move closed seasons out of the live races/results tables."""
+    try:
+        done = archive_before(current_app.db_engine, before, archive_dir(current_app))
+    except SeasonError as exc:
+        raise click.ClickException(str(exc))
+    for season in done:
+        click.echo(f"Archived {season['season']}: {season['races']} races, {season['results']} results")
+    click.echo(f"Archived {len(done)} seasons")
+
+
+@seasons.cli.command('restore')
+@click.argument('season', type=int)
+def restore_command(season):
+    """Bring the newest archived season back into the live tables."""
+    try:
+        restored = restore_season(current_app.db_engine, season)
+    except SeasonError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Restored {season}: {restored['races']} races, {restored['results']} results")
+
+
+@seasons.cli.command('partition')
+@click.option('--ahead', default=1, show_default=True, help='Seasons after the current one.')
+def partition_command(ahead):
+    """Create the live partitions up to ``ahead`` seasons from now (Postgres)."""
+    current = current_season()
+    with current_app.db_engine.begin() as conn:
+        created = ensure_partitions(conn, range(current, current + ahead + 1))
+    click.echo(f"Created partitions for {', '.join(map(str, created)) or 'no seasons'}")
@@ -0,0 +1,401 @@
+"""Server-side sessions that carry the signed-in principal.
+
+With the default signed-cookie session every request decodes the whole
+session from the cookie and Flask-Login then rebuilds the user through
+``load_user``.  With ``SESSION_BACKEND`` set to ``memory`` or
+``database`` the cookie holds only a random token; the session data lives
+on the server next to the principal (id, login, role), and ``load_user``
+takes the principal straight from the session instead of querying.
+
+Stores:
+
+* ``MemoryStore`` - per-process; only for a single worker or sticky
+  routing, sessions die with the process.
+* ``DatabaseStore`` - the ``user_sessions`` table, shared by all workers,
+  with a small per-process front cache (``SESSION_CACHE_TTL`` seconds) so
+  an active visitor costs a query only once per TTL.
+
+Rows are keyed on the sha256 of the token.  A record is rewritten only
+when the session changed or half of its lifetime has passed, and expired
+rows are deleted in batches at most every ``SESSION_SWEEP_SECONDS`` per
+process (or by ``flask sessions sweep`` from cron), never per request.
+
+When a user row changes (role, password) ``forget_user`` drops the stored
+principal, so the next request reloads it through ``load_user``, which
+then reads ``users`` itself rather than this worker's ``user_cache`` (that
+may still hold the old row).  Only a principal read from ``users`` during
+the request (``principal_loaded``) is ever written to the store.
+``revoke_user`` deletes every session of a user instead, which signs them
+out on all workers within the front-cache TTL; ``flask sessions revoke
+LOGIN`` runs it by hand.  A worker that still has a revoked record cached
+never writes it back: a record read from the table is only updated, not
+re-inserted.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import click
+from flask import Blueprint, current_app
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import delete, insert, select, update
+from werkzeug.datastructures import CallbackDict
+
+from app.models import UserSession, UserType
+from app.user_cache import UserSnapshot
+
+sessions = Blueprint('sessions', __name__)
+
+user_sessions = UserSession.__table__
+serializer = TaggedJSONSerializer()
+SWEEP_BATCH = 1000
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("ascii")).hexdigest()
+
+
+@dataclass
+class SessionRecord:
+    data: str  # serialized, so every request works on its own copy
+    expires_at: float
+    principal: Optional[UserSnapshot] = None
+    # the row already exists in user_sessions; if it is gone on save it was
+    # revoked or swept and must not come back
+    stored: bool = False
+
+
+class MemoryStore:
+    """Sessions in a per-process LRU dict."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[SessionRecord]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            keep_until, record = item
+            if keep_until <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return record
+
+    def save(self, key: str, record: SessionRecord, ttl: Optional[float] = None) -> None:
+        keep_until = record.expires_at if ttl is None else min(record.expires_at, time.time() + ttl)
+        with self._lock:
+            self._data[key] = (keep_until, record)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def revoke_user(self, user_id: int) -> int:
+        with self._lock:
+            keys = [k for k, (_, r) in self._data.items() if r.principal and r.principal.id == user_id]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def forget_user(self, user_id: int) -> None:
+        with self._lock:
+            for key, (keep_until, record) in self._data.items():
+                if record.principal and record.principal.id == user_id:
+                    self._data[key] = (keep_until, SessionRecord(record.data, record.expires_at))
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            keys = [k for k, (keep_until, _) in self._data.items() if keep_until <= now]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        return {"store": type(self).__name__, "size": len(self._data)}
+
+
+class DatabaseStore:
+    """Sessions in ``user_sessions`` behind a short-lived per-process cache."""
+
+    def __init__(self, engine, cache_size: int = 10000, cache_ttl: float = 5.0):
+        self.engine = engine
+        self.cache_ttl = cache_ttl
+        self._front = MemoryStore(maxsize=cache_size if cache_ttl > 0 else 0)
+        self.hits = 0
+        self.misses = 0
+
+    def _cache(self, key: str, record: SessionRecord) -> None:
+        if self.cache_ttl > 0:
+            self._front.save(key, record, ttl=self.cache_ttl)
+
+    def get(self, key: str) -> Optional[SessionRecord]:
+        cached = self._front.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(user_sessions).where(
+                    user_sessions.c.id == key, user_sessions.c.expires_at > time.time(),
+                )
+            ).first()
+        if row is None:
+            return None
+        principal = None
+        if row.login is not None:
+            principal = UserSnapshot(id=row.user_id, login=row.login, type=UserType(row.user_type))
+        record = SessionRecord(row.data, row.expires_at, principal, stored=True)
+        self._cache(key, record)
+        return record
+
+    def save(self, key: str, record: SessionRecord) -> None:
+        principal = record.principal
+        values = {
+            "user_id": principal.id if principal else None,
+            "login": principal.login if principal else None,
+            "user_type": principal.type.value if principal else None,
+            "data": record.data,
+            "expires_at": record.expires_at,
+        }
+        with self.engine.begin() as conn:
+            # keys are fresh random tokens, so update-then-insert cannot race
+            updated = conn.execute(update(user_sessions).where(user_sessions.c.id == key), values)
+            if updated.rowcount == 0:
+                if record.stored:
+                    # deleted by another worker (revoke_user, sweep) while
+                    # this one still had the record cached
+                    self._front.delete(key)
+                    return
+                conn.execute(insert(user_sessions), {"id": key, **values})
+        record.stored = True
+        self._cache(key, record)
+
+    def delete(self, key: str) -> None:
+        self._front.delete(key)
+        with self.engine.begin() as conn:
+            conn.execute(delete(user_sessions).where(user_sessions.c.id == key))
+
+    def revoke_user(self, user_id: int) -> int:
+        self._front.revoke_user(user_id)
+        with self.engine.begin() as conn:
+            return conn.execute(delete(user_sessions).where(user_sessions.c.user_id == user_id)).rowcount
+
+    def forget_user(self, user_id: int) -> None:
+        self._front.revoke_user(user_id)
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(user_sessions).where(user_sessions.c.user_id == user_id).values(login=None, user_type=None)
+            )
+
+    def sweep(self, batch: int = SWEEP_BATCH) -> int:
+        """Delete expired rows, ``batch`` at a time in short transactions."""
+        removed = 0
+        while True:
+            expired = select(user_sessions.c.id).where(
+                user_sessions.c.expires_at <= time.time()
+            ).limit(batch)
+            with self.engine.begin() as conn:
+                count = conn.execute(
+                    delete(user_sessions).where(user_sessions.c.id.in_(expired.scalar_subquery()))
+                ).rowcount
+            removed += count
+            if count < batch:
+                break
+        self._front.sweep()
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "store": type(self).__name__,
+            "size": self._front.stats()["size"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, token: Optional[str] = None,
+                 principal: Optional[UserSnapshot] = None, record: Optional[SessionRecord] = None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.token = token
+        self.principal = principal
+        # read from users during this request, so safe to store
+        self.loaded: Optional[UserSnapshot] = None
+        self.record = record
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store, sweep_every: float = 300.0):
+        self.store = store
+        self.sweep_every = sweep_every
+        self._next_sweep = time.monotonic() + sweep_every
+        self._sweep_lock = threading.Lock()
+
+    def open_session(self, app, request):
+        token = request.cookies.get(self.get_cookie_name(app))
+        if token:
+            record = self.store.get(token_key(token))
+            if record is not None:
+                return ServerSession(serializer.loads(record.data), token, record.principal, record)
+        return ServerSession()
+
+    def _current_principal(self, session: ServerSession) -> Optional[UserSnapshot]:
+        user_id = session.get("_user_id")
+        if user_id is None:
+            return None
+        # never g._login_user: it may be another worker's stale user_cache entry
+        for principal in (session.loaded, session.principal):
+            if principal is not None and str(principal.id) == str(user_id):
+                return principal
+        return None
+
+    def save_session(self, app, session: ServerSession, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.token:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.token:
+                self.store.delete(token_key(session.token))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        principal = self._current_principal(session)
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        record = session.record
+        changed_user = (principal and principal.id) != (session.principal and session.principal.id)
+        renew = record is None or record.expires_at - now < lifetime / 2
+        if not (session.modified or renew or principal != session.principal):
+            self._maybe_sweep()
+            return
+
+        if changed_user and session.token:
+            # new token on sign-in and sign-out (session fixation)
+            self.store.delete(token_key(session.token))
+            session.token = None
+        stored = bool(session.token and record and record.stored)
+        token = session.token or secrets.token_urlsafe(32)
+        self.store.save(
+            token_key(token), SessionRecord(serializer.dumps(dict(session)), now + lifetime, principal, stored),
+        )
+        if token != session.token or renew:
+            response.set_cookie(
+                name, token,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+            response.vary.add("Cookie")
+        self._maybe_sweep()
+
+    def _maybe_sweep(self) -> None:
+        if self.sweep_every <= 0 or time.monotonic() < self._next_sweep:
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = time.monotonic() + self.sweep_every
+            self.store.sweep()
+        finally:
+            self._sweep_lock.release()
+
+
+def session_principal(session) -> Optional[UserSnapshot]:
+    """Principal stored with a server-side session, if any."""
+    return getattr(session, "principal", None)
+
+
+def is_server_session(session) -> bool:
+    return isinstance(session, ServerSession)
+
+
+def principal_loaded(session, snapshot: UserSnapshot) -> None:
+    """Mark ``snapshot`` as read from ``users`` in this request, so it is stored with the session."""
+    if isinstance(session, ServerSession):
+        session.loaded = snapshot
+
+
+def forget_user(user_id: int) -> None:
+    """Drop ``user_id`` from the user cache and from the principals of its sessions.
+
+    For Core writes to ``users`` (``app.auth.update_password``), which
+    ``watch_sessions`` only sees through the ORM.
+    """
+    current_app.user_cache.invalidate(user_id)
+    if current_app.session_store is not None:
+        current_app.session_store.forget_user(user_id)
+
+
+def make_store(config, engine):
+    kind = config.get("SESSION_BACKEND", "database")
+    if kind == "memory":
+        return MemoryStore(maxsize=int(config.get("SESSION_CACHE_SIZE", 10000)))
+    if kind == "database":
+        return DatabaseStore(
+            engine,
+            cache_size=int(config.get("SESSION_CACHE_SIZE", 10000)),
+            cache_ttl=float(config.get("SESSION_CACHE_TTL", 5)),
+        )
+    if kind == "cookie":
+        return None
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind!r}")
+
+
+def init_app(app, engine) -> None:
+    """Install the server-side session interface; ``app.session_store`` is None for cookies."""
+    store = make_store(app.config, engine)
+    app.session_store = store
+    if store is not None:
+        app.session_interface = ServerSessionInterface(
+            store, sweep_every=float(app.config.get("SESSION_SWEEP_SECONDS", 300)),
+        )
+
+
+def _store():
+    store = current_app.session_store
+    if store is None:
+        raise click.ClickException("SESSION_BACKEND is 'cookie'; there is no session store")
+    return store
+
+
+@sessions.cli.command('sweep')
+def sweep_command():
+    """Delete expired sessions."""
+    click.echo(f"Removed {_store().sweep()} expired sessions")
+
+
+@sessions.cli.command('revoke')
+@click.argument('login')
+def revoke_command(login):
+    """Sign LOGIN out of every session."""
+    from app.auth import lookup_login
+    with current_app.db_session() as session:
+        row = lookup_login(session, login)
+    if row is None:
+        raise click.ClickException(f"No user {login!r}")
+    click.echo(f"Revoked {_store().revoke_user(row.id)} sessions of {login}")
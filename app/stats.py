@@ -0,0 +1,499 @@
+"""Leaderboards and statistics for horses, jockeys and owners.
+
+Instead of running GROUP BY over ``results`` on every request, every
+inserted, deleted or changed ``Result`` adjusts counters in ``result_stats``
+(see ``ResultStat``) inside the same transaction, and so does an ORM change
+of a race's venue or date or a horse's owner.  Each result touches
+four buckets per entity: (place, month), (place, all time),
+(all venues, month) and (all venues, all time), so an unfiltered
+leaderboard reads a handful of index entries and a date-range
+leaderboard only sums the monthly buckets of that range.
+"""
+import re
+from collections import defaultdict
+from typing import Iterable, Optional
+
+import click
+from flask import Blueprint, abort, current_app, jsonify, request
+from sqlalchemy import delete, event, func, inspect, select, update, insert
+from sqlalchemy.orm import Session
+
+from app.models import Horse, Jockey, Owner, Race, Result, ResultStat
+from app.race_time import format_race_time
+from app.seasons import source_connection, sources
+
+stats = Blueprint('stats', __name__, url_prefix='/stats')
+
+ENTITIES = {"horse": Horse, "jockey": Jockey, "owner": Owner}
+ORDERINGS = ("wins", "podiums", "avg_position", "starts")
+ALL = ""  # place / period value of the rollup buckets
+
+result_stats = ResultStat.__table__
+_COUNTERS = ("starts", "wins", "podiums", "position_sum")
+_MONTH_RE = re.compile(r"^(\d{4})-(\d{2})$")
+
+
+# --- maintenance -----------------------------------------------------------
+
+def result_deltas(rows: Iterable[dict]) -> dict:
+    """Fold resolved result rows into counter deltas keyed by bucket.
+
+    Every row needs ``horse_id``, ``jockey_id``, ``owner_id``, ``place``,
+    ``date`` and ``position``; an optional ``sign`` of -1 retracts a row.
+    Declared runners (position 0) are not starts and count nowhere.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for row in rows:
+        sign = row.get("sign", 1)
+        position = row["position"]
+        if not position or position < 0:
+            continue
+        month = row["date"].strftime("%Y-%m")
+        place = row["place"] or ALL
+        values = (
+            sign,
+            sign if position == 1 else 0,
+            sign if position <= 3 else 0,
+            sign * position,
+        )
+        for entity in ENTITIES:
+            entity_id = row[f"{entity}_id"]
+            if entity_id is None:
+                continue
+            for bucket in ((place, month), (place, ALL), (ALL, month), (ALL, ALL)):
+                acc = deltas[(entity, entity_id) + bucket]
+                for i, value in enumerate(values):
+                    acc[i] += value
+    return deltas
+
+
+def _upsert_stmt(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(result_stats)
+    return stmt.on_conflict_do_update(
+        index_elements=[c.name for c in result_stats.primary_key],
+        set_={name: result_stats.c[name] + stmt.excluded[name] for name in _COUNTERS},
+    )
+
+
+def apply_deltas(conn, deltas: dict) -> None:
+    """Add ``deltas`` (from ``result_deltas``) to ``result_stats``."""
+    if not deltas:
+        return
+    params = [
+        {"entity": key[0], "entity_id": key[1], "place": key[2], "period": key[3],
+         **dict(zip(_COUNTERS, values))}
+        for key, values in deltas.items()
+    ]
+    stmt = _upsert_stmt(conn.dialect.name)
+    if stmt is not None:
+        conn.execute(stmt, params)
+        return
+    for p in params:
+        pk = (
+            (result_stats.c.entity == p["entity"]) & (result_stats.c.entity_id == p["entity_id"])
+            & (result_stats.c.place == p["place"]) & (result_stats.c.period == p["period"])
+        )
+        updated = conn.execute(
+            update(result_stats).where(pk).values(
+                {name: result_stats.c[name] + p[name] for name in _COUNTERS}
+            )
+        )
+        if not updated.rowcount:
+            conn.execute(insert(result_stats), p)
+
+
+def record_results(conn, facts: Iterable[tuple]) -> None:
+    """Apply ``(sign, race_id, horse_id, jockey_id, position)`` facts.
+
+    Looks up venue/date of the races and current owner of the horses, then
+    updates the aggregates.
+    """
+    facts = list(facts)
+    if not facts:
+        return
+    race_ids = {f[1] for f in facts}
+    horse_ids = {f[2] for f in facts}
+    races = {
+        r.id: r for r in conn.execute(
+            select(Race.id, Race.place, Race.date).where(Race.id.in_(race_ids))
+        )
+    }
+    owners = dict(conn.execute(select(Horse.id, Horse.owner_id).where(Horse.id.in_(horse_ids))).all())
+    rows = []
+    for sign, race_id, horse_id, jockey_id, position in facts:
+        race = races.get(race_id)
+        if race is None or race.date is None:
+            continue
+        rows.append({
+            "sign": sign, "horse_id": horse_id, "jockey_id": jockey_id,
+            "owner_id": owners.get(horse_id), "place": race.place,
+            "date": race.date, "position": position,
+        })
+    apply_deltas(conn, result_deltas(rows))
+
+
+_TRACKED = ("race_id", "horse_id", "jockey_id", "position")
+_OWNER_MOVES = "stats:owner_moves"
+
+
+def _old_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_moves(session, flush_context, instances):
+    """Move the counted results of races and horses whose venue, date or owner change.
+
+    Reads the results before the flush, so exactly the ones the aggregates
+    hold; results added or removed in the same flush are counted with the
+    new values (see ``_track_results``).  Core UPDATEs of these columns
+    bypass this; run ``flask stats rebuild`` after them.
+    """
+    session.info.pop(_OWNER_MOVES, None)  # left over from a failed flush
+    races, horses = {}, {}
+    for obj in session.dirty:
+        if isinstance(obj, Race) and obj.id is not None:
+            old = (_old_value(obj, "place"), _old_value(obj, "date"))
+            if old != (obj.place, obj.date):
+                races[obj.id] = (old, (obj.place, obj.date))
+        elif isinstance(obj, Horse) and obj.id is not None:
+            state = inspect(obj)
+            # assigning horse.owner only sets owner_id during the flush
+            if state.attrs.owner.history.has_changes() or state.attrs.owner_id.history.has_changes():
+                horses[obj.id] = (obj, _old_value(obj, "owner_id"))
+    if not races and not horses:
+        return
+    conn = session.connection()
+    rows = []
+    if races:
+        stmt = (
+            select(Result.race_id, Result.horse_id, Result.jockey_id, Horse.owner_id, Result.position)
+            .join(Horse, Horse.id == Result.horse_id)
+            .where(Result.race_id.in_(races))
+        )
+        for race_id, horse_id, jockey_id, owner_id, position in conn.execute(stmt):
+            for sign, (place, date) in zip((-1, 1), races[race_id]):
+                if date is not None:
+                    rows.append({"sign": sign, "horse_id": horse_id, "jockey_id": jockey_id,
+                                 "owner_id": owner_id, "place": place, "date": date, "position": position})
+        apply_deltas(conn, result_deltas(rows))
+    if horses:
+        stmt = (
+            select(Result.race_id, Result.horse_id, Race.place, Race.date, Result.position)
+            .join(Race, Race.id == Result.race_id)
+            .where(Result.horse_id.in_(horses))
+        )
+        moves = defaultdict(list)
+        for race_id, horse_id, place, date, position in conn.execute(stmt):
+            if race_id in races:
+                # already moved to the race's new venue/date above
+                place, date = races[race_id][1]
+            if date is not None:
+                moves[horse_id].append({"place": place, "date": date, "position": position})
+        # the new owner id is known after the flush, see _apply_owner_moves
+        session.info[_OWNER_MOVES] = [(obj, old, moves[horse_id]) for horse_id, (obj, old) in horses.items()]
+
+
+def _apply_owner_moves(session) -> None:
+    rows = []
+    for horse, old, results in session.info.pop(_OWNER_MOVES, ()):
+        if horse.owner_id == old:
+            continue
+        for sign, owner_id in ((-1, old), (1, horse.owner_id)):
+            rows.extend({**row, "sign": sign, "horse_id": None, "jockey_id": None, "owner_id": owner_id}
+                        for row in results)
+    apply_deltas(session.connection(), result_deltas(rows))
+
+
+def _values(obj, old: bool) -> tuple:
+    state = inspect(obj)
+    values = []
+    for key in _TRACKED:
+        history = state.attrs[key].history
+        if old and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(obj, key))
+    return tuple(values)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_results(session, flush_context):
+    _apply_owner_moves(session)
+    facts = []
+    for obj in session.new:
+        if isinstance(obj, Result):
+            facts.append((1,) + _values(obj, old=False))
+    for obj in session.deleted:
+        if isinstance(obj, Result):
+            facts.append((-1,) + _values(obj, old=True))
+    for obj in session.dirty:
+        if isinstance(obj, Result) and session.is_modified(obj):
+            old, new = _values(obj, old=True), _values(obj, old=False)
+            if old != new:
+                facts.append((-1,) + old)
+                facts.append((1,) + new)
+    if facts:
+        record_results(session.connection(), facts)
+
+
+def _rebuild_query(race, result, chunk_size: int):
+    return (
+        select(result.horse_id, result.jockey_id, Horse.owner_id, race.place, race.date, result.position)
+        .join(race, result.race_id == race.id)
+        .join(Horse, result.horse_id == Horse.id)
+        .where(result.position > 0)
+        .execution_options(yield_per=chunk_size)
+    )
+
+
+def rebuild(session: Session, chunk_size: int = 10000) -> int:
+    """Recompute ``result_stats`` from scratch; returns the number of counted results.
+
+    Archived seasons are folded into one set of deltas first, each read on
+    a connection of its own, before the session starts writing.
+    """
+    total = 0
+    archives = defaultdict(lambda: [0, 0, 0, 0])
+    for source in sources(session.connection())[:-1]:
+        stmt = _rebuild_query(source.race, source.result, chunk_size)
+        with source_connection(session.get_bind(), source) as conn:
+            for partition in conn.execute(stmt).mappings().partitions():
+                for key, values in result_deltas(partition).items():
+                    archives[key] = [a + b for a, b in zip(archives[key], values)]
+                total += len(partition)
+
+    session.execute(delete(result_stats))
+    apply_deltas(session.connection(), archives)
+    for partition in session.execute(_rebuild_query(Race, Result, chunk_size)).mappings().partitions():
+        apply_deltas(session.connection(), result_deltas(partition))
+        total += len(partition)
+    return total
+
+
+# --- queries ---------------------------------------------------------------
+
+def _row_dict(row) -> dict:
+    return {
+        "id": row.entity_id,
+        "starts": row.starts,
+        "wins": row.wins,
+        "podiums": row.podiums,
+        "avg_position": round(row.position_sum / row.starts, 2) if row.starts else None,
+    }
+
+
+def _bucket_query(entity: str, place: str, month_from: Optional[str], month_to: Optional[str]):
+    t = result_stats
+    if month_from is None and month_to is None:
+        return select(
+            t.c.entity_id, t.c.starts, t.c.wins, t.c.podiums, t.c.position_sum
+        ).where(t.c.entity == entity, t.c.place == place, t.c.period == ALL)
+
+    conditions = [t.c.entity == entity, t.c.place == place, t.c.period != ALL]
+    if month_from:
+        conditions.append(t.c.period >= month_from)
+    if month_to:
+        conditions.append(t.c.period <= month_to)
+    return (
+        select(
+            t.c.entity_id,
+            func.sum(t.c.starts).label("starts"),
+            func.sum(t.c.wins).label("wins"),
+            func.sum(t.c.podiums).label("podiums"),
+            func.sum(t.c.position_sum).label("position_sum"),
+        )
+        .where(*conditions)
+        .group_by(t.c.entity_id)
+    )
+
+
+def leaderboard(
+    session: Session,
+    entity: str,
+    place: str = ALL,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+    order: str = "wins",
+    limit: int = 20,
+    min_starts: int = 1,
+) -> list:
+    model = ENTITIES[entity]
+    sub = _bucket_query(entity, place, month_from, month_to).subquery()
+    if order == "avg_position":
+        ordering = [(sub.c.position_sum * 1.0 / sub.c.starts).asc()]
+    else:
+        ordering = [sub.c[order].desc()]
+    stmt = (
+        select(sub)
+        .where(sub.c.starts >= min_starts)
+        .order_by(*ordering, sub.c.entity_id)
+        .limit(limit)
+    )
+    rows = [_row_dict(r) for r in session.execute(stmt)]
+    names = dict(session.execute(
+        select(model.id, model.name).where(model.id.in_([r["id"] for r in rows]))
+    ).all())
+    for r in rows:
+        r["name"] = names.get(r["id"])
+    return rows
+
+
+def entity_stats(
+    session: Session,
+    entity: str,
+    entity_id: int,
+    place: str = ALL,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+) -> Optional[dict]:
+    sub = _bucket_query(entity, place, month_from, month_to).subquery()
+    row = session.execute(select(sub).where(sub.c.entity_id == entity_id)).first()
+    return _row_dict(row) if row else None
+
+
+def personal_best(session: Session, horse_id: int) -> Optional[int]:
+    """Fastest ``race_time_ms`` of a horse (index scan on ix_results_horse_time)."""
+    return session.scalar(
+        select(Result.race_time_ms)
+        .where(Result.horse_id == horse_id, Result.race_time_ms.is_not(None))
+        .order_by(Result.race_time_ms)
+        .limit(1)
+    )
+
+
+def winning_time(session: Session, race_id: int) -> Optional[int]:
+    """Winner's ``race_time_ms`` (index lookup on ix_results_race_position)."""
+    return session.scalar(
+        select(Result.race_time_ms).where(Result.race_id == race_id, Result.position == 1).limit(1)
+    )
+
+
+def track_record(session: Session, place: str):
+    """Fastest finish at ``place``: ``(race_time_ms, horse_id, race_id)`` or None.
+
+    The races at ``place`` come from ``ix_races_place_date_time_id`` and each
+    one's fastest time is a single seek in ``ix_results_race_time``, so the
+    cost grows with the races at the venue, not with their runners.
+    """
+    best = (
+        select(Result.race_time_ms)
+        .where(Result.race_id == Race.id, Result.race_time_ms.is_not(None), Result.position > 0)
+        .order_by(Result.race_time_ms).limit(1).scalar_subquery()
+    )
+    fastest = (
+        select(Race.id.label("race_id"), best.label("best"))
+        .where(Race.place == place)
+        .subquery()
+    )
+    fastest = (
+        select(fastest).where(fastest.c.best.is_not(None)).order_by(fastest.c.best).limit(1).subquery()
+    )
+    return session.execute(
+        select(Result.race_time_ms, Result.horse_id, Result.race_id)
+        .join(fastest, (Result.race_id == fastest.c.race_id) & (Result.race_time_ms == fastest.c.best))
+        .where(Result.position > 0)
+        .order_by(Result.id)
+        .limit(1)
+    ).first()
+
+
+# --- views -----------------------------------------------------------------
+
+def _month_arg(name: str) -> Optional[str]:
+    value = request.args.get(name)
+    if not value:
+        return None
+    match = _MONTH_RE.match(value)
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        # buckets are monthly, so a day would silently widen to its whole month
+        abort(400, description=f"'{name}' must be a month, YYYY-MM")
+    return f"{match.group(1)}-{match.group(2)}"
+
+
+def _entity_arg(entity: str) -> str:
+    if entity not in ENTITIES:
+        abort(404)
+    return entity
+
+
+@stats.route('/<entity>/leaderboard')
+def leaderboard_view(entity):
+    entity = _entity_arg(entity)
+    order = request.args.get('order', 'wins')
+    if order not in ORDERINGS:
+        abort(400, description=f"'order' must be one of {', '.join(ORDERINGS)}")
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    min_starts = request.args.get('min_starts', 1, type=int)
+
+    session = current_app.db_session()
+    try:
+        rows = leaderboard(
+            session, entity,
+            place=request.args.get('place', ALL),
+            month_from=_month_arg('from'),
+            month_to=_month_arg('to'),
+            order=order, limit=limit, min_starts=min_starts,
+        )
+    finally:
+        session.close()
+    return jsonify({"entity": entity, "order": order, "results": rows})
+
+
+@stats.route('/<entity>/<int:entity_id>')
+def entity_view(entity, entity_id):
+    entity = _entity_arg(entity)
+    session = current_app.db_session()
+    try:
+        row = entity_stats(
+            session, entity, entity_id,
+            place=request.args.get('place', ALL),
+            month_from=_month_arg('from'),
+            month_to=_month_arg('to'),
+        )
+        if row is not None and entity == "horse":
+            best = personal_best(session, entity_id)
+            row["personal_best"] = format_race_time(best) or None
+            row["personal_best_ms"] = best
+    finally:
+        session.close()
+    if row is None:
+        abort(404)
+    return jsonify({"entity": entity, **row})
+
+
+@stats.route('/track-record/<place>')
+def track_record_view(place):
+    session = current_app.db_session()
+    try:
+        record = track_record(session, place)
+    finally:
+        session.close()
+    if record is None:
+        abort(404)
+    return jsonify({
+        "place": place,
+        "race_time": format_race_time(record.race_time_ms),
+        "race_time_ms": record.race_time_ms,
+        "horse_id": record.horse_id,
+        "race_id": record.race_id,
+    })
+
+
+@stats.cli.command('rebuild')
+def rebuild_command():
+    """Recompute result_stats from the results table."""
+    session = current_app.db_session()
+    try:
+        total = rebuild(session)
+        session.commit()
+    finally:
+        session.close()
+    click.echo(f"Rebuilt statistics from {total} results")
@@ -0,0 +1,128 @@
+"""Per-process cache of authenticated users for Flask-Login.
+
+``load_user`` runs on every request of a logged-in user, so instead of
+opening a session and hydrating an ORM ``User`` each time we keep small,
+detached, read-only snapshots keyed by user id.  Entries expire after a TTL
+and the least recently used ones are evicted once the cache is full.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from app.models import User, UserType
+
+
+@dataclass(frozen=True)
+class UserSnapshot(UserMixin):
+    """Read-only copy of the fields the views need from ``User``."""
+
+    id: int
+    login: str
+    type: UserType
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(id=user.id, login=user.login, type=user.type)
+
+    @property
+    def is_admin(self) -> bool:
+        return self.type == UserType.ADMIN
+
+
+class UserCache:
+    """Thread-safe TTL + LRU cache of ``UserSnapshot`` objects."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Optional[UserSnapshot]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= now:
+                del self._data[user_id]
+                self.misses += 1
+                return None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return snapshot
+
+    def put(self, snapshot: UserSnapshot) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[snapshot.id] = (time.monotonic() + self.ttl, snapshot)
+            self._data.move_to_end(snapshot.id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            if self._data.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def watch_sessions(cache: UserCache, session_factory, *callbacks) -> None:
+    """Invalidate cached users whenever a session commits changes to them.
+
+    Any flush that updates or deletes a ``User`` (password change, role
+    change, removal) remembers its id; the ids are dropped from the cache
+    only after the transaction commits, so a rollback keeps the cache valid.
+    Each of ``callbacks`` is then called with the user id as well.
+    """
+
+    @event.listens_for(session_factory, "after_flush")
+    def _collect(session, flush_context):
+        pending = session.info.setdefault("user_cache_invalidate", set())
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User) and obj.id is not None:
+                pending.add(obj.id)
+
+    @event.listens_for(session_factory, "after_commit")
+    def _invalidate(session):
+        for user_id in session.info.pop("user_cache_invalidate", ()):
+            cache.invalidate(user_id)
+            for callback in callbacks:
+                callback(user_id)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _discard(session):
+        session.info.pop("user_cache_invalidate", None)
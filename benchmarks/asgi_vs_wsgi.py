@@ -0,0 +1,186 @@
+"""WSGI (gunicorn sync/gthread) vs. ASGI (uvicorn) on the same routes.
+
+Seeds a temporary database with one user, starts each server with the same
+number of worker processes and drives it with asyncio clients that log in
+and load the home page.  ``--slow-ms`` makes every client dribble its
+request headers, to show how many slow connections each model can hold.
+
+    python -m benchmarks.asgi_vs_wsgi --servers gthread,uvicorn --clients 50,500 \\
+        --workers 2 --duration 10 --slow-ms 200
+
+Needs uvicorn, asgiref and aiosqlite for the ASGI runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from app.metrics import percentile
+from benchmarks.loadtest import _csv, free_port, wait_for_port
+
+SERVERS = {
+    "sync": ["--worker-class", "sync", "app:create_app()"],
+    "gthread": ["--worker-class", "gthread", "--threads", "8", "app:create_app()"],
+    "uvicorn": ["--worker-class", "uvicorn.workers.UvicornWorker", "app.asgi:create_asgi_app()"],
+}
+LOGIN = "bench"
+PASSWORD = "bench-password"
+
+
+def seed(env: dict) -> None:
+    code = (
+        "from app import create_app\n"
+        "from app.auth import create_user\n"
+        "app = create_app()\n"
+        "with app.db_session() as s:\n"
+        f"    create_user(s, {LOGIN!r}, app.password_hasher.hash({PASSWORD!r}))\n"
+        "    s.commit()\n"
+    )
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+
+async def _request(reader, writer, method, path, body=b"", cookie=None, slow_s=0.0):
+    head = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1"]
+    if body:
+        head += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+    if cookie:
+        head.append(f"Cookie: {cookie}")
+    request = ("\r\n".join(head) + "\r\n\r\n").encode() + body
+    if slow_s:
+        half = len(request) // 2
+        writer.write(request[:half])
+        await writer.drain()
+        await asyncio.sleep(slow_s)
+        request = request[half:]
+    writer.write(request)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length, set_cookie = 0, None
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "set-cookie":
+            set_cookie = value.strip().split(";", 1)[0]
+    await reader.readexactly(length)
+    return status, set_cookie
+
+
+async def _drive(port: int, clients: int, duration: float, slow_s: float) -> dict:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    body = urlencode({"login": LOGIN, "password": PASSWORD}).encode()
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            except OSError:
+                errors += 1
+                await asyncio.sleep(0.05)
+                continue
+            try:
+                cookie = None
+                for method, path, payload in (("POST", "/login", body), ("GET", "/", b"")):
+                    if time.perf_counter() >= deadline:
+                        break
+                    start = time.perf_counter()
+                    status, set_cookie = await asyncio.wait_for(
+                        _request(reader, writer, method, path, payload, cookie, slow_s), timeout=30,
+                    )
+                    cookie = set_cookie or cookie
+                    if status >= 500:
+                        errors += 1
+                    else:
+                        latencies.append((time.perf_counter() - start) * 1000)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors += 1
+            finally:
+                writer.close()
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_sec": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def run_server(server: str, args, env: dict, clients: int) -> dict:
+    port = free_port()
+    argv = [
+        sys.executable, "-m", "gunicorn", "--workers", str(args.workers),
+        "--bind", f"127.0.0.1:{port}", "--log-level", "warning",
+        "--worker-connections", str(max(1000, clients)), *SERVERS[server],
+    ]
+    proc = subprocess.Popen(argv, env=env)
+    try:
+        wait_for_port(port)
+        asyncio.run(_drive(port, min(clients, 8), 1.0, 0))  # warm-up
+        result = asyncio.run(_drive(port, clients, args.duration, args.slow_ms / 1000))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {"server": server, "workers": args.workers, "clients": clients, "slow_ms": args.slow_ms, **result}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", type=_csv(str), default=["sync", "gthread", "uvicorn"])
+    parser.add_argument("--clients", type=_csv(int), default=[50, 500])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="pause inside every request")
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:1000",
+                        help="cheap by default, to measure serving rather than hashing")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.servers) - set(SERVERS)
+    if unknown:
+        parser.error(f"unknown servers: {', '.join(sorted(unknown))}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+            PASSWORD_HASH_METHOD=args.hash_method,
+            SERVER_TIMING="0",
+            SLOW_QUERY_MS="60000",
+            PAGE_CACHE_BACKEND="none",
+            RATE_LIMIT_BACKEND="none",
+        )
+        seed(env)
+        for server in args.servers:
+            for clients in args.clients:
+                result = run_server(server, args, env, clients)
+                results.append(result)
+                print(
+                    f"{server:<8} clients={clients:<5} {result['req_per_sec']:>9} req/s  "
+                    f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                    f"errors={result['errors']}"
+                )
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Head-to-head matrices for race cards over a synthetic results history.
+
+Builds ``ResultArrays`` from ``--races`` races of ``--field`` runners (the
+same generator as ``bench_ratings``), then times the horse head-to-head
+matrix and the form figures for ``--cards`` random cards of ``--card``
+runners, i.e. what ``FormAnalysis`` does on a cache miss apart from the
+two name lookups.
+
+    python -m benchmarks.bench_analysis --races 100000 --card 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.analysis import ResultArrays
+from benchmarks.bench_ratings import synthetic
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--races", type=int, default=100000)
+    parser.add_argument("--field", type=int, default=10)
+    parser.add_argument("--horses", type=int, default=20000)
+    parser.add_argument("--jockeys", type=int, default=400)
+    parser.add_argument("--card", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    race_of_row, horse, jockey, position = synthetic(args.races, args.field, args.horses, args.jockeys)
+    started = time.perf_counter()
+    arrays = ResultArrays(np.arange(1, len(horse) + 1), race_of_row, horse, jockey, position, race_of_row * 600)
+    print(f"index: {len(arrays)} results in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    rng = np.random.default_rng(2)
+    spent = []
+    for _ in range(args.cards):
+        card = rng.choice(args.horses, args.card, replace=False)
+        started = time.perf_counter()
+        arrays.head_to_head("horse", card)
+        for horse_id in card.tolist():
+            arrays.form("horse", horse_id)
+        spent.append(time.perf_counter() - started)
+    spent = np.array(spent) * 1000
+    print(f"card of {args.card}: median {np.median(spent):.2f}ms, max {spent.max():.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Login throughput at several password hashing cost settings.
+
+For every method the script creates an app backed by a temporary SQLite
+database, registers one user and then fires concurrent ``POST /login``
+requests through the Flask test client from a thread pool.  It reports
+successful logins per second, how many requests were rejected with 503
+because the hashing queue was full, and the latency of ``GET /`` measured
+while the login storm is running.
+
+    python -m benchmarks.bench_hashing --workers 2 --requests 200
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:100000",
+    "pbkdf2:sha256:600000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+]
+
+
+def make_app(db_path, method, workers, queue_limit):
+    class BenchConfig:
+        SECRET_KEY = "bench"
+        DATABASE_URL = f"sqlite:///{db_path}"
+        PASSWORD_HASH_METHOD = method
+        HASH_POOL_WORKERS = workers
+        HASH_QUEUE_LIMIT = queue_limit
+        # every request comes from the same address and login
+        RATE_LIMIT_BACKEND = "none"
+
+    return create_app(BenchConfig)
+
+
+def run_one(method, requests, concurrency, workers, queue_limit):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(f"{tmp}/bench.db", method, workers, queue_limit)
+        app.test_client().post("/register", data={"login": "bench", "password": "bench-pass"})
+
+        def login(_):
+            client = app.test_client()
+            return client.post("/login", data={"login": "bench", "password": "bench-pass"}).status_code
+
+        index_latencies = []
+        stop = threading.Event()
+
+        def probe_index():
+            client = app.test_client()
+            while not stop.is_set():
+                start = time.perf_counter()
+                client.get("/")
+                index_latencies.append((time.perf_counter() - start) * 1000)
+                time.sleep(0.01)
+
+        probe = threading.Thread(target=probe_index, daemon=True)
+        probe.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(login, range(requests)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        probe.join()
+        app.password_hasher.shutdown()
+        app.db_engine.dispose()
+
+    ok = statuses.count(302)
+    return {
+        "method": method,
+        "requests": requests,
+        "concurrency": concurrency,
+        "pool_workers": workers,
+        "ok": ok,
+        "rejected": statuses.count(503),
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(ok / elapsed, 1) if elapsed else 0.0,
+        "index_p50_ms": round(statistics.median(index_latencies), 2) if index_latencies else None,
+        "index_max_ms": round(max(index_latencies), 2) if index_latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--method", action="append", dest="methods",
+                        help="hash method to test, may be repeated")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2, help="hashing pool size (0 = inline)")
+    parser.add_argument("--queue-limit", type=int, default=32)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for method in args.methods or DEFAULT_METHODS:
+        result = run_one(method, args.requests, args.concurrency, args.workers, args.queue_limit)
+        results.append(result)
+        print(
+            f"{method:<24} {result['logins_per_sec']:>8} logins/s  "
+            f"ok={result['ok']} rejected={result['rejected']}  "
+            f"GET / p50={result['index_p50_ms']}ms max={result['index_max_ms']}ms"
+        )
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Cost of a login rate-limit check next to the password hash it guards.
+
+Times ``LoginLimiter.check`` for allowed and rejected attempts with the
+in-process buckets and, with ``--db``, with the shared ``rate_limits``
+table on a temporary SQLite database.  For scale it also times one
+``PasswordHasher.verify`` with ``--hash-method``.
+
+    python -m benchmarks.bench_ratelimit --checks 100000 --db
+"""
+import argparse
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from app.hashing import PasswordHasher
+from app.ratelimit import DatabaseBuckets, LoginLimiter, Rate, RateLimited, rate_limits
+
+
+def time_checks(limiter, checks: int, addresses: int):
+    """Mean microseconds per allowed and per rejected check."""
+    spent = {True: 0.0, False: 0.0}
+    counts = {True: 0, False: 0}
+    for i in range(checks):
+        ip, login = f"10.0.{i % addresses // 256}.{i % 256}", f"user{i % addresses}"
+        started = time.perf_counter()
+        try:
+            limiter.check(ip, login)
+            allowed = True
+        except RateLimited:
+            allowed = False
+        spent[allowed] += time.perf_counter() - started
+        counts[allowed] += 1
+    return {
+        key: (spent[key] / counts[key] * 1e6 if counts[key] else 0.0, counts[key]) for key in (True, False)
+    }
+
+
+def report(name, results):
+    for allowed, label in ((True, "allowed"), (False, "rejected")):
+        us, count = results[allowed]
+        print(f"{name:<9} {label:<9} {count:>8} checks  {us:8.1f} us/check")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=100000)
+    parser.add_argument("--addresses", type=int, default=1000, help="distinct clients cycled through")
+    parser.add_argument("--per-ip", default="20/60")
+    parser.add_argument("--per-login", default="5/300")
+    parser.add_argument("--db", action="store_true", help="also time the shared rate_limits table")
+    parser.add_argument("--hash-method", default="scrypt")
+    args = parser.parse_args(argv)
+    per_ip, per_login = Rate.parse(args.per_ip), Rate.parse(args.per_login)
+
+    report("memory", time_checks(LoginLimiter(per_ip, per_login), args.checks, args.addresses))
+
+    if args.db:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{tmp}/ratelimit.db")
+            rate_limits.create(engine)
+            limiter = LoginLimiter(per_ip, per_login, shared=DatabaseBuckets(engine))
+            report("database", time_checks(limiter, min(args.checks, 20000), args.addresses))
+            engine.dispose()
+
+    hasher = PasswordHasher(method=args.hash_method)
+    stored = hasher.hash("bench-pass")
+    started = time.perf_counter()
+    hasher.verify(stored, "wrong-pass")
+    print(f"{'hash':<9} {args.hash_method:<9} {'1':>8} verify  {(time.perf_counter() - started) * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
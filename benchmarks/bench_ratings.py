@@ -0,0 +1,86 @@
+"""Full rating recompute over a synthetic results history.
+
+Generates ``--races`` races of ``--field`` runners drawn from
+``--horses`` horses and ``--jockeys`` jockeys, then times the NumPy
+computation (``app.ratings.compute``) and, with ``--db``, a complete
+``rebuild`` against a temporary SQLite database including the reads and
+the ``rating_history`` writes.
+
+    python -m benchmarks.bench_ratings --races 100000 --field 10 --db
+"""
+import argparse
+import datetime as dt
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+
+from app.models import Base, Horse, Jockey, Owner, Race, Result
+from app.ratings import INITIAL_RATING, compute, rebuild
+
+
+def synthetic(races: int, field: int, horses: int, jockeys: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    race_of_row = np.repeat(np.arange(races), field)
+    # distinct runners within every race
+    horse = np.concatenate([rng.choice(horses, field, replace=False) for _ in range(races)])
+    jockey = np.concatenate([rng.choice(jockeys, field, replace=False) for _ in range(races)])
+    position = np.tile(np.arange(1, field + 1), races)
+    return race_of_row, horse, jockey, position
+
+
+def fill_db(engine, race_of_row, horse, jockey, position, horses, jockeys):
+    start = dt.date(2000, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Owner), [{"id": 1, "name": "Stable"}])
+        conn.execute(insert(Horse), [
+            {"id": i + 1, "name": f"H{i}", "gender": "male", "age": 4, "owner_id": 1} for i in range(horses)
+        ])
+        conn.execute(insert(Jockey), [
+            {"id": i + 1, "name": f"J{i}", "age": 30, "rating": INITIAL_RATING} for i in range(jockeys)
+        ])
+        races = int(race_of_row[-1]) + 1
+        conn.execute(insert(Race), [
+            {"id": r + 1, "date": start + dt.timedelta(days=r // 8), "time": dt.time(10 + r % 8), "place": "M"}
+            for r in range(races)
+        ])
+        rows = np.column_stack((race_of_row + 1, horse + 1, jockey + 1, position)).tolist()
+        for i in range(0, len(rows), 50000):
+            conn.execute(insert(Result), [
+                {"race_id": r, "race_date": start + dt.timedelta(days=(r - 1) // 8), "horse_id": h,
+                 "jockey_id": j, "position": p, "race_time": ""}
+                for r, h, j, p in rows[i:i + 50000]
+            ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--races", type=int, default=100000)
+    parser.add_argument("--field", type=int, default=10)
+    parser.add_argument("--horses", type=int, default=20000)
+    parser.add_argument("--jockeys", type=int, default=400)
+    parser.add_argument("--db", action="store_true", help="also time rebuild() on SQLite")
+    args = parser.parse_args(argv)
+
+    race_of_row, horse, jockey, position = synthetic(args.races, args.field, args.horses, args.jockeys)
+    started = time.perf_counter()
+    compute(race_of_row, position, {
+        "horse": (horse, np.full(args.horses, INITIAL_RATING)),
+        "jockey": (jockey, np.full(args.jockeys, INITIAL_RATING)),
+    })
+    print(f"compute: {len(race_of_row)} results in {time.perf_counter() - started:.2f}s")
+
+    if args.db:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{tmp}/ratings.db")
+            Base.metadata.create_all(engine)
+            fill_db(engine, race_of_row, horse, jockey, position, args.horses, args.jockeys)
+            started = time.perf_counter()
+            total = rebuild(engine)
+            print(f"rebuild: {total} results in {time.perf_counter() - started:.2f}s")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Throughput vs. gunicorn worker model and connection pool settings.
+
+Starts a real gunicorn for every combination of worker class, worker
+count, threads and pool size, drives it with concurrent HTTP clients for
+a fixed time and reports requests/s and latency percentiles.
+
+    python -m benchmarks.loadtest --worker-class sync,gthread --workers 2,4 \\
+        --threads 4 --pool-size 2,5 --paths /,/login --duration 10
+
+Uses a temporary SQLite database unless --database-url is given
+(e.g. the Postgres from docker-compose.yml).
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from app.metrics import percentile
+
+
+def _csv(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+
+def drive(port: int, paths: list, clients: int, duration: float) -> dict:
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(n):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        local = []
+        for path in itertools.cycle(paths[n % len(paths):] + paths[:n % len(paths)]):
+            if time.perf_counter() >= deadline:
+                break
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                conn.getresponse().read()
+                local.append((time.perf_counter() - start) * 1000)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "req_per_sec": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def run_combination(args, worker_class, workers, threads, pool_size) -> dict:
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        DB_POOL_SIZE=str(pool_size),
+        DB_MAX_OVERFLOW="0",
+        SERVER_TIMING="0",
+    )
+    argv = [
+        sys.executable, "-m", "gunicorn",
+        "--workers", str(workers), "--worker-class", worker_class,
+        "--threads", str(threads), "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning", "app:create_app()",
+    ]
+    proc = subprocess.Popen(argv, env=env)
+    try:
+        wait_for_port(port)
+        drive(port, args.paths, args.clients, min(2.0, args.duration))  # warm-up
+        result = drive(port, args.paths, args.clients, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        "worker_class": worker_class, "workers": workers, "threads": threads,
+        "pool_size": pool_size, "clients": args.clients, **result,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--worker-class", type=_csv(str), default=["sync", "gthread"])
+    parser.add_argument("--workers", type=_csv(int), default=[2, 4])
+    parser.add_argument("--threads", type=_csv(int), default=[4])
+    parser.add_argument("--pool-size", type=_csv(int), default=[5])
+    parser.add_argument("--paths", type=_csv(str), default=["/", "/login", "/register"])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--database-url")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    if not args.database_url:
+        tmp = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{tmp.name}/loadtest.db"
+
+    results = []
+    try:
+        for worker_class, workers, threads, pool_size in itertools.product(
+            args.worker_class, args.workers, args.threads, args.pool_size
+        ):
+            if worker_class == "sync" and threads != args.threads[0]:
+                continue  # threads do not apply to sync workers
+            result = run_combination(args, worker_class, workers, threads if worker_class != "sync" else 1, pool_size)
+            results.append(result)
+            print(
+                f"{worker_class:<8} w={workers:<3} t={result['threads']:<3} pool={pool_size:<3} "
+                f"{result['req_per_sec']:>9} req/s  p50={result['p50_ms']}ms "
+                f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}"
+            )
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
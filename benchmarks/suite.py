@@ -0,0 +1,403 @@
+"""Route benchmark suite with JSON baselines for regression comparison.
+
+Seeds a database with users, owners, horses, jockeys, races and results
+(``--scale`` multiplies the base sizes in ``BASE_SCALE``), then drives the
+``main`` routes (``/``, ``/register``, ``/login``, ``/logout``,
+``/admin``) and ``/schedule`` either through the Flask test client in
+this process or over HTTP against a real gunicorn.  For every route it
+reports requests/s, p50/p95/p99 latency and queries per request; the
+query count is read from the ``Server-Timing`` header, so it works
+across the process boundary too.
+
+    python -m benchmarks.suite --target testclient --requests 500 --json base.json
+    python -m benchmarks.suite --target gunicorn --workers 2 --clients 16 --duration 10
+    python -m benchmarks.suite --compare base.json --json new.json --tolerance 15
+
+Uses a temporary SQLite database unless --database-url is given (e.g. the
+Postgres from docker-compose.yml; its tables are dropped and re-seeded).
+Rate limiting is switched off and password hashing made cheap by default,
+so the numbers measure serving rather than the limiter or the hash.
+"""
+import argparse
+import datetime as dt
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from urllib.parse import quote, urlencode
+
+from sqlalchemy import insert
+
+from app import create_app
+from app.metrics import percentile
+from app.models import Base, Horse, Jockey, Owner, Race, Result, User, UserType
+from app.race_time import format_race_time
+from benchmarks.loadtest import free_port, wait_for_port
+
+BASE_SCALE = {"users": 200, "owners": 50, "horses": 1000, "jockeys": 100, "races": 2000, "field": 8}
+PLACES = ["Москва", "Казань", "Пятигорск", "Ростов", "Краснодар"]
+PASSWORD = "bench-password"
+ADMIN = "bench-admin"
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    auth: Optional[str] = None  # None, "user" or "admin": signed in before every timed request
+    body: Optional[Callable[[str], dict]] = None
+
+
+SCENARIOS = [
+    Scenario("index", "GET", "/"),
+    Scenario("register_form", "GET", "/register"),
+    Scenario("register", "POST", "/register", body=lambda tag: {"login": f"new-{tag}", "password": PASSWORD}),
+    Scenario("login_form", "GET", "/login"),
+    Scenario("login", "POST", "/login", body=lambda tag: {"login": "user-1", "password": PASSWORD}),
+    Scenario("login_failed", "POST", "/login", body=lambda tag: {"login": "user-2", "password": "wrong"}),
+    Scenario("index_signed_in", "GET", "/", auth="user"),
+    Scenario("logout", "POST", "/logout", auth="user"),
+    Scenario("admin", "GET", "/admin", auth="admin"),
+    Scenario("schedule", "GET", "/schedule?format=json"),
+    Scenario("schedule_place", "GET", f"/schedule?format=json&place={quote(PLACES[0])}"),
+]
+
+
+class SuiteConfig:
+    TESTING = False
+    SECRET_KEY = "bench"
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    RATE_LIMIT_BACKEND = "none"
+    SERVER_TIMING = True
+    SLOW_QUERY_MS = 60000
+
+
+def make_config(args):
+    return type("Config", (SuiteConfig,), {
+        "DATABASE_URL": args.database_url,
+        "PASSWORD_HASH_METHOD": args.hash_method,
+        "PAGE_CACHE_BACKEND": args.page_cache,
+        "SESSION_BACKEND": args.session_backend,
+    })
+
+
+def seed(app, scale: float, seed_value: int = 1) -> dict:
+    """Fill an empty schema; returns the row counts."""
+    sizes = {k: max(1, int(v * scale)) if k != "field" else v for k, v in BASE_SCALE.items()}
+    rng = random.Random(seed_value)
+    engine = app.db_engine
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    password = app.password_hasher.hash(PASSWORD)
+    # six races a day, the last tenth of them still to come
+    start = dt.date.today() - dt.timedelta(days=sizes["races"] * 9 // 60)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"login": ADMIN, "password": password, "type": UserType.ADMIN}] + [
+            {"login": f"user-{i}", "password": password, "type": UserType.PEASANT} for i in range(sizes["users"])
+        ])
+        conn.execute(insert(Owner), [{"id": i + 1, "name": f"Владелец {i}"} for i in range(sizes["owners"])])
+        conn.execute(insert(Horse), [
+            {"id": i + 1, "name": f"Лошадь {i}", "gender": rng.choice(["male", "female"]),
+             "age": rng.randint(2, 12), "owner_id": rng.randint(1, sizes["owners"])}
+            for i in range(sizes["horses"])
+        ])
+        conn.execute(insert(Jockey), [
+            {"id": i + 1, "name": f"Жокей {i}", "age": rng.randint(18, 50), "rating": 1500.0}
+            for i in range(sizes["jockeys"])
+        ])
+        conn.execute(insert(Race), [
+            {"id": r + 1, "date": start + dt.timedelta(days=r // 6), "time": dt.time(11 + r % 6),
+             "starts_at": dt.datetime.combine(start + dt.timedelta(days=r // 6), dt.time(11 + r % 6)),
+             "place": rng.choice(PLACES), "title": f"Заезд {r + 1}"}
+            for r in range(sizes["races"])
+        ])
+        field = min(sizes["field"], sizes["horses"], sizes["jockeys"])
+        rows = []
+        for r in range(sizes["races"]):
+            horses = rng.sample(range(1, sizes["horses"] + 1), field)
+            jockeys = rng.sample(range(1, sizes["jockeys"] + 1), field)
+            ms = rng.randint(90000, 110000)
+            for position, (horse, jockey) in enumerate(zip(horses, jockeys), start=1):
+                ms += rng.randint(0, 800)
+                rows.append({"race_id": r + 1, "race_date": start + dt.timedelta(days=r // 6), "horse_id": horse,
+                             "jockey_id": jockey, "position": position,
+                             "race_time": format_race_time(ms), "race_time_ms": ms})
+            if len(rows) >= 50000:
+                conn.execute(insert(Result), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Result), rows)
+
+    from app import ratings, stats
+    with app.db_session() as session:
+        stats.rebuild(session)
+        session.commit()
+    ratings.rebuild(engine)
+    sizes["results"] = sizes["races"] * field
+    return sizes
+
+
+def summarize(latencies: list, queries: list, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0.0,
+    }
+
+
+def _query_count(server_timing: str) -> Optional[int]:
+    match = QUERIES.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+
+class TestClientTarget:
+    """Requests through ``app.test_client()`` in this process."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        client = self.app.test_client()
+
+        def request(method, path, data=None):
+            response = client.open(path, method=method, data=data)
+            return response.status_code, response.headers.get("Server-Timing", "")
+        return request
+
+
+class HttpTarget:
+    """Keep-alive HTTP/1.1 requests with one session cookie per client."""
+
+    def __init__(self, port: int):
+        self.port = port
+
+    def client(self):
+        state = {"conn": http.client.HTTPConnection("127.0.0.1", self.port, timeout=30), "cookie": None}
+
+        def request(method, path, data=None):
+            headers = {}
+            body = None
+            if data is not None:
+                body = urlencode(data)
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            if state["cookie"]:
+                headers["Cookie"] = state["cookie"]
+            try:
+                state["conn"].request(method, path, body=body, headers=headers)
+                response = state["conn"].getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                state["conn"].close()
+                state["conn"] = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+                raise
+            cookie = response.getheader("Set-Cookie")
+            if cookie:
+                state["cookie"] = cookie.split(";", 1)[0]
+            return response.status, response.getheader("Server-Timing", "")
+        return request
+
+
+def run_scenario(target, scenario: Scenario, clients: int, requests: int, duration: Optional[float]) -> dict:
+    """``clients`` threads each send ``requests`` (or for ``duration`` seconds)."""
+    latencies, queries, errors = [], [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(n):
+        request = target.client()
+        local_latencies, local_queries, local_errors = [], [], 0
+        i = 0
+        while (time.perf_counter() < deadline) if deadline else (i < requests):
+            tag = f"{os.getpid()}-{n}-{i}-{time.perf_counter_ns()}"
+            i += 1
+            try:
+                if scenario.auth:
+                    login = ADMIN if scenario.auth == "admin" else "user-1"
+                    request("POST", "/login", {"login": login, "password": PASSWORD})
+                start = time.perf_counter()
+                status, server_timing = request(
+                    scenario.method, scenario.path, scenario.body(tag) if scenario.body else None,
+                )
+                elapsed = (time.perf_counter() - start) * 1000
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                continue
+            if status >= 500:
+                local_errors += 1
+                continue
+            local_latencies.append(elapsed)
+            count = _query_count(server_timing)
+            if count is not None:
+                local_queries.append(count)
+        with lock:
+            latencies.extend(local_latencies)
+            queries.extend(local_queries)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if scenario.auth:
+        # leave out the untimed sign-in before every request
+        elapsed = sum(latencies) / 1000 / clients
+    return summarize(latencies, queries, errors[0], elapsed)
+
+
+def start_gunicorn(args, port: int) -> subprocess.Popen:
+    config = make_config(args)
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        PASSWORD_HASH_METHOD=args.hash_method,
+        PAGE_CACHE_BACKEND=args.page_cache,
+        SESSION_BACKEND=args.session_backend,
+        RATE_LIMIT_BACKEND=config.RATE_LIMIT_BACKEND,
+        SERVER_TIMING="1",
+        SLOW_QUERY_MS=str(config.SLOW_QUERY_MS),
+        AUTO_CREATE_SCHEMA="0",
+    )
+    argv = [
+        sys.executable, "-m", "gunicorn", "--workers", str(args.workers),
+        "--worker-class", args.worker_class, "--threads", str(args.threads),
+        "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "app:create_app()",
+    ]
+    return subprocess.Popen(argv, env=env)
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """Routes whose p95 or queries/request regressed by more than ``tolerance`` percent."""
+    for key in ("target", "database"):
+        if baseline.get(key) != current[key]:
+            print(f"warning: baseline {key} is {baseline.get(key)!r}, this run is {current[key]!r}")
+    regressions = []
+    for name, now in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        for key in ("p95_ms", "queries_per_request"):
+            if before[key] and (now[key] - before[key]) / before[key] * 100 > tolerance:
+                regressions.append(f"{name}: {key} {before[key]} -> {now[key]}")
+        print(f"{name:<16} p95 {before['p95_ms']:>8} -> {now['p95_ms']:<8} ms  "
+              f"req/s {before['req_per_sec']:>8} -> {now['req_per_sec']:<8}  "
+              f"queries {before['queries_per_request']} -> {now['queries_per_request']}")
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["testclient", "gunicorn"], default="testclient")
+    parser.add_argument("--routes", default=",".join(s.name for s in SCENARIOS),
+                        help="comma-separated scenario names")
+    parser.add_argument("--scale", type=float, default=1.0, help=f"multiplier for {BASE_SCALE}")
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=200, help="per client, unless --duration")
+    parser.add_argument("--duration", type=float, help="seconds per route instead of --requests")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:1000")
+    parser.add_argument("--page-cache", default="memory", help="PAGE_CACHE_BACKEND")
+    parser.add_argument("--session-backend", default="database", help="SESSION_BACKEND")
+    parser.add_argument("--database-url")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="allowed regression, percent")
+    args = parser.parse_args(argv)
+
+    by_name = {s.name: s for s in SCENARIOS}
+    unknown = [name for name in args.routes.split(",") if name and name not in by_name]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+    scenarios = [by_name[name] for name in args.routes.split(",") if name]
+
+    tmp = None
+    if not args.database_url:
+        tmp = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{tmp.name}/suite.db"
+
+    proc = None
+    try:
+        app = create_app(make_config(args))
+        started = time.perf_counter()
+        sizes = seed(app, args.scale)
+        print(f"seeded {sizes} in {time.perf_counter() - started:.1f}s")
+
+        if args.target == "gunicorn":
+            app.db_engine.dispose()
+            port = free_port()
+            proc = start_gunicorn(args, port)
+            wait_for_port(port)
+            target = HttpTarget(port)
+        else:
+            target = TestClientTarget(app)
+
+        results = {}
+        for scenario in scenarios:
+            run_scenario(target, scenario, 1, min(20, args.requests), None)  # warm-up
+            result = run_scenario(target, scenario, args.clients, args.requests, args.duration)
+            results[scenario.name] = result
+            print(f"{scenario.name:<16} {result['req_per_sec']:>9} req/s  p50={result['p50_ms']}ms "
+                  f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                  f"queries={result['queries_per_request']} errors={result['errors']}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if tmp is not None:
+            tmp.cleanup()
+
+    report = {
+        "revision": _git_revision(),
+        "created_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": args.database_url.split(":", 1)[0],
+        "target": args.target,
+        "settings": {k: getattr(args, k) for k in (
+            "scale", "clients", "requests", "duration", "workers", "worker_class", "threads",
+            "hash_method", "page_cache", "session_backend",
+        )},
+        "sizes": sizes,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(json.load(fh), report, args.tolerance)
+        if regressions:
+            print("Regressions over {:.0f}%:\n  ".format(args.tolerance) + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,3 +5,6 @@
 
 -- You can also create extensions on first init
 -- CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- Trigram indexes for name search (app/search.py)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
@@ -37,4 +37,38 @@ def session(app):
     with app.app_context():
         engine = create_engine(app.config['DATABASE_URL'])
         with Session(engine) as session:
-            yield session
\ No newline at end of file
+            yield session
+
+@pytest.fixture
+def db_app(tmp_path):
+    """Приложение с отдельной SQLite-базой на каждый тест"""
+    class TestConfig:
+        TESTING = True
+        SECRET_KEY = 'test-secret-key'
+        DATABASE_URL = f"sqlite:///{tmp_path / 'test.db'}"
+        QUERY_BUDGET = 10
+
+    app = create_app(TestConfig)
+    yield app
+    app.db_engine.dispose()
+
+
+@pytest.fixture
+def db_client(db_app):
+    return db_app.test_client()
+
+
+@pytest.fixture
+def assert_max_queries():
+    """Проверка, что блок выполняет не больше N запросов к БД"""
+    from contextlib import contextmanager
+    from app.metrics import count_queries
+
+    @contextmanager
+    def check(engine, limit):
+        with count_queries(engine) as counter:
+            yield counter
+        assert counter.count <= limit, (
+            f"{counter.count} queries (limit {limit}):\n" + "\n".join(counter.statements)
+        )
+    return check
@@ -0,0 +1,47 @@
+import io
+
+from app.metrics import count_queries
+from test_ratings_api import import_csv
+
+CSV = (
+    'date,time,place,title,horse,gender,age,owner,jockey,jockey_age,position,race_time\n'
+    '2024-05-01,14:30,Moscow,Spring Cup,Lightning,male,5,Stable A,Ivanov,30,1,1:38.20\n'
+    '2024-05-01,14:30,Moscow,Spring Cup,Thunder,male,4,Stable A,Petrov,25,2,1:39.00\n'
+    '2024-06-01,14:30,Kazan,June Cup,Lightning,male,5,Stable A,Petrov,25,2,1:37.50\n'
+    '2024-06-01,14:30,Kazan,June Cup,Thunder,male,4,Stable A,Ivanov,30,1,1:38.00\n'
+    '2024-07-01,14:30,Kazan,July Cup,Lightning,male,5,Stable A,Ivanov,30,1,1:37.00\n'
+    '2024-07-01,14:30,Kazan,July Cup,Thunder,male,4,Stable A,Petrov,25,3,1:39.00\n'
+)
+
+
+def test_race_card_head_to_head(db_app, db_client):
+    assert import_csv(db_app, db_client, CSV).status_code == 200
+    ids = {h['name']: h['id'] for h in db_client.get('/ratings/horse').get_json()['results']}
+
+    card = db_client.get('/analysis/races/3').get_json()
+    assert [(r['horse'], r['horse_form']) for r in card['runners']] == [('Lightning', '12'), ('Thunder', '21')]
+    assert card['horse_ahead'] == [[0, 1], [1, 0]]
+    assert card['horse_meetings'] == [[0, 2], [2, 0]]
+
+    with count_queries(db_app.db_engine) as counter:
+        response = db_client.get('/analysis/races/3')
+    assert response.get_json() == card
+    assert counter.count == 0
+    assert 'analysis' in response.headers.get('Server-Timing', '')
+
+    pair = db_client.get(f"/analysis/horse/{ids['Lightning']}/vs/{ids['Thunder']}").get_json()
+    assert (pair['a_ahead'], pair['b_ahead'], pair['meetings']) == (2, 1, 3)
+    form = db_client.get(f"/analysis/horse/{ids['Thunder']}/form?runs=2").get_json()
+    assert form['form'] == '13'
+    assert db_client.get('/analysis/races/99').status_code == 404
+    assert db_client.get('/analysis/owner/1/form').status_code == 404
+
+
+def test_card_refreshed_after_import(db_app, db_client):
+    import_csv(db_app, db_client, CSV)
+    assert db_client.get('/analysis/races/1').get_json()['horse_meetings'] == [[0, 0], [0, 0]]
+    earlier = CSV.replace('2024-0', '2023-0').encode()
+    db_client.post('/admin/import', data={'file': (io.BytesIO(earlier), '2023.csv')},
+                   content_type='multipart/form-data')
+    card = db_client.get('/analysis/races/1').get_json()
+    assert card['horse_meetings'] == [[0, 3], [3, 0]]
@@ -0,0 +1,100 @@
+import asyncio
+from urllib.parse import urlencode
+
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+
+from app.asgi import create_asgi_app
+
+
+@pytest.fixture
+def asgi_app(tmp_path):
+    class TestConfig:
+        TESTING = True
+        SECRET_KEY = 'test-secret-key'
+        DATABASE_URL = f"sqlite:///{tmp_path / 'test.db'}"
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+    app = create_asgi_app(TestConfig)
+    yield app
+    asyncio.run(app.async_engine.dispose())
+    app.flask_app.db_engine.dispose()
+
+
+def call(app, method, path, form=None, cookie=None):
+    """Один HTTP-запрос к ASGI-приложению; возвращает (status, headers, body)."""
+    path, _, query = path.partition('?')
+    body = urlencode(form).encode() if form else b''
+    headers = [(b'host', b'localhost')]
+    if form:
+        headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+    if cookie:
+        headers.append((b'cookie', cookie))
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query.encode(), 'headers': headers, 'http_version': '1.1', 'scheme': 'http',
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 1234), 'asgi': {'version': '3.0'},
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    payload = b''.join(m.get('body', b'') for m in sent[1:])
+    return start['status'], dict(start['headers']), payload
+
+
+def test_register_login_and_index(asgi_app):
+    """Тест регистрации, входа и главной страницы через асинхронные маршруты"""
+    status, headers, _ = call(asgi_app, 'POST', '/register', {'login': 'bob', 'password': 'pw'})
+    assert status == 302 and headers[b'location'].endswith(b'/login')
+
+    status, headers, _ = call(asgi_app, 'POST', '/register', {'login': 'bob', 'password': 'pw'})
+    assert status == 200
+
+    status, headers, _ = call(asgi_app, 'POST', '/login', {'login': 'bob', 'password': 'wrong'})
+    assert status == 200
+
+    status, headers, _ = call(asgi_app, 'POST', '/login', {'login': 'bob', 'password': 'pw'})
+    assert status == 302
+    cookie = headers[b'set-cookie'].split(b';')[0]
+
+    status, _, body = call(asgi_app, 'GET', '/', cookie=cookie)
+    assert status == 200
+    assert 'Выйти' in body.decode()
+
+
+def test_other_routes_fall_back_to_wsgi(asgi_app):
+    """Тест обработки остальных маршрутов обычным Flask-приложением"""
+    status, _, body = call(asgi_app, 'GET', '/races?format=json')
+    assert status == 200
+    assert body.startswith(b'{')
+    status, _, _ = call(asgi_app, 'DELETE', '/login')
+    assert status == 405
+
+
+def test_login_rehash_drops_cached_user(asgi_app, monkeypatch):
+    """Тест что перехеширование пароля при входе сбрасывает кэш пользователя и принципалы сессий"""
+    from app.hashing import PasswordHasher
+    flask_app = asgi_app.flask_app
+    call(asgi_app, 'POST', '/register', {'login': 'eve', 'password': 'pw'})
+    call(asgi_app, 'POST', '/login', {'login': 'eve', 'password': 'pw'})
+    forgotten = []
+    monkeypatch.setattr(flask_app.session_store, 'forget_user', forgotten.append)
+    invalidations = flask_app.user_cache.stats()['invalidations']
+
+    flask_app.password_hasher = PasswordHasher(method='pbkdf2:sha256:2000')
+    status, _, _ = call(asgi_app, 'POST', '/login', {'login': 'eve', 'password': 'pw'})
+    assert status == 302
+    assert flask_app.user_cache.stats()['invalidations'] == invalidations + 1
+    assert len(forgotten) == 1
@@ -0,0 +1,28 @@
+import json
+
+from benchmarks import suite
+
+
+def test_suite_writes_report_for_every_route(tmp_path):
+    out = tmp_path / 'report.json'
+    suite.main(['--scale', '0.1', '--requests', '3', '--json', str(out)])
+
+    report = json.loads(out.read_text())
+    assert report['database'] == 'sqlite'
+    assert report['sizes']['results'] == report['sizes']['races'] * 8
+    assert set(report['results']) == {s.name for s in suite.SCENARIOS}
+    for name, result in report['results'].items():
+        assert result['requests'] == 3, name
+        assert result['errors'] == 0, name
+    assert report['results']['login']['queries_per_request'] >= 1
+
+
+def test_compare_flags_regressions():
+    baseline = {'target': 'testclient', 'database': 'sqlite', 'results': {
+        'index': {'p95_ms': 1.0, 'req_per_sec': 100, 'queries_per_request': 1.0},
+    }}
+    current = {'target': 'testclient', 'database': 'sqlite', 'results': {
+        'index': {'p95_ms': 1.1, 'req_per_sec': 90, 'queries_per_request': 3.0},
+        'admin': {'p95_ms': 5.0, 'req_per_sec': 10, 'queries_per_request': 0.0},
+    }}
+    assert suite.compare(baseline, current, tolerance=20) == ['index: queries_per_request 1.0 -> 3.0']
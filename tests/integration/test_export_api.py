@@ -0,0 +1,45 @@
+import datetime as dt
+import gzip
+
+from app.models import Horse, Jockey, Owner, Race, Result
+from tests.integration.test_ingest_api import login_admin
+
+
+def seed(app):
+    with app.db_session() as session:
+        horse = Horse(name='Lightning', gender='male', age=5, owner=Owner(name='Stable A'))
+        race = Race(date=dt.date(2024, 5, 1), time=dt.time(12, 0), place='Moscow')
+        session.add(Result(race=race, horse=horse, jockey=Jockey(name='Ivanov', age=30, rating=0),
+                           position=1, race_time='1:40.0'))
+        session.commit()
+
+
+def test_export_requires_admin(db_client):
+    assert db_client.get('/admin/export').status_code in (302, 401)
+
+
+def test_export_streams_gzip(db_app, db_client):
+    seed(db_app)
+    login_admin(db_app, db_client)
+    response = db_client.get('/admin/export?format=csv', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'results.csv' in response.headers['Content-Disposition']
+    lines = gzip.decompress(response.data).decode('utf-8').splitlines()
+    assert lines[0].startswith('id,date,time,place')
+    assert 'Lightning' in lines[1]
+
+
+def test_export_bad_arguments(db_app, db_client):
+    login_admin(db_app, db_client)
+    assert db_client.get('/admin/export?format=xlsx').status_code == 400
+    assert db_client.get('/admin/export?from=yesterday').status_code == 400
+
+
+def test_export_command(db_app, tmp_path):
+    seed(db_app)
+    out = tmp_path / 'results.jsonl.gz'
+    result = db_app.test_cli_runner().invoke(args=['export', 'results', str(out), '--format', 'jsonl'])
+    assert result.exit_code == 0, result.output
+    assert b'"place": "Moscow"' in gzip.decompress(out.read_bytes())
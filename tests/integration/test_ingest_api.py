@@ -0,0 +1,49 @@
+import io
+
+from app.models import User, UserType
+
+CSV = (
+    'date,time,place,title,horse,gender,age,owner,jockey,jockey_age,position,race_time\n'
+    '2024-05-01,14:30,Moscow,Spring Cup,Lightning,male,5,Stable A,Ivanov,30,1,1:38.20\n'
+)
+
+
+def login_admin(app, client):
+    client.post('/register', data={'login': 'root', 'password': 'secret'})
+    with app.db_session() as session:
+        session.query(User).filter_by(login='root').one().type = UserType.ADMIN
+        session.commit()
+    client.post('/login', data={'login': 'root', 'password': 'secret'})
+
+
+def test_import_requires_admin(db_client):
+    response = db_client.post('/admin/import', data={'file': (io.BytesIO(CSV.encode()), 'season.csv')})
+    assert response.status_code in (302, 401)
+
+
+def test_import_upload(db_app, db_client):
+    login_admin(db_app, db_client)
+    response = db_client.post(
+        '/admin/import',
+        data={'file': (io.BytesIO(CSV.encode()), 'season.csv')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200
+    assert response.get_json()['rows'] == 1
+
+    # a different file under the same name is not mistaken for a resumed one
+    other = CSV.replace('Lightning', 'Thunder')
+    response = db_client.post(
+        '/admin/import',
+        data={'file': (io.BytesIO(other.encode()), 'season.csv')},
+        content_type='multipart/form-data',
+    )
+    assert response.get_json()['rows'] == 1 and response.get_json()['skipped'] == 0
+
+
+def test_import_cli(db_app, tmp_path):
+    path = tmp_path / 'season.csv'
+    path.write_text(CSV)
+    result = db_app.test_cli_runner().invoke(args=['ingest', 'results', str(path)])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 1 rows' in result.output
@@ -0,0 +1,70 @@
+import io
+import os
+import time
+
+from app.jobs import Worker
+from app.models import Result
+from test_ingest_api import login_admin
+from test_ratings_api import CSV
+
+
+def test_admin_enqueues_and_sees_jobs(db_app, db_client):
+    login_admin(db_app, db_client)
+    response = db_client.post('/admin/jobs', data={'kind': 'ratings.rebuild', 'priority': '3'},
+                              headers={'Accept': 'application/json'})
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    assert db_client.get(status_url).get_json()['status'] == 'queued'
+    assert db_client.post('/admin/jobs', data={'kind': 'import'}).status_code == 400
+
+    Worker(db_app, poll_seconds=0.01).run(burst=True)
+    job = db_client.get(status_url).get_json()
+    assert (job['status'], job['priority'], job['result']) == ('done', 3, {'results': 0})
+    page = db_client.get('/admin').get_data(as_text=True)
+    assert 'ratings.rebuild' in page and 'Фоновые задачи' in page
+
+
+def test_background_import(db_app, db_client, tmp_path):
+    db_app.job_queue.spool_dir = str(tmp_path / 'spool')
+    login_admin(db_app, db_client)
+    response = db_client.post(
+        '/admin/import', data={'file': (io.BytesIO(CSV.encode()), 'season.csv'), 'background': '1'},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 202
+    with db_app.db_session() as session:
+        assert session.query(Result).count() == 0
+
+    Worker(db_app, poll_seconds=0.01).run(burst=True)
+    job = db_client.get(response.get_json()['status_url']).get_json()
+    assert job['status'] == 'done' and job['result']['rows'] == 4
+    assert os.listdir(tmp_path / 'spool') == []
+    assert len(db_client.get('/ratings/horse').get_json()['results']) == 2
+
+
+def test_process_pool_worker(db_app):
+    job_id = db_app.job_queue.enqueue('stats.rebuild')
+    worker = Worker(db_app, concurrency=1, pool='process', poll_seconds=0.05)
+    worker.run(burst=True)
+    assert db_app.job_queue.get(job_id)['status'] == 'done'
+
+
+def test_export_download_and_expiry(db_app, db_client, tmp_path):
+    db_app.job_queue.spool_dir = str(tmp_path / 'spool')
+    login_admin(db_app, db_client)
+    db_client.post('/admin/import', data={'file': (io.BytesIO(CSV.encode()), 'season.csv')},
+                   content_type='multipart/form-data')
+    response = db_client.post('/admin/jobs', data={'kind': 'export'}, headers={'Accept': 'application/json'})
+    job_id = response.get_json()['job_id']
+    assert db_client.get(f'/admin/jobs/{job_id}/download').status_code == 404
+
+    Worker(db_app, poll_seconds=0.01).run(burst=True)
+    download = db_client.get(f'/admin/jobs/{job_id}/download')
+    assert download.status_code == 200
+    assert 'filename=results.csv' in download.headers['Content-Disposition']
+    assert len(download.get_data(as_text=True).splitlines()) == 1 + 4
+    download.close()
+    assert f'/admin/jobs/{job_id}/download' in db_client.get('/admin').get_data(as_text=True)
+
+    assert db_app.job_queue.sweep_spool(now=time.time() + 2 * 86400) == 1
+    assert db_client.get(f'/admin/jobs/{job_id}/download').status_code == 404
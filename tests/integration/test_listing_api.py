@@ -0,0 +1,52 @@
+import datetime as dt
+
+from app.models import Horse, Owner, Race
+
+
+def seed(app):
+    with app.db_session() as session:
+        stable_a, stable_b = Owner(name='Stable A'), Owner(name='Stable B')
+        for i in range(5):
+            session.add(Horse(name=f'A{i}', gender='male' if i % 2 else 'female', age=4, owner=stable_a))
+        session.add(Horse(name='B0', gender='male', age=4, owner=stable_b))
+        for day in range(1, 6):
+            session.add(Race(date=dt.date(2024, 5, day), time=dt.time(12), place='Moscow' if day % 2 else 'Kazan'))
+        session.commit()
+        return stable_a.id
+
+
+def test_races_paginate_newest_first(db_app, db_client):
+    seed(db_app)
+    first = db_client.get('/races?format=json&limit=2').get_json()
+    assert [item['date'] for item in first['items']] == ['2024-05-05', '2024-05-04']
+
+    second = db_client.get(f"/races?format=json&limit=2&cursor={first['next_cursor']}").get_json()
+    assert [item['date'] for item in second['items']] == ['2024-05-03', '2024-05-02']
+    assert second['items'][0]['time'] == '12:00:00'
+
+
+def test_race_filters(db_app, db_client):
+    seed(db_app)
+    data = db_client.get('/races?format=json&place=Moscow&from=2024-05-02&to=2024-05-05').get_json()
+    assert [item['date'] for item in data['items']] == ['2024-05-05', '2024-05-03']
+    assert data['next_cursor'] is None
+    assert db_client.get('/races?from=May').status_code == 400
+
+
+def test_horse_filters_and_next_link(db_app, db_client):
+    owner_id = seed(db_app)
+    data = db_client.get(f'/horses?format=json&owner={owner_id}&gender=male&limit=1').get_json()
+    assert data['items'][0]['name'] == 'A1'
+    # the next link keeps the filters
+    data = db_client.get(data['next']).get_json()
+    assert [item['name'] for item in data['items']] == ['A3']
+    assert data['next'] is None
+
+
+def test_listing_html_and_bad_cursor(db_app, db_client):
+    seed(db_app)
+    response = db_client.get('/owners')
+    assert 'text/html' in response.content_type
+    assert 'Stable B' in response.get_data(as_text=True)
+    assert db_client.get('/jockeys', headers={'Accept': 'application/json'}).get_json()['items'] == []
+    assert db_client.get('/horses?cursor=garbage').status_code == 400
@@ -0,0 +1,104 @@
+import asyncio
+import datetime as dt
+import json
+
+import pytest
+
+from app.models import Horse, Jockey, Owner, Race, Result
+
+
+def seed(app):
+    with app.db_session() as session:
+        session.add(Owner(id=1, name='Stable'))
+        session.add_all([Horse(id=i, name=f'H{i}', gender='male', age=4, owner_id=1) for i in (1, 2)])
+        session.add(Jockey(id=1, name='J', age=30, rating=1500.0))
+        session.add(Race(id=1, date=dt.date.today(), time=dt.time(12), place='M'))
+        session.add(Result(race_id=1, horse_id=1, jockey_id=1, position=1, race_time='1:40.00'))
+        session.commit()
+
+
+def add_result(app, horse_id, position):
+    with app.db_session() as session:
+        session.add(Result(race_id=1, horse_id=horse_id, jockey_id=1, position=position, race_time='1:41.00'))
+        session.commit()
+
+
+def data_of(frame: bytes):
+    return json.loads(frame.split(b'data: ', 1)[1])
+
+
+def test_live_stream_pushes_new_results(db_app, db_client):
+    seed(db_app)
+    response = db_client.get('/races/1/live', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    frames = response.iter_encoded()
+    assert next(frames).startswith(b'retry:')
+    assert [r['horse'] for r in data_of(next(frames))] == ['H1']
+
+    # the commit wakes the publisher without waiting for the poll interval
+    add_result(db_app, 2, 2)
+    frame = next(frames)
+    assert b'event: result' in frame
+    assert data_of(frame)['position'] == 2
+
+    assert db_app.live_feed.stats()['subscribers'] == 1
+    response.close()
+    assert db_app.live_feed.stats()['subscribers'] == 0
+
+
+def test_live_stream_limits_and_missing_race(db_app, db_client):
+    seed(db_app)
+    assert db_client.get('/races/99/live').status_code == 404
+    db_app.live_feed.max_subscribers = 0
+    response = db_client.get('/races/1/live')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_live_stream_refused_under_sync_workers(db_app, db_client):
+    seed(db_app)
+    db_app.live_feed.streaming = False
+    response = db_client.get('/races/1/live')
+    assert response.status_code == 503
+    assert db_app.live_feed.stats()['subscribers'] == 0
+
+
+def test_live_stream_served_natively_by_asgi(tmp_path):
+    pytest.importorskip('asgiref')
+    pytest.importorskip('aiosqlite')
+    from app.asgi import create_asgi_app
+
+    class TestConfig:
+        TESTING = True
+        SECRET_KEY = 'test-secret-key'
+        DATABASE_URL = f"sqlite:///{tmp_path / 'test.db'}"
+
+    app = create_asgi_app(TestConfig)
+    seed(app.flask_app)
+    sent, disconnect = [], asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+        if b'event: result' in message.get('body', b''):
+            disconnect.set()
+
+    async def scenario():
+        scope = {'type': 'http', 'method': 'GET', 'path': '/races/1/live', 'query_string': b'', 'headers': []}
+        task = asyncio.ensure_future(app(scope, receive, send))
+        while len(sent) < 3:
+            await asyncio.sleep(0.01)
+        await asyncio.to_thread(add_result, app.flask_app, 2, 2)
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(scenario())
+    assert sent[0]['status'] == 200
+    assert (b'content-type', b'text/event-stream; charset=utf-8') in sent[0]['headers']
+    assert b'event: snapshot' in sent[2]['body']
+    assert app.flask_app.live_feed.stats()['subscribers'] == 0
+    asyncio.run(app.async_engine.dispose())
+    app.flask_app.db_engine.dispose()
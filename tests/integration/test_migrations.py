@@ -0,0 +1,166 @@
+import datetime as dt
+import os
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, text
+
+from app.models import Base
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), '..', '..', 'alembic.ini')
+
+
+@pytest.fixture
+def alembic_db(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    monkeypatch.setenv('DATABASE_URL', url)
+    cfg = Config(ALEMBIC_INI)
+    cfg.set_main_option('script_location', os.path.join(os.path.dirname(ALEMBIC_INI), 'alembic'))
+    cfg.set_main_option('sqlalchemy.url', url)
+    return cfg, url
+
+
+def test_upgrade_empty_database(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, 'head')
+
+    inspector = inspect(create_engine(url))
+    assert {'users', 'owners', 'horses', 'jockeys', 'races', 'results'} <= set(inspector.get_table_names())
+    with create_engine(url).connect() as conn:
+        # expression indexes are not reflected by the inspector on SQLite
+        indexes = set(conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users'"
+        )).scalars())
+    assert 'ix_users_login_lower' in indexes
+    # the unique login index holds the rowid already; no wide copy of it on SQLite
+    assert 'ix_users_login_auth' not in indexes
+
+
+def test_upgrade_drops_wide_login_index(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, 'a71c5d9e2b48')
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_users_login_auth ON users (login, password, type)"))
+    command.upgrade(cfg, 'head')
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name FROM sqlite_master WHERE name = 'ix_users_login_auth'")).first() is None
+
+
+def test_upgrade_database_created_by_create_all(alembic_db):
+    cfg, url = alembic_db
+    Base.metadata.create_all(create_engine(url))
+    command.upgrade(cfg, 'head')
+    command.downgrade(cfg, 'base')
+    assert 'users' not in inspect(create_engine(url)).get_table_names()
+
+
+def test_race_time_ms_backfill(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, '220f7feb7ca7')
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO owners (id, name) VALUES (1, 'A')"))
+        conn.execute(text("INSERT INTO horses (id, name, gender, age, owner_id) VALUES (1, 'H', 'male', 3, 1)"))
+        conn.execute(text("INSERT INTO jockeys (id, name, age, rating) VALUES (1, 'J', 30, 0)"))
+        conn.execute(text("INSERT INTO races (id, date, time, place) VALUES (1, '2024-05-01', '12:00:00.000000', 'X')"))
+        conn.execute(text(
+            "INSERT INTO results (race_id, horse_id, jockey_id, position, race_time) "
+            "VALUES (1, 1, 1, 1, '1:38.20'), (1, 1, 1, 2, 'DNF')"
+        ))
+
+    command.upgrade(cfg, 'head')
+    with engine.connect() as conn:
+        values = conn.execute(text("SELECT race_time_ms FROM results ORDER BY id")).scalars().all()
+    assert values == [98200, None]
+
+
+def test_listing_indexes(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, 'head')
+    inspector = inspect(create_engine(url))
+    races = {ix['name']: ix['column_names'] for ix in inspector.get_indexes('races')}
+    horses = {ix['name'] for ix in inspector.get_indexes('horses')}
+    assert races['ix_races_place_date_time_id'] == ['place', 'date', 'time', 'id']
+    assert {'ix_horses_owner_id', 'ix_horses_gender_id'} <= horses
+
+
+def test_search_index_backfill(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, 'b8f415b1bb4c')
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO owners (id, name) VALUES (1, 'Stable')"))
+
+    command.upgrade(cfg, 'head')
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO jockeys (id, name, age, rating) VALUES (1, 'Stan', 30, 0)"))
+        hits = conn.execute(text(
+            "SELECT rowid FROM search_index WHERE search_index MATCH '\"sta\"*' ORDER BY rowid"
+        )).scalars().all()
+    assert hits == [1 * 4 + 2, 1 * 4 + 3]  # jockey from the trigger, owner from the backfill
+
+
+def test_race_starts_at_backfill(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, '4b2473c153b6')
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO races (id, date, time, place) VALUES (1, '2024-05-01', '12:30:00.000000', 'X')"))
+
+    command.upgrade(cfg, 'head')
+    from sqlalchemy.orm import Session
+    from app.models import Race
+    with Session(engine) as session:
+        assert session.get(Race, 1).starts_at == dt.datetime(2024, 5, 1, 12, 30)
+    races = {ix['name'] for ix in inspect(engine).get_indexes('races')}
+    assert {'ix_races_starts_at_id', 'ix_races_place_starts_at_id'} <= races
+
+
+def test_results_race_date_backfill(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, '7c3e91a05b2d')
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO races (id, date, time, place) VALUES (1, '2019-05-01', '12:00:00.000000', 'X')"))
+        conn.execute(text(
+            "INSERT INTO results (race_id, horse_id, jockey_id, position, race_time) VALUES (1, 1, 1, 1, '')"
+        ))
+
+    command.upgrade(cfg, 'head')
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT race_date FROM results")).scalar() == '2019-05-01'
+    assert 'season_archives' in inspect(engine).get_table_names()
+    command.downgrade(cfg, '7c3e91a05b2d')
+    assert 'race_date' not in {c['name'] for c in inspect(engine).get_columns('results')}
+
+
+def test_result_stats_backfill_matches_rebuild(alembic_db):
+    cfg, url = alembic_db
+    command.upgrade(cfg, '37758253a6b4')
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO owners (id, name) VALUES (1, 'A'), (2, 'B')"))
+        conn.execute(text("INSERT INTO horses (id, name, gender, age, owner_id) "
+                          "VALUES (1, 'H1', 'male', 3, 1), (2, 'H2', 'male', 3, 2)"))
+        conn.execute(text("INSERT INTO jockeys (id, name, age, rating) VALUES (1, 'J1', 30, 0), (2, 'J2', 30, 0)"))
+        conn.execute(text("INSERT INTO races (id, date, time, place) VALUES "
+                          "(1, '2024-05-01', '12:00:00.000000', 'X'), (2, '2024-06-01', '12:00:00.000000', 'Y')"))
+        conn.execute(text(
+            "INSERT INTO results (race_id, horse_id, jockey_id, position, race_time) VALUES "
+            "(1, 1, 1, 1, ''), (1, 2, 2, 2, ''), (2, 2, 1, 1, ''), (2, 1, 2, 5, '')"
+        ))
+
+    command.upgrade(cfg, 'head')
+    query = text("SELECT * FROM result_stats ORDER BY entity, entity_id, place, period")
+    with engine.connect() as conn:
+        migrated = conn.execute(query).all()
+    from sqlalchemy.orm import Session
+    from app.stats import rebuild
+    with Session(engine) as session:
+        rebuild(session)
+        session.commit()
+    with engine.connect() as conn:
+        assert conn.execute(query).all() == migrated
+    assert len(migrated) == 6 * 7  # 3 kinds x 2 ids, each in 2 venues and 2 months
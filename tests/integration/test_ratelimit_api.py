@@ -0,0 +1,67 @@
+import pytest
+
+from app import create_app
+from app.metrics import count_queries
+
+
+@pytest.fixture
+def limited_app(tmp_path):
+    class LimitedConfig:
+        TESTING = True
+        SECRET_KEY = 'test-secret-key'
+        DATABASE_URL = f"sqlite:///{tmp_path / 'test.db'}"
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+        RATE_LIMIT_BACKEND = 'database'
+        RATE_LIMIT_PER_IP = '100/60'
+        RATE_LIMIT_PER_LOGIN = '3/300'
+
+    app = create_app(LimitedConfig)
+    yield app
+    app.db_engine.dispose()
+
+
+def test_login_rejected_with_429_before_hashing(limited_app):
+    client = limited_app.test_client()
+    client.post('/register', data={'login': 'alice', 'password': 'secret'})
+    for _ in range(3):
+        assert client.post('/login', data={'login': 'alice', 'password': 'wrong'}).status_code == 200
+
+    hashed = []
+    limited_app.password_hasher.verify = lambda *args: hashed.append(args)
+    with count_queries(limited_app.db_engine) as counter:
+        response = client.post('/login', data={'login': 'alice', 'password': 'secret'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert hashed == []
+    assert counter.count == 0, counter.statements
+
+
+def test_successful_login_refills_login_bucket(limited_app):
+    client = limited_app.test_client()
+    client.post('/register', data={'login': 'bob', 'password': 'secret'})
+    client.post('/login', data={'login': 'bob', 'password': 'wrong'})
+    client.post('/login', data={'login': 'bob', 'password': 'wrong'})
+    assert client.post('/login', data={'login': 'bob', 'password': 'secret'}).status_code == 302
+    for _ in range(3):
+        assert client.post('/login', data={'login': 'bob', 'password': 'wrong'}).status_code == 200
+
+
+def test_register_limited_per_ip(db_app, db_client):
+    from app.ratelimit import LoginLimiter, Rate
+    db_app.login_limiter = LoginLimiter(per_ip=Rate(1, 60), per_login=Rate(5, 60))
+    db_client.post('/register', data={'login': 'carol', 'password': 'secret'})
+    response = db_client.post('/register', data={'login': 'dave', 'password': 'secret'})
+    assert response.status_code == 429
+    assert 'ratelimit;dur=' in response.headers['Server-Timing']
+
+
+def test_admin_page_shows_limiter_stats(db_app, db_client):
+    from app.models import User, UserType
+    db_client.post('/register', data={'login': 'root', 'password': 'secret'})
+    db_client.post('/login', data={'login': 'root', 'password': 'secret'})
+    with db_app.db_session() as session:
+        session.query(User).filter_by(login='root').one().type = UserType.ADMIN
+        session.commit()
+
+    page = db_client.get('/admin').get_data(as_text=True)
+    assert 'Ограничение попыток входа' in page
@@ -0,0 +1,45 @@
+from test_ingest_api import login_admin
+
+CSV = (
+    'date,time,place,title,horse,gender,age,owner,jockey,jockey_age,position,race_time\n'
+    '2024-05-01,14:30,Moscow,Spring Cup,Lightning,male,5,Stable A,Ivanov,30,1,1:38.20\n'
+    '2024-05-01,14:30,Moscow,Spring Cup,Thunder,male,4,Stable A,Petrov,25,2,1:39.00\n'
+    '2024-06-01,14:30,Kazan,June Cup,Lightning,male,5,Stable A,Petrov,25,1,1:37.50\n'
+    '2024-06-01,14:30,Kazan,June Cup,Thunder,male,4,Stable A,Ivanov,30,2,1:38.00\n'
+)
+
+
+def import_csv(app, client, text):
+    import io
+    login_admin(app, client)
+    return client.post(
+        '/admin/import', data={'file': (io.BytesIO(text.encode()), 'season.csv')},
+        content_type='multipart/form-data',
+    )
+
+
+def test_import_rates_horses_and_jockeys(db_app, db_client):
+    assert import_csv(db_app, db_client, CSV).status_code == 200
+
+    horses = db_client.get('/ratings/horse').get_json()['results']
+    assert [h['name'] for h in horses] == ['Lightning', 'Thunder']
+    assert horses[0]['rating'] > 1500 > horses[1]['rating']
+
+    # one win each, but Petrov's came as the lower rated jockey
+    jockeys = db_client.get('/ratings/jockey').get_json()['results']
+    assert [j['name'] for j in jockeys] == ['Petrov', 'Ivanov']
+    assert jockeys[0]['rating'] + jockeys[1]['rating'] == 3000.0
+
+    detail = db_client.get(f"/ratings/horse/{horses[0]['id']}").get_json()
+    assert [h['place'] for h in detail['history']] == ['Kazan', 'Moscow']
+    assert detail['history'][0]['after'] == detail['rating']
+    assert detail['history'][1]['before'] == 1500.0
+
+
+def test_rebuild_command(db_app, db_client):
+    import_csv(db_app, db_client, CSV)
+    before = db_client.get('/ratings/horse').get_json()
+    result = db_app.test_cli_runner().invoke(args=['ratings', 'rebuild'])
+    assert 'Rated 4 results' in result.output
+    assert db_client.get('/ratings/horse').get_json() == before
+    assert db_client.get('/ratings/owner').status_code == 404
@@ -0,0 +1,45 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import create_app
+from app.models import Base, Race
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica = create_engine(replica_url)
+    Base.metadata.create_all(replica)
+    with replica.begin() as conn:
+        conn.execute(Race.__table__.insert().values(date=dt.date(2024, 5, 1), time=dt.time(12), place='Replica'))
+    replica.dispose()
+
+    class TestConfig:
+        TESTING = True
+        SECRET_KEY = 'test-secret-key'
+        DATABASE_URL = f"sqlite:///{tmp_path / 'primary.db'}"
+        DATABASE_REPLICA_URLS = replica_url
+        REPLICA_STICKY_SECONDS = 60
+
+    app = create_app(TestConfig)
+    yield app
+    app.db_engine.dispose()
+    for engine in app.db_replicas.replicas:
+        engine.dispose()
+
+
+def test_listing_reads_from_replica(replica_app):
+    items = replica_app.test_client().get('/races?format=json').get_json()['items']
+    assert [item['place'] for item in items] == ['Replica']
+
+
+def test_read_your_writes_after_register(replica_app):
+    client = replica_app.test_client()
+    # the new user exists only on the primary; login right after must still find it
+    client.post('/register', data={'login': 'alice', 'password': 'secret'})
+    response = client.post('/login', data={'login': 'alice', 'password': 'secret'})
+    assert response.status_code == 302
+    # pinned to the primary, which has no races yet
+    assert client.get('/races?format=json').get_json()['items'] == []
@@ -10,3 +10,169 @@ def test_register_page_get(client):
 def test_login_page_get(client):
     response = client.get('/login')
     assert response.status_code == 200
+
+
+def register_and_login(client, login='alice', password='secret'):
+    client.post('/register', data={'login': login, 'password': password})
+    return client.post('/login', data={'login': login, 'password': password})
+
+
+def test_register_and_login(db_client):
+    response = register_and_login(db_client)
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/')
+
+
+def test_logged_in_requests_hit_user_cache(db_app, db_client):
+    from flask.sessions import SecureCookieSessionInterface
+    # with signed-cookie sessions load_user runs on every request
+    db_app.session_interface = SecureCookieSessionInterface()
+    register_and_login(db_client)
+    cache = db_app.user_cache
+    before = cache.stats()
+
+    for _ in range(3):
+        assert db_client.get('/').status_code == 200
+
+    after = cache.stats()
+    assert after['hits'] - before['hits'] == 3
+    assert after['misses'] == before['misses']
+
+
+def test_admin_page_shows_cache_stats(db_app, db_client):
+    from app.models import User, UserType
+    register_and_login(db_client, login='root')
+    with db_app.db_session() as session:
+        user = session.query(User).filter_by(login='root').one()
+        user.type = UserType.ADMIN
+        session.commit()
+
+    response = db_client.get('/admin')
+    assert response.status_code == 200
+    assert 'Кэш пользователей' in response.get_data(as_text=True)
+
+
+def test_login_rehashes_outdated_password(db_app, db_client, monkeypatch):
+    from app.hashing import PasswordHasher
+    from app.models import User
+    db_app.password_hasher = PasswordHasher(method='pbkdf2:sha256:1000')
+    register_and_login(db_client, login='carol')
+    forgotten = []
+    monkeypatch.setattr(db_app.session_store, 'forget_user', forgotten.append)
+    invalidations = db_app.user_cache.stats()['invalidations']
+
+    db_app.password_hasher = PasswordHasher(method='pbkdf2:sha256:2000')
+    response = db_client.post('/login', data={'login': 'carol', 'password': 'secret'})
+    assert response.status_code == 302
+    # the UPDATE is Core, so the cached user and session principals are dropped by hand
+    assert db_app.user_cache.stats()['invalidations'] == invalidations + 1
+    assert len(forgotten) == 1
+
+    with db_app.db_session() as session:
+        user = session.query(User).filter_by(login='carol').one()
+        assert user.password.startswith('pbkdf2:sha256:2000$')
+
+
+def test_login_returns_503_when_hasher_is_saturated(db_app, db_client):
+    from app.hashing import PasswordHasher
+    db_client.post('/register', data={'login': 'dave', 'password': 'secret'})
+    db_app.password_hasher = PasswordHasher(method='pbkdf2:sha256:1000', max_pending=1)
+    db_app.password_hasher._slots.acquire()
+
+    response = db_client.post('/login', data={'login': 'dave', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_register_duplicate_login(db_client):
+    db_client.post('/register', data={'login': 'erin', 'password': 'secret'})
+    response = db_client.post('/register', data={'login': 'erin', 'password': 'other'})
+    assert response.status_code == 200
+    assert db_client.post('/login', data={'login': 'erin', 'password': 'other'}).status_code == 200
+    assert db_client.post('/login', data={'login': 'erin', 'password': 'secret'}).status_code == 302
+
+
+def test_case_insensitive_login_setting(db_app, db_client):
+    db_client.post('/register', data={'login': 'Frank', 'password': 'secret'})
+    assert db_client.post('/login', data={'login': 'frank', 'password': 'secret'}).status_code == 200
+    db_app.config['LOGIN_CASE_INSENSITIVE'] = True
+    assert db_client.post('/login', data={'login': 'frank', 'password': 'secret'}).status_code == 302
+
+
+def test_login_reports_hash_timing(db_client):
+    db_client.post('/register', data={'login': 'frank', 'password': 'secret'})
+    response = db_client.post('/login', data={'login': 'frank', 'password': 'secret'})
+    assert 'hash;dur=' in response.headers['Server-Timing']
+    assert 'tpl;dur=' in db_client.get('/').headers['Server-Timing']
+
+
+def test_admin_metrics_page(db_app, db_client):
+    from app.models import User, UserType
+    register_and_login(db_client, login='root')
+    with db_app.db_session() as session:
+        session.query(User).filter_by(login='root').one().type = UserType.ADMIN
+        session.commit()
+    db_client.get('/')
+
+    response = db_client.get('/admin/metrics')
+    assert response.status_code == 200
+    assert 'main.index' in response.get_data(as_text=True)
+
+
+def test_anonymous_index_served_from_page_cache(db_app, db_client):
+    from flask import template_rendered
+
+    rendered = []
+
+    def on_render(sender, template, context, **extra):
+        rendered.append(template.name)
+
+    template_rendered.connect(on_render, db_app)
+
+    first = db_client.get('/')
+    second = db_client.get('/')
+    assert first.headers['X-Page-Cache'] == 'miss'
+    assert second.headers['X-Page-Cache'] == 'hit'
+    assert second.data == first.data
+    assert len(rendered) == 1
+
+
+def test_page_cache_conditional_get(db_client):
+    first = db_client.get('/login')
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified']
+
+    response = db_client.get('/login', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    response = db_client.get('/login', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
+
+
+def test_page_cache_keyed_on_auth_state(db_client):
+    anonymous = db_client.get('/')
+    register_and_login(db_client)
+    logged_in = db_client.get('/')
+
+    assert logged_in.headers['X-Page-Cache'] == 'miss'
+    assert logged_in.data != anonymous.data
+    assert 'Выйти' in logged_in.get_data(as_text=True)
+
+
+def test_page_cache_skips_pages_showing_flashes(db_app, db_client):
+    from app.cache import cached_page
+
+    @cached_page()
+    def flashes_view():
+        from flask import get_flashed_messages
+        return ','.join(get_flashed_messages())
+
+    db_app.add_url_rule('/flashes-test', 'flashes_test', flashes_view)
+    assert db_client.get('/flashes-test').headers['X-Page-Cache'] == 'miss'
+    assert db_client.get('/flashes-test').headers['X-Page-Cache'] == 'hit'
+
+    db_client.post('/login', data={'login': '', 'password': ''})  # flashes an error
+    response = db_client.get('/flashes-test')
+    assert response.get_data(as_text=True) == 'Login and password required'
+    assert 'X-Page-Cache' not in response.headers
@@ -0,0 +1,73 @@
+import datetime as dt
+import io
+
+from app.metrics import count_queries
+from app.models import Horse, Jockey, Owner, Race, Result
+
+
+def seed(app):
+    now = dt.datetime.now().replace(second=0, microsecond=0)
+    with app.db_session() as session:
+        session.add(Owner(id=1, name='Stable'))
+        session.add(Horse(id=1, name='Буран', gender='male', age=4, owner_id=1))
+        session.add(Jockey(id=1, name='Петров', age=30, rating=1500.0))
+        for race_id, hours, place in ((1, -48, 'Москва'), (2, -24, 'Казань'), (3, 2, 'Москва'), (4, 26, 'Казань')):
+            starts = now + dt.timedelta(hours=hours)
+            session.add(Race(id=race_id, date=starts.date(), time=starts.time(), place=place, title=f'R{race_id}'))
+            session.add(Result(race_id=race_id, horse_id=1, jockey_id=1, position=1 if hours < 0 else 0,
+                               race_time='1:40.00' if hours < 0 else ''))
+        session.commit()
+
+
+def test_upcoming_schedule_served_from_memory(db_app, db_client):
+    seed(db_app)
+    first = db_client.get('/schedule?format=json').get_json()
+    assert [r['id'] for r in first['upcoming']] == [3, 4]
+
+    with count_queries(db_app.db_engine) as counter:
+        response = db_client.get('/schedule?format=json&place=Москва')
+        html = db_client.get('/schedule')
+    assert [r['id'] for r in response.get_json()['upcoming']] == [3]
+    assert 'Буран' in html.get_data(as_text=True)
+    assert counter.count == 0
+
+
+def test_schedule_reloaded_after_import(db_app, db_client):
+    from app.models import User, UserType
+    seed(db_app)
+    assert len(db_client.get('/schedule?format=json').get_json()['upcoming']) == 2
+
+    db_client.post('/register', data={'login': 'root', 'password': 'secret'})
+    db_client.post('/login', data={'login': 'root', 'password': 'secret'})
+    with db_app.db_session() as session:
+        session.query(User).filter_by(login='root').one().type = UserType.ADMIN
+        session.commit()
+    tomorrow = (dt.date.today() + dt.timedelta(days=1)).isoformat()
+    csv = ('date,time,place,title,horse,gender,age,owner,jockey,jockey_age,position,race_time\n'
+           f'{tomorrow},23:00,Сочи,Кубок,Гром,male,5,Stable,Иванов,28,0,\n')
+    response = db_client.post('/admin/import', data={'file': (io.BytesIO(csv.encode()), 'card.csv')})
+    assert response.status_code == 200
+
+    upcoming = db_client.get('/schedule?format=json&place=Сочи').get_json()['upcoming']
+    assert [r['runners'][0]['horse'] for r in upcoming] == ['Гром']
+
+
+def test_past_races_paginated(db_app, db_client):
+    seed(db_app)
+    page = db_client.get('/schedule/past?format=json&limit=1').get_json()
+    assert [r['id'] for r in page['past']] == [2]
+    page = db_client.get(page['next']).get_json()
+    assert [r['id'] for r in page['past']] == [1]
+    assert page['next'] is None
+    assert db_client.get('/schedule/past?cursor=zzz').status_code == 400
+
+
+def test_horse_and_jockey_schedule(db_app, db_client):
+    seed(db_app)
+    horse = db_client.get('/schedule/horse/1?format=json').get_json()
+    assert horse['name'] == 'Буран'
+    assert [r['id'] for r in horse['upcoming']] == [3, 4]
+    assert [(r['id'], r['position']) for r in horse['past']] == [(2, 1), (1, 1)]
+    assert db_client.get('/schedule/jockey/1').status_code == 200
+    assert db_client.get('/schedule/jockey/99').status_code == 404
+    assert db_client.get('/schedule/owner/1').status_code == 404
@@ -0,0 +1,21 @@
+from app.models import Horse, Jockey, Owner
+
+
+def test_search_endpoint(db_app, db_client):
+    with db_app.db_session() as session:
+        session.add(Horse(name='Lightning', gender='male', age=5, owner=Owner(name='Light Stable')))
+        session.add(Jockey(name='Lightfoot', age=25, rating=0))
+        session.commit()
+
+    data = db_client.get('/search?q=ligh').get_json()
+    assert {(r['type'], r['name']) for r in data['results']} == {
+        ('horse', 'Lightning'), ('owner', 'Light Stable'), ('jockey', 'Lightfoot'),
+    }
+    data = db_client.get('/search?q=ligh&type=jockey,owner&limit=1').get_json()
+    assert len(data['results']) == 1
+    assert data['results'][0]['type'] in ('jockey', 'owner')
+
+
+def test_search_bad_type(db_client):
+    assert db_client.get('/search?q=x&type=trainer').status_code == 400
+    assert db_client.get('/search').get_json()['results'] == []
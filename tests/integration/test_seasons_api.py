@@ -0,0 +1,47 @@
+import io
+
+from app.ingest import import_file
+from app.jobs import Worker
+from test_ingest_api import CSV, login_admin
+
+
+def season_csv(year: int) -> str:
+    return CSV.replace('2024-', f'{year}-')
+
+
+def fill(db_app):
+    for year in (2018, 2019, 2024):
+        import_file(db_app.db_engine, io.StringIO(season_csv(year)), "csv", f"{year}.csv")
+
+
+def test_archive_and_restore_commands(db_app, tmp_path):
+    db_app.config['SEASON_ARCHIVE_DIR'] = str(tmp_path / 'archive')
+    fill(db_app)
+    runner = db_app.test_cli_runner()
+
+    result = runner.invoke(args=['seasons', 'archive', '--before', '2020'])
+    assert result.exit_code == 0, result.output
+    assert 'Archived 2 seasons' in result.output
+    assert sorted(p.name for p in (tmp_path / 'archive').iterdir()) == ['season_2018.db', 'season_2019.db']
+    assert '2019: 1 races, 1 results' in runner.invoke(args=['seasons', 'list']).output
+
+    result = runner.invoke(args=['seasons', 'restore', '2018'])
+    assert result.exit_code != 0 and 'newest archived' in result.output
+    assert runner.invoke(args=['seasons', 'restore', '2019']).exit_code == 0
+    # a partition command is a no-op on SQLite
+    assert 'no seasons' in runner.invoke(args=['seasons', 'partition']).output
+
+
+def test_archive_job_and_admin_page(db_app, db_client, tmp_path):
+    db_app.config['SEASON_ARCHIVE_DIR'] = str(tmp_path)
+    fill(db_app)
+    job_id = db_app.job_queue.enqueue('seasons.archive', {'before': 2019})
+    Worker(db_app, poll_seconds=0.01).run(burst=True)
+    assert db_app.job_queue.get(job_id)['result'] == {'seasons': [2018]}
+
+    login_admin(db_app, db_client)
+    page = db_client.get('/admin').get_data(as_text=True)
+    assert 'Архив сезонов' in page and 'season_2018.db' in page
+    # the import endpoint refuses rows of the archived season
+    response = db_client.post('/admin/import', data={'file': (io.BytesIO(season_csv(2018).encode()), 'late.csv')})
+    assert response.status_code == 400 and 'archived' in response.get_json()['error']
@@ -0,0 +1,95 @@
+import datetime as dt
+import io
+import os
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, func, select, text, update
+
+from app.export import iter_chunks
+from app.ingest import import_file
+from app.models import Race, Result
+from app.seasons import (
+    archive_season, is_partitioned, partition_tables, restore_season, sources, unpartition_tables,
+)
+from test_ingest_api import CSV
+from test_migrations import ALEMBIC_INI
+
+# an empty scratch database: the test migrates it to head and back to base
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL is not set')
+
+
+def season_csv(year: int) -> str:
+    return CSV.replace('2024-', f'{year}-')
+
+
+def count_results(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(Result)).scalar()
+
+
+@pytest.fixture
+def pg(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', POSTGRES_URL)
+    cfg = Config(ALEMBIC_INI)
+    cfg.set_main_option('script_location', os.path.join(os.path.dirname(ALEMBIC_INI), 'alembic'))
+    cfg.set_main_option('sqlalchemy.url', POSTGRES_URL)
+    command.upgrade(cfg, 'head')
+    engine = create_engine(POSTGRES_URL)
+    yield cfg, engine
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA IF EXISTS archive CASCADE"))
+        conn.execute(text("DELETE FROM season_archives"))
+    engine.dispose()
+    command.downgrade(cfg, 'base')
+
+
+def test_partitions_archive_restore_and_unpartition(pg):
+    cfg, engine = pg
+    today = dt.date.today()
+    with engine.connect() as conn:
+        assert is_partitioned(conn)
+    for year in (2019, 2020, today.year):
+        import_file(engine, io.StringIO(season_csv(year)), 'csv', f'{year}.csv')
+    with engine.connect() as conn:
+        partitions = set(conn.execute(text(
+            "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'results'::regclass"
+        )).scalars())
+        assert {'results_2019', 'results_2020', f'results_{today.year}'} <= partitions
+        plan = '\n'.join(conn.execute(text("EXPLAIN SELECT * FROM results WHERE race_date >= :d"),
+                                      {'d': today}).scalars())
+        assert 'results_2019' not in plan and f'results_{today.year}' in plan
+
+    # a rescheduled race takes its results along to the new partition
+    with engine.begin() as conn:
+        conn.execute(update(Race).where(Race.date == dt.date(2020, 5, 1)).values(date=dt.date(2020, 6, 1)))
+        assert conn.execute(text("SELECT race_date FROM results_2020")).scalar() == dt.date(2020, 6, 1)
+
+    info = archive_season(engine, 2019, '')
+    assert (info['races'], info['results']) == (1, 1)
+    assert count_results(engine) == 2
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT to_regclass('archive.results_2019') IS NOT NULL")).scalar()
+    assert [source.season for source in sources(engine, dt.date(2019, 1, 1), dt.date(2019, 12, 31))] == [2019, None]
+    assert len([row for rows in iter_chunks(engine) for row in rows]) == 3
+
+    assert restore_season(engine, 2019)['results'] == 1
+    assert count_results(engine) == 3
+
+    with engine.begin() as conn:
+        unpartition_tables(conn)
+        assert not is_partitioned(conn)
+        partition_tables(conn)
+        assert is_partitioned(conn)
+    assert count_results(engine) == 3
+
+    # the migration's own copy of the rebuild works both ways as well
+    command.downgrade(cfg, '7c3e91a05b2d')
+    with engine.connect() as conn:
+        assert not is_partitioned(conn)
+    command.upgrade(cfg, 'head')
+    with engine.connect() as conn:
+        assert is_partitioned(conn)
+    assert count_results(engine) == 3
@@ -0,0 +1,112 @@
+from sqlalchemy import select
+
+from app import create_app
+
+from app.models import User, UserSession, UserType
+from app.sessions import token_key
+from test_ingest_api import login_admin
+from test_routes import register_and_login
+
+
+def session_token(client, app):
+    cookie = client.get_cookie(app.config.get('SESSION_COOKIE_NAME', 'session'))
+    return cookie.value if cookie else None
+
+
+def stored_sessions(app):
+    with app.db_session() as session:
+        return session.execute(select(UserSession)).scalars().all()
+
+
+def test_cookie_holds_only_a_token(db_app, db_client):
+    register_and_login(db_client)
+    token = session_token(db_client, db_app)
+    rows = stored_sessions(db_app)
+    assert [row.id for row in rows if row.login] == [token_key(token)]
+    assert rows[-1].login == 'alice' and rows[-1].user_type == 'peasant'
+    assert len(token) < 64
+
+
+def test_logged_in_requests_skip_user_reload(db_app, db_client, assert_max_queries):
+    register_and_login(db_client)
+    db_client.get('/')
+    lookups = db_app.user_cache.stats()
+    with assert_max_queries(db_app.db_engine, 0):
+        for _ in range(3):
+            assert 'Выйти' in db_client.get('/').get_data(as_text=True)
+    after = db_app.user_cache.stats()
+    assert (after['hits'], after['misses']) == (lookups['hits'], lookups['misses'])
+
+
+def test_token_rotates_on_login_and_logout(db_app, db_client):
+    db_client.post('/login', data={'login': 'nobody', 'password': 'x'})  # flash -> anonymous session
+    anonymous = session_token(db_client, db_app)
+    register_and_login(db_client)
+    signed_in = session_token(db_client, db_app)
+    assert anonymous and signed_in and anonymous != signed_in
+
+    db_client.post('/logout')
+    assert session_token(db_client, db_app) != signed_in
+    assert token_key(signed_in) not in {row.id for row in stored_sessions(db_app)}
+
+
+def test_revoke_user_signs_out_everywhere(db_app):
+    first, second = db_app.test_client(), db_app.test_client()
+    register_and_login(first)
+    register_and_login(second)
+    with db_app.db_session() as session:
+        user_id = session.execute(select(User.id).where(User.login == 'alice')).scalar_one()
+
+    assert db_app.session_store.revoke_user(user_id) == 2
+    for client in (first, second):
+        assert 'Выйти' not in client.get('/').get_data(as_text=True)
+
+
+def test_role_change_reloads_principal(db_app, db_client):
+    register_and_login(db_client, login='root')
+    with db_app.db_session() as session:
+        session.query(User).filter_by(login='root').one().type = UserType.ADMIN
+        session.commit()
+    assert db_client.get('/admin').status_code == 200
+    assert [row.user_type for row in stored_sessions(db_app) if row.login] == ['admin']
+
+
+def test_sweep_command(db_app):
+    import time
+    from sqlalchemy import insert
+    with db_app.db_engine.begin() as conn:
+        conn.execute(insert(UserSession), [
+            {'id': f'{i:064x}', 'data': '{}', 'expires_at': time.time() - 1} for i in range(3)
+        ])
+    result = db_app.test_cli_runner().invoke(args=['sessions', 'sweep'])
+    assert 'Removed 3 expired sessions' in result.output
+
+
+def test_demotion_is_not_undone_by_another_worker(tmp_path):
+    class WorkerConfig:
+        TESTING = True
+        SECRET_KEY = 'test-secret-key'
+        DATABASE_URL = f"sqlite:///{tmp_path / 'shared.db'}"
+        SESSION_CACHE_TTL = 0
+
+    first, second = create_app(WorkerConfig), create_app(WorkerConfig)
+    client = second.test_client()
+    # signing in on the second worker leaves an ADMIN snapshot in its user_cache
+    login_admin(second, client)
+    assert client.get('/admin').status_code == 200
+
+    with first.db_session() as session:
+        session.query(User).filter_by(login='root').one().type = UserType.PEASANT
+        session.commit()
+    assert client.get('/admin').status_code == 403
+    assert [row.user_type for row in stored_sessions(second) if row.user_id] == ['peasant']
+
+    for app in (first, second):
+        app.user_cache.clear()
+    token = session_token(client, second)
+    other = first.test_client()
+    other.set_cookie(first.config.get('SESSION_COOKIE_NAME', 'session'), token)
+    assert other.get('/admin').status_code == 403
+    assert client.get('/admin').status_code == 403
+    for app in (first, second):
+        app.db_engine.dispose()
@@ -0,0 +1,52 @@
+import datetime as dt
+
+from app.models import Horse, Jockey, Owner, Race, Result
+
+
+def seed(app):
+    with app.db_session() as session:
+        owner = Owner(name='Stable A')
+        horse = Horse(name='Lightning', gender='male', age=5, owner=owner)
+        jockey = Jockey(name='Ivanov', age=30, rating=0)
+        race = Race(date=dt.date(2024, 5, 1), time=dt.time(12, 0), place='Moscow')
+        session.add(Result(race=race, horse=horse, jockey=jockey, position=1, race_time='1:40.0'))
+        session.commit()
+        return horse.id
+
+
+def test_leaderboard_endpoint(db_app, db_client):
+    seed(db_app)
+    response = db_client.get('/stats/horse/leaderboard?place=Moscow&from=2024-01&to=2024-12')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['results'][0]['name'] == 'Lightning'
+    assert data['results'][0]['wins'] == 1
+
+
+def test_entity_endpoint(db_app, db_client):
+    horse_id = seed(db_app)
+    assert db_client.get(f'/stats/horse/{horse_id}').get_json()['starts'] == 1
+    assert db_client.get('/stats/horse/9999').status_code == 404
+
+
+def test_bad_arguments(db_client):
+    assert db_client.get('/stats/trainer/leaderboard').status_code == 404
+    assert db_client.get('/stats/horse/leaderboard?order=speed').status_code == 400
+    assert db_client.get('/stats/horse/leaderboard?from=2024-13').status_code == 400
+    # buckets are monthly; a day range is refused rather than widened
+    assert db_client.get('/stats/horse/leaderboard?to=2024-12-31').status_code == 400
+
+
+def test_rebuild_command(db_app):
+    seed(db_app)
+    result = db_app.test_cli_runner().invoke(args=['stats', 'rebuild'])
+    assert result.exit_code == 0
+    assert 'from 1 results' in result.output
+
+
+def test_personal_best_and_track_record(db_app, db_client):
+    horse_id = seed(db_app)
+    assert db_client.get(f'/stats/horse/{horse_id}').get_json()['personal_best'] == '1:40.00'
+    record = db_client.get('/stats/track-record/Moscow').get_json()
+    assert record['race_time_ms'] == 100000
+    assert db_client.get('/stats/track-record/Kazan').status_code == 404
@@ -0,0 +1,147 @@
+import datetime as dt
+import itertools
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.analysis import FormAnalysis, ResultArrays, form_figures, init_app
+from app.models import Base, Horse, Jockey, Owner, Race, Result
+
+
+def arrays(rows):
+    """Массивы из строк (race, horse, jockey, position, starts)"""
+    race, horse, jockey, position, starts = zip(*rows)
+    return ResultArrays(np.arange(1, len(rows) + 1), race, horse, jockey, position, starts)
+
+
+def naive(rows, ids, before=None):
+    """Эталон: перебор всех пар по каждому заезду"""
+    races = {}
+    for race, horse, _, position, starts in rows:
+        if position > 0 and (before is None or starts < before):
+            races.setdefault(race, {})[horse] = position
+    n = len(ids)
+    ahead, meetings = np.zeros((n, n), dtype=int), np.zeros((n, n), dtype=int)
+    for field in races.values():
+        for (i, a), (j, b) in itertools.permutations(enumerate(ids), 2):
+            if a in field and b in field:
+                meetings[i, j] += 1
+                ahead[i, j] += field[a] < field[b]
+    return ahead, meetings
+
+
+def test_head_to_head_matches_naive():
+    """Тест совпадения векторного расчета очных встреч с перебором"""
+    rng = np.random.default_rng(3)
+    rows = []
+    for race in range(200):
+        field = int(rng.integers(2, 9))
+        horses = rng.choice(30, field, replace=False)
+        positions = rng.permutation(field) + 1
+        positions[0] = positions[1] if race % 17 == 0 else positions[0]  # иногда мертвый гит
+        if race % 23 == 0:
+            positions[:] = 0  # заявлены, но еще не бежали
+        for horse, position in zip(horses, positions):
+            rows.append((race, int(horse), 0, int(position), race * 100))
+    data = arrays(rows)
+    card = [5, 0, 29, 12, 7, 100]
+    for before in (None, 10000):
+        ahead, meetings = data.head_to_head("horse", card, before)
+        expected_ahead, expected_meetings = naive(rows, card, before)
+        assert ahead.tolist() == expected_ahead.tolist()
+        assert meetings.tolist() == expected_meetings.tolist()
+    assert (ahead[:, -1] == 0).all() and (meetings[-1] == 0).all()
+
+
+def test_form_is_oldest_first_and_skips_unrun():
+    """Тест строки формы: по времени старта, без незавершенных заездов"""
+    data = arrays([
+        (1, 1, 1, 2, 300), (2, 1, 1, 12, 100), (3, 1, 2, 1, 200), (4, 1, 1, 0, 400),
+    ])
+    assert data.form("horse", 1) == [12, 1, 2]
+    assert data.form("horse", 1, runs=2) == [1, 2]
+    assert data.form("horse", 1, before=250) == [12, 1]
+    assert data.form("jockey", 1) == [12, 2]
+    assert data.form("horse", 99) == []
+    assert form_figures([12, 1, 2]) == "012"
+
+
+def make_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'analysis.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Owner), [{"id": 1, "name": "Stable"}])
+        conn.execute(insert(Horse), [
+            {"id": i, "name": f"H{i}", "gender": "male", "age": 4, "owner_id": 1} for i in (1, 2, 3)
+        ])
+        conn.execute(insert(Jockey), [{"id": i, "name": f"J{i}", "age": 30, "rating": 1500.0} for i in (1, 2, 3)])
+        conn.execute(insert(Race), [
+            {"id": r, "date": dt.date(2024, 5, r), "time": dt.time(14), "place": "M",
+             "starts_at": dt.datetime(2024, 5, r, 14)} for r in (1, 2, 3)
+        ])
+        conn.execute(insert(Result), [
+            {"race_id": 1, "horse_id": 1, "jockey_id": 1, "position": 1, "race_time": ""},
+            {"race_id": 1, "horse_id": 2, "jockey_id": 2, "position": 2, "race_time": ""},
+            {"race_id": 3, "horse_id": 1, "jockey_id": 1, "position": 0, "race_time": ""},
+            {"race_id": 3, "horse_id": 2, "jockey_id": 2, "position": 0, "race_time": ""},
+        ])
+    return engine
+
+
+def test_cards_cached_and_dropped_on_new_results(tmp_path):
+    """Тест кэша карточек: повторно без расчета, сброс при новых результатах"""
+    engine = make_db(tmp_path)
+    analysis = FormAnalysis(engine, sessionmaker(bind=engine), refresh_seconds=3600)
+    card = analysis.race_card(3)
+    assert [r["horse"] for r in card["runners"]] == ["H1", "H2"]
+    assert card["horse_ahead"] == [[0, 1], [0, 0]]
+    assert card["runners"][0]["horse_form"] == "1"
+    assert analysis.race_card(3) is card and analysis.hits == 1
+    assert analysis.race_card(99) is None
+
+    with engine.begin() as conn:
+        conn.execute(insert(Result), [
+            {"race_id": 2, "horse_id": 2, "jockey_id": 2, "position": 1, "race_time": ""},
+            {"race_id": 2, "horse_id": 1, "jockey_id": 3, "position": 2, "race_time": ""},
+        ])
+    assert analysis.race_card(3) is card  # ждет уведомления или истечения refresh_seconds
+    analysis.invalidate()
+    card = analysis.race_card(3)
+    assert card["horse_ahead"] == [[0, 1], [1, 0]]
+    assert card["runners"][1]["horse_form"] == "21"
+    assert analysis.stats()["loads"] == 1 and analysis.stats()["results"] == 6
+
+
+def test_correction_reloads_results(tmp_path):
+    """Тест исправления результатов: обмен местами и удаление видны после commit"""
+    engine = make_db(tmp_path)
+    app = Flask(__name__)
+    app.config["ANALYSIS_REFRESH_SECONDS"] = 3600
+    init_app(app, engine, sessionmaker(bind=engine))
+    analysis = app.form_analysis
+    assert analysis.pair("horse", 1, 2)["a_ahead"] == 1
+    assert analysis.race_card(3)["horse_ahead"] == [[0, 1], [0, 0]]
+
+    with sessionmaker(bind=engine)() as session:
+        first, second = session.scalars(select(Result).where(Result.race_id == 1).order_by(Result.position))
+        first.position, second.position = 2, 1
+        session.commit()
+    assert analysis.pair("horse", 1, 2) == {"entity": "horse", "a": 1, "b": 2, "a_ahead": 0, "b_ahead": 1,
+                                            "meetings": 1}
+    assert analysis.race_card(3)["horse_ahead"] == [[0, 0], [1, 0]]
+    assert analysis.loads == 2
+
+    with engine.begin() as conn:
+        conn.execute(delete(Result).where(Result.race_id == 1))
+    assert analysis.pair("horse", 1, 2)["meetings"] == 0
+    assert analysis.stats()["results"] == 2
+
+    # строка с меньшим id, закоммиченная позже, тоже подхватывается
+    with engine.begin() as conn:
+        conn.execute(insert(Result), [
+            {"id": 1, "race_id": 2, "horse_id": 1, "jockey_id": 1, "position": 1, "race_time": ""},
+        ])
+    assert analysis.form("horse", 1)["form"] == "1"
+    assert analysis.loads == 3
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+
+from app.asgi import async_database_url, build_environ
+
+
+def test_async_database_url():
+    """Тест подстановки асинхронного драйвера в DATABASE_URL"""
+    assert async_database_url('sqlite:///dev.db') == 'sqlite+aiosqlite:///dev.db'
+    assert async_database_url('postgres://u:p@h/db') == 'postgresql+asyncpg://u:p@h/db'
+    assert async_database_url('postgresql+psycopg2://u@h/db') == 'postgresql+asyncpg://u@h/db'
+    with pytest.raises(ValueError):
+        async_database_url('mysql://u@h/db')
+
+
+def test_build_environ():
+    """Тест сборки WSGI environ из ASGI scope"""
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': '/login', 'query_string': b'next=%2F',
+        'headers': [
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'cookie', b'a=1'), (b'cookie', b'b=2'),
+        ],
+        'server': ('example.org', 8000), 'client': ('10.0.0.1', 5555),
+    }
+    environ = build_environ(scope, b'login=x')
+    assert environ['REQUEST_METHOD'] == 'POST'
+    assert (environ['PATH_INFO'], environ['QUERY_STRING']) == ('/login', 'next=%2F')
+    assert environ['CONTENT_TYPE'] == 'application/x-www-form-urlencoded'
+    assert environ['CONTENT_LENGTH'] == '7'
+    assert environ['HTTP_COOKIE'] == 'a=1; b=2'
+    assert (environ['SERVER_NAME'], environ['SERVER_PORT']) == ('example.org', '8000')
+    assert environ['REMOTE_ADDR'] == '10.0.0.1'
+    assert environ['wsgi.input'].read() == b'login=x'
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.auth import create_user, lookup_login, update_password
+from app.models import Base, UserType
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_lookup_returns_only_auth_columns(session):
+    """Тест что поиск по логину возвращает только нужные поля"""
+    user_id = create_user(session, 'alice', 'hash-1', UserType.ADMIN)
+    session.commit()
+
+    row = lookup_login(session, 'alice')
+    assert tuple(row._fields) == ('id', 'password', 'type')
+    assert row.id == user_id
+    assert row.password == 'hash-1'
+    assert row.type == UserType.ADMIN
+    assert lookup_login(session, 'nobody') is None
+
+
+def test_lookup_case_insensitive(session):
+    """Тест поиска без учета регистра"""
+    create_user(session, 'Alice', 'hash-1')
+    session.commit()
+
+    assert lookup_login(session, 'alice') is None
+    assert lookup_login(session, 'alice', case_insensitive=True).password == 'hash-1'
+
+
+def test_create_user_conflict_returns_none(session):
+    """Тест что повторная регистрация не падает и ничего не вставляет"""
+    assert create_user(session, 'bob', 'hash-1') is not None
+    assert create_user(session, 'bob', 'hash-2') is None
+    session.commit()
+    assert lookup_login(session, 'bob').password == 'hash-1'
+
+
+def test_update_password(session):
+    """Тест обновления хеша пароля"""
+    user_id = create_user(session, 'carol', 'old')
+    update_password(session, user_id, 'new')
+    session.commit()
+    assert lookup_login(session, 'carol').password == 'new'
@@ -0,0 +1,89 @@
+import time
+
+from flask import Flask, render_template_string
+
+from app import cache as page_cache
+from app.cache import MemoryBackend, SQLiteBackend
+
+
+def entry(body=b'<html></html>'):
+    return {'body': body, 'status': 200, 'content_type': 'text/html', 'etag': 'x', 'last_modified': 0}
+
+
+def test_memory_backend_lru_eviction():
+    """Тест вытеснения старых страниц из LRU"""
+    backend = MemoryBackend(maxsize=2)
+    backend.set('a', entry(), 60)
+    backend.set('b', entry(), 60)
+    backend.get('a')
+    backend.set('c', entry(), 60)
+
+    assert backend.get('b') is None
+    assert backend.get('a') is not None
+    assert backend.get('c') is not None
+
+
+def test_memory_backend_ttl(monkeypatch):
+    """Тест истечения срока жизни записи"""
+    backend = MemoryBackend()
+    backend.set('a', entry(), 10)
+    now = time.time()
+    monkeypatch.setattr(page_cache.time, 'time', lambda: now + 11)
+    assert backend.get('a') is None
+
+
+def test_sqlite_backend_shared_between_instances(tmp_path):
+    """Тест общего файла кэша для нескольких воркеров"""
+    path = str(tmp_path / 'cache.sqlite')
+    writer = SQLiteBackend(path)
+    reader = SQLiteBackend(path)
+
+    writer.set('page', entry(b'hello'), 60)
+    got = reader.get('page')
+    assert got['body'] == b'hello'
+    assert got['etag'] == 'x'
+
+    writer.delete('page')
+    assert reader.get('page') is None
+
+
+def test_sqlite_backend_prune_keeps_newest(tmp_path):
+    """Тест ограничения размера файлового кэша"""
+    backend = SQLiteBackend(str(tmp_path / 'cache.sqlite'), maxsize=2)
+    for i in range(4):
+        backend.set(f'k{i}', entry(), 60)
+        time.sleep(0.001)
+    backend.prune()
+    assert backend.get('k0') is None
+    assert backend.get('k3') is not None
+
+
+def test_fragment_cache_tag():
+    """Тест тега {% cache %} в шаблонах"""
+    app = Flask(__name__)
+    page_cache.init_app(app, namespace='test')
+    calls = []
+    template = '{% cache "board", 60 %}{{ expensive() }}{% endcache %}'
+
+    def expensive():
+        calls.append(1)
+        return 'rendered'
+
+    with app.test_request_context():
+        assert render_template_string(template, expensive=expensive) == 'rendered'
+        assert render_template_string(template, expensive=expensive) == 'rendered'
+    assert len(calls) == 1
+
+
+def test_source_namespace_follows_file_contents(tmp_path):
+    """Тест пространства имен кэша: одинаково для всех воркеров, меняется с шаблонами"""
+    (tmp_path / 'templates').mkdir()
+    template = tmp_path / 'templates' / 'index.html'
+    template.write_text('v1')
+    (tmp_path / '__pycache__').mkdir()
+    first = page_cache.source_namespace(str(tmp_path))
+    (tmp_path / '__pycache__' / 'views.cpython-311.pyc').write_bytes(b'\0')
+    assert page_cache.source_namespace(str(tmp_path)) == first
+
+    template.write_text('v2')
+    assert page_cache.source_namespace(str(tmp_path)) != first
@@ -0,0 +1,140 @@
+import pytest
+from sqlalchemy.pool import NullPool
+
+from app import engine_options
+from app.entrypoint import engines_per_worker, gunicorn_argv, gunicorn_settings, normalize_db_url, pool_settings
+
+
+def test_normalize_db_url():
+    """Тест замены устаревшей схемы postgres://"""
+    assert normalize_db_url('postgres://u@h/db') == 'postgresql://u@h/db'
+    assert normalize_db_url('sqlite:///dev.db') == 'sqlite:///dev.db'
+
+
+def test_workers_from_cpu_count():
+    """Тест расчета числа воркеров по числу ядер"""
+    assert gunicorn_settings({}, cpu_count=2)['workers'] == 5
+    assert gunicorn_settings({}, cpu_count=64)['workers'] == 16
+    threaded = gunicorn_settings({'GUNICORN_WORKER_CLASS': 'gthread'}, cpu_count=4)
+    assert (threaded['workers'], threaded['threads'], threaded['concurrency']) == (5, 4, 4)
+    assert gunicorn_settings({'WEB_CONCURRENCY': '3'}, cpu_count=64)['workers'] == 3
+    with pytest.raises(ValueError):
+        gunicorn_settings({'GUNICORN_WORKER_CLASS': 'eventlet'})
+
+
+@pytest.mark.parametrize('workers, concurrency, budget', [
+    (5, 1, 90), (17, 4, 90), (4, 8, 20), (3, 1000, 30), (50, 1, 20),
+])
+def test_pool_stays_within_connection_budget(workers, concurrency, budget):
+    """Тест что суммарное число соединений не превышает бюджет"""
+    pool = pool_settings(workers, concurrency, {'DB_MAX_CONNECTIONS': str(budget)})
+    per_worker = pool['DB_POOL_SIZE'] + pool['DB_MAX_OVERFLOW']
+    assert pool['DB_POOL_SIZE'] >= 1
+    assert per_worker <= max(1, budget // workers)
+    assert pool['DB_POOL_SIZE'] <= concurrency
+
+
+def test_null_pool_mode():
+    """Тест режима без пула для PgBouncer"""
+    pool = pool_settings(4, 4, {'DB_POOL_MODE': 'null'})
+    assert 'DB_POOL_SIZE' not in pool
+    options = engine_options(pool, 'postgresql://u@h/db')
+    assert options['poolclass'] is NullPool
+
+
+def test_engine_options_for_queue_pool():
+    """Тест передачи размеров пула в create_engine"""
+    options = engine_options({'DB_POOL_SIZE': 3, 'DB_MAX_OVERFLOW': 1}, 'postgresql://u@h/db')
+    assert (options['pool_size'], options['max_overflow']) == (3, 1)
+    assert 'pool_size' not in engine_options({'DB_POOL_SIZE': 3}, 'sqlite:///dev.db')
+
+
+def test_gunicorn_argv():
+    """Тест командной строки gunicorn"""
+    argv = gunicorn_argv(gunicorn_settings({'GUNICORN_WORKER_CLASS': 'gthread', 'WEB_CONCURRENCY': '2'}))
+    assert argv[:3] == ['gunicorn', '--workers', '2']
+    assert argv[argv.index('--threads') + 1] == '4'
+    assert argv[-1] == 'app:create_app()'
+
+
+def test_wait_for_db_backs_off_exponentially():
+    """Тест экспоненциальной задержки при ожидании БД"""
+    from app.entrypoint import wait_for_db
+    delays = []
+    with pytest.raises(Exception):
+        wait_for_db('sqlite:////nonexistent-dir/db.sqlite', timeout=0.05,
+                    max_delay=0.4, sleep=delays.append)
+    assert delays[:4] == [0.1, 0.2, 0.4, 0.4]
+
+
+def test_skip_upgrade_when_at_head(tmp_path, monkeypatch):
+    """Тест пропуска миграций, если схема актуальна"""
+    import os
+    from app.entrypoint import alembic_config, migrations_current, run_alembic_upgrade
+    root = os.path.join(os.path.dirname(__file__), '..', '..')
+    monkeypatch.chdir(root)
+    url = f"sqlite:///{tmp_path / 'boot.db'}"
+    monkeypatch.setenv('DATABASE_URL', url)
+    cfg = alembic_config(url)
+
+    assert migrations_current(cfg) is False
+    assert run_alembic_upgrade(cfg) is True
+    assert migrations_current(cfg) is True
+    assert run_alembic_upgrade(cfg) is False
+
+
+def test_preload_flag():
+    """Тест что gunicorn запускается с --preload по умолчанию"""
+    assert '--preload' in gunicorn_argv(gunicorn_settings({}))
+    assert '--preload' not in gunicorn_argv(gunicorn_settings({'GUNICORN_PRELOAD': '0'}))
+
+
+def test_create_app_without_create_all(tmp_path):
+    """Тест что create_all можно отключить"""
+    from sqlalchemy import inspect
+    from app import create_app
+
+    class Config:
+        SECRET_KEY = 'x'
+        DATABASE_URL = f"sqlite:///{tmp_path / 'empty.db'}"
+        AUTO_CREATE_SCHEMA = False
+
+    app = create_app(Config)
+    assert inspect(app.db_engine).get_table_names() == []
+
+
+def test_uvicorn_worker_argv(monkeypatch):
+    """Тест запуска ASGI-приложения через воркер uvicorn"""
+    import importlib.util
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: object())
+    settings = gunicorn_settings({'GUNICORN_WORKER_CLASS': 'uvicorn'}, cpu_count=4)
+    assert (settings['workers'], settings['concurrency']) == (4, 1000)
+    argv = gunicorn_argv(settings)
+    assert argv[argv.index('--worker-class') + 1] == 'uvicorn.workers.UvicornWorker'
+    assert argv[argv.index('--worker-connections') + 1] == '1000'
+    assert argv[-1] == 'app.asgi:create_asgi_app()'
+
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+    with pytest.raises(ValueError, match='needs uvicorn'):
+        gunicorn_settings({'GUNICORN_WORKER_CLASS': 'uvicorn'})
+
+
+def test_pool_split_between_engines():
+    """Тест деления бюджета соединений между двумя движками воркера"""
+    env = {'DB_MAX_CONNECTIONS': '80'}
+    single = pool_settings(4, 1000, env)
+    double = pool_settings(4, 1000, env, engines_per_worker=2)
+    assert single['DB_POOL_SIZE'] + single['DB_MAX_OVERFLOW'] <= 20
+    assert double['DB_POOL_SIZE'] + double['DB_MAX_OVERFLOW'] <= 10
+
+
+def test_budget_counts_other_engines_and_job_worker():
+    """Тест учета движков лимитера и соединений воркера задач в бюджете"""
+    assert engines_per_worker('gthread', {}) == 1
+    limiter = {'RATE_LIMIT_BACKEND': 'database', 'RATE_LIMIT_DATABASE_URL': 'postgresql://u@h/limits'}
+    assert engines_per_worker('uvicorn', limiter) == 3
+    # the default job worker (2 slots + 1) is left out of the web pools
+    pool = pool_settings(1, 1000, {'DB_MAX_CONNECTIONS': '20'})
+    assert pool['DB_POOL_SIZE'] + pool['DB_MAX_OVERFLOW'] == 17
+    pool = pool_settings(1, 1000, {'DB_MAX_CONNECTIONS': '20', 'DB_RESERVED_CONNECTIONS': '10'})
+    assert pool['DB_POOL_SIZE'] + pool['DB_MAX_OVERFLOW'] == 10
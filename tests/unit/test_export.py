@@ -0,0 +1,67 @@
+import datetime as dt
+import gzip
+import io
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.export import encode_columnar, export_stream, iter_chunks, read_columnar
+from app.ingest import iter_records, parse_record
+from app.metrics import count_queries
+from app.models import Base, Horse, Jockey, Owner, Race, Result
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        horse = Horse(name='Гром', gender='male', age=5, owner=Owner(name='Stable A'))
+        jockey = Jockey(name='Ivanov', age=30, rating=0)
+        for day in range(1, 8):
+            race = Race(date=dt.date(2024, 5, day), time=dt.time(14, 30), place='Moscow' if day % 2 else 'Kazan')
+            session.add(Result(race=race, horse=horse, jockey=jockey, position=day, race_time='1:38.20'))
+        session.add(Result(race=race, horse=horse, jockey=jockey, position=9, race_time='DNF'))
+        session.commit()
+    return engine
+
+
+def test_chunks_are_separate_short_queries(engine):
+    """Тест выгрузки порциями по ключу, по запросу на порцию"""
+    with count_queries(engine) as counter:
+        chunks = list(iter_chunks(engine, chunk_size=3))
+    assert [len(rows) for rows in chunks] == [3, 3, 2]
+    assert [row[0] for rows in chunks for row in rows] == list(range(1, 9))
+    assert counter.count == 1 + 3  # the archived seasons, then one query per chunk
+
+
+def test_csv_export_can_be_imported_again(engine):
+    """Тест совместимости CSV-выгрузки с форматом импорта"""
+    data = b''.join(export_stream(engine, 'csv', place='Kazan')).decode('utf-8')
+    records = [parse_record(n, raw) for n, raw in iter_records(io.StringIO(data), 'csv')]
+    assert [r['date'] for r in records] == [dt.date(2024, 5, 2), dt.date(2024, 5, 4), dt.date(2024, 5, 6)]
+    assert records[0]['race_time_ms'] == 98200
+
+
+def test_gzip_jsonl_export(engine):
+    """Тест сжатия JSONL на лету"""
+    data = b''.join(export_stream(engine, 'jsonl', compress=True, date_to=dt.date(2024, 5, 2)))
+    lines = gzip.decompress(data).decode('utf-8').splitlines()
+    assert len(lines) == 2
+    assert '"horse": "Гром"' in lines[0]
+
+
+def test_columnar_round_trip(engine):
+    """Тест записи и чтения колоночного формата"""
+    data = b''.join(encode_columnar(iter_chunks(engine, chunk_size=5)))
+    groups = list(read_columnar(io.BytesIO(data)))
+    assert [len(group['id']) for group in groups] == [5, 3]
+    last = groups[-1]
+    assert last['horse'] == ['Гром'] * 3
+    assert last['time'][0] == dt.time(14, 30)
+    assert last['date'][-1] == dt.date(2024, 5, 7)
+    assert last['race_time_ms'] == [98200, 98200, None]
+
+    with pytest.raises(ValueError):
+        next(read_columnar(io.BytesIO(b'not columnar')))
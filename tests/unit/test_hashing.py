@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+
+from app.hashing import HasherBusy, PasswordHasher, normalize_method
+
+FAST = 'pbkdf2:sha256:1000'
+
+
+def test_normalize_method_defaults():
+    """Тест разворачивания сокращенных названий методов"""
+    assert normalize_method('scrypt') == 'scrypt:32768:8:1'
+    assert normalize_method('scrypt:16384') == 'scrypt:16384:8:1'
+    assert normalize_method('pbkdf2') == f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+    with pytest.raises(ValueError):
+        normalize_method('md5')
+
+
+def test_hash_and_verify_inline():
+    """Тест хеширования без пула процессов"""
+    hasher = PasswordHasher(method=FAST)
+    hashed = hasher.hash('secret')
+    assert hashed.startswith(FAST + '$')
+    assert hasher.verify(hashed, 'secret') is True
+    assert hasher.verify(hashed, 'wrong') is False
+    assert hasher.verify('', 'secret') is False
+
+
+def test_needs_rehash_on_cost_change():
+    """Тест определения устаревших параметров хеша"""
+    old = PasswordHasher(method=FAST).hash('secret')
+    assert PasswordHasher(method=FAST).needs_rehash(old) is False
+    assert PasswordHasher(method='pbkdf2:sha256:2000').needs_rehash(old) is True
+
+
+def test_hash_in_process_pool():
+    """Тест хеширования в пуле процессов"""
+    hasher = PasswordHasher(method=FAST, workers=1)
+    try:
+        assert hasher.verify(hasher.hash('secret'), 'secret') is True
+    finally:
+        hasher.shutdown()
+
+
+def test_rejects_when_queue_is_full():
+    """Тест быстрого отказа при заполненной очереди"""
+    hasher = PasswordHasher(method=FAST, max_pending=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(*args):
+        started.set()
+        release.wait(5)
+        return 'done'
+
+    worker = threading.Thread(target=hasher._run, args=(slow,))
+    worker.start()
+    started.wait(5)
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash('secret')
+        assert hasher.rejected == 1
+    finally:
+        release.set()
+        worker.join()
+    assert hasher.hash('secret')
+
+
+def test_timed_out_hash_keeps_its_slot():
+    """Тест что хеш, который перестали ждать, занимает очередь до своего завершения"""
+    import time
+
+    hasher = PasswordHasher(method=FAST, workers=1, max_pending=1, timeout=0.1)
+    try:
+        assert hasher.hash('warm up')
+        with pytest.raises(HasherBusy, match='timed out'):
+            hasher._run(time.sleep, 1)
+        with pytest.raises(HasherBusy, match='queue is full'):
+            hasher.hash('secret')
+        assert hasher.rejected == 2
+        time.sleep(1.5)
+        assert hasher.hash('secret')
+    finally:
+        hasher.shutdown()
+
+
+def test_async_hash_and_verify():
+    """Тест асинхронного хеширования в пуле потоков и процессов"""
+    import asyncio
+
+    for workers in (0, 1):
+        hasher = PasswordHasher(method=FAST, workers=workers)
+        try:
+            hashed = asyncio.run(hasher.hash_async('secret'))
+            assert asyncio.run(hasher.verify_async(hashed, 'secret')) is True
+            assert asyncio.run(hasher.verify_async(hashed, 'wrong')) is False
+            assert asyncio.run(hasher.verify_async(None, 'secret')) is False
+        finally:
+            hasher.shutdown()
+
+
+def test_pool_off_for_sync_workers():
+    """Тест отключения пула хеширования для sync-воркеров"""
+    from app.hashing import pool_workers
+
+    assert pool_workers(4, 'sync') == 0
+    assert pool_workers(4, 'gthread') == 4
+    assert pool_workers(4, '') == 4
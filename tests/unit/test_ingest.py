@@ -0,0 +1,135 @@
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from app.ingest import (
+    IngestError, Ingestor, content_key, detect_format, import_file, iter_records, parse_record, write_results,
+)
+from app.models import Base, Horse, IngestCheckpoint, Jockey, Owner, Race, Result
+from app.stats import entity_stats
+
+HEADER = 'date,time,place,title,horse,gender,age,owner,jockey,jockey_age,position,race_time\n'
+ROWS = [
+    '2024-05-01,14:30,Moscow,Spring Cup,Lightning,male,5,Stable A,Ivanov,30,1,1:38.20\n',
+    '2024-05-01,14:30,Moscow,Spring Cup,Breeze,female,3,Stable B,Petrov,25,2,1:39.00\n',
+    '2024-05-08,15:00,Kazan,,Lightning,male,5,Stable A,Petrov,25,2,1:41.10\n',
+    '2024-05-08,15:00,Kazan,,Breeze,female,3,Stable B,Ivanov,30,1,1:40.90\n',
+    '2024-05-08,15:00,Kazan,,Thunder,male,4,Stable A,Sidorov,41,3,1:42.00\n',
+]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def count(engine, model):
+    with Session(engine) as session:
+        return session.scalar(select(func.count()).select_from(model))
+
+
+def test_detect_format():
+    """Тест определения формата по расширению"""
+    assert detect_format('season.csv') == 'csv'
+    assert detect_format('season.JSONL') == 'jsonl'
+
+
+def test_content_key():
+    """Тест ключа контрольной точки по содержимому файла"""
+    first = io.BytesIO((HEADER + ROWS[0]).encode())
+    assert content_key(first) == content_key(io.BytesIO((HEADER + ROWS[0]).encode()))
+    assert first.tell() == 0
+    assert content_key(first) != content_key(io.BytesIO((HEADER + ROWS[1]).encode()))
+
+
+def test_parse_record_errors():
+    """Тест сообщений об ошибках в записи"""
+    with pytest.raises(IngestError, match='record 7: missing field'):
+        parse_record(7, {'date': '2024-05-01'})
+    with pytest.raises(IngestError, match='record 3'):
+        parse_record(3, dict(zip(HEADER.strip().split(','), ROWS[0].strip().split(',')), position='first'))
+
+
+def test_import_csv_resolves_names(engine):
+    """Тест импорта CSV с разрешением имен в идентификаторы"""
+    report = import_file(engine, io.StringIO(HEADER + ''.join(ROWS)), 'csv', 'season', batch_size=2)
+
+    assert report.rows == 5
+    assert report.batches == 3
+    assert count(engine, Result) == 5
+    assert count(engine, Race) == 2
+    assert count(engine, Horse) == 3
+    assert count(engine, Owner) == 2
+    assert count(engine, Jockey) == 3
+    with Session(engine) as session:
+        lightning = session.scalars(select(Horse).where(Horse.name == 'Lightning')).one()
+        assert lightning.owner.name == 'Stable A'
+        assert entity_stats(session, 'horse', lightning.id)['wins'] == 1
+
+
+def test_import_jsonl_reuses_existing_entities(engine):
+    """Тест что существующие записи не дублируются"""
+    import_file(engine, io.StringIO(HEADER + ROWS[0]), 'csv', 'first')
+    keys = HEADER.strip().split(',')
+    lines = [json.dumps(dict(zip(keys, row.strip().split(',')))) for row in ROWS[1:3]]
+    import_file(engine, io.StringIO('\n'.join(lines) + '\n'), 'jsonl', 'second')
+
+    assert count(engine, Race) == 2
+    assert count(engine, Horse) == 2
+    assert count(engine, Result) == 3
+
+
+def test_resume_after_failure(engine):
+    """Тест продолжения импорта после ошибки"""
+    broken = HEADER + ROWS[0] + ROWS[1] + ROWS[2].replace(',2,1:41.10', ',x,1:41.10') + ROWS[3]
+    with pytest.raises(IngestError):
+        import_file(engine, io.StringIO(broken), 'csv', 'season', batch_size=2)
+    assert count(engine, Result) == 2
+
+    fixed = HEADER + ''.join(ROWS[:4])
+    report = import_file(engine, io.StringIO(fixed), 'csv', 'season', batch_size=2)
+    assert report.resumed_from == 2
+    assert report.skipped == 2
+    assert report.rows == 2
+    assert count(engine, Result) == 4
+
+    with Session(engine) as session:
+        # a completed run leaves no checkpoint behind
+        assert session.get(IngestCheckpoint, 'season') is None
+
+
+def test_progress_callback(engine):
+    """Тест отчета о скорости импорта"""
+    seen = []
+    ingestor = Ingestor(engine, batch_size=2, progress=lambda r: seen.append(r.rows))
+    report = ingestor.run(iter_records(io.StringIO(HEADER + ''.join(ROWS)), 'csv'), 'season')
+    assert seen == [2, 4]
+    assert report.rows_per_sec > 0
+
+
+class CopyCursor:
+    def copy_expert(self, sql, buf):
+        self.sql, self.data = sql, buf.read()
+
+    def close(self):
+        pass
+
+
+def test_copy_keeps_blank_race_time_not_null():
+    """Тест COPY: пустое время забега загружается как пустая строка, а не NULL"""
+    cursor = CopyCursor()
+    conn = SimpleNamespace(
+        dialect=SimpleNamespace(name='postgresql', driver='psycopg2'), info={},
+        connection=SimpleNamespace(dbapi_connection=SimpleNamespace(cursor=lambda: cursor)),
+    )
+    record = parse_record(1, dict(zip(HEADER.strip().split(','), ROWS[0].strip().split(',')), race_time=''))
+    assert record['race_time'] == '' and record['race_time_ms'] is None
+    write_results(conn, [dict(record, race_id=1, horse_id=2, jockey_id=3)])
+    assert 'FORCE_NOT_NULL (race_time)' in cursor.sql
+    assert cursor.data == '1,2024-05-01,2,3,1,,\r\n'
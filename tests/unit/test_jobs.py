@@ -0,0 +1,153 @@
+import datetime as dt
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.jobs import (
+    DONE, FAILED, HANDLERS, QUEUED, RUNNING, JobQueue, Worker, claim, enqueue, fail, jobs_t, requeue_stale,
+)
+from app.models import Base
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def kinds(monkeypatch):
+    """Тестовые обработчики задач"""
+    calls = []
+
+    def echo(ctx, value=None):
+        ctx.progress(0.5, "half way", force=True)
+        calls.append(value)
+        return {"value": value}
+
+    attempts = []
+
+    def flaky(ctx, fails=1):
+        attempts.append(ctx.job_id)
+        if len(attempts) <= fails:
+            raise RuntimeError("boom")
+        return "ok"
+
+    monkeypatch.setitem(HANDLERS, "test.echo", echo)
+    monkeypatch.setitem(HANDLERS, "test.flaky", flaky)
+    return calls
+
+
+def status(engine, job_id):
+    with engine.connect() as conn:
+        return conn.execute(select(jobs_t).where(jobs_t.c.id == job_id)).one()
+
+
+def test_claim_order_priority_then_age(engine, kinds):
+    """Тест порядка выдачи: сначала приоритет, затем время постановки"""
+    with engine.begin() as conn:
+        low = enqueue(conn, "test.echo")
+        high = enqueue(conn, "test.echo", priority=5)
+        later = enqueue(conn, "test.echo", priority=9, delay=3600)
+        second_low = enqueue(conn, "test.echo")
+        order = [claim(conn, "w").id for _ in range(3)]
+        assert claim(conn, "w") is None
+    assert order == [high, low, second_low]
+    job = status(engine, high)
+    assert (job.status, job.attempts, job.locked_by) == (RUNNING, 1, "w")
+    assert status(engine, later).status == QUEUED
+    with pytest.raises(ValueError):
+        with engine.begin() as conn:
+            enqueue(conn, "no.such.kind")
+
+
+def test_concurrent_claims_take_each_job_once(engine, kinds):
+    """Тест: параллельные воркеры не получают одну задачу дважды"""
+    with engine.begin() as conn:
+        for _ in range(30):
+            enqueue(conn, "test.echo")
+    claimed, errors = [], []
+
+    def drain(name):
+        try:
+            while True:
+                with engine.begin() as conn:
+                    job = claim(conn, name)
+                if job is None:
+                    return
+                claimed.append(job.id)
+        except Exception as exc:  # pragma: no cover - reported below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=drain, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert sorted(claimed) == list(range(1, 31))
+
+
+def test_fail_retries_with_backoff_then_gives_up(engine, kinds):
+    """Тест повторов с растущей задержкой и окончательной ошибки"""
+    with engine.begin() as conn:
+        job_id = enqueue(conn, "test.echo", max_attempts=2)
+        job = claim(conn, "w")
+        assert fail(conn, job.id, "w", "boom", job.attempts, job.max_attempts, retry_seconds=60)
+    retried = status(engine, job_id)
+    assert retried.status == QUEUED and retried.error == "boom"
+    assert retried.run_after - retried.started_at >= dt.timedelta(seconds=59)
+
+    with engine.begin() as conn:
+        assert claim(conn, "w") is None  # not due yet
+        job = claim(conn, "w", now=retried.run_after)
+        assert job.attempts == 2
+        assert not fail(conn, job.id, "w", "boom again", job.attempts, job.max_attempts, retry_seconds=60)
+    assert status(engine, job_id).status == FAILED
+
+
+def test_stale_lease_is_requeued(engine, kinds):
+    """Тест возврата в очередь задач упавшего воркера"""
+    with engine.begin() as conn:
+        job_id = enqueue(conn, "test.echo")
+        claim(conn, "dead")
+    started = status(engine, job_id).locked_at
+    with engine.begin() as conn:
+        assert requeue_stale(conn, lease_seconds=60, now=started + dt.timedelta(seconds=30)) == 0
+        assert requeue_stale(conn, lease_seconds=60, now=started + dt.timedelta(seconds=61)) == 1
+    job = status(engine, job_id)
+    assert (job.status, job.locked_by) == (QUEUED, None)
+
+
+def test_worker_runs_and_retries_jobs(db_app, kinds):
+    """Тест воркера на пуле потоков: результат, прогресс и повтор после ошибки"""
+    queue = db_app.job_queue
+    echo = queue.enqueue("test.echo", {"value": 7})
+    flaky = queue.enqueue("test.flaky", {"fails": 1})
+    worker = Worker(db_app, concurrency=2, poll_seconds=0.01, retry_seconds=0)
+    worker.run(burst=True)
+
+    assert queue.get(echo)["result"] == {"value": 7}
+    assert queue.get(echo)["message"] == "half way" and queue.get(echo)["progress"] == 1.0
+    job = queue.get(flaky)
+    assert (job["status"], job["attempts"], job["result"]) == (DONE, 2, "ok")
+    assert worker.completed == {DONE: 2, QUEUED: 1, FAILED: 0}
+    assert queue.stats()["counts"] == {QUEUED: 0, RUNNING: 0, DONE: 2, FAILED: 0}
+
+
+def test_spool_sweep_keeps_recent_and_pending_files(engine, kinds, tmp_path):
+    """Тест очистки спула с сохранением свежих и ожидающих файлов"""
+    queue = JobQueue(engine, spool_dir=str(tmp_path / 'spool'), spool_retention=3600)
+    old, pending, fresh = (queue.spool_path(name) for name in ('old.csv', 'pending.csv', 'fresh.csv'))
+    for path in (old, pending):
+        os.utime(path, (time.time() - 7200,) * 2)
+    queue.enqueue('test.echo', {'path': pending})
+
+    assert queue.sweep_spool() == 1
+    assert not os.path.exists(old) and os.path.exists(pending) and os.path.exists(fresh)
+    assert queue.spooled(fresh) and not queue.spooled(str(tmp_path / 'elsewhere.csv'))
@@ -0,0 +1,46 @@
+import datetime as dt
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.listing import decode_cursor, encode_cursor, keyset_page
+from app.models import Base, Race
+
+
+def test_cursor_round_trip():
+    """Тест кодирования и разбора курсора"""
+    keys = (Race.date, Race.time, Race.id)
+    token = encode_cursor([dt.date(2024, 5, 1), dt.time(12, 30), 7])
+    assert decode_cursor(token, keys) == [dt.date(2024, 5, 1), dt.time(12, 30), 7]
+
+
+def test_malformed_cursor():
+    """Тест отклонения испорченного курсора"""
+    keys = (Race.date, Race.time, Race.id)
+    assert decode_cursor('not-a-cursor', keys) is None
+    assert decode_cursor(encode_cursor([1]), keys) is None
+    assert decode_cursor(encode_cursor(['x', 'y', 'z']), keys) is None
+
+
+def test_keyset_pages_cover_all_rows_once():
+    """Тест обхода всех заездов страницами без пропусков и повторов"""
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(7):
+            # equal dates and times force the id tie-breaker
+            session.add(Race(date=dt.date(2024, 1, 1 + i % 2), time=dt.time(12), place='X'))
+        session.commit()
+
+        keys = (Race.date, Race.time, Race.id)
+        stmt = select(Race.id, Race.date, Race.time)
+        seen, after = [], None
+        while True:
+            rows, cursor = keyset_page(session, stmt, keys, after, limit=3, descending=True)
+            seen += [row['id'] for row in rows]
+            if cursor is None:
+                break
+            after = decode_cursor(cursor, keys)
+
+    expected = [6, 4, 2, 7, 5, 3, 1]  # 2024-01-02 first, then id descending
+    assert seen == expected
@@ -0,0 +1,143 @@
+import asyncio
+import datetime as dt
+import json
+
+import pytest
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+
+from app.live import Channel, LiveFeed, LiveFeedFull
+from app.metrics import count_queries
+from app.models import Base, Horse, Jockey, Owner, Race, Result
+
+
+def row(result_id, position=1):
+    return {'result_id': result_id, 'race_id': 1, 'position': position, 'race_time': '1:40.00',
+            'horse_id': 1, 'horse': 'H', 'jockey_id': 1, 'jockey': 'J'}
+
+
+def test_channel_buffer_and_resume():
+    """Тест общего буфера канала и продолжения по Last-Event-ID"""
+    channel = Channel(1, [row(1)], buffer_size=2)
+    seq, snapshot = channel.snapshot()
+    assert seq == 0 and b'event: snapshot' in snapshot
+    assert channel.snapshot()[1] is snapshot  # encoded once
+
+    assert channel.publish([row(1), row(2, 2)]) == 1  # already known rows are skipped
+    assert [s for s, _ in channel.since(0)] == [1]
+    channel.publish([row(3, 3)])
+    channel.publish([row(4, 4)])
+    # the buffer holds two events, a subscriber still at 0 fell behind
+    assert channel.since(0) is None
+    assert [s for s, _ in channel.since(2)] == [3]
+    assert channel.parse_event_id(channel.event_id(2)) == 2
+    assert channel.parse_event_id('other-2') is None
+    assert [r['result_id'] for r in json.loads(channel.snapshot()[1].split(b'data: ')[1])] == [1, 2, 3, 4]
+
+
+def test_channel_wakes_async_waiters():
+    """Тест пробуждения асинхронных подписчиков одной публикацией"""
+    channel = Channel(1, [])
+
+    async def scenario():
+        waiters = [asyncio.ensure_future(channel.wait_async(0, 5)) for _ in range(100)]
+        await asyncio.sleep(0)
+        channel.publish([row(1)])
+        assert all(await asyncio.gather(*waiters))
+        assert await channel.wait_async(1, 0.01) is False
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def feed():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Owner), [{'id': 1, 'name': 'Stable'}])
+        conn.execute(insert(Horse), [{'id': i, 'name': f'H{i}', 'gender': 'male', 'age': 4, 'owner_id': 1}
+                                     for i in (1, 2)])
+        conn.execute(insert(Jockey), [{'id': 1, 'name': 'J', 'age': 30, 'rating': 1500.0}])
+        conn.execute(insert(Race), [{'id': race_id, 'date': dt.date(2024, 5, 1), 'time': dt.time(12), 'place': 'M'}
+                                    for race_id in (1, 2)])
+    feed = LiveFeed(engine, sessionmaker(bind=engine), max_subscribers=3)
+    feed._ensure_thread = lambda: None  # polled by hand
+    return feed
+
+
+def add_result(engine, result_id, race_id, position):
+    with engine.begin() as conn:
+        conn.execute(insert(Result), [{'id': result_id, 'race_id': race_id, 'horse_id': 1, 'jockey_id': 1,
+                                       'position': position, 'race_time': '1:40.00'}])
+
+
+def test_feed_polls_once_for_all_subscribers(feed):
+    """Тест одного чтения из БД на обновление при любом числе зрителей"""
+    add_result(feed.engine, 1, 1, 1)
+    first = feed.subscribe(1)
+    second = feed.subscribe(1)
+    other = feed.subscribe(2)
+    assert first is second and first is not other
+    assert [r['result_id'] for r in first.results.values()] == [1]
+    with pytest.raises(LiveFeedFull):
+        feed.subscribe(1)
+
+    add_result(feed.engine, 2, 1, 2)
+    add_result(feed.engine, 3, 2, 1)
+    with count_queries(feed.engine) as counter:
+        assert feed.poll_once() == 2
+    assert counter.count == 1
+    assert [s for s, _ in first.since(0)] == [1]
+    assert [s for s, _ in other.since(0)] == [1]
+    assert feed.poll_once() == 0
+
+    feed.unsubscribe(other)
+    assert 2 not in feed.channels
+    assert feed.subscribe(99) is None
+
+
+def test_stream_snapshot_then_results(feed):
+    """Тест потока: снимок, затем новые результаты и пинг"""
+    feed.heartbeat = 0.01
+    channel = feed.subscribe(1)
+    stream = feed.stream(channel)
+    assert next(stream).startswith(b'retry:')
+    assert b'event: snapshot' in next(stream)
+    assert next(stream) == b': ping\n\n'
+
+    add_result(feed.engine, 1, 1, 1)
+    feed.poll_once()
+    frame = next(stream)
+    assert frame.startswith(f'id: {channel.event_id(1)}\n'.encode()) and b'event: result' in frame
+
+    resumed = feed.stream(channel, last_event_id=channel.event_id(1))
+    assert next(resumed).startswith(b'retry:')
+    assert next(resumed) == b': ping\n\n'  # no snapshot again
+
+
+def test_slow_subscriber_is_dropped(feed):
+    """Тест отключения отставшего подписчика"""
+    feed.buffer_size = 2
+    channel = feed.subscribe(1)
+    stream = feed.stream(channel)
+    next(stream), next(stream)
+    for result_id in range(1, 5):
+        add_result(feed.engine, result_id, 1, result_id)
+    feed.poll_once()
+    assert b'event: dropped' in next(stream)
+    assert list(stream) == []
+    assert feed.stats()['dropped'] == 1
+
+
+def test_corrections_are_published(feed):
+    """Тест отправки исправленных позиции и времени зрителям"""
+    add_result(feed.engine, 1, 1, 2)
+    channel = feed.subscribe(1)
+    assert feed.poll_once() == 0
+    with feed.engine.begin() as conn:
+        conn.execute(update(Result).where(Result.id == 1).values(position=1, race_time='1:39.50'))
+    assert feed.poll_once() == 1
+    (seq, frame), = channel.since(0)
+    corrected = json.loads(frame.split(b'data: ')[1])
+    assert (corrected['result_id'], corrected['position'], corrected['race_time']) == (1, 1, '1:39.50')
+    assert feed.poll_once() == 0
@@ -0,0 +1,108 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from app import metrics
+from app.metrics import QueryBudgetExceeded, count_queries, query_budget
+
+
+def make_app(budget, testing=True):
+    engine = create_engine('sqlite:///:memory:')
+    app = Flask(__name__)
+    app.config.update(TESTING=testing, QUERY_BUDGET=budget)
+    metrics.install(app, engine)
+
+    def run(n):
+        with engine.connect() as conn:
+            for _ in range(n):
+                conn.execute(text('SELECT 1'))
+        return 'ok'
+
+    @app.route('/three')
+    def three():
+        return run(3)
+
+    @app.route('/many')
+    @query_budget(5)
+    def many():
+        return run(5)
+
+    return app, engine
+
+
+def test_count_queries():
+    """Тест подсчета запросов в блоке"""
+    engine = create_engine('sqlite:///:memory:')
+    with count_queries(engine) as counter:
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            conn.execute(text('SELECT 2'))
+    assert counter.count == 2
+    assert counter.statements == ['SELECT 1', 'SELECT 2']
+
+
+def test_budget_exceeded_fails_in_testing():
+    """Тест что превышение бюджета роняет тест"""
+    app, _ = make_app(budget=2)
+    with pytest.raises(QueryBudgetExceeded, match='ran 3 queries'):
+        app.test_client().get('/three')
+
+
+def test_view_override_and_disabled_budget():
+    """Тест переопределения бюджета для представления"""
+    app, _ = make_app(budget=2)
+    assert app.test_client().get('/many').status_code == 200
+    app, _ = make_app(budget=0)
+    assert app.test_client().get('/three').status_code == 200
+
+
+def test_budget_only_logs_in_production(caplog):
+    """Тест что в продакшене превышение только логируется"""
+    app, _ = make_app(budget=2, testing=False)
+    assert app.test_client().get('/three').status_code == 200
+    assert 'ran 3 queries' in caplog.text
+
+
+def test_percentile():
+    """Тест вычисления перцентилей"""
+    from app.metrics import percentile
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0.0
+
+
+def test_server_timing_and_request_log(caplog):
+    """Тест заголовка Server-Timing и структурированного лога"""
+    import json
+    import logging
+    app, _ = make_app(budget=0)
+    with caplog.at_level(logging.INFO, logger='request'):
+        response = app.test_client().get('/three')
+
+    header = response.headers['Server-Timing']
+    assert header.startswith('db;dur=')
+    assert 'desc="3 queries"' in header
+    assert 'total;dur=' in header
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line['endpoint'] == 'three'
+    assert line['queries'] == 3
+    assert len(line['slowest']) == 3
+
+
+def test_rolling_summary_and_slow_queries():
+    """Тест скользящего окна и журнала медленных запросов"""
+    app, _ = make_app(budget=0)
+    app.config['SLOW_QUERY_MS'] = 0.000001
+    client = app.test_client()
+    for _ in range(4):
+        client.get('/three')
+
+    summary = {row['endpoint']: row for row in app.request_metrics.summary()}
+    assert summary['three']['count'] == 4
+    assert summary['three']['avg_queries'] == 3
+    assert summary['three']['p50_ms'] <= summary['three']['p99_ms']
+    assert app.request_metrics.slow_queries[-1]['statement'] == 'SELECT 1'
@@ -0,0 +1,86 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+
+from app import queries
+from app.models import Base, Horse, Jockey, Owner, Race, Result
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def card(engine):
+    """Два заезда по пять участников"""
+    with Session(engine) as session:
+        owners = [Owner(name=f'Owner {i}') for i in range(5)]
+        horses = [Horse(name=f'Horse {i}', gender='male', age=4, owner=owners[i]) for i in range(5)]
+        jockeys = [Jockey(name=f'Jockey {i}', age=30, rating=0) for i in range(5)]
+        races = [Race(date=dt.date(2024, 5, d), time=dt.time(12), place='Moscow') for d in (1, 2)]
+        for race in races:
+            for i in range(5):
+                session.add(Result(race=race, horse=horses[i], jockey=jockeys[i],
+                                   position=5 - i, race_time='1:40.0'))
+        session.commit()
+        return [r.id for r in races], horses[0].id, jockeys[0].id, owners[0].id
+
+
+def test_race_card_query_count(engine, card, assert_max_queries):
+    """Тест что карточка заезда грузится за два запроса"""
+    race_ids, *_ = card
+    with Session(engine) as session, assert_max_queries(engine, 2):
+        race = queries.race_card(session, race_ids[0])
+        rows = [(r.position, r.horse.name, r.horse.owner.name, r.jockey.name) for r in race.results]
+    assert rows[0] == (1, 'Horse 4', 'Owner 4', 'Jockey 4')
+    assert len(rows) == 5
+
+
+def test_race_cards_constant_queries(engine, card, assert_max_queries):
+    """Тест что число запросов не зависит от числа заездов"""
+    race_ids, *_ = card
+    with Session(engine) as session, assert_max_queries(engine, 2):
+        races = queries.race_cards(session, race_ids)
+        assert sum(len(r.results) for r in races) == 10
+        assert all(res.horse.owner.name for r in races for res in r.results)
+
+
+def test_unplanned_relationship_raises(engine, card):
+    """Тест что незапланированная ленивая загрузка запрещена"""
+    race_ids, *_ = card
+    with Session(engine) as session:
+        race = queries.race_card(session, race_ids[0])
+        with pytest.raises(InvalidRequestError):
+            race.results[0].horse.results
+
+
+def test_horse_history(engine, card, assert_max_queries):
+    """Тест истории выступлений лошади"""
+    _, horse_id, _, _ = card
+    with Session(engine) as session, assert_max_queries(engine, 2):
+        horse = queries.horse_history(session, horse_id)
+        history = [(r.race.date, r.jockey.name, r.position) for r in horse.results]
+        assert horse.owner.name == 'Owner 0'
+    assert [h[0].day for h in history] == [2, 1]
+
+
+def test_jockey_form(engine, card, assert_max_queries):
+    """Тест последних выступлений жокея одним запросом"""
+    _, _, jockey_id, _ = card
+    with Session(engine) as session, assert_max_queries(engine, 1):
+        rides = queries.jockey_form(session, jockey_id, last=1)
+        assert [(r.race.date.day, r.horse.name) for r in rides] == [(2, 'Horse 0')]
+
+
+def test_owner_stable(engine, card):
+    """Тест загрузки конюшни владельца"""
+    *_, owner_id = card
+    with Session(engine) as session:
+        owner = queries.owner_stable(session, owner_id)
+        assert [h.name for h in owner.horses] == ['Horse 0']
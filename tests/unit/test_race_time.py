@@ -0,0 +1,73 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.models import Base, Horse, Jockey, Owner, Race, Result
+from app.race_time import format_race_time, parse_race_time
+from app.stats import personal_best, track_record, winning_time
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1:38.20', 98200),
+    ('1:38,2', 98200),
+    ('0:59.999', 59999),
+    ('1:02:03.5', 3723500),
+    ('98.2', 98200),
+    ('98.2s', 98200),
+    ('1m 38.2s', 98200),
+    ('1m38.20s', 98200),
+    ('1.38.20', 98200),
+    (' 2:05 ', 125000),
+])
+def test_parse_race_time(value, expected):
+    """Тест разбора распространенных форматов времени"""
+    assert parse_race_time(value) == expected
+
+
+@pytest.mark.parametrize('value', [None, '', 'DNF', '-', '1:75.0', '1.75.00', 'abc'])
+def test_parse_race_time_rejects_garbage(value):
+    """Тест что непонятные значения дают None"""
+    assert parse_race_time(value) is None
+
+
+def test_format_race_time():
+    """Тест обратного форматирования"""
+    assert format_race_time(98200) == '1:38.20'
+    assert format_race_time(59999) == '1:00.00'
+    assert format_race_time(3723500) == '62:03.50'
+    assert format_race_time(None) == ''
+
+
+def test_model_keeps_ms_in_sync():
+    """Тест что race_time_ms заполняется при установке race_time"""
+    result = Result(race_time='1:40.5')
+    assert result.race_time_ms == 100500
+    result.race_time = 'DNF'
+    assert result.race_time_ms is None
+
+
+def test_timing_queries():
+    """Тест запросов лучших времен"""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        horse = Horse(name='Lightning', gender='male', age=5, owner=Owner(name='A'))
+        other = Horse(name='Breeze', gender='female', age=3, owner=Owner(name='B'))
+        jockey = Jockey(name='Ivanov', age=30, rating=0)
+        first = Race(date=dt.date(2024, 5, 1), time=dt.time(12), place='Moscow')
+        second = Race(date=dt.date(2024, 5, 8), time=dt.time(12), place='Moscow')
+        session.add_all([
+            Result(race=first, horse=horse, jockey=jockey, position=1, race_time='1:40.0'),
+            Result(race=first, horse=other, jockey=jockey, position=2, race_time='1:41.0'),
+            Result(race=second, horse=horse, jockey=jockey, position=2, race_time='1:39.5'),
+            Result(race=second, horse=other, jockey=jockey, position=1, race_time='1:39.0'),
+        ])
+        session.commit()
+
+        assert personal_best(session, horse.id) == 99500
+        assert winning_time(session, first.id) == 100000
+        record = track_record(session, 'Moscow')
+        assert (record.race_time_ms, record.horse_id) == (99000, other.id)
+        assert track_record(session, 'Kazan') is None
@@ -0,0 +1,101 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.models import RateLimitBucket
+from app.ratelimit import DatabaseBuckets, LoginLimiter, MemoryBuckets, Rate, RateLimited, make_limiter
+
+
+def test_rate_parse():
+    """Тест разбора лимита вида 'ёмкость/секунды'"""
+    rate = Rate.parse('5/300')
+    assert (rate.capacity, rate.period) == (5, 300)
+    assert rate.per_second == pytest.approx(1 / 60)
+    with pytest.raises(ValueError):
+        Rate.parse('0/60')
+
+
+def test_memory_bucket_burst_and_refill():
+    """Тест расхода и пополнения корзины в памяти"""
+    buckets = MemoryBuckets()
+    rate = Rate(3, 30)
+    assert [buckets.take('k', rate, 100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take('k', rate, 100.0) == pytest.approx(10.0)
+    assert buckets.take('k', rate, 105.0) == pytest.approx(5.0)
+    assert buckets.take('k', rate, 110.0) == 0.0
+    # refill never exceeds the capacity
+    assert [buckets.take('k', rate, 1000.0) for _ in range(4)][-1] > 0
+
+
+def test_memory_buckets_are_bounded():
+    """Тест вытеснения старых корзин"""
+    buckets = MemoryBuckets(maxsize=2)
+    rate = Rate(1, 60)
+    for key in ('a', 'b', 'c'):
+        buckets.take(key, rate, 0.0)
+    assert len(buckets) == 2
+    assert buckets.take('a', rate, 0.0) == 0.0
+
+
+def test_database_buckets_shared_between_instances():
+    """Тест общей корзины в таблице rate_limits"""
+    engine = create_engine('sqlite://')
+    RateLimitBucket.__table__.create(engine)
+    first, second = DatabaseBuckets(engine), DatabaseBuckets(engine)
+    rate = Rate(2, 20)
+    assert first.take('ip:1', rate, 50.0) == 0.0
+    assert second.take('ip:1', rate, 50.0) == 0.0
+    assert first.take('ip:1', rate, 50.0) == pytest.approx(10.0)
+    assert second.take('ip:1', rate, 60.0) == 0.0
+
+    second.reset('ip:1')
+    assert first.take('ip:1', rate, 60.0) == 0.0
+    assert first.sweep(idle_before=61.0) == 1
+    with engine.connect() as conn:
+        assert conn.execute(select(RateLimitBucket.key)).all() == []
+
+
+def test_login_limiter_scopes_and_stats():
+    """Тест лимитов по IP и по логину"""
+    limiter = LoginLimiter(per_ip=Rate(3, 60), per_login=Rate(2, 60))
+    limiter.check('10.0.0.1', 'Alice')
+    limiter.check('10.0.0.2', 'alice')
+    with pytest.raises(RateLimited) as exc:
+        limiter.check('10.0.0.3', 'ALICE')
+    assert exc.value.scope == 'login'
+    assert exc.value.retry_after > 0
+
+    limiter.succeeded('alice')
+    limiter.check('10.0.0.1', 'alice')
+    limiter.check('10.0.0.1')
+    with pytest.raises(RateLimited) as exc:
+        limiter.check('10.0.0.1', 'bob')
+    assert exc.value.scope == 'ip'
+    assert limiter.stats()['allowed'] == 4
+    assert limiter.stats()['rejected_login'] == 1
+    assert limiter.stats()['rejected_ip'] == 1
+
+
+def test_login_limiter_rejects_locally_before_shared_store():
+    """Тест отказа без обращения к общей таблице"""
+    class CountingBuckets:
+        calls = 0
+
+        def take(self, key, rate, now):
+            self.calls += 1
+            return 0.0
+
+    shared = CountingBuckets()
+    limiter = LoginLimiter(per_ip=Rate(1, 60), per_login=Rate(5, 60), shared=shared)
+    limiter.check('10.0.0.1')
+    with pytest.raises(RateLimited):
+        limiter.check('10.0.0.1')
+    assert shared.calls == 1
+
+
+def test_make_limiter_backends():
+    """Тест выбора хранилища по конфигурации"""
+    assert make_limiter({'RATE_LIMIT_BACKEND': 'none'}, None) is None
+    assert make_limiter({}, None).shared is None
+    assert make_limiter({'RATE_LIMIT_BACKEND': 'database'}, object()).stats()['backend'] == 'database'
+    with pytest.raises(ValueError):
+        make_limiter({'RATE_LIMIT_BACKEND': 'redis'}, None)
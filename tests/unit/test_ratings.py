@@ -0,0 +1,134 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app.models import Base, Horse, Jockey, Owner, Race, RatingHistory, Result
+from app.ratings import INITIAL_RATING, compute, elo_delta, rebuild, update_races
+
+
+def test_two_runner_race():
+    """Тест изменения рейтинга в заезде двух участников"""
+    delta = elo_delta(np.array([[1500.0, 1500.0]]), np.array([[1, 2]]), np.array([[True, True]]))
+    assert delta.tolist() == [[16.0, -16.0]]
+    tie = elo_delta(np.array([[1600.0, 1400.0, 0.0]]), np.array([[1, 1, 0]]), np.array([[True, True, False]]))
+    assert tie[0, 0] < 0 < tie[0, 1] and tie[0, 2] == 0
+    assert tie.sum() == pytest.approx(0)
+
+
+def sequential(races, pool_size):
+    """Эталон: заезды по одному, в порядке проведения"""
+    rating = np.full(pool_size, INITIAL_RATING)
+    for ids, positions in races:
+        current = rating[ids][None, :]
+        delta = elo_delta(current, np.array(positions)[None, :], np.ones_like(current, dtype=bool))
+        rating[ids] += delta[0]
+    return rating
+
+
+def test_layered_compute_matches_sequential():
+    """Тест совпадения послойного расчета с последовательным"""
+    rng = np.random.default_rng(7)
+    races, race_of_row, index, position = [], [], [], []
+    for number in range(300):
+        field = int(rng.integers(2, 8))
+        ids = rng.choice(12, field, replace=False)
+        positions = rng.permutation(field) + 1
+        races.append((ids, positions))
+        race_of_row += [number] * field
+        index += ids.tolist()
+        position += positions.tolist()
+
+    rating = np.full(12, INITIAL_RATING)
+    history = compute(np.array(race_of_row), np.array(position), {"horse": (np.array(index), rating)})
+    assert rating == pytest.approx(sequential(races, 12))
+    before, after = history["horse"]
+    assert before[0] == INITIAL_RATING
+    # rating points are only exchanged within a race
+    assert np.bincount(race_of_row, weights=after - before) == pytest.approx(np.zeros(300), abs=1e-9)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Owner), [{'id': 1, 'name': 'Stable'}])
+        conn.execute(insert(Horse), [
+            {'id': i, 'name': f'H{i}', 'gender': 'male', 'age': 4, 'owner_id': 1} for i in range(1, 7)
+        ])
+        conn.execute(insert(Jockey), [
+            {'id': i, 'name': f'J{i}', 'age': 30, 'rating': INITIAL_RATING} for i in range(1, 5)
+        ])
+    return engine
+
+
+def add_race(conn, race_id, day, finishers):
+    conn.execute(insert(Race), [{'id': race_id, 'date': dt.date(2024, 5, day), 'time': dt.time(12), 'place': 'M'}])
+    conn.execute(insert(Result), [
+        {'race_id': race_id, 'horse_id': h, 'jockey_id': j, 'position': p, 'race_time': ''}
+        for p, (h, j) in enumerate(finishers, start=1)
+    ])
+
+
+def ratings_of(engine):
+    with engine.connect() as conn:
+        return (
+            conn.execute(select(Horse.id, Horse.rating).order_by(Horse.id)).all(),
+            conn.execute(select(Jockey.id, Jockey.rating).order_by(Jockey.id)).all(),
+            conn.execute(select(RatingHistory).order_by(RatingHistory.result_id)).all(),
+        )
+
+
+def test_incremental_updates_match_rebuild(engine):
+    """Тест совпадения инкрементального пересчета с полным"""
+    with engine.begin() as conn:
+        add_race(conn, 1, 1, [(1, 1), (2, 2), (3, 3)])
+        add_race(conn, 2, 3, [(2, 1), (1, 2)])
+    assert rebuild(engine) == 5
+
+    with engine.begin() as conn:
+        # a later race touches only its own runners
+        add_race(conn, 3, 5, [(4, 3), (5, 4)])
+        assert update_races(conn, [3])
+        # an earlier race is replayed together with the races after it
+        add_race(conn, 4, 2, [(1, 2), (3, 1), (6, 4)])
+        assert update_races(conn, [4])
+    incremental = ratings_of(engine)
+
+    rebuild(engine)
+    full = ratings_of(engine)
+    for got, expected in zip(incremental, full):
+        assert [tuple(r) for r in got] == [pytest.approx(tuple(r)) for r in expected]
+    horses = dict(full[0])
+    assert horses[6] is not None and horses[6] < INITIAL_RATING
+
+
+def test_replay_limit(engine, monkeypatch):
+    """Тест отказа от слишком длинной перепроверки"""
+    import app.ratings
+    monkeypatch.setattr(app.ratings, 'REPLAY_LIMIT', 1)
+    with engine.begin() as conn:
+        add_race(conn, 1, 1, [(1, 1), (2, 2)])
+        add_race(conn, 2, 2, [(1, 1), (2, 2)])
+        assert update_races(conn, [1, 2]) is False
+    assert ratings_of(engine)[2] == []
+
+
+def test_declared_runners_are_not_rated(engine):
+    """Тест: заявленные, но еще не бежавшие участники не влияют на рейтинг"""
+    with engine.begin() as conn:
+        add_race(conn, 1, 1, [(1, 1), (2, 2)])
+    rebuild(engine)
+    before = ratings_of(engine)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Race), [{'id': 2, 'date': dt.date(2030, 5, 1), 'time': dt.time(12), 'place': 'M'}])
+        conn.execute(insert(Result), [
+            {'race_id': 2, 'horse_id': h, 'jockey_id': h, 'position': 0, 'race_time': ''} for h in (1, 2)
+        ])
+        assert update_races(conn, [2])
+    assert ratings_of(engine) == before
+    assert rebuild(engine) == 2
+    assert ratings_of(engine) == before
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.models import Base, Owner
+from app.replicas import ReplicaSet, routing_sessionmaker
+
+
+def make_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def engines(tmp_path):
+    primary = make_engine(tmp_path / 'primary.db')
+    replica = make_engine(tmp_path / 'replica.db')
+    with replica.begin() as conn:
+        conn.execute(Owner.__table__.insert().values(name='on replica'))
+    return primary, replica
+
+
+def owner_names(session):
+    return session.scalars(select(Owner.name)).all()
+
+
+def test_reads_go_to_replica_and_writes_to_primary(engines):
+    """Тест маршрутизации чтения на реплику, а записи на основную базу"""
+    primary, replica = engines
+    factory = routing_sessionmaker(ReplicaSet(primary, [replica]), expire_on_commit=False)
+
+    with factory() as session:
+        assert owner_names(session) == ['on replica']
+        session.add(Owner(name='on primary'))
+        session.flush()
+        # after a write the session reads its own changes
+        assert owner_names(session) == ['on primary']
+        session.commit()
+
+    with primary.connect() as conn:
+        assert conn.execute(select(Owner.name)).scalars().all() == ['on primary']
+
+
+def test_round_robin_and_fallback_to_primary(engines, tmp_path):
+    """Тест перебора реплик по кругу и отказа на основную базу"""
+    primary, replica = engines
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replicas = ReplicaSet(primary, [replica, broken], retry_after=60)
+
+    assert [replicas.pick() for _ in range(2)] == [replica, broken]
+    with pytest.raises(Exception):
+        broken.connect()
+    assert replicas.stats()['down']
+    assert [replicas.pick() for _ in range(3)] == [replica, replica, replica]
+
+    replicas.mark_down(replica)
+    assert replicas.pick() is None
+    assert replicas.read_engine() is primary
+
+
+def test_down_replica_is_probed_again(engines):
+    """Тест повторной проверки упавшей реплики"""
+    primary, replica = engines
+    replicas = ReplicaSet(primary, [replica], retry_after=0)
+    replicas.mark_down(replica)
+    assert replicas.pick() is replica
+    assert replicas.stats()['down'] == []
@@ -0,0 +1,145 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine, insert, select, text, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.dml import Delete, Update
+
+from app.models import Base, Horse, Jockey, Owner, Race, Result
+from app.schedule import WATCHED_TABLES, UpcomingRaces, record_write, watch_engine
+
+NOW = dt.datetime(2024, 5, 1, 12, 0)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Owner), [{'id': 1, 'name': 'Stable'}])
+        conn.execute(insert(Horse), [
+            {'id': i, 'name': f'H{i}', 'gender': 'male', 'age': 4, 'owner_id': 1} for i in (1, 2)
+        ])
+        conn.execute(insert(Jockey), [{'id': 1, 'name': 'J1', 'age': 30, 'rating': 1500.0}])
+    return engine
+
+
+def add_race(session, race_id, starts_at, place='M', horse_id=None):
+    race = Race(id=race_id, date=starts_at.date(), time=starts_at.time(), place=place)
+    session.add(race)
+    if horse_id is not None:
+        session.add(Result(race_id=race_id, horse_id=horse_id, jockey_id=1, position=0, race_time=''))
+    session.commit()
+
+
+def test_race_starts_at_follows_date_and_time(engine):
+    """Тест синхронизации starts_at с датой и временем заезда"""
+    race = Race(date=dt.date(2024, 5, 1), time=dt.time(14, 30), place='M')
+    assert race.starts_at == dt.datetime(2024, 5, 1, 14, 30)
+    race.time = dt.time(15)
+    assert race.starts_at == dt.datetime(2024, 5, 1, 15)
+
+
+def test_upcoming_window_and_indexes(engine):
+    """Тест окна ближайших заездов и выборок по ипподрому и лошади"""
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    with factory() as session:
+        add_race(session, 1, NOW - dt.timedelta(hours=1), horse_id=1)
+        add_race(session, 2, NOW + dt.timedelta(hours=1), place='K', horse_id=1)
+        add_race(session, 3, NOW + dt.timedelta(days=2), horse_id=2)
+        add_race(session, 4, NOW + dt.timedelta(days=30))
+    cache = UpcomingRaces(factory, days=7)
+
+    assert [r['id'] for r in cache.upcoming(now=NOW)] == [2, 3]
+    assert [r['id'] for r in cache.upcoming(place='K', now=NOW)] == [2]
+    assert [r['id'] for r in cache.upcoming(horse_id=1, now=NOW)] == [2]
+    assert [r['id'] for r in cache.upcoming(jockey_id=1, days=1, now=NOW)] == [2]
+    assert cache.upcoming(now=NOW)[0]['runners'] == [{'horse_id': 1, 'horse': 'H1', 'jockey_id': 1, 'jockey': 'J1'}]
+    # a race that has started drops out without a reload
+    assert [r['id'] for r in cache.upcoming(now=NOW + dt.timedelta(hours=2))] == [3]
+    assert cache.loads == 1
+
+
+def test_commit_of_races_or_results_invalidates(engine):
+    """Тест сброса кэша после записи в races/results"""
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    cache = UpcomingRaces(factory, days=7, refresh_seconds=3600)
+    watch_engine(engine, WATCHED_TABLES, cache.invalidate)
+    assert cache.upcoming(now=NOW) == []
+    assert cache.upcoming(now=NOW) == [] and cache.loads == 1
+
+    with factory() as session:
+        add_race(session, 1, NOW + dt.timedelta(hours=3))
+    assert [r['id'] for r in cache.upcoming(now=NOW)] == [1]
+
+    with engine.connect() as conn:
+        conn.execute(update(Race).values(place='Z'))
+        conn.rollback()
+    with engine.begin() as conn:
+        conn.execute(insert(Owner), [{'id': 2, 'name': 'Other'}])
+    cache.upcoming(now=NOW)
+    assert cache.loads == 2
+
+    with engine.begin() as conn:
+        conn.execute(update(Race).values(place='Z'))
+    assert cache.upcoming(now=NOW)[0]['place'] == 'Z'
+    assert cache.loads == 3
+
+
+def test_reported_raw_writes_invalidate(engine):
+    """Тест сброса после записи в обход Core (COPY, DDL), о которой сообщили явно"""
+    calls, edits = [], []
+    watch_engine(engine, WATCHED_TABLES, lambda: calls.append(1))
+    watch_engine(engine, {'results'}, lambda: edits.append(1), statements=(Update, Delete))
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE races SET place = 'Z'"))
+    assert calls == []
+
+    with engine.begin() as conn:
+        record_write(conn, {'results'})
+    assert (calls, edits) == ([1], [])
+
+    with engine.connect() as conn:
+        conn.execute(text("DELETE FROM results"))
+        record_write(conn, {'races', 'results'}, Delete)
+        conn.rollback()
+    with engine.begin() as conn:
+        record_write(conn, {'owners'}, Delete)
+    assert (calls, edits) == ([1], [])
+
+    with engine.begin() as conn:
+        record_write(conn, {'results'}, Delete)
+    assert (calls, edits) == ([1, 1], [1])
+
+
+def test_reload_publishes_a_new_snapshot(engine):
+    """Тест что перезагрузка не меняет снимок, который уже читают"""
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    cache = UpcomingRaces(factory, days=7, refresh_seconds=3600)
+    assert cache.upcoming(now=NOW) == []
+    before = cache._snapshot
+
+    with factory() as session:
+        add_race(session, 1, NOW + dt.timedelta(hours=3), horse_id=1)
+    cache.invalidate()
+    assert [r['id'] for r in cache.upcoming(now=NOW)] == [1]
+    assert cache._snapshot is not before
+    assert (before.starts, before.items, before.by_horse) == ((), (), {})
+
+
+def test_rescheduled_race_keeps_its_runners(engine):
+    """Тест переноса даты заезда вместе с results.race_date"""
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    cache = UpcomingRaces(factory, days=7)
+    with factory() as session:
+        add_race(session, 1, NOW - dt.timedelta(days=3), horse_id=1)
+        result = session.get(Result, 1)
+        race = session.get(Race, 1)
+        race.date = (NOW + dt.timedelta(days=1)).date()
+        session.commit()
+        assert result.race_date == race.date
+    with engine.connect() as conn:
+        assert conn.execute(select(Result.race_date)).scalar() == race.date
+    [upcoming] = cache.upcoming(now=NOW)
+    assert [runner['horse_id'] for runner in upcoming['runners']] == [1]
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.models import Base, Horse, Jockey, Owner
+from app.search import search_names
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        owner = Owner(name='Иван Громов')
+        session.add_all([
+            Horse(name='Гром', gender='male', age=4, owner=owner),
+            Horse(name='Летний Гром', gender='male', age=5, owner=owner),
+            Horse(name='Ёлка', gender='female', age=3, owner=owner),
+            Jockey(name='Громов Пётр', age=30, rating=0),
+        ])
+        session.commit()
+        yield session
+
+
+def test_prefix_of_name_ranks_first(session):
+    """Тест ранжирования: совпадение с началом имени выше"""
+    results = search_names(session, 'гро')
+    assert results[0]['name'] in ('Гром', 'Громов Пётр')
+    assert {r['name'] for r in results} == {'Гром', 'Летний Гром', 'Громов Пётр', 'Иван Громов'}
+    names = [r['name'] for r in results]
+    assert names.index('Летний Гром') > names.index('Гром')
+
+
+def test_filters_by_type_and_folds_yo(session):
+    """Тест фильтра по типу и поиска «е» вместо «ё»"""
+    assert [r['type'] for r in search_names(session, 'гром', types=['jockey'])] == ['jockey']
+    assert search_names(session, 'елк')[0]['name'] == 'Ёлка'
+    assert search_names(session, 'петр')[0]['name'] == 'Громов Пётр'
+
+
+def test_triggers_keep_index_in_sync(session):
+    """Тест синхронизации поискового индекса триггерами"""
+    horse = session.query(Horse).filter_by(name='Гром').one()
+    horse.name = 'Буран'
+    session.commit()
+    assert search_names(session, 'буран')[0]['id'] == horse.id
+
+    session.delete(horse)
+    session.commit()
+    assert search_names(session, 'буран') == []
+
+
+def test_empty_and_punctuation_queries(session):
+    """Тест пустых запросов и спецсимволов"""
+    assert search_names(session, '') == []
+    assert search_names(session, '"*') == []
@@ -0,0 +1,120 @@
+import datetime as dt
+import io
+import os
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from app.export import iter_chunks
+from app.ingest import IngestError, import_file
+from app.models import Base, Horse, Jockey, Race, RatingHistory, Result, ResultStat
+from app.ratings import rebuild as rebuild_ratings
+from app.seasons import (
+    SeasonError, archive_before, archive_season, restore_season, season_bounds, source_connection, sources,
+)
+from app.stats import rebuild as rebuild_stats
+
+HEADER = "date,time,place,title,horse,gender,age,owner,jockey,jockey_age,position,race_time\n"
+
+
+def season_csv(year: int, races: int = 3) -> str:
+    lines = []
+    for day in range(1, races + 1):
+        for position, (horse, jockey) in enumerate((("Lightning", "Ivanov"), ("Thunder", "Petrov")), start=1):
+            if day % 2 == 0:
+                position = 3 - position
+            lines.append(f"{year}-05-0{day},12:00,Moscow,Cup,{horse},male,5,Stable,{jockey},30,{position},1:4{position}.0\n")
+    return HEADER + "".join(lines)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    Base.metadata.create_all(engine)
+    for year in (2019, 2020, 2024):
+        import_file(engine, io.StringIO(season_csv(year)), "csv", f"{year}.csv")
+    yield engine
+    engine.dispose()
+
+
+def snapshot(engine):
+    with engine.connect() as conn:
+        return (
+            conn.execute(select(Horse.name, Horse.rating).order_by(Horse.id)).all(),
+            conn.execute(select(Jockey.name, Jockey.rating).order_by(Jockey.id)).all(),
+            conn.execute(select(ResultStat.__table__).order_by(*ResultStat.__table__.primary_key.columns)).all(),
+        )
+
+
+def test_archive_moves_season_into_its_own_file(engine, tmp_path):
+    """Тест переноса закрытого сезона в отдельный файл"""
+    info = archive_season(engine, 2019, str(tmp_path / "archive"))
+    assert (info["races"], info["results"]) == (3, 6)
+    assert os.path.exists(tmp_path / "archive" / "season_2019.db")
+    with engine.connect() as conn:
+        assert conn.execute(select(func.min(Race.date))).scalar() == dt.date(2020, 5, 1)
+        assert conn.execute(select(func.count()).select_from(Result)).scalar() == 12
+        # the moved results keep no rating history in the live database
+        assert conn.execute(select(func.count()).select_from(RatingHistory)).scalar() == 12
+
+    found = sources(engine, dt.date(2019, 1, 1), dt.date(2019, 12, 31))
+    assert [source.season for source in found] == [2019, None]
+    with source_connection(engine, found[0]) as conn:
+        dates = conn.execute(select(found[0].race.date).order_by(found[0].race.id)).scalars().all()
+    assert dates == [dt.date(2019, 5, day) for day in (1, 2, 3)]
+    assert [source.season for source in sources(engine, dt.date(2020, 1, 1))] == [None]
+
+
+def test_history_readers_include_archives(engine, tmp_path):
+    """Тест выгрузки и пересчетов вместе с архивными сезонами"""
+    exported = [row for rows in iter_chunks(engine, chunk_size=4) for row in rows]
+    rebuild_ratings(engine)
+    before = snapshot(engine)
+
+    assert [info["season"] for info in archive_before(engine, 2021, str(tmp_path))] == [2019, 2020]
+    assert [row for rows in iter_chunks(engine, chunk_size=4) for row in rows] == exported
+    assert [row[0] for rows in iter_chunks(engine, date_from=dt.date(2020, 1, 1),
+                                           date_to=dt.date(2020, 12, 31)) for row in rows] == list(range(7, 13))
+    assert rebuild_ratings(engine) == 18
+    with Session(engine) as session:
+        assert rebuild_stats(session) == 18
+        session.commit()
+    assert snapshot(engine) == before
+
+
+def test_restore_newest_archive(engine, tmp_path):
+    """Тест возврата последнего архивного сезона"""
+    archive_before(engine, 2021, str(tmp_path))
+    with pytest.raises(SeasonError):
+        restore_season(engine, 2019)
+    assert restore_season(engine, 2020)["results"] == 6
+    assert not os.path.exists(tmp_path / "season_2020.db")
+    with engine.connect() as conn:
+        assert conn.execute(select(func.min(Race.date))).scalar() == dt.date(2020, 5, 1)
+    assert [source.season for source in sources(engine)] == [2019, None]
+
+
+def test_archive_guards(engine, tmp_path):
+    """Тест ограничений архивации"""
+    with pytest.raises(SeasonError, match="not over"):
+        archive_season(engine, dt.date.today().year, str(tmp_path))
+    with pytest.raises(SeasonError, match="older seasons"):
+        archive_season(engine, 2020, str(tmp_path))
+    assert archive_season(engine, 2018, str(tmp_path)) is None
+    assert not os.path.exists(tmp_path / "season_2018.db")
+    archive_season(engine, 2019, str(tmp_path))
+    with pytest.raises(SeasonError, match="already archived"):
+        archive_season(engine, 2019, str(tmp_path))
+    assert season_bounds(2019) == (dt.date(2019, 1, 1), dt.date(2020, 1, 1))
+
+
+def test_import_refuses_archived_season(engine, tmp_path):
+    """Тест запрета импорта в архивный сезон"""
+    archive_season(engine, 2019, str(tmp_path))
+    with pytest.raises(IngestError, match="season 2019 is archived"):
+        import_file(engine, io.StringIO(season_csv(2019)), "csv", "late-2019.csv")
+    report = import_file(engine, io.StringIO(season_csv(2025, races=1)), "csv", "2025.csv")
+    assert report.rows == 2
+    with engine.connect() as conn:
+        assert conn.execute(select(Result.race_date).order_by(Result.id.desc()).limit(1)).scalar() == dt.date(2025, 5, 1)
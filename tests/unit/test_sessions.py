@@ -0,0 +1,91 @@
+import time
+
+from sqlalchemy import create_engine, func, insert, select
+
+from app.models import Base, UserSession, UserType
+from app.sessions import DatabaseStore, MemoryStore, SessionRecord, serializer
+from app.user_cache import UserSnapshot
+
+ALICE = UserSnapshot(id=1, login='alice', type=UserType.PEASANT)
+
+
+def record(principal=None, ttl=60, **data):
+    return SessionRecord(serializer.dumps(data), time.time() + ttl, principal)
+
+
+def test_memory_store_expiry_and_lru():
+    """Тест истечения и вытеснения сессий в памяти процесса"""
+    store = MemoryStore(maxsize=2)
+    store.save('a', record(x=1))
+    store.save('old', record(ttl=-1))
+    assert store.get('old') is None
+    store.save('b', record())
+    store.save('c', record())
+    assert store.get('a') is None
+    assert serializer.loads(store.get('b').data) == {}
+
+
+def test_memory_store_revoke_and_forget_user():
+    """Тест отзыва и сброса принципала пользователя"""
+    store = MemoryStore()
+    store.save('a', record(ALICE))
+    store.save('b', record(ALICE))
+    store.save('c', record())
+    store.forget_user(1)
+    assert store.get('a').principal is None
+    store.save('a', record(ALICE))
+    assert store.revoke_user(1) == 1
+    assert store.get('a') is None and store.get('c') is not None
+
+
+def make_db_store(**kwargs):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    return DatabaseStore(engine, **kwargs)
+
+
+def test_database_store_round_trip_and_front_cache():
+    """Тест хранения сессии в таблице и кэша перед ней"""
+    store = make_db_store(cache_ttl=60)
+    store.save('k', record(ALICE, _user_id='1'))
+    assert store.get('k').principal == ALICE
+    assert (store.hits, store.misses) == (1, 0)
+
+    fresh = DatabaseStore(store.engine, cache_ttl=60)
+    loaded = fresh.get('k')
+    assert loaded.principal == ALICE
+    assert serializer.loads(loaded.data) == {'_user_id': '1'}
+    assert (fresh.hits, fresh.misses) == (0, 1)
+
+    fresh.forget_user(1)
+    assert DatabaseStore(store.engine).get('k').principal is None
+    assert fresh.revoke_user(1) == 1
+    assert DatabaseStore(store.engine).get('k') is None
+
+
+def test_database_store_sweeps_in_batches():
+    """Тест пакетного удаления истекших сессий"""
+    store = make_db_store()
+    with store.engine.begin() as conn:
+        conn.execute(insert(UserSession), [
+            {'id': f'{i:064x}', 'data': '{}', 'expires_at': time.time() - 1} for i in range(25)
+        ])
+    store.save('live', record())
+    assert store.sweep(batch=10) == 25
+    with store.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(UserSession)).scalar() == 1
+
+
+def test_revoked_session_is_not_written_back():
+    """Тест что отозванная сессия не возвращается из кэша другого воркера"""
+    store = make_db_store(cache_ttl=60)
+    store.save('k', record(ALICE, _user_id='1'))
+    other = DatabaseStore(store.engine, cache_ttl=60)
+    cached = other.get('k')
+    assert store.revoke_user(1) == 1
+
+    renewed = SessionRecord(cached.data, time.time() + 60, ALICE, stored=cached.stored)
+    other.save('k', renewed)
+    with store.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(UserSession)).scalar() == 0
+    assert other.get('k') is None
@@ -0,0 +1,142 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.models import Base, Horse, Jockey, Owner, Race, Result, ResultStat
+from app.stats import entity_stats, leaderboard, rebuild
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def field(session):
+    """Два владельца, три лошади, два жокея"""
+    owners = [Owner(name='Stable A'), Owner(name='Stable B')]
+    horses = [
+        Horse(name='Lightning', gender='male', age=5, owner=owners[0]),
+        Horse(name='Thunder', gender='male', age=4, owner=owners[0]),
+        Horse(name='Breeze', gender='female', age=3, owner=owners[1]),
+    ]
+    jockeys = [Jockey(name='Ivanov', age=30, rating=0), Jockey(name='Petrov', age=25, rating=0)]
+    session.add_all(owners + horses + jockeys)
+    session.commit()
+    return owners, horses, jockeys
+
+
+def run_race(session, place, date, finishers):
+    race = Race(date=date, time=dt.time(12, 0), place=place)
+    session.add(race)
+    for position, (horse, jockey) in enumerate(finishers, start=1):
+        session.add(Result(race=race, horse=horse, jockey=jockey, position=position, race_time='1:40.0'))
+    session.commit()
+    return race
+
+
+def snapshot(session):
+    return sorted(
+        (s.entity, s.entity_id, s.place, s.period, s.starts, s.wins, s.podiums, s.position_sum)
+        for s in session.scalars(select(ResultStat))
+        if s.starts  # emptied buckets stay behind as zeros
+    )
+
+
+def test_insert_updates_aggregates(session, field):
+    """Тест инкрементального обновления агрегатов"""
+    owners, horses, jockeys = field
+    run_race(session, 'Moscow', dt.date(2024, 5, 1), [(horses[0], jockeys[0]), (horses[2], jockeys[1])])
+    run_race(session, 'Kazan', dt.date(2024, 6, 1), [(horses[2], jockeys[1]), (horses[0], jockeys[0])])
+
+    board = leaderboard(session, 'horse')
+    assert [(r['name'], r['wins'], r['starts']) for r in board] == [('Lightning', 1, 2), ('Breeze', 1, 2)]
+    assert board[0]['avg_position'] == 1.5
+
+    moscow = leaderboard(session, 'horse', place='Moscow')
+    assert moscow[0]['name'] == 'Lightning' and moscow[0]['wins'] == 1
+
+    june = leaderboard(session, 'jockey', month_from='2024-06', month_to='2024-06')
+    assert [(r['name'], r['wins']) for r in june] == [('Petrov', 1), ('Ivanov', 0)]
+
+    stable_a = entity_stats(session, 'owner', owners[0].id)
+    assert stable_a['starts'] == 2 and stable_a['podiums'] == 2
+
+
+def test_update_and_delete_adjust_aggregates(session, field):
+    """Тест корректировки агрегатов при изменении и удалении результатов"""
+    owners, horses, jockeys = field
+    race = run_race(session, 'Moscow', dt.date(2024, 5, 1), [(horses[0], jockeys[0]), (horses[1], jockeys[1])])
+
+    first, second = sorted(race.results, key=lambda r: r.position)
+    first.position, second.position = 2, 1
+    session.commit()
+    assert entity_stats(session, 'horse', horses[1].id)['wins'] == 1
+    assert entity_stats(session, 'horse', horses[0].id)['wins'] == 0
+
+    session.delete(second)
+    session.commit()
+    assert entity_stats(session, 'horse', horses[1].id)['starts'] == 0
+
+
+def test_rebuild_matches_incremental(session, field):
+    """Тест что полный пересчет совпадает с инкрементальным"""
+    owners, horses, jockeys = field
+    run_race(session, 'Moscow', dt.date(2024, 5, 1), [(horses[0], jockeys[0]), (horses[2], jockeys[1])])
+    run_race(session, 'Moscow', dt.date(2024, 7, 3), [(horses[1], jockeys[0]), (horses[0], jockeys[1])])
+    incremental = snapshot(session)
+
+    assert rebuild(session) == 4
+    session.commit()
+    assert snapshot(session) == incremental
+
+
+def test_order_by_average_position(session, field):
+    """Тест сортировки по среднему месту"""
+    owners, horses, jockeys = field
+    run_race(session, 'Moscow', dt.date(2024, 5, 1), [(horses[1], jockeys[0]), (horses[0], jockeys[1])])
+    run_race(session, 'Moscow', dt.date(2024, 5, 2), [(horses[1], jockeys[0]), (horses[0], jockeys[1])])
+    board = leaderboard(session, 'horse', order='avg_position', min_starts=2)
+    assert [r['name'] for r in board] == ['Thunder', 'Lightning']
+
+
+def test_race_and_owner_edits_move_counters(session, field):
+    """Тест переноса счетчиков при смене ипподрома, даты и владельца"""
+    owners, horses, jockeys = field
+    race = run_race(session, 'Moscow', dt.date(2024, 5, 1), [(horses[0], jockeys[0]), (horses[2], jockeys[1])])
+    run_race(session, 'Kazan', dt.date(2024, 6, 1), [(horses[0], jockeys[1])])
+    race.place, race.date = 'Sochi', dt.date(2024, 7, 1)
+    horses[0].owner = owners[1]
+    session.commit()
+    incremental = snapshot(session)
+
+    rebuild(session)
+    session.commit()
+    assert snapshot(session) == incremental
+    assert leaderboard(session, 'horse', place='Moscow') == []
+
+
+def test_declared_runners_are_not_starts(session, field):
+    """Тест: заявка без результата не считается стартом, пока не выставлено место"""
+    owners, horses, jockeys = field
+    run_race(session, 'Moscow', dt.date(2024, 5, 1), [(horses[0], jockeys[0])])
+    race = Race(date=dt.date(2030, 5, 1), time=dt.time(12, 0), place='Moscow')
+    declared = Result(race=race, horse=horses[0], jockey=jockeys[0], position=0, race_time='')
+    session.add_all([race, declared])
+    session.commit()
+    lightning = entity_stats(session, 'horse', horses[0].id)
+    assert (lightning['starts'], lightning['avg_position']) == (1, 1.0)
+    assert rebuild(session) == 1
+    session.commit()
+    assert entity_stats(session, 'horse', horses[0].id)['starts'] == 1
+
+    assert declared.position == 0
+    declared.position, declared.race_time = 2, '1:41.0'
+    session.commit()
+    lightning = entity_stats(session, 'horse', horses[0].id)
+    assert (lightning['starts'], lightning['avg_position']) == (2, 1.5)
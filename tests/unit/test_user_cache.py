@@ -0,0 +1,100 @@
+import time
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from app.models import User, UserType
+from app.user_cache import UserCache, UserSnapshot, watch_sessions
+
+
+def make_snapshot(user_id, login='user', type_=UserType.PEASANT):
+    return UserSnapshot(id=user_id, login=login, type=type_)
+
+
+def test_hit_and_miss_counters():
+    """Тест счетчиков попаданий и промахов"""
+    cache = UserCache(maxsize=10, ttl=60)
+    assert cache.get(1) is None
+    cache.put(make_snapshot(1))
+    assert cache.get(1).id == 1
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_lru_eviction():
+    """Тест вытеснения давно неиспользуемых записей"""
+    cache = UserCache(maxsize=2, ttl=60)
+    cache.put(make_snapshot(1))
+    cache.put(make_snapshot(2))
+    cache.get(1)
+    cache.put(make_snapshot(3))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.get(3) is not None
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry():
+    """Тест истечения времени жизни записи"""
+    cache = UserCache(maxsize=10, ttl=0.01)
+    cache.put(make_snapshot(1))
+    time.sleep(0.02)
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_snapshot_is_read_only():
+    """Тест что снимок пользователя нельзя изменить"""
+    snapshot = make_snapshot(5, type_=UserType.ADMIN)
+    assert snapshot.get_id() == '5'
+    assert snapshot.is_authenticated
+    assert snapshot.is_admin
+    with pytest.raises(FrozenInstanceError):
+        snapshot.type = UserType.PEASANT
+
+
+def test_commit_invalidates_changed_user(db_app):
+    """Тест инвалидации кэша при смене роли пользователя"""
+    cache = db_app.user_cache
+    with db_app.db_session() as session:
+        user = User(login='alice', password='x')
+        session.add(user)
+        session.commit()
+        cache.put(UserSnapshot.from_user(user))
+
+        user.type = UserType.ADMIN
+        session.rollback()
+        assert cache.get(user.id) is not None
+
+        user = session.get(User, user.id)
+        user.type = UserType.ADMIN
+        session.commit()
+        assert cache.get(user.id) is None
+
+
+def test_watch_sessions_on_plain_sessionmaker():
+    """Тест что подписка работает на произвольной фабрике сессий"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.models import Base
+
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    cache = UserCache()
+    watch_sessions(cache, factory)
+
+    with factory() as session:
+        user = User(login='bob', password='x')
+        session.add(user)
+        session.commit()
+        cache.put(UserSnapshot.from_user(user))
+        session.delete(user)
+        session.commit()
+
+    assert cache.get(user.id) is None
+    assert cache.invalidations == 1